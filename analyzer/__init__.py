@@ -2,5 +2,7 @@
 Модуль анализа рекламных материалов на соответствие ФЗ "О рекламе"
 """
 from .material_analyzer import MaterialAnalyzer
+from .results import AnalysisResult, Violation
+from .rules import RulePack, RulePackManager, RulePackError, get_rule_manager
 
-__all__ = ['MaterialAnalyzer']
+__all__ = ['MaterialAnalyzer', 'AnalysisResult', 'Violation', 'RulePack', 'RulePackManager', 'RulePackError', 'get_rule_manager']
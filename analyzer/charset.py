@@ -0,0 +1,196 @@
+"""
+Определение кодировки страниц и потоковое декодирование
+
+Порядок: BOM → charset из Content-Type → <meta charset> в первых SNIFF_BYTES
+байтах → статистика по ограниченному образцу. Русские сайты часто подписывают
+windows-1251 вместо utf-8 и наоборот, поэтому объявленная кодировка сверяется
+с образцом: байты, не являющиеся UTF-8, не читаются как UTF-8, а корректный
+многобайтный UTF-8 не читается как однобайтная кириллица (в тексте на cp1251
+такие последовательности практически не встречаются).
+"""
+import codecs
+import re
+from typing import Optional, Tuple
+
+from metrics import PAGE_ENCODING_TOTAL
+
+try:
+    from charset_normalizer import from_bytes
+except ImportError:  # без charset-normalizer — cp1251, самая частая кодировка старых сайтов
+    from_bytes = None
+
+# Где искать <meta charset> и сколько байт с первого не-ASCII символа сверять и отдавать статистике
+SNIFF_BYTES = 4096
+SAMPLE_BYTES = 16 * 1024
+# Дальше решение не откладывается, даже если не-ASCII символов еще не было
+MAX_BUFFER_BYTES = 1024 * 1024
+
+# Кандидаты статистического определения: кириллица и западная кодировка
+DETECT_CANDIDATES = ['cp1251', 'koi8_r', 'cp866', 'cp1252']
+DEFAULT_ENCODING = 'cp1251'
+# Объявленные кодировки, которыми часто ошибочно подписаны кириллические страницы
+_WESTERN = ('ascii', 'iso8859-1', 'cp1252')
+
+# UTF-32 раньше UTF-16: BOM UTF-32 LE начинается с BOM UTF-16 LE
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+_CONTENT_TYPE_CHARSET_RE = re.compile(r'charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+# <meta charset="..."> и <meta http-equiv="Content-Type" content="text/html; charset=...">
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+?charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+_NON_ASCII_RE = re.compile(rb'[\x80-\xff]')
+
+
+def _lookup(name: str) -> Optional[str]:
+    """Каноническое имя кодировки Python или None для неизвестной"""
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def charset_from_content_type(content_type: Optional[str]) -> Optional[str]:
+    """Кодировка из заголовка Content-Type (None, если не указана или неизвестна)"""
+    if not content_type:
+        return None
+    match = _CONTENT_TYPE_CHARSET_RE.search(content_type)
+    return _lookup(match.group(1)) if match else None
+
+
+def charset_from_meta(head: bytes) -> Optional[str]:
+    """Кодировка из <meta> в первых SNIFF_BYTES байтах страницы"""
+    match = _META_CHARSET_RE.search(head[:SNIFF_BYTES])
+    if not match:
+        return None
+    encoding = _lookup(match.group(1).decode('ascii', errors='ignore'))
+    # Страница, прочитанная до <meta>, уже ASCII-совместима: utf-16 в meta — ошибка автора
+    if encoding and encoding.startswith('utf-16'):
+        return 'utf-8'
+    return encoding
+
+
+def _is_utf8(sample: bytes) -> bool:
+    """Образец — корректный UTF-8 (обрезанный в конце символ допускается)"""
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def detect_encoding(sample: bytes) -> str:
+    """Статистическое определение по образцу: UTF-8, иначе лучший из DETECT_CANDIDATES"""
+    sample = sample[:SAMPLE_BYTES]
+    if _is_utf8(sample):
+        return 'utf-8'
+    if from_bytes is not None:
+        match = from_bytes(sample, cp_isolation=DETECT_CANDIDATES).best()
+        if match is not None:
+            return _lookup(match.encoding) or DEFAULT_ENCODING
+    return DEFAULT_ENCODING
+
+
+def _sample(data: bytes) -> bytes:
+    """Образец для сверки и статистики: SAMPLE_BYTES с первого не-ASCII байта"""
+    match = _NON_ASCII_RE.search(data)
+    return data[match.start():match.start() + SAMPLE_BYTES] if match else b''
+
+
+def sniff_encoding(head: bytes, content_type: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Определяет кодировку по началу страницы
+
+    Args:
+        head: первые байты страницы (для сверки — не меньше SAMPLE_BYTES
+            с первого не-ASCII байта, если они есть)
+        content_type: заголовок Content-Type ответа
+
+    Returns:
+        (кодировка, источник): источник — bom, header, meta, detected или
+        corrected (объявленная кодировка не совпала с содержимым)
+    """
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding, 'bom'
+
+    declared, source = charset_from_content_type(content_type), 'header'
+    if declared is None:
+        declared, source = charset_from_meta(head), 'meta'
+    sample = _sample(head)
+    if declared is None:
+        return (detect_encoding(sample) if sample else 'utf-8'), 'detected'
+    if not sample or declared.startswith(('utf-16', 'utf-32')):
+        return declared, source
+
+    if declared == 'utf-8':
+        if _is_utf8(sample):
+            return declared, source
+        return detect_encoding(sample), 'corrected'
+    if _is_utf8(sample):
+        return 'utf-8', 'corrected'
+    if declared in _WESTERN:
+        # Латиница по умолчанию серверов и CMS на кириллической странице — сверяем со статистикой
+        detected = detect_encoding(sample)
+        if detected != declared:
+            return detected, 'corrected'
+    return declared, source
+
+
+class HtmlDecoder:
+    """
+    Потоковое декодирование страницы: байты подаются частями по мере загрузки,
+    кодировка определяется, как только накоплен образец, дальше части
+    декодируются сразу, без копии всей страницы в байтах
+    """
+
+    def __init__(self, content_type: Optional[str] = None):
+        self.content_type = content_type
+        self.encoding: Optional[str] = None
+        self.source: Optional[str] = None
+        self._buffer = bytearray()
+        self._sample_from: Optional[int] = None
+        self._decoder = None
+
+    def feed(self, chunk: bytes) -> str:
+        """Добавляет часть страницы; возвращает декодированный текст (пустой, пока копится образец)"""
+        if self._decoder is not None:
+            return self._decoder.decode(chunk)
+        if self._sample_from is None:
+            match = _NON_ASCII_RE.search(chunk)
+            if match:
+                self._sample_from = len(self._buffer) + match.start()
+        self._buffer += chunk
+        if self._ready():
+            return self._start()
+        return ''
+
+    def close(self) -> str:
+        """Завершает декодирование: остаток буфера и незавершенный символ в конце"""
+        text = self._start() if self._decoder is None else ''
+        return text + self._decoder.decode(b'', final=True)
+
+    def _ready(self) -> bool:
+        size = len(self._buffer)
+        if size >= MAX_BUFFER_BYTES:
+            return True
+        # Пока все байты ASCII, объявленную кодировку сверять не с чем — ждем образец
+        return (size >= SNIFF_BYTES and self._sample_from is not None
+                and size - self._sample_from >= SAMPLE_BYTES)
+
+    def _start(self) -> str:
+        data = bytes(self._buffer)
+        self._buffer = bytearray()
+        self.encoding, self.source = sniff_encoding(data, self.content_type)
+        PAGE_ENCODING_TOTAL.labels(self.source).inc()
+        self._decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+        return self._decoder.decode(data)
+
+
+def decode_html(data: bytes, content_type: Optional[str] = None) -> str:
+    """Текст страницы или файла целиком (кодировка — как у HtmlDecoder)"""
+    decoder = HtmlDecoder(content_type)
+    return decoder.feed(data) + decoder.close()
@@ -0,0 +1,264 @@
+"""
+Извлечение текста из присланных файлов: .txt, .html, .docx, .pdf
+Выполняется в пуле процессов. Файл читается с диска частями: абзацы и
+страницы извлекаются по одному, документ целиком в памяти не строится.
+Для каждого абзаца (страницы PDF) запоминается смещение в итоговом тексте,
+чтобы в отчете указать, где найдена формулировка.
+"""
+import os
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from bisect import bisect_right
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional, Tuple
+
+from analyzer.charset import HtmlDecoder
+
+try:
+    from pypdf import PdfReader
+    from pypdf.errors import PyPdfError
+    PDF_AVAILABLE = True
+except ImportError:
+    PDF_AVAILABLE = False
+
+# Формат по расширению файла
+DOCUMENT_FORMATS = {
+    '.txt': 'txt',
+    '.html': 'html',
+    '.htm': 'html',
+    '.docx': 'docx',
+    '.pdf': 'pdf',
+}
+
+# Размер части файла при чтении .txt и .html
+CHUNK_BYTES = 64 * 1024
+# Дальше текст не извлекается (защита от «zip-бомб» и многотысячестраничных PDF)
+MAX_TEXT_CHARS = 2 * 1024 * 1024
+
+# Теги, на которых заканчивается абзац HTML, и теги, текст которых не виден
+_HTML_BLOCK_TAGS = frozenset((
+    'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'figcaption',
+    'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav',
+    'ol', 'p', 'pre', 'section', 'table', 'td', 'th', 'title', 'tr', 'ul',
+))
+_HTML_SKIP_TAGS = frozenset(('script', 'style', 'noscript', 'template'))
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_DOCX_PARAGRAPH = _W + 'p'
+_DOCX_TABLE = _W + 'tbl'
+_DOCX_TEXT = _W + 't'
+_DOCX_BREAKS = (_W + 'tab', _W + 'br', _W + 'cr')
+
+
+class DocumentError(ValueError):
+    """Файл поврежден или не является документом своего формата"""
+
+
+def document_format(filename: Optional[str]) -> Optional[str]:
+    """Формат документа по имени файла (None — формат не поддерживается)"""
+    extension = os.path.splitext(filename or '')[1].lower()
+    return DOCUMENT_FORMATS.get(extension)
+
+
+class _TextCollector:
+    """Собирает абзацы в один текст и запоминает смещение и подпись каждого"""
+
+    def __init__(self, unit: str):
+        self.unit = unit
+        self.parts: List[str] = []
+        self.sections: List[Tuple[int, str]] = []
+        self.size = 0
+        self.count = 0
+        self.truncated = False
+
+    def add(self, text: str, number: Optional[int] = None) -> bool:
+        """
+        Добавляет абзац (пробелы нормализуются, пустые пропускаются)
+
+        Args:
+            text: Текст абзаца или страницы
+            number: Номер для подписи (по умолчанию — номер непустого абзаца)
+
+        Returns:
+            False, если достигнут MAX_TEXT_CHARS и читать дальше не нужно
+        """
+        text = ' '.join(text.split())
+        if not text:
+            return True
+        self.count += 1
+        self.sections.append((self.size, f'{self.unit} {number or self.count}'))
+        room = MAX_TEXT_CHARS - self.size
+        if len(text) >= room:
+            self.parts.append(text[:room])
+            self.size = MAX_TEXT_CHARS
+            self.truncated = True
+            return False
+        self.parts.append(text)
+        self.size += len(text) + 1
+        return True
+
+    @property
+    def text(self) -> str:
+        return '\n'.join(self.parts)
+
+
+class _HtmlParagraphs(HTMLParser):
+    """Потоковый разбор HTML: видимый текст, разбитый на абзацы по блочным тегам"""
+
+    def __init__(self, collector: _TextCollector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+        self._buffer: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _HTML_SKIP_TAGS:
+            self._skip += 1
+        elif tag in _HTML_BLOCK_TAGS:
+            self.flush()
+
+    def handle_endtag(self, tag):
+        if tag in _HTML_SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in _HTML_BLOCK_TAGS:
+            self.flush()
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._buffer.append(data)
+
+    def flush(self):
+        if self._buffer:
+            # Как BeautifulSoup.get_text(separator=' ') в MaterialAnalyzer.extract_text
+            self.collector.add(' '.join(self._buffer))
+            self._buffer.clear()
+
+
+def _decoded_chunks(path: str):
+    """Текст файла частями по CHUNK_BYTES байт (кодировка — как у страниц сайтов)"""
+    decoder = HtmlDecoder()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            yield decoder.feed(chunk)
+    yield decoder.close()
+
+
+def _extract_txt(path: str, collector: _TextCollector):
+    """Абзац — непустая строка файла"""
+    tail = ''
+    for text in _decoded_chunks(path):
+        lines = (tail + text).split('\n')
+        tail = lines.pop()
+        for line in lines:
+            if not collector.add(line):
+                return
+    collector.add(tail)
+
+
+def _extract_html(path: str, collector: _TextCollector):
+    parser = _HtmlParagraphs(collector)
+    for text in _decoded_chunks(path):
+        parser.feed(text)
+        if collector.truncated:
+            return
+    parser.close()
+    parser.flush()
+
+
+def _extract_docx(path: str, collector: _TextCollector):
+    """Абзацы word/document.xml по одному (iterparse), разобранные элементы очищаются"""
+    try:
+        with zipfile.ZipFile(path) as archive, archive.open('word/document.xml') as document:
+            for _, element in ET.iterparse(document):
+                if element.tag == _DOCX_PARAGRAPH:
+                    text = ''.join(
+                        (node.text or '') if node.tag == _DOCX_TEXT else ' '
+                        for node in element.iter() if node.tag == _DOCX_TEXT or node.tag in _DOCX_BREAKS
+                    )
+                    element.clear()
+                    if not collector.add(text):
+                        return
+                elif element.tag == _DOCX_TABLE:
+                    element.clear()
+    except (zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+        raise DocumentError(f"Не удалось прочитать DOCX: {e}") from e
+
+
+def _extract_pdf(path: str, collector: _TextCollector):
+    """Страницы по одной; подпись — номер страницы, в том числе после пустых страниц"""
+    if not PDF_AVAILABLE:
+        raise DocumentError("Чтение PDF недоступно: не установлен pypdf")
+    try:
+        reader = PdfReader(path)
+        for number, page in enumerate(reader.pages, 1):
+            if not collector.add(page.extract_text() or '', number):
+                return
+    except PyPdfError as e:
+        raise DocumentError(f"Не удалось прочитать PDF: {e}") from e
+
+
+_EXTRACTORS = {
+    'txt': (_extract_txt, 'абз.'),
+    'html': (_extract_html, 'абз.'),
+    'docx': (_extract_docx, 'абз.'),
+    'pdf': (_extract_pdf, 'стр.'),
+}
+
+
+def extract_document(path: str, filename: str) -> Dict:
+    """
+    Извлекает текст документа для анализа
+
+    Выполняется в процессе пула, поэтому принимает и возвращает только
+    сериализуемые значения.
+
+    Args:
+        path: Путь к загруженному файлу
+        filename: Исходное имя файла (формат определяется по расширению)
+
+    Returns:
+        Dict с форматом, текстом (абзацы через перевод строки), разделами
+        [(смещение, подпись)], числом абзацев или страниц с текстом, признаком
+        обрезки по MAX_TEXT_CHARS и временем извлечения
+
+    Raises:
+        DocumentError: если формат не поддерживается или файл не читается
+    """
+    format = document_format(filename)
+    if format is None:
+        raise DocumentError(f"Неподдерживаемый формат файла: {filename}")
+    extract, unit = _EXTRACTORS[format]
+    collector = _TextCollector(unit)
+
+    started = time.perf_counter()
+    extract(path, collector)
+    return {
+        'format': format,
+        'text': collector.text,
+        'sections': collector.sections,
+        'units': collector.count,
+        'truncated': collector.truncated,
+        'timings': {'extract': time.perf_counter() - started},
+    }
+
+
+def section_locator(sections: Optional[List[Tuple[int, str]]]) -> Optional[Callable[[int], Optional[str]]]:
+    """
+    Функция «смещение в тексте → подпись абзаца или страницы» для отчета
+
+    Returns:
+        None, если разделов нет (материал — не документ)
+    """
+    if not sections:
+        return None
+    offsets = [offset for offset, _ in sections]
+
+    def locate(offset: int) -> Optional[str]:
+        index = bisect_right(offsets, offset) - 1
+        return sections[index][1] if index >= 0 else None
+
+    return locate
@@ -0,0 +1,150 @@
+"""
+Распознавание текста на рекламных изображениях (баннеры, скриншоты объявлений)
+Работает офлайн через локальный Tesseract и выполняется в пуле процессов
+"""
+import io
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import REQUIRED_DISCLAIMER
+
+try:
+    from PIL import Image
+    import pytesseract
+    OCR_AVAILABLE = True
+except ImportError:
+    OCR_AVAILABLE = False
+
+_WORD_RE = re.compile(r'[0-9a-zа-яё%]+')
+
+# Сколько слов дисклеймера подряд может не распознаться, прежде чем блок считается законченным
+MAX_MISSED_WORDS = 3
+
+
+def _normalize(word: str) -> str:
+    """Нижний регистр, без пунктуации, ё -> е"""
+    return ''.join(_WORD_RE.findall(word.lower())).replace('ё', 'е')
+
+
+DISCLAIMER_WORDS = [w for w in (_normalize(w) for w in REQUIRED_DISCLAIMER.split()) if w]
+
+
+def downsample(image: 'Image.Image', max_side: int) -> 'Image.Image':
+    """Уменьшает изображение так, чтобы большая сторона не превышала max_side"""
+    if max(image.size) <= max_side:
+        return image
+    image = image.copy()
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    return image
+
+
+def find_disclaimer_box(words: List[Tuple[str, int, int, int, int]]) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Находит область дисклеймера среди распознанных слов
+
+    Ищет самую длинную последовательность слов, идущих в порядке текста
+    дисклеймера (с допуском на нераспознанные слова).
+
+    Args:
+        words: Список (слово, left, top, width, height) в порядке чтения
+
+    Returns:
+        (left, top, right, bottom) или None, если дисклеймер не найден
+    """
+    normalized = [_normalize(w[0]) for w in words]
+    best: List[int] = []
+
+    for i, word in enumerate(normalized):
+        if word != DISCLAIMER_WORDS[0] and word != DISCLAIMER_WORDS[1]:
+            continue
+        matched = [i]
+        expected = DISCLAIMER_WORDS.index(word) + 1
+        missed = 0
+        j = i + 1
+        while j < len(normalized) and expected < len(DISCLAIMER_WORDS) and missed <= MAX_MISSED_WORDS:
+            if not normalized[j]:
+                j += 1
+                continue
+            # Допускаем пропуск нескольких слов дисклеймера, которые OCR не распознал
+            window = DISCLAIMER_WORDS[expected:expected + MAX_MISSED_WORDS + 1]
+            if normalized[j] in window:
+                expected += window.index(normalized[j]) + 1
+                matched.append(j)
+                missed = 0
+            else:
+                missed += 1
+            j += 1
+        if len(matched) > len(best):
+            best = matched
+
+    # Слишком короткое совпадение — скорее случайное слово «банкротство» в тексте
+    if len(best) < len(DISCLAIMER_WORDS) // 3:
+        return None
+
+    left = min(words[k][1] for k in best)
+    top = min(words[k][2] for k in best)
+    right = max(words[k][1] + words[k][3] for k in best)
+    bottom = max(words[k][2] + words[k][4] for k in best)
+    return left, top, right, bottom
+
+
+def ocr_image(image_bytes: bytes, max_side: int = 2000, lang: str = 'rus') -> Dict:
+    """
+    Распознает текст на изображении и измеряет площадь дисклеймера
+
+    Выполняется в процессе пула, поэтому принимает и возвращает только
+    сериализуемые значения.
+
+    Args:
+        image_bytes: Содержимое файла изображения
+        max_side: Максимальная сторона изображения перед OCR (пиксели)
+        lang: Языки Tesseract
+
+    Returns:
+        Dict с текстом, исходными размерами, областью дисклеймера (в координатах
+        уменьшенного изображения), ее площадью в % и временем этапов
+    """
+    timings = {}
+
+    started = time.perf_counter()
+    image = Image.open(io.BytesIO(image_bytes))
+    image.load()
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    timings['decode'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    original_size = image.size
+    image = downsample(image, max_side)
+    timings['downsample'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+    timings['ocr'] = time.perf_counter() - started
+
+    # Tesseract возвращает слова в порядке чтения; пустые записи — границы блоков и строк
+    words = []
+    for k, word in enumerate(data['text']):
+        word = word.strip()
+        if word:
+            words.append((word, data['left'][k], data['top'][k], data['width'][k], data['height'][k]))
+
+    # Переносы строк на баннере не должны мешать поиску точного текста дисклеймера
+    text = ' '.join(w[0] for w in words)
+
+    width, height = image.size
+    box = find_disclaimer_box(words)
+    area_percent = None
+    if box:
+        left, top, right, bottom = box
+        area_percent = round((right - left) * (bottom - top) * 100.0 / (width * height), 2)
+
+    return {
+        'text': text,
+        'width': original_size[0],
+        'height': original_size[1],
+        'disclaimer_box': box,
+        'disclaimer_area_percent': area_percent,
+        'timings': timings,
+    }
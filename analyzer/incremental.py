@@ -0,0 +1,279 @@
+"""
+Повторная проверка страницы: анализ только изменившихся сегментов
+Текст страницы делится на сегменты по границам, зависящим от содержимого
+(концы предложений с подходящим хэшем), поэтому правка в одном месте меняет
+один-два сегмента, а не все. Найденные формулировки хранятся по хэшу
+сегмента; при повторной проверке того же URL анализируются только новые
+сегменты, а ответ дополняется сравнением с прошлой проверкой
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import zlib
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from metrics import RECHECK_SEGMENTS_TOTAL
+from tracing import span
+from .material_analyzer import MaterialAnalyzer
+from .results import AnalysisResult, Violation
+
+logger = logging.getLogger(__name__)
+
+# Размер сегмента (символов): граница не раньше MIN и не позже MAX
+SEGMENT_MIN_CHARS = 256
+SEGMENT_MAX_CHARS = 4096
+# Конец предложения становится границей, если младшие биты хэша его окончания
+# равны нулю: 1 из BOUNDARY_MASK + 1 — в среднем сегмент около 1 КБ
+BOUNDARY_MASK = 7
+# Символов по обе стороны границы, в которых ищутся совпадения через границу
+SEAM_CHARS = 128
+# Сегментов в памяти (общие для всех страниц: шапки, футеры)
+SEGMENT_CACHE_SIZE = 50000
+
+SNAPSHOT_VERSION = 1
+
+_SENTENCE_END_RE = re.compile(r'[.!?…]+\s+')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Находки сегмента: (категория, номер шаблона, начало, конец) относительно сегмента
+Findings = Tuple[Tuple[str, int, int, int], ...]
+
+
+def _is_boundary(text: str, end: int) -> bool:
+    return zlib.crc32(text[max(0, end - 16):end].encode('utf-8')) & BOUNDARY_MASK == 0
+
+
+def _fallback_cut(text: str, start: int) -> int:
+    """Граница в длинном фрагменте без подходящих концов предложений (меню, списки)"""
+    limit = start + SEGMENT_MAX_CHARS
+    for match in _WHITESPACE_RE.finditer(text, start + SEGMENT_MIN_CHARS, limit):
+        if _is_boundary(text, match.end()):
+            return match.end()
+    return limit
+
+
+def split_segments(text: str) -> List[Tuple[int, int]]:
+    """
+    Делит текст на сегменты, зависящие от содержимого
+
+    Returns:
+        Список (начало, конец); сегменты покрывают текст без пропусков
+    """
+    bounds = []
+    start = 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        end = match.end()
+        while end - start > SEGMENT_MAX_CHARS:
+            cut = _fallback_cut(text, start)
+            bounds.append((start, cut))
+            start = cut
+        if end - start >= SEGMENT_MIN_CHARS and _is_boundary(text, end):
+            bounds.append((start, end))
+            start = end
+    while len(text) - start > SEGMENT_MAX_CHARS:
+        cut = _fallback_cut(text, start)
+        bounds.append((start, cut))
+        start = cut
+    if start < len(text):
+        bounds.append((start, len(text)))
+    return bounds
+
+
+def segment_hash(segment: str) -> str:
+    return hashlib.blake2b(segment.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def diff_results(previous: Dict, result: AnalysisResult) -> Dict:
+    """
+    Сравнение с прошлой проверкой страницы
+
+    Нарушения сравниваются по категории и найденной фразе (с учетом
+    количества), а не по позиции: сдвиг текста не считается изменением.
+
+    Returns:
+        previous_verdict, previous_checked_at, rules_changed, fixed, new
+        (списки {'category', 'phrase', 'count'}), unchanged (число), disclaimer
+        ('added', 'removed' или 'unchanged')
+    """
+    before = Counter(tuple(found) for found in previous['found'])
+    after = Counter((v.category, v.phrase) for v in result.violations)
+
+    def listed(counter: Counter) -> List[Dict]:
+        return [{'category': category, 'phrase': phrase, 'count': count}
+                for (category, phrase), count in sorted(counter.items())]
+
+    was_found = previous['disclaimer_found']
+    is_found = bool(result.disclaimer.get('found'))
+    return {
+        'previous_verdict': previous['verdict'],
+        'previous_checked_at': previous['checked_at'],
+        'rules_changed': previous['rules'] != result.rules_version,
+        'fixed': listed(before - after),
+        'new': listed(after - before),
+        'unchanged': sum((before & after).values()),
+        'disclaimer': 'unchanged' if was_found == is_found else ('added' if is_found else 'removed'),
+    }
+
+
+class IncrementalAnalyzer:
+    """
+    Проверка страниц с повторным использованием результатов по сегментам
+
+    Результат совпадает с MaterialAnalyzer.analyze_html: дисклеймер ищется по
+    всему тексту (это дешево), запрещенные формулировки — по сегментам, а
+    совпадения через границу сегментов — в окне SEAM_CHARS вокруг нее.
+    Сегменты последней проверки URL хранятся в базе по пользователю.
+    """
+
+    def __init__(self, analyzer: MaterialAnalyzer, db=None, cache_size: int = SEGMENT_CACHE_SIZE):
+        """
+        Args:
+            analyzer: Анализатор (набор правил, дисклеймер, вердикт)
+            db: Database для сегментов прошлых проверок (None — только кэш в памяти)
+            cache_size: Сегментов и границ в памяти
+        """
+        self.analyzer = analyzer
+        self.db = db
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[Tuple, Findings]' = OrderedDict()
+        # Анализ выполняется в потоках (asyncio.to_thread)
+        self._lock = threading.Lock()
+
+    def _cached(self, key: Tuple) -> Optional[Findings]:
+        with self._lock:
+            found = self._cache.get(key)
+            if found is not None:
+                self._cache.move_to_end(key)
+            return found
+
+    def _remember(self, key: Tuple, found: Findings):
+        with self._lock:
+            self._cache[key] = found
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def analyze_html(self, html: str, url: str, owner: str) -> Tuple[AnalysisResult, Optional[Dict]]:
+        """
+        Проверяет страницу; при повторной проверке — только изменившиеся сегменты
+
+        Args:
+            html: HTML страницы
+            url: URL страницы
+            owner: Кто проверяет (telegram_id): сравнение — с его прошлой проверкой
+
+        Returns:
+            (результат анализа, сравнение с прошлой проверкой или None)
+        """
+        text = self.analyzer.extract_text(html)
+
+        previous = None
+        if self.db is not None:
+            try:
+                row = self.db.get_url_snapshot(owner, url_hash(url))
+                if row:
+                    previous = json.loads(row['snapshot'])
+            except Exception as e:
+                logger.warning("Не удалось прочитать прошлую проверку %s: %s", url, e)
+            if previous is not None and previous.get('v') != SNAPSHOT_VERSION:
+                previous = None
+
+        with span('analyze'):
+            result, segments, seams = self._analyze(text, url, previous)
+
+        diff = diff_results(previous, result) if previous is not None else None
+        if self.db is not None:
+            snapshot = {
+                'v': SNAPSHOT_VERSION,
+                'rules': result.rules_version,
+                'verdict': result.verdict,
+                'disclaimer_found': bool(result.disclaimer.get('found')),
+                'checked_at': datetime.now().strftime('%d.%m.%Y %H:%M'),
+                'segments': segments,
+                'seams': seams,
+                'found': [(v.category, v.phrase) for v in result.violations],
+            }
+            self.db.save_url_snapshot(owner, url_hash(url), url, result.rules_version,
+                                      json.dumps(snapshot, ensure_ascii=False, separators=(',', ':')))
+        return result, diff
+
+    def _analyze(self, text: str, url: Optional[str], previous: Optional[Dict]):
+        rule_pack = self.analyzer.rules.current
+        version = rule_pack.version
+        text_lower = text.lower()
+        if len(text_lower) != len(text):
+            # Редкие символы меняют длину при lower() — смещения сегментов не совпадут
+            result = self.analyzer._analyze_text(text, 'site', url=url)
+            return result, [], []
+
+        # Находки прошлой проверки годятся, только если набор правил тот же
+        known: Dict[str, Findings] = {}
+        known_seams: Dict[Tuple[str, str], Findings] = {}
+        if previous is not None and previous.get('rules') == version:
+            known = {h: tuple(tuple(f) for f in found) for h, found in previous['segments']}
+            known_seams = {(left, right): tuple(tuple(f) for f in found) for left, right, found in previous['seams']}
+
+        def findings(segment: str) -> Findings:
+            return tuple((category, pattern_id, match.start(), match.end())
+                         for category, pattern_id, match in rule_pack.finditer(segment))
+
+        bounds = split_segments(text_lower)
+        hashes = [segment_hash(text_lower[start:end]) for start, end in bounds]
+        matches = []
+        segments, seams = [], []
+        analyzed = 0
+        for i, (start, end) in enumerate(bounds):
+            h = hashes[i]
+            found = known.get(h)
+            if found is None:
+                found = self._cached((version, h))
+            if found is None:
+                found = findings(text_lower[start:end])
+                analyzed += 1
+            self._remember((version, h), found)
+            segments.append((h, found))
+            matches.extend((category, pattern_id, start + a, start + b) for category, pattern_id, a, b in found)
+
+            if i + 1 < len(bounds):
+                key = (h, hashes[i + 1])
+                found = known_seams.get(key)
+                if found is None:
+                    found = self._cached((version,) + key)
+                if found is None:
+                    left = text_lower[max(start, end - SEAM_CHARS):end]
+                    window = left + text_lower[end:min(bounds[i + 1][1], end + SEAM_CHARS)]
+                    # Только совпадения, пересекающие границу: остальные найдены в сегментах
+                    found = tuple((category, pattern_id, a - len(left), b - len(left))
+                                  for category, pattern_id, a, b in findings(window)
+                                  if a < len(left) < b)
+                self._remember((version,) + key, found)
+                seams.append((key[0], key[1], found))
+                matches.extend((category, pattern_id, end + a, end + b) for category, pattern_id, a, b in found)
+
+        RECHECK_SEGMENTS_TOTAL.labels('analyzed').inc(analyzed)
+        RECHECK_SEGMENTS_TOTAL.labels('reused').inc(len(bounds) - analyzed)
+
+        # Порядок как у полного анализа: категория, шаблон, позиция
+        order = {category: i for i, category in enumerate(rule_pack.category_ids)}
+        matches.sort(key=lambda m: (order[m[0]], m[1], m[2]))
+        violations = [Violation(category, pattern_id, a, b, source=text) for category, pattern_id, a, b in matches]
+
+        disclaimer = self.analyzer._check_disclaimer(text, text_lower)
+        result = AnalysisResult(
+            verdict=self.analyzer._determine_verdict(disclaimer, len(violations)),
+            material_type='site',
+            url=url,
+            disclaimer=disclaimer,
+            violations=violations,
+            categories=rule_pack.category_ids,
+            rules_version=version,
+            text=text,
+        )
+        return result, segments, seams
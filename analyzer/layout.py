@@ -0,0 +1,254 @@
+"""
+Измерение дисклеймера на отрисованной странице
+Верстает HTML и CSS сайта офлайн (WeasyPrint) в окне первого экрана,
+находит блоки текста дисклеймера, их кегль, площадь и скрытые элементы
+"""
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from config import REQUIRED_DISCLAIMER, LAYOUT_VIEWPORT, LAYOUT_FETCH_TIMEOUT
+from metrics import ERRORS_TOTAL
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Ключевые фразы для частичного совпадения (как в MaterialAnalyzer._check_disclaimer)
+KEY_PHRASES = [
+    'банкротство влечет негативные последствия',
+    'ограничения на получение кредита',
+    'повторное банкротство в течение пяти лет',
+]
+
+# Текст мельче этого кегля считаем нечитаемым (скрытым)
+MIN_VISIBLE_FONT_PX = 1.0
+
+
+def _normalize(text: str) -> str:
+    return ' '.join(text.lower().replace('ё', 'е').split())
+
+
+def _stylesheet_fetcher(url: str):
+    """
+    Загрузчик ресурсов для верстки: только таблицы стилей и data: URL
+
+    Картинки, шрифты и скрипты не нужны для измерения и не загружаются.
+    """
+    from weasyprint import default_url_fetcher
+
+    if url.startswith('data:'):
+        return default_url_fetcher(url)
+    if not urlparse(url).path.lower().endswith('.css'):
+        raise ValueError(f"Ресурс не загружается при измерении верстки: {url}")
+    return default_url_fetcher(url, timeout=LAYOUT_FETCH_TIMEOUT)
+
+
+def _intersect(a: Tuple[float, float, float, float], b: Tuple[float, float, float, float]):
+    left, top = max(a[0], b[0]), max(a[1], b[1])
+    right, bottom = min(a[2], b[2]), min(a[3], b[3])
+    return left, top, max(left, right), max(top, bottom)
+
+
+def _area(rect: Tuple[float, float, float, float]) -> float:
+    return (rect[2] - rect[0]) * (rect[3] - rect[1])
+
+
+def _collect_text_boxes(box, clip, opacity: float, background, page_index: int, out: List[Dict]):
+    """
+    Обходит дерево блоков страницы и собирает текстовые блоки
+
+    Вместе с каждым блоком запоминается видимая часть (с учетом overflow
+    предков), итоговая прозрачность и цвет ближайшего непрозрачного фона.
+    """
+    from weasyprint.formatting_structure.boxes import ParentBox, TextBox
+
+    style = box.style
+    opacity *= style['opacity']
+    background_color = style['background_color']
+    if background_color.alpha > 0:
+        background = background_color
+
+    if isinstance(box, TextBox):
+        rect = (
+            box.content_box_x(),
+            box.content_box_y(),
+            box.content_box_x() + box.width,
+            box.content_box_y() + box.height,
+        )
+        color = style['color']
+        reasons = []
+        if style['visibility'] != 'visible':
+            reasons.append('visibility')
+        if opacity <= 0 or color.alpha <= 0:
+            reasons.append('transparent')
+        if style['font_size'] < MIN_VISIBLE_FONT_PX:
+            reasons.append('font_size')
+        if background is not None and tuple(color[:3]) == tuple(background[:3]):
+            reasons.append('color_matches_background')
+        visible_rect = _intersect(rect, clip)
+        if _area(visible_rect) <= 0:
+            reasons.append('clipped')
+        out.append({
+            'text': box.text,
+            'page': page_index,
+            'rect': visible_rect,
+            'font_size': style['font_size'],
+            'hidden_reasons': reasons,
+        })
+        return
+
+    if isinstance(box, ParentBox):
+        if style['overflow'] != 'visible':
+            clip = _intersect(clip, (
+                box.padding_box_x(),
+                box.padding_box_y(),
+                box.padding_box_x() + box.padding_width(),
+                box.padding_box_y() + box.padding_height(),
+            ))
+        for child in box.children:
+            _collect_text_boxes(child, clip, opacity, background, page_index, out)
+
+
+def _locate_disclaimer(boxes: List[Dict]) -> List[Dict]:
+    """Текстовые блоки, на которые приходится текст дисклеймера"""
+    spans = []
+    parts = []
+    position = 0
+    for box in boxes:
+        text = _normalize(box['text'])
+        if not text:
+            continue
+        spans.append((position, position + len(text), box))
+        parts.append(text)
+        position += len(text) + 1
+    full_text = ' '.join(parts)
+
+    disclaimer = _normalize(REQUIRED_DISCLAIMER)
+    start = full_text.find(disclaimer)
+    if start >= 0:
+        end = start + len(disclaimer)
+    else:
+        found = [(full_text.find(p), p) for p in KEY_PHRASES]
+        found = [(i, p) for i, p in found if i >= 0]
+        if len(found) < 2:
+            return []
+        start = min(i for i, _ in found)
+        end = max(i + len(p) for i, p in found)
+
+    return [box for box_start, box_end, box in spans if box_start < end and box_end > start]
+
+
+def measure_disclaimer_layout(html: str, base_url: Optional[str] = None,
+                              viewport: Tuple[int, int] = LAYOUT_VIEWPORT) -> Dict:
+    """
+    Верстает страницу и измеряет дисклеймер относительно первого экрана
+
+    Выполняется в процессе пула рендеринга, поэтому принимает и возвращает
+    только сериализуемые значения.
+
+    Args:
+        html: HTML-код страницы
+        base_url: URL страницы (для относительных ссылок на CSS)
+        viewport: Размер первого экрана (ширина, высота) в CSS-пикселях
+
+    Returns:
+        Dict с результатами: found_in_layout, visible, on_first_screen,
+        area_percent, font_size_px, hidden_reasons, timings
+    """
+    from weasyprint import CSS, HTML
+
+    width, height = viewport
+    timings = {}
+
+    # Страница размером с экран: первая страница документа — это первый экран
+    page_css = CSS(string=f'@page {{ size: {width}px {height}px; margin: 0 }}')
+
+    started = time.perf_counter()
+    document = HTML(
+        string=html,
+        base_url=base_url,
+        url_fetcher=_stylesheet_fetcher,
+        media_type='screen',
+    ).render(stylesheets=[page_css])
+    timings['layout'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    boxes = []
+    screen = (0.0, 0.0, float(width), float(height))
+    for page_index, page in enumerate(document.pages):
+        _collect_text_boxes(page._page_box, screen, 1.0, None, page_index, boxes)
+    disclaimer_boxes = _locate_disclaimer(boxes)
+
+    visible_boxes = [b for b in disclaimer_boxes if not b['hidden_reasons']]
+    first_screen = [b for b in visible_boxes if b['page'] == 0]
+    area = sum(_area(b['rect']) for b in first_screen)
+    hidden_reasons = sorted({r for b in disclaimer_boxes for r in b['hidden_reasons']})
+    timings['measure'] = time.perf_counter() - started
+
+    return {
+        'measured': True,
+        'found_in_layout': bool(disclaimer_boxes),
+        # Дисклеймер видим, если видима большая часть его блоков
+        'visible': bool(disclaimer_boxes) and len(visible_boxes) * 2 >= len(disclaimer_boxes),
+        'on_first_screen': bool(first_screen),
+        'area_percent': round(area * 100.0 / (width * height), 2),
+        'font_size_px': round(min(b['font_size'] for b in visible_boxes), 1) if visible_boxes else None,
+        'hidden_reasons': hidden_reasons,
+        'viewport': [width, height],
+        'timings': timings,
+    }
+
+
+class LayoutStage:
+    """
+    Этап измерения верстки: кэш по хэшу содержимого страницы + пул рендеринга
+
+    Одинаковые страницы (повторные проверки, несколько пользователей
+    с одним сайтом) верстаются один раз.
+    """
+
+    def __init__(self, pool, max_entries: int = 256, max_html_bytes: int = 2 * 1024 * 1024):
+        self.pool = pool
+        self.max_entries = max_entries
+        self.max_html_bytes = max_html_bytes
+        self._cache: 'OrderedDict[str, Dict]' = OrderedDict()
+
+    @staticmethod
+    def cache_key(html: str, base_url: Optional[str], viewport: Tuple[int, int] = LAYOUT_VIEWPORT) -> str:
+        """Ключ кэша: хэш содержимого страницы, базового URL и размера экрана"""
+        digest = hashlib.sha256(html.encode('utf-8', errors='replace'))
+        digest.update(f'|{base_url}|{viewport[0]}x{viewport[1]}'.encode())
+        return digest.hexdigest()
+
+    async def measure(self, html: str, base_url: Optional[str] = None) -> Optional[Dict]:
+        """
+        Измеряет дисклеймер на странице (из кэша или в пуле рендеринга)
+
+        Returns:
+            Результат measure_disclaimer_layout или None, если измерение не удалось
+        """
+        if len(html) > self.max_html_bytes:
+            logger.info("Страница слишком большая для измерения верстки: %s символов", len(html))
+            return None
+
+        key = self.cache_key(html, base_url)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        try:
+            with span('layout'):
+                result = await self.pool.submit(measure_disclaimer_layout, html, base_url, LAYOUT_VIEWPORT)
+        except Exception as e:
+            ERRORS_TOTAL.labels('layout').inc()
+            logger.warning("Не удалось измерить верстку %s: %s", base_url, e)
+            return None
+
+        self._cache[key] = result
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return result
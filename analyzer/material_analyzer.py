@@ -2,79 +2,36 @@
 Анализатор рекламных материалов
 Проверяет материалы на соответствие ФЗ "О рекламе"
 """
-import re
 import requests
 from bs4 import BeautifulSoup
 from typing import Dict, List, Optional, Tuple
 from config import REQUIRED_DISCLAIMER, MIN_DISCLAIMER_SIZE
+from metrics import HTTP_FETCH_IN_FLIGHT
+from tracing import span
+from .charset import HtmlDecoder
+from .rules import RulePack, RulePackManager, get_rule_manager
+from .results import AnalysisResult, Violation
+
+# Размер части тела страницы при загрузке
+FETCH_CHUNK_BYTES = 64 * 1024
 
 
 class MaterialAnalyzer:
     """Анализатор рекламных материалов на соответствие ФЗ "О рекламе" """
     
-    def __init__(self):
+    def __init__(self, rules: Optional[RulePackManager] = None):
         self.required_disclaimer = REQUIRED_DISCLAIMER
         self.min_disclaimer_size = MIN_DISCLAIMER_SIZE
         
-        # Запрещенные слова и фразы
-        self.prohibited_patterns = {
-            'guarantees': [
-                r'гарантируем',
-                r'гарантия',
-                r'100%[\s]*списание',
-                r'полное[\s]*списание',
-                r'гарантированное[\s]*освобождение',
-                r'обещаем[\s]*списание',
-                r'обещаем[\s]*освобождение',
-            ],
-            'calls_not_pay': [
-                r'не[\s]*платите',
-                r'перестаньте[\s]*платить',
-                r'прекратите[\s]*платежи',
-                r'можно[\s]*не[\s]*платить',
-                r'не[\s]*исполняйте[\s]*обязательства',
-            ],
-            'state_system': [
-                r'государство[\s]*создало',
-                r'государственная[\s]*программа',
-                r'государство[\s]*помогает',
-                r'система[\s]*освобождения',
-            ],
-            'mention_exemption': [
-                r'спишем[\s]*долги',
-                r'списание[\s]*долгов',
-                r'освобождение[\s]*от[\s]*долгов',
-                r'освобождение[\s]*от[\s]*кредитов',
-                r'избавимся[\s]*от[\s]*долгов',
-                r'долг[\s]*=[\s]*0',
-                r'долг[\s]*равен[\s]*нулю',
-            ],
-            'property_preservation': [
-                r'сохраним[\s]*имущество',
-                r'сохраним[\s]*квартиру',
-                r'сохраним[\s]*машину',
-                r'гарантируем[\s]*сохранение',
-            ],
-            'money_back': [
-                r'вернем[\s]*деньги',
-                r'компенсируем[\s]*расходы',
-                r'гарантия[\s]*возврата',
-                r'деньги[\s]*назад',
-            ],
-            'take_loans': [
-                r'возьмите[\s]*кредит',
-                r'берите[\s]*займы',
-                r'кредит[\s]*на[\s]*банкротство',
-            ],
-            'any_cases': [
-                r'беремся[\s]*за[\s]*любые[\s]*дела',
-                r'не[\s]*важно[\s]*на[\s]*что',
-                r'не[\s]*важно[\s]*сколько',
-                r'лудоман[\s]*не[\s]*проблема',
-            ],
-        }
+        # Запрещенные слова и фразы загружаются из версионированного набора правил
+        self.rules = rules or get_rule_manager()
     
-    def analyze_url(self, url: str) -> Dict:
+    @property
+    def prohibited_patterns(self) -> Dict[str, List[str]]:
+        """Шаблоны текущего набора правил по категориям"""
+        return {c.id: c.patterns for c in self.rules.current.categories}
+    
+    def analyze_url(self, url: str) -> AnalysisResult:
         """
         Анализирует сайт по URL
         
@@ -82,64 +39,109 @@ class MaterialAnalyzer:
             url: URL сайта для проверки
             
         Returns:
-            Dict с результатами анализа
+            AnalysisResult с результатами анализа
         """
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
+            html = self.fetch_html(url)
+            return self.analyze_html(html, url=url)
             
-            soup = BeautifulSoup(response.text, 'html.parser')
+        except Exception as e:
+            return AnalysisResult.failed(f'Ошибка при загрузке сайта: {str(e)}', url=url)
+    
+    def fetch_html(self, url: str) -> str:
+        """
+        Загружает HTML страницы
+        
+        Raises:
+            requests.RequestException: при ошибке загрузки
+        """
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        }
+        HTTP_FETCH_IN_FLIGHT.inc()
+        try:
+            with span('fetch'):
+                # Тело декодируется по мере загрузки: кодировка определяется по началу
+                # страницы, а не статистикой requests по всему телу
+                with requests.get(url, headers=headers, timeout=10, stream=True) as response:
+                    response.raise_for_status()
+                    decoder = HtmlDecoder(response.headers.get('Content-Type'))
+                    parts = [decoder.feed(chunk) for chunk in response.iter_content(FETCH_CHUNK_BYTES)]
+                    parts.append(decoder.close())
+                    return ''.join(parts)
+        finally:
+            HTTP_FETCH_IN_FLIGHT.dec()
+    
+    def analyze_html(self, html: str, url: Optional[str] = None) -> AnalysisResult:
+        """
+        Анализирует уже загруженный HTML страницы
+        
+        Args:
+            html: HTML-код страницы
+            url: URL страницы
+            
+        Returns:
+            AnalysisResult с результатами анализа
+        """
+        return self.analyze_text(self.extract_text(html), material_type='site', url=url)
+    
+    def extract_text(self, html: str) -> str:
+        """Текст страницы: видимый текст HTML с нормализованными пробелами"""
+        with span('parse'):
+            soup = BeautifulSoup(html, 'html.parser')
             
             # Извлекаем текст
             text = soup.get_text(separator=' ', strip=True)
             
             # Удаляем лишние пробелы
-            text = ' '.join(text.split())
-            
-            return self.analyze_text(text, material_type='site', url=url)
-            
-        except Exception as e:
-            return {
-                'error': f'Ошибка при загрузке сайта: {str(e)}',
-                'verdict': 'ERROR'
-            }
+            return ' '.join(text.split())
     
-    def analyze_text(self, text: str, material_type: str = 'text', **kwargs) -> Dict:
+    def analyze_text(self, text: str, material_type: str = 'text', **kwargs) -> AnalysisResult:
         """
         Анализирует текст на наличие нарушений
         
         Args:
             text: Текст для анализа
-            material_type: Тип материала (site, text, card)
-            **kwargs: Дополнительные параметры (url, etc.)
+            material_type: Тип материала (site, text, card, image, document)
+            **kwargs: Дополнительные параметры (url, disclaimer_area_percent —
+                измеренная площадь дисклеймера в % от площади материала)
             
         Returns:
-            Dict с результатами анализа
+            AnalysisResult с результатами анализа
         """
+        with span('analyze'):
+            return self._analyze_text(text, material_type, **kwargs)
+    
+    def _analyze_text(self, text: str, material_type: str, **kwargs) -> AnalysisResult:
         text_lower = text.lower()
         
+        # Фиксируем набор правил на всю проверку: перезагрузка во время анализа
+        # не должна смешивать версии
+        rule_pack = self.rules.current
+        
         # Проверка дисклеймера
-        disclaimer_check = self._check_disclaimer(text)
+        disclaimer_check = self._check_disclaimer(text, text_lower)
+        if kwargs.get('disclaimer_area_percent') is not None:
+            self._apply_disclaimer_size(disclaimer_check, kwargs['disclaimer_area_percent'])
         
         # Проверка запрещенных формулировок
-        violations = self._check_prohibited_formulations(text_lower, text)
+        violations = self._check_prohibited_formulations(text_lower, text, rule_pack)
         
         # Формирование вердикта
-        verdict = self._determine_verdict(disclaimer_check, violations)
+        verdict = self._determine_verdict(disclaimer_check, len(violations))
         
-        return {
-            'verdict': verdict,
-            'material_type': material_type,
-            'url': kwargs.get('url'),
-            'disclaimer': disclaimer_check,
-            'violations': violations,
-            'total_violations': sum(len(v) for v in violations.values() if v),
-        }
+        return AnalysisResult(
+            verdict=verdict,
+            material_type=material_type,
+            url=kwargs.get('url'),
+            disclaimer=disclaimer_check,
+            violations=violations,
+            categories=rule_pack.category_ids,
+            rules_version=rule_pack.version,
+            text=text,
+        )
     
-    def _check_disclaimer(self, text: str) -> Dict:
+    def _check_disclaimer(self, text: str, text_lower: Optional[str] = None) -> Dict:
         """
         Проверяет наличие и корректность дисклеймера
         
@@ -147,7 +149,8 @@ class MaterialAnalyzer:
             Dict с результатами проверки
         """
         disclaimer_lower = self.required_disclaimer.lower()
-        text_lower = text.lower()
+        if text_lower is None:
+            text_lower = text.lower()
         
         # Точное совпадение
         if disclaimer_lower in text_lower:
@@ -189,57 +192,83 @@ class MaterialAnalyzer:
             'visible': False,
         }
     
-    def _check_prohibited_formulations(self, text_lower: str, text_original: str) -> Dict:
+    def _apply_disclaimer_size(self, disclaimer_check: Dict, area_percent: float):
+        """
+        Дополняет проверку дисклеймера измеренной площадью
+        
+        Args:
+            disclaimer_check: Результат _check_disclaimer (изменяется на месте)
+            area_percent: Площадь дисклеймера в % от площади материала
+        """
+        if not disclaimer_check.get('found'):
+            return
+        
+        disclaimer_check['area_percent'] = area_percent
+        if area_percent >= self.min_disclaimer_size:
+            disclaimer_check['size_check'] = 'ok'
+        else:
+            disclaimer_check['size_check'] = 'too_small'
+            disclaimer_check['readable'] = False
+    
+    def apply_layout(self, analysis_result: AnalysisResult, layout: Optional[Dict]) -> AnalysisResult:
+        """
+        Дополняет результат анализа сайта измерениями верстки
+        
+        Args:
+            analysis_result: Результат analyze_html (изменяется на месте)
+            layout: Результат analyzer.layout.measure_disclaimer_layout или None
+            
+        Returns:
+            Обновленный результат анализа
+        """
+        disclaimer = analysis_result.disclaimer
+        if not layout or not disclaimer.get('found'):
+            return analysis_result
+        
+        if not layout['found_in_layout']:
+            # Текст есть в HTML, но не отрисовывается (display: none и т.п.)
+            disclaimer['visible'] = False
+            disclaimer['hidden_reasons'] = ['not_rendered']
+        else:
+            disclaimer['visible'] = layout['visible']
+            disclaimer['hidden_reasons'] = layout['hidden_reasons']
+        
+        disclaimer['on_first_screen'] = layout['on_first_screen']
+        disclaimer['font_size_px'] = layout['font_size_px']
+        self._apply_disclaimer_size(disclaimer, layout['area_percent'])
+        
+        analysis_result.verdict = self._determine_verdict(disclaimer, analysis_result.total_violations)
+        return analysis_result
+    
+    def _check_prohibited_formulations(self, text_lower: str, text_original: str,
+                                       rule_pack: Optional[RulePack] = None) -> List[Violation]:
         """
         Проверяет наличие запрещенных формулировок
         
         Returns:
-            Dict с найденными нарушениями по категориям
-        """
-        violations = {
-            'guarantees': [],
-            'calls_not_pay': [],
-            'state_system': [],
-            'mention_exemption': [],
-            'property_preservation': [],
-            'money_back': [],
-            'take_loans': [],
-            'any_cases': [],
-        }
+            Список нарушений (смещения в исходном тексте, контекст вычисляется при обращении)
+        """
+        rule_pack = rule_pack or self.rules.current
         
         # Ищем запрещенные фразы
-        for category, patterns in self.prohibited_patterns.items():
-            for pattern in patterns:
-                matches = re.finditer(pattern, text_lower, re.IGNORECASE)
-                for match in matches:
-                    # Извлекаем контекст (50 символов до и после)
-                    start = max(0, match.start() - 50)
-                    end = min(len(text_original), match.end() + 50)
-                    context = text_original[start:end]
-                    
-                    violations[category].append({
-                        'phrase': match.group(),
-                        'context': context.strip(),
-                        'position': match.start()
-                    })
-        
-        return violations
+        return [
+            Violation(category, pattern_id, match.start(), match.end(), source=text_original)
+            for category, pattern_id, match in rule_pack.finditer(text_lower)
+        ]
     
-    def _determine_verdict(self, disclaimer_check: Dict, violations: Dict) -> str:
+    def _determine_verdict(self, disclaimer_check: Dict, total_violations: int) -> str:
         """
         Определяет вердикт на основе проверок
         
         Returns:
             Вердикт: СООТВЕТСТВУЕТ, ЧАСТИЧНОЕ_НАРУШЕНИЕ, НЕ_СООТВЕТСТВУЕТ, КРИТИЧЕСКИЕ_НАРУШЕНИЯ
         """
-        total_violations = sum(len(v) for v in violations.values() if v)
-        
-        # Критические нарушения
-        if not disclaimer_check.get('found') or total_violations > 5:
+        # Критические нарушения (скрытый дисклеймер приравнивается к отсутствующему)
+        if not disclaimer_check.get('found') or disclaimer_check.get('visible') is False or total_violations > 5:
             return 'КРИТИЧЕСКИЕ_НАРУШЕНИЯ'
         
-        # Не соответствует
-        if total_violations > 0:
+        # Не соответствует (в том числе дисклеймер меньше MIN_DISCLAIMER_SIZE % площади)
+        if total_violations > 0 or disclaimer_check.get('size_check') == 'too_small':
             return 'НЕ_СООТВЕТСТВУЕТ'
         
         # Частичное нарушение
@@ -0,0 +1,203 @@
+"""
+Компактная модель результата анализа
+Нарушения хранят только смещения в исходном тексте; фраза и контекст
+вычисляются при обращении
+"""
+import json
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+# Сколько символов до и после совпадения показывать в контексте
+CONTEXT_CHARS = 50
+
+# Версия формата сериализации (to_json/to_bytes)
+FORMAT_VERSION = 1
+
+
+class Violation:
+    """Найденная запрещенная формулировка: категория, номер шаблона и смещения"""
+
+    __slots__ = ('category', 'pattern_id', 'start', 'end', '_source', '_phrase')
+
+    def __init__(self, category: str, pattern_id: int, start: int, end: int,
+                 source: Optional[str] = None, phrase: Optional[str] = None):
+        self.category = category
+        self.pattern_id = pattern_id
+        self.start = start
+        self.end = end
+        self._source = source
+        self._phrase = phrase
+
+    @property
+    def position(self) -> int:
+        """Позиция совпадения в тексте"""
+        return self.start
+
+    @property
+    def phrase(self) -> str:
+        """Найденная фраза (срез исходного текста)"""
+        if self._source is not None:
+            return self._source[self.start:self.end].lower()
+        return self._phrase or ''
+
+    @property
+    def context(self) -> str:
+        """Фраза с CONTEXT_CHARS символами до и после (пусто, если текст не сохранен)"""
+        if self._source is None:
+            return ''
+        start = max(0, self.start - CONTEXT_CHARS)
+        end = min(len(self._source), self.end + CONTEXT_CHARS)
+        return self._source[start:end].strip()
+
+    def to_dict(self) -> Dict:
+        """Словарь в прежнем формате ({'phrase', 'context', 'position'})"""
+        return {'phrase': self.phrase, 'context': self.context, 'position': self.start}
+
+    def __repr__(self):
+        return f"Violation({self.category!r}, {self.pattern_id}, {self.start}, {self.end})"
+
+
+class AnalysisResult:
+    """
+    Результат анализа материала
+
+    Хранит ссылку на проанализированный текст (без копирования) и плоский
+    список нарушений. Для отчетов нарушения группируются по категориям
+    в порядке набора правил.
+    """
+
+    __slots__ = ('verdict', 'material_type', 'url', 'disclaimer', 'violations',
+                 'categories', 'rules_version', 'text', 'error')
+
+    def __init__(self, verdict: str, material_type: str = 'text', url: Optional[str] = None,
+                 disclaimer: Optional[Dict] = None, violations: Optional[List[Violation]] = None,
+                 categories: Iterable[str] = (), rules_version: Optional[str] = None,
+                 text: Optional[str] = None, error: Optional[str] = None):
+        self.verdict = verdict
+        self.material_type = material_type
+        self.url = url
+        self.disclaimer = disclaimer if disclaimer is not None else {}
+        self.violations = violations if violations is not None else []
+        self.categories = tuple(categories)
+        self.rules_version = rules_version
+        self.text = text
+        self.error = error
+
+    @classmethod
+    def failed(cls, error: str, material_type: str = 'site', url: Optional[str] = None) -> 'AnalysisResult':
+        """Результат для материала, который не удалось проанализировать"""
+        return cls(verdict='ERROR', material_type=material_type, url=url, error=error)
+
+    @property
+    def total_violations(self) -> int:
+        """Общее количество найденных нарушений"""
+        return len(self.violations)
+
+    def violations_by_category(self) -> Dict[str, List[Violation]]:
+        """Нарушения по категориям (все категории набора правил, в том числе пустые)"""
+        grouped = {category: [] for category in self.categories}
+        for violation in self.violations:
+            grouped.setdefault(violation.category, []).append(violation)
+        return grouped
+
+    def to_dict(self) -> Dict:
+        """Словарь в прежнем формате analyze_text (с материализованными контекстами)"""
+        if self.error:
+            return {'error': self.error, 'verdict': self.verdict}
+        return {
+            'verdict': self.verdict,
+            'material_type': self.material_type,
+            'url': self.url,
+            'disclaimer': self.disclaimer,
+            'violations': {
+                category: [v.to_dict() for v in found]
+                for category, found in self.violations_by_category().items()
+            },
+            'total_violations': self.total_violations,
+            'rules_version': self.rules_version,
+        }
+
+    def to_json(self, include_text: bool = False) -> str:
+        """
+        Компактная JSON-сериализация для кэша и БД
+
+        Нарушения записываются плоским массивом [категория, шаблон, начало, конец, ...],
+        где категория — индекс в списке categories. Без текста сохраняются
+        только найденные фразы (контекст после загрузки недоступен).
+        """
+        index = {category: i for i, category in enumerate(self.categories)}
+        categories = list(self.categories)
+        matches = []
+        for v in self.violations:
+            if v.category not in index:
+                index[v.category] = len(categories)
+                categories.append(v.category)
+            matches.extend((index[v.category], v.pattern_id, v.start, v.end))
+
+        data = {
+            'v': FORMAT_VERSION,
+            'verdict': self.verdict,
+            'type': self.material_type,
+            'url': self.url,
+            'rules': self.rules_version,
+            'disclaimer': self.disclaimer,
+            'categories': categories,
+            'm': matches,
+        }
+        if self.error:
+            data['error'] = self.error
+        if include_text and self.text is not None:
+            data['text'] = self.text
+        else:
+            data['phrases'] = [v.phrase for v in self.violations]
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, payload: str, text: Optional[str] = None) -> 'AnalysisResult':
+        """
+        Восстанавливает результат из to_json
+
+        Args:
+            payload: Строка JSON
+            text: Исходный текст (если не сохранен в payload) — для контекстов
+        """
+        data = json.loads(payload)
+        if data.get('v') != FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия формата результата: {data.get('v')}")
+
+        text = data.get('text', text)
+        categories = data['categories']
+        phrases = data.get('phrases')
+        matches = data['m']
+        violations = []
+        for k in range(0, len(matches), 4):
+            category, pattern_id, start, end = matches[k:k + 4]
+            violations.append(Violation(
+                categories[category], pattern_id, start, end,
+                source=text,
+                phrase=phrases[k // 4] if phrases and text is None else None,
+            ))
+
+        return cls(
+            verdict=data['verdict'],
+            material_type=data.get('type', 'text'),
+            url=data.get('url'),
+            disclaimer=data.get('disclaimer') or {},
+            violations=violations,
+            categories=categories,
+            rules_version=data.get('rules'),
+            text=text,
+            error=data.get('error'),
+        )
+
+    def to_bytes(self, include_text: bool = False) -> bytes:
+        """Сжатая (zlib) форма to_json для BLOB/BYTEA-колонок и кэша"""
+        return zlib.compress(self.to_json(include_text=include_text).encode('utf-8'), 6)
+
+    @classmethod
+    def from_bytes(cls, payload: bytes, text: Optional[str] = None) -> 'AnalysisResult':
+        """Восстанавливает результат из to_bytes"""
+        return cls.from_json(zlib.decompress(payload).decode('utf-8'), text=text)
+
+    def __repr__(self):
+        return f"AnalysisResult({self.verdict!r}, violations={self.total_violations}, rules={self.rules_version!r})"
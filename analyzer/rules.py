@@ -0,0 +1,252 @@
+"""
+Версионированные наборы правил (rule packs)
+Загружает запрещенные формулировки из JSON-файла, компилирует их
+и атомарно подменяет текущий набор при изменении файла или по команде админа
+"""
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import RULES_PATH
+
+logger = logging.getLogger(__name__)
+
+SEVERITIES = ('critical', 'high', 'medium', 'low')
+
+# Сколько прежних наборов хранить для отчетов по результатам, посчитанным до перезагрузки
+MAX_KEPT_PACKS = 8
+
+
+class RulePackError(ValueError):
+    """Ошибка загрузки или валидации набора правил"""
+
+
+class RuleCategory:
+    """Категория запрещенных формулировок с откомпилированными шаблонами"""
+
+    __slots__ = ('id', 'name', 'severity', 'article', 'recommendation', 'patterns', 'compiled')
+
+    def __init__(self, id: str, name: str, severity: str, article: str,
+                 recommendation: str, patterns: List[str]):
+        self.id = id
+        self.name = name
+        self.severity = severity
+        self.article = article
+        self.recommendation = recommendation
+        self.patterns = list(patterns)
+        self.compiled = [re.compile(p, re.IGNORECASE) for p in self.patterns]
+
+
+class RulePack:
+    """
+    Неизменяемый откомпилированный набор правил
+
+    Экземпляр никогда не меняется после создания: при перезагрузке создается
+    новый RulePack, поэтому проверка, начатая со старым набором, доводится
+    до конца с ним же.
+    """
+
+    def __init__(self, version: str, categories: List[RuleCategory], description: str = ''):
+        self.version = version
+        self.description = description
+        self.categories = categories
+        self._by_id = {c.id: c for c in categories}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'RulePack':
+        """
+        Создает набор правил из словаря (содержимого JSON-файла)
+
+        Raises:
+            RulePackError: если структура некорректна или шаблон не компилируется
+        """
+        version = data.get('version')
+        if not version or not isinstance(version, str):
+            raise RulePackError("В наборе правил не указана версия ('version')")
+
+        raw_categories = data.get('categories')
+        if not isinstance(raw_categories, list) or not raw_categories:
+            raise RulePackError("В наборе правил нет категорий ('categories')")
+
+        categories = []
+        seen = set()
+        for raw in raw_categories:
+            category_id = raw.get('id')
+            if not category_id or category_id in seen:
+                raise RulePackError(f"Пустой или повторяющийся id категории: {category_id!r}")
+            seen.add(category_id)
+
+            severity = raw.get('severity', 'medium')
+            if severity not in SEVERITIES:
+                raise RulePackError(f"Неизвестная критичность '{severity}' в категории {category_id}")
+
+            patterns = raw.get('patterns') or []
+            try:
+                category = RuleCategory(
+                    id=category_id,
+                    name=raw.get('name', category_id),
+                    severity=severity,
+                    article=raw.get('article', ''),
+                    recommendation=raw.get('recommendation', ''),
+                    patterns=patterns,
+                )
+            except re.error as e:
+                raise RulePackError(f"Некорректный шаблон в категории {category_id}: {e}") from e
+            categories.append(category)
+
+        return cls(version=version, categories=categories, description=data.get('description', ''))
+
+    @classmethod
+    def load(cls, path: str) -> 'RulePack':
+        """Загружает и компилирует набор правил из JSON-файла"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise RulePackError(f"Не удалось прочитать набор правил {path}: {e}") from e
+        return cls.from_dict(data)
+
+    def get(self, category_id: str) -> Optional[RuleCategory]:
+        """Категория по id"""
+        return self._by_id.get(category_id)
+
+    @property
+    def category_ids(self) -> List[str]:
+        """Идентификаторы категорий в порядке из файла"""
+        return [c.id for c in self.categories]
+
+    @property
+    def category_names(self) -> Dict[str, str]:
+        """Отображение id категории -> человекочитаемое название"""
+        return {c.id: c.name for c in self.categories}
+
+    def finditer(self, text_lower: str) -> Iterator[Tuple[str, int, 're.Match']]:
+        """
+        Ищет все вхождения запрещенных шаблонов
+
+        Yields:
+            (id категории, номер шаблона в категории, совпадение)
+        """
+        for category in self.categories:
+            for pattern_id, pattern in enumerate(category.compiled):
+                for match in pattern.finditer(text_lower):
+                    yield category.id, pattern_id, match
+
+
+class RulePackManager:
+    """
+    Держит текущий набор правил и атомарно подменяет его
+
+    Чтение `current` не берет блокировок: ссылка на RulePack заменяется одним
+    присваиванием, а сами наборы неизменяемы.
+    """
+
+    def __init__(self, path: str = RULES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = self._file_stamp()
+        self._current = RulePack.load(path)
+        self._packs: 'OrderedDict[str, RulePack]' = OrderedDict([(self._current.version, self._current)])
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        logger.info("Загружен набор правил %s из %s", self._current.version, path)
+
+    @property
+    def current(self) -> RulePack:
+        """Текущий набор правил"""
+        return self._current
+
+    @property
+    def version(self) -> str:
+        """Версия текущего набора правил"""
+        return self._current.version
+
+    def pack_for(self, version: Optional[str]) -> RulePack:
+        """
+        Набор правил, которым посчитан результат (по rules_version)
+
+        Если такой версии уже нет среди MAX_KEPT_PACKS последних (или она не
+        указана), возвращается текущий набор.
+        """
+        return self._packs.get(version) or self._current
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def reload(self) -> RulePack:
+        """
+        Перечитывает файл правил и подменяет текущий набор
+
+        Если новый файл некорректен, текущий набор остается в силе.
+
+        Returns:
+            Актуальный набор правил
+
+        Raises:
+            RulePackError: если файл не удалось загрузить
+        """
+        with self._lock:
+            stamp = self._file_stamp()
+            pack = RulePack.load(self.path)
+            previous = self._current
+            self._current = pack
+            self._stamp = stamp
+            self._packs.pop(pack.version, None)
+            self._packs[pack.version] = pack
+            while len(self._packs) > MAX_KEPT_PACKS:
+                self._packs.popitem(last=False)
+        if pack.version != previous.version:
+            logger.info("Набор правил обновлен: %s -> %s", previous.version, pack.version)
+        return pack
+
+    def reload_if_changed(self) -> bool:
+        """Перезагружает правила, если файл изменился. Возвращает True при перезагрузке"""
+        if self._file_stamp() == self._stamp:
+            return False
+        try:
+            self.reload()
+            return True
+        except RulePackError as e:
+            logger.error("Новый набор правил отклонен, оставляю %s: %s", self.version, e)
+            # Запоминаем отметку, чтобы не сыпать ошибками до следующего изменения файла
+            self._stamp = self._file_stamp()
+            return False
+
+    def start_watching(self, interval: float = 5.0):
+        """Запускает фоновую проверку изменений файла правил"""
+        if self._watcher and self._watcher.is_alive():
+            return
+        self._stop.clear()
+
+        def _watch():
+            while not self._stop.wait(interval):
+                self.reload_if_changed()
+
+        self._watcher = threading.Thread(target=_watch, name='rules-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        """Останавливает фоновую проверку"""
+        self._stop.set()
+
+
+_default_manager: Optional[RulePackManager] = None
+_default_lock = threading.Lock()
+
+
+def get_rule_manager() -> RulePackManager:
+    """Общий для процесса менеджер правил (создается при первом обращении)"""
+    global _default_manager
+    if _default_manager is None:
+        with _default_lock:
+            if _default_manager is None:
+                _default_manager = RulePackManager(RULES_PATH)
+    return _default_manager
@@ -0,0 +1,449 @@
+"""
+HTTP API проверки рекламы для CRM и агентств
+JSON-эндпоинты одиночной и пакетной проверки и загрузки PDF-отчетов. Работает
+в процессе бота (API_PORT > 0) с его анализатором, кэшем верстки, хранилищем
+отчетов и пулом рендеринга или отдельно: python api.py
+
+Эндпоинты (ключ в заголовке X-API-Key или Authorization: Bearer <ключ>):
+    POST /v1/check          {"text": "..."} | {"url": "..."} | {"html": "...", "url": "..."}, "pdf": false
+    POST /v1/check/batch    {"items": [{"id": "1", "text": "..."}, ...], "pdf": false}
+    GET  /v1/reports/{hash}.pdf
+    GET  /v1/health         (без ключа)
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+from collections import OrderedDict
+from functools import partial
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from config import (
+    API_KEYS, API_HOST, API_PORT, API_CONCURRENCY, API_MAX_REQUESTS, API_KEY_CONCURRENCY,
+    API_BATCH_MAX, API_MAX_BODY_MB
+)
+from analyzer.layout import LayoutStage
+from analyzer.material_analyzer import MaterialAnalyzer
+from analyzer.results import AnalysisResult
+from metrics import API_REQUESTS_TOTAL, CHECKS_IN_FLIGHT, CHECKS_TOTAL, ERRORS_TOTAL
+from reports.report_generator import ReportGenerator
+from reports.store import GZIP_SUFFIX, ReportStore
+from tracing import finish_trace, set_trace_fields, span, start_trace
+from workers import QueueFullError
+
+logger = logging.getLogger(__name__)
+
+# Отчетов, для которых помнится хэш уже отрендеренного PDF
+PDF_CACHE_SIZE = 2048
+
+_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# Кириллица в ответах без \uXXXX-экранирования
+_dumps = partial(json.dumps, ensure_ascii=False)
+
+
+class ApiError(Exception):
+    """Ошибка запроса: HTTP-код, машинный код и сообщение для клиента"""
+
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+    def to_dict(self) -> Dict:
+        return {'code': self.code, 'message': self.message}
+
+
+class CheckService:
+    """
+    Проверка материала для API: анализ, верстка, PDF-отчет
+
+    Одновременно выполняется не больше `concurrency` проверок (пакет делит
+    их с одиночными запросами). Анализ идет в потоке, чтобы не задерживать
+    цикл событий бота; PDF рендерится в общем пуле и сохраняется в хранилище
+    отчетов, одинаковый отчет повторно не рендерится.
+    """
+
+    def __init__(self, analyzer: MaterialAnalyzer, report_generator: ReportGenerator,
+                 report_store: ReportStore, render_pdf: Callable[[str], Awaitable[bytes]],
+                 layout_stage: Optional[LayoutStage] = None, concurrency: int = 8):
+        """
+        Args:
+            analyzer: Анализатор
+            report_generator: Генератор отчетов
+            report_store: Хранилище PDF-отчетов
+            render_pdf: Корутина рендеринга HTML в PDF (обычно через пул процессов)
+            layout_stage: Измерение дисклеймера на странице (None — только текст)
+            concurrency: Одновременных проверок
+        """
+        self.analyzer = analyzer
+        self.report_generator = report_generator
+        self.report_store = report_store
+        self.render_pdf = render_pdf
+        self.layout_stage = layout_stage
+        self.concurrency = concurrency
+        self._slots = asyncio.Semaphore(concurrency)
+        # Хэш HTML-отчета -> хэш PDF в хранилище
+        self._pdf_cache: 'OrderedDict[str, str]' = OrderedDict()
+
+    @staticmethod
+    def parse_item(item) -> Tuple[str, str, Optional[str]]:
+        """
+        Материал из тела запроса
+
+        Returns:
+            (вид: text, html или url; содержимое; URL страницы)
+
+        Raises:
+            ApiError: если материал не задан или задан неверно
+        """
+        if not isinstance(item, dict):
+            raise ApiError(400, 'invalid_item', 'Материал должен быть объектом JSON')
+        url = item.get('url')
+        if url is not None and not (isinstance(url, str) and url.startswith(('http://', 'https://'))):
+            raise ApiError(400, 'invalid_url', 'url должен начинаться с http:// или https://')
+        for kind in ('text', 'html'):
+            value = item.get(kind)
+            if value is not None:
+                if not isinstance(value, str) or not value.strip():
+                    raise ApiError(400, 'invalid_item', f'{kind} должен быть непустой строкой')
+                return kind, value, url
+        if url:
+            return 'url', url, url
+        raise ApiError(400, 'invalid_item', 'Нужно одно из полей: text, html или url')
+
+    async def check(self, item: Dict, pdf: bool = False) -> Dict:
+        """
+        Проверяет один материал
+
+        Returns:
+            Результат анализа (AnalysisResult.to_dict()), id из запроса и
+            report — хэш и адрес PDF-отчета, если pdf=True
+
+        Raises:
+            ApiError: неверный материал, сайт не загрузился, пул рендеринга переполнен
+        """
+        kind, content, url = self.parse_item(item)
+        async with self._slots:
+            CHECKS_IN_FLIGHT.inc()
+            try:
+                return await self._check(item, kind, content, url, pdf)
+            finally:
+                CHECKS_IN_FLIGHT.dec()
+
+    async def _check(self, item: Dict, kind: str, content: str, url: Optional[str], pdf: bool) -> Dict:
+        if kind == 'text':
+            result = await asyncio.to_thread(self.analyzer.analyze_text, content, material_type='text')
+            material_type = 'text'
+            material_info = {'text': content[:100], 'type': 'Текст объявления'}
+        else:
+            if kind == 'url':
+                try:
+                    html = await asyncio.to_thread(self.analyzer.fetch_html, url)
+                except Exception as e:
+                    ERRORS_TOTAL.labels('fetch').inc()
+                    raise ApiError(502, 'fetch_failed', f'Не удалось загрузить сайт: {e}')
+            else:
+                html = content
+            layout_task = None
+            if self.layout_stage is not None:
+                layout_task = asyncio.create_task(self.layout_stage.measure(html, url))
+            result = await asyncio.to_thread(self.analyzer.analyze_html, html, url=url)
+            if layout_task is not None:
+                self.analyzer.apply_layout(result, await layout_task)
+            material_type = 'site'
+            material_info = {'url': url or '—', 'type': 'Сайт'}
+
+        response = {}
+        if item.get('id') is not None:
+            response['id'] = item['id']
+        response.update(result.to_dict())
+        if pdf:
+            response['report'] = await self._report(result, material_info)
+        CHECKS_TOTAL.labels(material_type, result.verdict).inc()
+        return response
+
+    def _stored_pdf(self, report_hash: str) -> Optional[str]:
+        """Хэш PDF, уже отрендеренного для этого отчета, если файл еще в хранилище"""
+        digest = self._pdf_cache.get(report_hash)
+        if digest is None:
+            return None
+        path = self.report_store.path_for(digest, 'pdf')
+        if not (os.path.exists(path) or os.path.exists(path + GZIP_SUFFIX)):
+            del self._pdf_cache[report_hash]
+            return None
+        self._pdf_cache.move_to_end(report_hash)
+        return digest
+
+    async def _report(self, result: AnalysisResult, material_info: Dict) -> Dict:
+        with span('report_html'):
+            html_content = self.report_generator.generate_html(result, material_info, embed_css=False)
+        report_hash = ReportStore.digest(html_content.encode('utf-8'))
+
+        digest = self._stored_pdf(report_hash)
+        if digest is None:
+            try:
+                with span('render'):
+                    pdf_bytes = await self.render_pdf(html_content)
+            except QueueFullError:
+                ERRORS_TOTAL.labels('render_queue_full').inc()
+                raise ApiError(503, 'busy', 'Очередь рендеринга PDF переполнена, повторите позже')
+            stored = await asyncio.to_thread(self.report_store.put, pdf_bytes, 'pdf')
+            digest = stored.digest
+            self._pdf_cache[report_hash] = digest
+            if len(self._pdf_cache) > PDF_CACHE_SIZE:
+                self._pdf_cache.popitem(last=False)
+        else:
+            set_trace_fields(pdf='cached')
+        return {'hash': digest, 'url': f'/v1/reports/{digest}.pdf'}
+
+    async def check_batch(self, items: List, pdf: bool = False) -> List[Dict]:
+        """Проверяет материалы пакета; ошибка одного материала не прерывает остальные"""
+
+        async def one(item) -> Dict:
+            try:
+                return await self.check(item, pdf)
+            except ApiError as e:
+                failed = {'error': e.to_dict()}
+            except Exception as e:
+                ERRORS_TOTAL.labels('api').inc()
+                logger.error("Ошибка проверки материала пакета: %s", e, exc_info=True)
+                failed = {'error': {'code': 'internal', 'message': 'Внутренняя ошибка'}}
+            if isinstance(item, dict) and item.get('id') is not None:
+                failed['id'] = item['id']
+            return failed
+
+        return list(await asyncio.gather(*(one(item) for item in items)))
+
+
+class _Limits:
+    """Запросы в работе: всего и по каждому ключу"""
+
+    def __init__(self, max_requests: int, key_concurrency: int):
+        self.max_requests = max_requests
+        self.key_concurrency = key_concurrency
+        self.total = 0
+        self.by_client: Dict[str, int] = {}
+
+    def acquire(self, client: str) -> Optional[str]:
+        """Занимает место под запрос; при превышении лимита возвращает причину отказа"""
+        if self.total >= self.max_requests:
+            return 'Сервис перегружен, повторите позже'
+        if self.by_client.get(client, 0) >= self.key_concurrency:
+            return f'Не больше {self.key_concurrency} одновременных запросов на ключ'
+        self.total += 1
+        self.by_client[client] = self.by_client.get(client, 0) + 1
+        return None
+
+    def release(self, client: str):
+        self.total -= 1
+        remaining = self.by_client[client] - 1
+        if remaining:
+            self.by_client[client] = remaining
+        else:
+            del self.by_client[client]
+
+
+def _error_response(error: ApiError, headers: Optional[Dict] = None) -> web.Response:
+    return web.json_response({'error': error.to_dict()}, status=error.status, headers=headers, dumps=_dumps)
+
+
+def build_api_app(service: CheckService, api_keys: Optional[List[str]] = None,
+                  max_requests: int = API_MAX_REQUESTS, key_concurrency: int = API_KEY_CONCURRENCY,
+                  batch_max: int = API_BATCH_MAX, max_body_mb: float = API_MAX_BODY_MB) -> web.Application:
+    """
+    Создает приложение aiohttp с эндпоинтами API
+
+    Args:
+        service: Сервис проверки
+        api_keys: Допустимые ключи (по умолчанию API_KEYS)
+        max_requests: Запросов в работе на весь сервис (сверх — 429)
+        key_concurrency: Запросов в работе на один ключ (сверх — 429)
+        batch_max: Материалов в одном пакете
+        max_body_mb: Максимальный размер тела запроса (МБ)
+
+    Raises:
+        ValueError: если не задан ни один ключ
+    """
+    keys = [key for key in (API_KEYS if api_keys is None else api_keys) if key]
+    if not keys:
+        raise ValueError("API_KEYS не задан: HTTP API не запускается без ключей")
+    # В логах и метриках клиент виден по короткому хэшу ключа, а не по самому ключу
+    clients = [(key.encode('utf-8'), hashlib.sha256(key.encode('utf-8')).hexdigest()[:8]) for key in keys]
+    limits = _Limits(max_requests, key_concurrency)
+
+    def authenticate(request: web.Request) -> Optional[str]:
+        presented = request.headers.get('X-API-Key', '')
+        if not presented:
+            authorization = request.headers.get('Authorization', '')
+            if authorization.startswith('Bearer '):
+                presented = authorization[len('Bearer '):].strip()
+        presented_bytes = presented.encode('utf-8')
+        client = None
+        for key, client_id in clients:
+            # Сравнение за постоянное время со всеми ключами
+            if hmac.compare_digest(presented_bytes, key):
+                client = client_id
+        return client
+
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        endpoint = request.match_info.route.name or 'unknown'
+        status = 500
+        try:
+            if endpoint == 'health' or request.match_info.http_exception is not None:
+                # Проверка живости и 404/405 — без ключа
+                response = await handler(request)
+            else:
+                client = authenticate(request)
+                if client is None:
+                    response = _error_response(ApiError(401, 'unauthorized', 'Неверный или отсутствующий API-ключ'))
+                else:
+                    refusal = limits.acquire(client)
+                    if refusal:
+                        response = _error_response(ApiError(429, 'too_many_requests', refusal),
+                                                   headers={'Retry-After': '1'})
+                    else:
+                        request['client'] = client
+                        try:
+                            response = await handler(request)
+                        except ApiError as e:
+                            response = _error_response(e)
+                        finally:
+                            limits.release(client)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            API_REQUESTS_TOTAL.labels(endpoint, str(status)).inc()
+
+    async def read_json(request: web.Request) -> Dict:
+        try:
+            body = await request.json()
+        except web.HTTPRequestEntityTooLarge:
+            raise ApiError(413, 'too_large', f'Тело запроса больше {max_body_mb:g} МБ')
+        except ValueError:
+            raise ApiError(400, 'invalid_json', 'Тело запроса должно быть JSON')
+        if not isinstance(body, dict):
+            raise ApiError(400, 'invalid_json', 'Тело запроса должно быть объектом JSON')
+        return body
+
+    async def check(request: web.Request) -> web.Response:
+        body = await read_json(request)
+        trace = start_trace('api', client=request['client'])
+        try:
+            result = await service.check(body, pdf=bool(body.get('pdf')))
+            set_trace_fields(verdict=result['verdict'])
+            return web.json_response(result, dumps=_dumps)
+        except ApiError as e:
+            trace.fields['status'] = e.code
+            raise
+        except Exception as e:
+            ERRORS_TOTAL.labels('api').inc()
+            trace.fields['status'] = 'error'
+            logger.error("Ошибка проверки через API: %s", e, exc_info=True)
+            raise ApiError(500, 'internal', 'Внутренняя ошибка')
+        finally:
+            finish_trace(trace)
+
+    async def check_batch(request: web.Request) -> web.Response:
+        body = await read_json(request)
+        items = body.get('items')
+        if not isinstance(items, list) or not items:
+            raise ApiError(400, 'invalid_batch', 'items должен быть непустым массивом')
+        if len(items) > batch_max:
+            raise ApiError(413, 'batch_too_large', f'Не больше {batch_max} материалов в пакете')
+        trace = start_trace('api_batch', client=request['client'], items=len(items))
+        try:
+            results = await service.check_batch(items, pdf=bool(body.get('pdf')))
+            trace.fields['errors'] = sum(1 for r in results if 'error' in r)
+            return web.json_response({'results': results}, dumps=_dumps)
+        finally:
+            finish_trace(trace)
+
+    async def report(request: web.Request) -> web.Response:
+        digest = request.match_info['digest']
+        if not _DIGEST_RE.match(digest):
+            raise ApiError(404, 'not_found', 'Отчет не найден')
+        data = await asyncio.to_thread(service.report_store.read, digest, 'pdf')
+        if data is None:
+            raise ApiError(404, 'not_found', 'Отчет не найден или удален по сроку хранения')
+        return web.Response(body=data, content_type='application/pdf',
+                            headers={'Cache-Control': 'private, max-age=86400'})
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({'status': 'ok', 'rules_version': service.analyzer.rules.version}, dumps=_dumps)
+
+    app = web.Application(middlewares=[middleware], client_max_size=int(max_body_mb * 1024 * 1024))
+    app.router.add_post('/v1/check', check, name='check')
+    app.router.add_post('/v1/check/batch', check_batch, name='batch')
+    app.router.add_get('/v1/reports/{digest}.pdf', report, name='report')
+    app.router.add_get('/v1/health', health, name='health')
+    return app
+
+
+async def start_api_server(app: web.Application, host: str = API_HOST, port: int = API_PORT) -> web.AppRunner:
+    """Запускает API в текущем цикле событий (рядом с ботом); остановка — runner.cleanup()"""
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("HTTP API слушает %s:%s", host, port)
+    return runner
+
+
+def main():
+    """Запуск API отдельно от бота: свои анализатор, хранилище отчетов и пул рендеринга"""
+    from config import (
+        LOG_LEVEL, LOG_FORMAT, LOG_JSON, LOG_DEBUG_SAMPLE_RATE, RULES_RELOAD_INTERVAL,
+        RENDER_WORKERS, RENDER_QUEUE_SIZE, REPORTS_STORE_PATH, REPORTS_COMPRESS_AFTER_DAYS,
+        REPORTS_EXPIRE_AFTER_DAYS, REPORTS_MAX_MB, REPORTS_SWEEP_INTERVAL, METRICS_PORT, METRICS_HOST
+    )
+    import metrics
+    from reports.pdf_generator import render_report_pdf
+    from tracing import setup_logging
+    from workers import WorkerPool
+
+    log_listener = setup_logging(LOG_LEVEL, LOG_FORMAT, json_output=LOG_JSON,
+                                 debug_sample_rate=LOG_DEBUG_SAMPLE_RATE)
+    render_pool = WorkerPool('render', max_workers=RENDER_WORKERS, max_queue=RENDER_QUEUE_SIZE)
+    try:
+        analyzer = MaterialAnalyzer()
+        report_store = ReportStore(
+            REPORTS_STORE_PATH,
+            compress_after_days=REPORTS_COMPRESS_AFTER_DAYS,
+            expire_after_days=REPORTS_EXPIRE_AFTER_DAYS,
+            max_bytes=REPORTS_MAX_MB * 1024 * 1024 or None
+        )
+        service = CheckService(
+            analyzer, ReportGenerator(store=report_store), report_store,
+            render_pdf=lambda html_content: render_pool.submit(render_report_pdf, html_content),
+            layout_stage=LayoutStage(render_pool),
+            concurrency=API_CONCURRENCY
+        )
+        app = build_api_app(service)
+
+        if RULES_RELOAD_INTERVAL > 0:
+            analyzer.rules.start_watching(RULES_RELOAD_INTERVAL)
+        if REPORTS_SWEEP_INTERVAL > 0:
+            report_store.start_retention(REPORTS_SWEEP_INTERVAL)
+        if METRICS_PORT > 0:
+            metrics.start_http_server(METRICS_PORT, METRICS_HOST)
+
+        port = API_PORT or 8080
+        logger.info("HTTP API запущен на %s:%s", API_HOST, port)
+        web.run_app(app, host=API_HOST, port=port, access_log=None, print=None)
+    finally:
+        render_pool.shutdown()
+        log_listener.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,308 @@
+"""
+Пакетный аудит рекламных материалов без Telegram
+
+Обходит каталог или zip-архив с сохраненными лендингами (.html, .htm) и текстами
+объявлений (.txt, .md), анализирует файлы MaterialAnalyzer в пуле процессов на
+всех ядрах и пишет результаты построчно в JSONL или CSV. Прерванный аудит
+продолжается с --resume: уже записанные файлы пропускаются.
+
+Запуск:
+    python audit.py materials.zip --out audit.jsonl
+    python audit.py ./landings --out audit.csv --format csv --workers 8
+    python audit.py materials.zip --out audit.jsonl --resume --reports-dir reports --report-format pdf
+"""
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, NamedTuple, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+HTML_EXTENSIONS = ('.html', '.htm')
+TEXT_EXTENSIONS = ('.txt', '.md')
+CSV_FIELDS = ['source', 'kind', 'bytes', 'verdict', 'total_violations', 'disclaimer_found',
+              'rules_version', 'seconds', 'report', 'error']
+REPORT_FORMATS = ('html', 'markdown', 'pdf')
+
+_SAFE_NAME_RE = re.compile(r'[^\w.-]+')
+
+
+class Source(NamedTuple):
+    """Файл материала: путь в каталоге или элемент архива"""
+    name: str  # Идентификатор в результатах (путь относительно корня или внутри архива)
+    kind: str  # 'html' или 'text'
+    path: str  # Файл на диске или zip-архив
+    member: Optional[str] = None  # Элемент архива
+
+
+def _kind(filename: str) -> Optional[str]:
+    lower = filename.lower()
+    if lower.endswith(HTML_EXTENSIONS):
+        return 'html'
+    if lower.endswith(TEXT_EXTENSIONS):
+        return 'text'
+    return None
+
+
+def iter_sources(path: str) -> Iterator[Source]:
+    """
+    Файлы материалов каталога или zip-архива (в порядке имен, лениво)
+
+    Остальные файлы и каталоги __MACOSX пропускаются.
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            names = sorted(info.filename for info in archive.infolist() if not info.is_dir())
+        for member in names:
+            kind = _kind(member)
+            if kind and not member.startswith('__MACOSX/'):
+                yield Source(member, kind, path, member)
+        return
+
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            kind = _kind(filename)
+            if kind:
+                full_path = os.path.join(root, filename)
+                yield Source(os.path.relpath(full_path, path), kind, full_path)
+
+
+def decode_material(data: bytes) -> str:
+    """Текст файла: BOM, <meta charset> сохраненной страницы, иначе определение по образцу"""
+    from analyzer.charset import decode_html
+    return decode_html(data)
+
+
+# Состояние процесса пула: анализатор, генератор отчетов и открытые архивы
+_analyzer = None
+_report_generator = None
+_archives: Dict[str, zipfile.ZipFile] = {}
+
+
+def _read(source: Source) -> bytes:
+    if source.member is None:
+        with open(source.path, 'rb') as f:
+            return f.read()
+    archive = _archives.get(source.path)
+    if archive is None:
+        archive = _archives[source.path] = zipfile.ZipFile(source.path)
+    return archive.read(source.member)
+
+
+def _report_path(reports_dir: str, source: Source, report_format: str) -> str:
+    ext = {'html': 'html', 'markdown': 'md', 'pdf': 'pdf'}[report_format]
+    # Короткий хэш различает одноименные файлы из разных каталогов
+    digest = hashlib.sha1(source.name.encode('utf-8')).hexdigest()[:8]
+    base = _SAFE_NAME_RE.sub('_', os.path.splitext(source.name)[0])[-80:]
+    return os.path.join(reports_dir, f"{base}_{digest}.{ext}")
+
+
+def _write_report(result, source: Source, reports_dir: str, report_format: str) -> str:
+    global _report_generator
+    from reports.report_generator import ReportGenerator
+    from reports.store import ReportStore, atomic_write
+
+    if _report_generator is None:
+        _report_generator = ReportGenerator(store=ReportStore(reports_dir))
+    material_info = {'url': source.name, 'type': 'Сайт' if source.kind == 'html' else 'Текст объявления'}
+    if report_format == 'markdown':
+        data = _report_generator.generate_markdown(result, material_info).encode('utf-8')
+    elif report_format == 'html':
+        data = _report_generator.generate_html(result, material_info).encode('utf-8')
+    else:
+        from reports.pdf_generator import render_report_pdf
+        data = render_report_pdf(_report_generator.generate_html(result, material_info, embed_css=False))
+    path = _report_path(reports_dir, source, report_format)
+    atomic_write(path, data)
+    return path
+
+
+def audit_one(source: Source, reports_dir: Optional[str] = None, report_format: str = 'html') -> Dict:
+    """
+    Анализирует один файл (выполняется в процессе пула)
+
+    Returns:
+        Запись результата: source, kind, bytes, verdict, нарушения, дисклеймер,
+        длительность и путь к отчету; при ошибке — error
+    """
+    global _analyzer
+    if _analyzer is None:
+        from analyzer.material_analyzer import MaterialAnalyzer
+        _analyzer = MaterialAnalyzer()
+
+    started = time.perf_counter()
+    record = {'source': source.name, 'kind': source.kind}
+    try:
+        data = _read(source)
+        record['bytes'] = len(data)
+        content = decode_material(data)
+        if source.kind == 'html':
+            result = _analyzer.analyze_html(content)
+        else:
+            result = _analyzer.analyze_text(content, material_type='text')
+        record.update(
+            verdict=result.verdict,
+            total_violations=result.total_violations,
+            disclaimer_found=bool(result.disclaimer.get('found')),
+            rules_version=result.rules_version,
+            result=result.to_dict(),
+        )
+        if reports_dir:
+            record['report'] = _write_report(result, source, reports_dir, report_format)
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+    record['seconds'] = round(time.perf_counter() - started, 4)
+    return record
+
+
+class ResultWriter:
+    """
+    Построчная запись результатов с продолжением
+
+    Каждая запись сбрасывается на диск сразу, поэтому после сбоя теряется не
+    больше одной строки; недописанная строка отбрасывается при --resume.
+    """
+
+    def __init__(self, path: str, fmt: str = 'jsonl', resume: bool = False):
+        self.path = path
+        self.fmt = fmt
+        self.done: Set[str] = self._load_done() if resume else set()
+        mode = 'a' if resume and os.path.exists(path) else 'w'
+        self._file = open(path, mode, encoding='utf-8', newline='')
+        self._csv = None
+        if fmt == 'csv':
+            self._csv = csv.DictWriter(self._file, fieldnames=CSV_FIELDS, extrasaction='ignore')
+            if mode == 'w':
+                self._csv.writeheader()
+
+    def _load_done(self) -> Set[str]:
+        """Источники, уже записанные в файл результатов; обрезает недописанную строку"""
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        # Все, что после последнего перевода строки, — недописанная запись
+        complete = data[:data.rfind(b'\n') + 1]
+        if len(complete) != len(data):
+            with open(self.path, 'r+b') as f:
+                f.truncate(len(complete))
+        text = complete.decode('utf-8')
+        if self.fmt == 'csv':
+            return {row['source'] for row in csv.DictReader(text.splitlines())}
+        done = set()
+        for line in text.splitlines():
+            if line.strip():
+                done.add(json.loads(line)['source'])
+        return done
+
+    def write(self, record: Dict):
+        if self._csv is not None:
+            self._csv.writerow(record)
+        else:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def run_audit(path: str, out: str, fmt: str = 'jsonl', workers: Optional[int] = None,
+              resume: bool = False, reports_dir: Optional[str] = None, report_format: str = 'html',
+              progress_every: int = 500) -> Dict:
+    """
+    Аудит каталога или архива
+
+    Файлы подаются в пул по мере обхода: в работе не больше workers * 4 задач,
+    поэтому память не зависит от размера архива.
+
+    Args:
+        path: Каталог или zip-архив
+        out: Файл результатов
+        fmt: jsonl или csv
+        workers: Процессов (по умолчанию — число ядер)
+        resume: Пропустить файлы, уже записанные в out
+        reports_dir: Каталог для отчетов по каждому файлу (None — без отчетов)
+        report_format: html, markdown или pdf
+        progress_every: Сообщать о ходе аудита каждые N файлов
+
+    Returns:
+        Итог: files, skipped, errors, verdicts, seconds, files_per_second
+    """
+    workers = workers or os.cpu_count() or 1
+    if reports_dir:
+        os.makedirs(reports_dir, exist_ok=True)
+    writer = ResultWriter(out, fmt, resume)
+    summary = {'files': 0, 'skipped': 0, 'errors': 0, 'verdicts': {}}
+    started = time.perf_counter()
+
+    def collect(future):
+        record = future.result()
+        writer.write(record)
+        summary['files'] += 1
+        if 'error' in record:
+            summary['errors'] += 1
+        else:
+            summary['verdicts'][record['verdict']] = summary['verdicts'].get(record['verdict'], 0) + 1
+        if progress_every and summary['files'] % progress_every == 0:
+            elapsed = time.perf_counter() - started
+            logger.info("Проанализировано %d файлов (%.1f файлов/с)", summary['files'], summary['files'] / elapsed)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            for source in iter_sources(path):
+                if source.name in writer.done:
+                    summary['skipped'] += 1
+                    continue
+                pending.add(pool.submit(audit_one, source, reports_dir, report_format))
+                if len(pending) >= workers * 4:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        collect(future)
+            for future in wait(pending).done:
+                collect(future)
+    finally:
+        writer.close()
+
+    seconds = time.perf_counter() - started
+    summary['seconds'] = round(seconds, 2)
+    summary['files_per_second'] = round(summary['files'] / seconds, 1) if seconds else 0.0
+    summary['workers'] = workers
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Пакетный аудит рекламных материалов')
+    parser.add_argument('path', help='Каталог или zip-архив с .html/.htm/.txt/.md')
+    parser.add_argument('--out', required=True, help='Файл результатов')
+    parser.add_argument('--format', choices=('jsonl', 'csv'), help='Формат (по умолчанию — по расширению --out)')
+    parser.add_argument('--workers', type=int, help='Процессов (по умолчанию — число ядер)')
+    parser.add_argument('--resume', action='store_true', help='Продолжить: пропустить уже записанные файлы')
+    parser.add_argument('--reports-dir', help='Сохранять отчет по каждому файлу в этот каталог')
+    parser.add_argument('--report-format', choices=REPORT_FORMATS, default='html', help='Формат отчетов')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    # Поэтапные записи анализатора не нужны в пакетном режиме
+    logging.getLogger('tracing').setLevel(logging.WARNING)
+    if not os.path.exists(args.path):
+        parser.error(f"не найден: {args.path}")
+    fmt = args.format or ('csv' if args.out.lower().endswith('.csv') else 'jsonl')
+
+    summary = run_audit(args.path, args.out, fmt, args.workers, args.resume,
+                        args.reports_dir, args.report_format)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    sys.exit(1 if summary['errors'] and not summary['files'] - summary['errors'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+"""
+Бенчмарки Рекламного Инспектора
+
+Каждый модуль bench_*.py запускается как `python -m benchmarks.bench_<name>`
+и выводит результаты в JSON.
+
+suite.py — общий набор (анализ, отчеты, PDF, база) на корпусе corpus.py с
+сохранением базовой линии и сравнением: `python -m benchmarks.suite run|compare`.
+"""
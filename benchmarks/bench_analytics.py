@@ -0,0 +1,200 @@
+"""
+Бенчмарк аналитики для админа (/analytics) на суточных агрегатах
+
+Генератор синтетических данных заполняет базу за год: пользователи с датами
+регистрации (часть так и не сделала проверку), `--checks` проверок текстов и
+сайтов (домены неравномерные: несколько крупных, много мелких), нарушения с
+категориями, шаблонами и фразами из набора правил. Агрегаты строятся
+rebuild_rollups — как при миграции существующей базы, затем сверяются с прямым
+подсчетом по check_violations.
+
+Измеряет пересчет агрегатов, запись пакетов save_checks с обновлением
+агрегатов и медианное время каждого запроса аналитики (цель — до 100 мс).
+
+Запуск:
+    python -m benchmarks.bench_analytics --checks 1000000 --users 50000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict
+
+from analyzer.material_analyzer import MaterialAnalyzer
+from database import Database
+
+FILL_BATCH = 5000
+VERDICTS = ['СООТВЕТСТВУЕТ', 'ЧАСТИЧНОЕ_НАРУШЕНИЕ', 'НЕ_СООТВЕТСТВУЕТ', 'КРИТИЧЕСКИЕ_НАРУШЕНИЯ']
+
+
+def _timestamp(moment: datetime) -> str:
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def generate(db: Database, checks: int, users: int, domains: int, seed: int = 1) -> Dict:
+    """
+    Заполняет базу синтетическими пользователями, проверками и нарушениями за год
+
+    Returns:
+        Число вставленных строк по таблицам
+    """
+    rng = random.Random(seed)
+    rules = MaterialAnalyzer().rules.current
+    # Фразы: по несколько вариантов на шаблон (словоформы)
+    vocabulary = [(c.id, pattern_id, f"{c.id}-{pattern_id}-{form}")
+                  for c in rules.categories for pattern_id in range(len(c.patterns)) for form in range(3)]
+    domain_names = [f"site{rank}.ru" for rank in range(domains)]
+    domain_weights = [1 / (rank + 1) for rank in range(domains)]
+    now = datetime.utcnow()
+
+    conn = db._get_connection(write=True)
+    cursor = conn.cursor()
+    # Пользователи: регистрация за год, 70% делают проверки, половина из них — в первые сутки
+    registered = []
+    user_rows = []
+    for i in range(users):
+        registered_at = now - timedelta(seconds=rng.uniform(0, 365 * 86400))
+        registered.append(registered_at)
+        user_rows.append((f"bench{i}", f"user{i}", 'Пользователь', '+79990000000', 1, _timestamp(registered_at)))
+    db._executemany(cursor, f'INSERT INTO users (telegram_id, username, full_name, phone, gdpr_consent, registered_at) '
+                    f'VALUES ({", ".join("?" * 6)})', user_rows)
+    db._execute(cursor, 'SELECT id, telegram_id FROM users WHERE telegram_id LIKE ?', ('bench%',))
+    ids = {telegram_id: user_id for user_id, telegram_id in cursor.fetchall()}
+    active = [(ids[f"bench{i}"], registered[i]) for i in range(users) if rng.random() < 0.7]
+    active_weights = [1 / (rank + 1) ** 0.5 for rank in range(len(active))]
+
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM checks')
+    next_id = cursor.fetchone()[0] + 1
+    total_violations = 0
+    for offset in range(0, checks, FILL_BATCH):
+        check_rows, violation_rows = [], []
+        picked = rng.choices(active, active_weights, k=min(FILL_BATCH, checks - offset))
+        for check_id, (user_id, registered_at) in enumerate(picked, start=next_id + offset):
+            first_day = rng.random() < 0.5
+            span = 86400 if first_day else max(86400.0, (now - registered_at).total_seconds())
+            checked_at = _timestamp(min(now, registered_at + timedelta(seconds=rng.uniform(0, span))))
+            found = min(int(rng.expovariate(0.6)), 12)
+            verdict = VERDICTS[min(found, 3)]
+            if rng.random() < 0.4:
+                material_type = 'site'
+                url = f"https://{rng.choices(domain_names, domain_weights)[0]}/page{rng.randrange(50)}"
+            else:
+                material_type, url = 'text', 'Текст объявления'
+            check_rows.append((check_id, user_id, material_type, url, verdict, found, rules.version, checked_at))
+            for category, pattern_id, phrase in rng.choices(vocabulary, k=found):
+                violation_rows.append((check_id, category, pattern_id, phrase, 0, len(phrase), rules.version,
+                                       checked_at))
+        db._executemany(
+            cursor,
+            f'INSERT INTO checks (id, user_id, material_type, material_url, verdict, violations_count, rules_version, '
+            f'checked_at) VALUES ({", ".join("?" * 8)})', check_rows)
+        db._executemany(
+            cursor,
+            f'INSERT INTO check_violations (check_id, category, pattern_id, phrase, start_pos, end_pos, rules_version, '
+            f'checked_at) VALUES ({", ".join("?" * 8)})', violation_rows)
+        total_violations += len(violation_rows)
+        conn.commit()
+    if db.use_postgresql:
+        cursor.execute("SELECT setval(pg_get_serial_sequence('checks', 'id'), (SELECT MAX(id) FROM checks))")
+    conn.commit()
+    conn.close()
+    return {'users': users, 'checks': checks, 'violations': total_violations}
+
+
+def _median_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1000, 2)
+
+
+def _direct_category_counts(db: Database, since: datetime) -> Dict:
+    """Подсчет по check_violations напрямую — для сверки с агрегатами"""
+    conn = db._get_connection()
+    cursor = conn.cursor()
+    db._execute(cursor, 'SELECT category, COUNT(*) FROM check_violations WHERE checked_at >= ? GROUP BY category',
+                (since.strftime('%Y-%m-%d'),))
+    counts = {row[0]: row[1] for row in cursor.fetchall()}
+    conn.close()
+    return counts
+
+
+def run(checks: int = 1000000, users: int = 50000, domains: int = 5000, writes: int = 2000, batch: int = 64,
+        repeat: int = 5, seed: int = 1) -> Dict:
+    with tempfile.TemporaryDirectory(prefix='inspector-bench-analytics-') as workdir:
+        db = Database(os.path.join(workdir, 'users.db'))
+        started = time.perf_counter()
+        rows = generate(db, checks, users, domains, seed)
+        generate_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        db.rebuild_rollups()
+        rebuild_seconds = time.perf_counter() - started
+
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        month, year = today - timedelta(days=30), today - timedelta(days=365)
+        consistent = _direct_category_counts(db, month) == db.get_violation_stats(month)['categories']
+
+        # Запись: пакеты save_checks с обновлением агрегатов
+        analyzer = MaterialAnalyzer()
+        result = analyzer.analyze_text('Гарантируем полное списание долгов! Сохраним квартиру и машину.')
+        check = {
+            'material_type': 'site', 'material_url': 'https://site1.ru/', 'verdict': result.verdict,
+            'violations_count': result.total_violations, 'report_path': None,
+            'rules_version': result.rules_version, 'result': result.to_bytes(),
+            'violations': [(v.category, v.pattern_id, v.phrase, v.start, v.end) for v in result.violations],
+        }
+        rng = random.Random(seed)
+        started = time.perf_counter()
+        for offset in range(0, writes, batch):
+            db.save_checks([dict(check, telegram_id=f"bench{rng.randrange(users)}")
+                            for _ in range(min(batch, writes - offset))])
+        write_seconds = time.perf_counter() - started
+
+        queries = {
+            'violation_stats_30d': lambda: db.get_violation_stats(month),
+            'violation_stats_365d': lambda: db.get_violation_stats(year),
+            'verdict_trend_weekly_365d': lambda: db.get_verdict_trend(year, 'week'),
+            'verdict_trend_daily_30d': lambda: db.get_verdict_trend(month, 'day'),
+            'top_domains_30d': lambda: db.get_top_domains(month),
+            'top_users_30d': lambda: db.get_top_users(month),
+            'user_trend_365d': lambda: db.get_user_trend('bench1', year),
+            'domain_trend_365d': lambda: db.get_domain_trend('site0.ru', year),
+            'funnel_30d': lambda: db.get_funnel(month),
+            'funnel_365d': lambda: db.get_funnel(year),
+        }
+        timings = {f'{name}_ms': _median_ms(fn, repeat) for name, fn in queries.items()}
+
+    return {
+        'backend': 'postgresql' if db.use_postgresql else 'sqlite',
+        **rows,
+        'domains': domains,
+        'generate_s': round(generate_seconds, 1),
+        'rebuild_rollups_s': round(rebuild_seconds, 1),
+        'rollups_consistent': consistent,
+        'save_checks_per_second': round(writes / write_seconds),
+        **timings,
+        'slowest_ms': max(timings.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк аналитики на суточных агрегатах')
+    parser.add_argument('--checks', type=int, default=1000000, help='Проверок за год')
+    parser.add_argument('--users', type=int, default=50000, help='Зарегистрированных пользователей')
+    parser.add_argument('--domains', type=int, default=5000, help='Доменов проверяемых сайтов')
+    parser.add_argument('--writes', type=int, default=2000, help='Проверок для замера записи')
+    parser.add_argument('--repeat', type=int, default=5, help='Повторов каждого запроса')
+    args = parser.parse_args()
+    print(json.dumps(run(args.checks, args.users, args.domains, args.writes, repeat=args.repeat),
+                     ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
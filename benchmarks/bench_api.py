@@ -0,0 +1,154 @@
+"""
+Нагрузочный бенчмарк HTTP API (api.py)
+
+Поднимает API на локальном порту со своим хранилищем отчетов во временном
+каталоге и пулом рендеринга, затем `--clients` клиентов в течение `--duration`
+секунд непрерывно отправляют POST /v1/check (или /v1/check/batch). Сообщает
+устойчивую пропускную способность (проверок в секунду), задержку p50/p95/p99
+и ответы по кодам — без PDF и с PDF. Если WeasyPrint не установлен, режим с
+PDF попадает в skipped.
+
+Запуск:
+    python -m benchmarks.bench_api --clients 16 --duration 20
+    python -m benchmarks.bench_api --batch 20 --modes nopdf --size 4096
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+import aiohttp
+
+from api import CheckService, build_api_app, start_api_server
+from analyzer.material_analyzer import MaterialAnalyzer
+from benchmarks.corpus import make_text
+from reports.report_generator import ReportGenerator
+from reports.store import ReportStore
+from workers import WorkerPool
+
+API_KEY = 'bench-key'
+
+
+def _percentiles(samples: List[float]) -> Dict:
+    if not samples:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+    return {'p50_ms': pick(0.5), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99)}
+
+
+async def _load(url: str, texts: List[str], pdf: bool, clients: int, duration: float, batch: int) -> Dict:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    checks = 0
+    counter = 0
+    deadline = time.perf_counter() + duration
+
+    async def client(session: aiohttp.ClientSession):
+        nonlocal checks, counter
+        while time.perf_counter() < deadline:
+            items = []
+            for _ in range(batch):
+                items.append({'id': str(counter), 'text': texts[counter % len(texts)]})
+                counter += 1
+            if batch == 1:
+                path, body = '/v1/check', {**items[0], 'pdf': pdf}
+            else:
+                path, body = '/v1/check/batch', {'items': items, 'pdf': pdf}
+            started = time.perf_counter()
+            async with session.post(url + path, json=body) as response:
+                payload = await response.json()
+            latencies.append(time.perf_counter() - started)
+            statuses[str(response.status)] = statuses.get(str(response.status), 0) + 1
+            if response.status == 200:
+                results = payload['results'] if batch > 1 else [payload]
+                checks += sum(1 for r in results if 'error' not in r)
+            elif response.status == 429:
+                await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(headers={'X-API-Key': API_KEY}) as session:
+        await asyncio.gather(*(client(session) for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(latencies),
+        'checks': checks,
+        'checks_per_second': round(checks / elapsed, 1),
+        **_percentiles(latencies),
+        'statuses': statuses,
+    }
+
+
+async def _run(modes: List[str], clients: int, duration: float, batch: int, size: int,
+               distinct: int, concurrency: int, port: int) -> Dict:
+    results: Dict[str, Dict] = {}
+    skipped: Dict[str, str] = {}
+    texts = [make_text(size, seed=i, disclaimer=i % 2 == 0) for i in range(distinct)]
+
+    with tempfile.TemporaryDirectory(prefix='inspector-bench-api-') as workdir:
+        store = ReportStore(os.path.join(workdir, 'reports'))
+        render_pool = WorkerPool('render', max_queue=max(16, concurrency))
+        if 'pdf' in modes:
+            try:
+                from reports.pdf_generator import render_report_pdf
+            except (ImportError, OSError) as e:
+                # WeasyPrint без системных библиотек (pango) не импортируется
+                skipped['pdf'] = f"WeasyPrint недоступен: {e}"
+                modes = [mode for mode in modes if mode != 'pdf']
+        service = CheckService(
+            MaterialAnalyzer(), ReportGenerator(store=store), store,
+            render_pdf=lambda html_content: render_pool.submit(render_report_pdf, html_content),
+            concurrency=concurrency
+        )
+        app = build_api_app(service, [API_KEY], max_requests=clients * 2, key_concurrency=clients)
+        runner = await start_api_server(app, '127.0.0.1', port)
+        try:
+            url = f'http://127.0.0.1:{port}'
+            for mode in modes:
+                results[mode] = await _load(url, texts, mode == 'pdf', clients, duration, batch)
+        finally:
+            await runner.cleanup()
+            render_pool.shutdown()
+
+    return {
+        'clients': clients,
+        'duration': duration,
+        'batch': batch,
+        'text_bytes': size,
+        'distinct_texts': distinct,
+        'concurrency': concurrency,
+        'cpu_count': os.cpu_count(),
+        'results': results,
+        'skipped': skipped,
+    }
+
+
+def run(modes: List[str] = ('nopdf', 'pdf'), clients: int = 16, duration: float = 20.0, batch: int = 1,
+        size: int = 2048, distinct: int = 1000, concurrency: int = 8, port: int = 8765) -> Dict:
+    return asyncio.run(_run(list(modes), clients, duration, batch, size, distinct, concurrency, port))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный бенчмарк HTTP API')
+    parser.add_argument('--modes', default='nopdf,pdf', help='Режимы через запятую: nopdf, pdf')
+    parser.add_argument('--clients', type=int, default=16, help='Одновременных клиентов')
+    parser.add_argument('--duration', type=float, default=20.0, help='Длительность режима (секунды)')
+    parser.add_argument('--batch', type=int, default=1, help='Материалов в запросе (больше 1 — /v1/check/batch)')
+    parser.add_argument('--size', type=int, default=2048, help='Размер текста объявления (байт)')
+    parser.add_argument('--distinct', type=int, default=1000,
+                        help='Разных текстов (повторы отчетов берутся из хранилища без рендеринга)')
+    parser.add_argument('--concurrency', type=int, default=8, help='API_CONCURRENCY сервиса')
+    parser.add_argument('--port', type=int, default=8765, help='Порт API')
+    args = parser.parse_args()
+    print(json.dumps(run(args.modes.split(','), args.clients, args.duration, args.batch, args.size,
+                         args.distinct, args.concurrency, args.port), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Бенчмарк пакетного аудита (audit.py): масштабирование по числу процессов
+
+Создает во временном каталоге корпус из текстов объявлений и лендингов (по
+умолчанию 400 файлов по 16 КБ), прогоняет run_audit с 1, 2, 4 ... процессами
+до числа ядер и сообщает файлов в секунду и ускорение относительно одного
+процесса.
+
+Запуск:
+    python -m benchmarks.bench_audit --files 400 --size 16384
+    python -m benchmarks.bench_audit --files 2000 --workers 1,4,8,16
+"""
+import argparse
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional
+
+from audit import run_audit
+from benchmarks.corpus import make_html, make_text
+
+
+def make_corpus(directory: str, files: int, size: int) -> int:
+    """Записывает корпус: половина — тексты, половина — лендинги; возвращает объем в байтах"""
+    total = 0
+    for i in range(files):
+        if i % 2:
+            name, content = f'landing_{i:05d}.html', make_html(size, seed=i, disclaimer=i % 3 != 0)
+        else:
+            name, content = f'ad_{i:05d}.txt', make_text(size, seed=i, disclaimer=i % 3 != 0)
+        data = content.encode('utf-8')
+        with open(os.path.join(directory, name), 'wb') as f:
+            f.write(data)
+        total += len(data)
+    return total
+
+
+def _worker_counts(limit: int) -> List[int]:
+    counts, n = [], 1
+    while n < limit:
+        counts.append(n)
+        n *= 2
+    counts.append(limit)
+    return counts
+
+
+def run(files: int = 400, size: int = 16 * 1024, workers: Optional[List[int]] = None) -> Dict:
+    workers = workers or _worker_counts(os.cpu_count() or 1)
+    results = []
+    with tempfile.TemporaryDirectory(prefix='bench_audit_') as tmp:
+        corpus = os.path.join(tmp, 'corpus')
+        os.makedirs(corpus)
+        corpus_bytes = make_corpus(corpus, files, size)
+        for count in workers:
+            summary = run_audit(corpus, os.path.join(tmp, f'audit_{count}.jsonl'),
+                                workers=count, progress_every=0)
+            results.append({
+                'workers': count,
+                'seconds': summary['seconds'],
+                'files_per_second': summary['files_per_second'],
+                'mb_per_second': round(corpus_bytes / 1024 / 1024 / summary['seconds'], 2),
+                'errors': summary['errors'],
+            })
+
+    base = results[0]['files_per_second'] / results[0]['workers']
+    for result in results:
+        result['speedup'] = round(result['files_per_second'] / base, 2) if base else 0.0
+        result['efficiency'] = round(result['speedup'] / result['workers'], 2)
+    return {
+        'cpu_count': os.cpu_count(),
+        'files': files,
+        'file_bytes': size,
+        'corpus_mb': round(corpus_bytes / 1024 / 1024, 1),
+        'runs': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк пакетного аудита')
+    parser.add_argument('--files', type=int, default=400, help='Файлов в корпусе')
+    parser.add_argument('--size', type=int, default=16 * 1024, help='Размер файла (байт)')
+    parser.add_argument('--workers', help='Числа процессов через запятую (по умолчанию 1, 2, 4 ... ядра)')
+    args = parser.parse_args()
+    workers = [int(n) for n in args.workers.split(',')] if args.workers else None
+    print(json.dumps(run(args.files, args.size, workers), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
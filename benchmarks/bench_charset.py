@@ -0,0 +1,124 @@
+"""
+Бенчмарк декодирования страниц (analyzer.charset)
+
+Корпус страниц в разных кодировках: UTF-8 и cp1251 с charset в заголовке, в
+<meta> и без него, koi8-r и cp866 без объявления, UTF-8 с BOM и страницы с
+ошибочно объявленной кодировкой (cp1251 под видом utf-8 и наоборот, latin-1 по
+умолчанию сервера). Сравнивает прежний путь — `response.text` у requests
+(charset из заголовка; для text/* без него — ISO-8859-1, без Content-Type —
+статистика по всему телу) — с HtmlDecoder, которому тело подается частями
+по 64 КБ, как в fetch_html. Для каждого случая: медианное время и совпадает
+ли результат с исходным текстом.
+
+Запуск:
+    python -m benchmarks.bench_charset --sizes 16kb,256kb,1mb
+"""
+import argparse
+import codecs
+import json
+import statistics
+import time
+from typing import Dict, List, Optional, Tuple
+
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from analyzer.charset import HtmlDecoder
+from analyzer.material_analyzer import FETCH_CHUNK_BYTES
+from benchmarks.corpus import SIZES, make_html
+
+# (название, кодировка байтов, Content-Type, charset в <meta>, BOM)
+CASES: List[Tuple[str, str, Optional[str], Optional[str], bool]] = [
+    ('utf8_header', 'utf-8', 'text/html; charset=utf-8', None, False),
+    ('utf8_meta', 'utf-8', 'text/html', 'utf-8', False),
+    ('utf8_undeclared', 'utf-8', None, None, False),
+    ('utf8_bom', 'utf-8', None, None, True),
+    ('cp1251_header', 'cp1251', 'text/html; charset=windows-1251', None, False),
+    ('cp1251_meta', 'cp1251', 'text/html', 'windows-1251', False),
+    ('cp1251_undeclared', 'cp1251', None, None, False),
+    ('koi8r_undeclared', 'koi8_r', None, None, False),
+    ('cp866_undeclared', 'cp866', None, None, False),
+    ('cp1251_labelled_utf8', 'cp1251', 'text/html; charset=utf-8', None, False),
+    ('utf8_labelled_cp1251', 'utf-8', 'text/html', 'windows-1251', False),
+    ('cp1251_labelled_latin1', 'cp1251', 'text/html; charset=iso-8859-1', None, False),
+]
+
+
+def _page(size: int, encoding: str, meta: Optional[str], bom: bool, seed: int) -> Tuple[bytes, str]:
+    html = make_html(size, seed=seed).replace('<meta charset="utf-8">', f'<meta charset="{meta}">' if meta else '')
+    # Символы, которых нет в кодировке (тире в koi8-r, cp866), заменяются — эталон тот же текст
+    data = html.encode(encoding, errors='replace')
+    expected = data.decode(encoding)
+    if bom:
+        data = codecs.BOM_UTF8 + data
+    return data, expected
+
+
+def _requests_text(data: bytes, content_type: Optional[str]) -> str:
+    response = Response()
+    response._content = data
+    response.headers = CaseInsensitiveDict({'Content-Type': content_type} if content_type else {})
+    # Как HTTPAdapter.build_response: для text/* без charset — ISO-8859-1
+    response.encoding = get_encoding_from_headers(response.headers)
+    return response.text
+
+
+def _streamed(data: bytes, content_type: Optional[str]) -> str:
+    decoder = HtmlDecoder(content_type)
+    parts = [decoder.feed(data[i:i + FETCH_CHUNK_BYTES]) for i in range(0, len(data), FETCH_CHUNK_BYTES)]
+    parts.append(decoder.close())
+    return ''.join(parts)
+
+
+def _median_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1000, 2)
+
+
+def run(sizes: List[str] = ('16kb', '256kb', '1mb'), repeat: int = 5) -> Dict:
+    results = {}
+    totals = {'pages': 0, 'requests_correct': 0, 'decoder_correct': 0, 'requests_ms': 0.0, 'decoder_ms': 0.0}
+    for label in sizes:
+        for number, (name, encoding, content_type, meta, bom) in enumerate(CASES):
+            data, expected = _page(SIZES[label], encoding, meta, bom, seed=number + 1)
+            decoder = HtmlDecoder(content_type)
+            decoder.feed(data)
+            decoder.close()
+            old_ms = _median_ms(lambda: _requests_text(data, content_type), repeat)
+            new_ms = _median_ms(lambda: _streamed(data, content_type), repeat)
+            old_ok = _requests_text(data, content_type) == expected
+            new_ok = _streamed(data, content_type) == expected
+            results[f'{name}_{label}'] = {
+                'bytes': len(data),
+                'encoding': decoder.encoding,
+                'source': decoder.source,
+                'requests_ms': old_ms,
+                'requests_correct': old_ok,
+                'decoder_ms': new_ms,
+                'decoder_correct': new_ok,
+            }
+            totals['pages'] += 1
+            totals['requests_correct'] += old_ok
+            totals['decoder_correct'] += new_ok
+            totals['requests_ms'] += old_ms
+            totals['decoder_ms'] += new_ms
+    totals['requests_ms'] = round(totals['requests_ms'], 1)
+    totals['decoder_ms'] = round(totals['decoder_ms'], 1)
+    return {'totals': totals, 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк декодирования страниц')
+    parser.add_argument('--sizes', default='16kb,256kb,1mb', help=f"Размеры через запятую: {', '.join(SIZES)}")
+    parser.add_argument('--repeat', type=int, default=5, help='Повторов каждого замера')
+    args = parser.parse_args()
+    print(json.dumps(run(args.sizes.split(','), args.repeat), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
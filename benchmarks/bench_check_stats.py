@@ -0,0 +1,152 @@
+"""
+Бенчмарк хранения проверок и аналитики по ним (checks, check_violations)
+
+Запись: save_check по одной проверке против save_checks пакетами, как пишет
+CheckPipeline (полный результат анализа и нарушения построчно).
+Аналитика: база заполняется `--checks` проверками за год (по умолчанию миллион,
+в среднем 2 нарушения на проверку), затем измеряется get_violation_stats за
+сутки, 30 дней и весь год.
+
+Запуск:
+    python -m benchmarks.bench_check_stats --checks 1000000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from analyzer.material_analyzer import MaterialAnalyzer
+from benchmarks.corpus import make_text
+from database import Database
+
+FILL_BATCH = 5000
+
+
+def _check(analyzer: MaterialAnalyzer, telegram_id: str, text: str) -> Dict:
+    result = analyzer.analyze_text(text)
+    return {
+        'telegram_id': telegram_id,
+        'material_type': 'text',
+        'material_url': text[:100],
+        'verdict': result.verdict,
+        'violations_count': result.total_violations,
+        'report_path': None,
+        'rules_version': result.rules_version,
+        'result': result.to_bytes(),
+        'violations': [(v.category, v.pattern_id, v.phrase, v.start, v.end) for v in result.violations],
+    }
+
+
+def _fill(db: Database, checks: int, users: int, categories: List[str], seed: int) -> float:
+    """Проверки за год с явным checked_at — быстрее, чем через save_checks"""
+    rng = random.Random(seed)
+    verdicts = ['СООТВЕТСТВУЕТ', 'ТРЕБУЕТ_ДОРАБОТКИ', 'КРИТИЧЕСКИЕ_НАРУШЕНИЯ']
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    conn = db._get_connection(write=True)
+    cursor = conn.cursor()
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM checks')
+    next_id = cursor.fetchone()[0] + 1
+    for offset in range(0, checks, FILL_BATCH):
+        check_rows, violation_rows = [], []
+        for check_id in range(next_id + offset, next_id + min(checks, offset + FILL_BATCH)):
+            checked_at = (now - timedelta(seconds=rng.uniform(0, 365 * 86400))).strftime('%Y-%m-%d %H:%M:%S')
+            found = min(int(rng.expovariate(0.5)), 12)
+            verdict = verdicts[min(found, 2)]
+            check_rows.append((check_id, rng.randint(1, users), 'text', 'Текст объявления', verdict, found,
+                               '2026.01.1', checked_at))
+            for _ in range(found):
+                violation_rows.append((check_id, rng.choice(categories), rng.randint(0, 5), 'фраза', 0, 5,
+                                       '2026.01.1', checked_at))
+        db._executemany(
+            cursor,
+            f'INSERT INTO checks (id, user_id, material_type, material_url, verdict, violations_count, rules_version, '
+            f'checked_at) VALUES ({", ".join("?" * 8)})', check_rows)
+        db._executemany(
+            cursor,
+            f'INSERT INTO check_violations (check_id, category, pattern_id, phrase, start_pos, end_pos, rules_version, '
+            f'checked_at) VALUES ({", ".join("?" * 8)})', violation_rows)
+        conn.commit()
+    if db.use_postgresql:
+        cursor.execute("SELECT setval(pg_get_serial_sequence('checks', 'id'), (SELECT MAX(id) FROM checks))")
+        cursor.execute('ANALYZE checks')
+        cursor.execute('ANALYZE check_violations')
+    else:
+        cursor.execute('ANALYZE')
+    conn.commit()
+    conn.close()
+    return time.perf_counter() - started
+
+
+def _median_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1000, 2)
+
+
+def run(checks: int = 1000000, writes: int = 2000, batch: int = 64, users: int = 1000,
+        repeat: int = 5, seed: int = 1) -> Dict:
+    analyzer = MaterialAnalyzer()
+    categories = analyzer.rules.current.category_ids
+    with tempfile.TemporaryDirectory(prefix='inspector-bench-stats-') as workdir:
+        db = Database(os.path.join(workdir, 'users.db'))
+        for i in range(users):
+            db.register_user(str(200000 + i), f'user{i}', 'Пользователь', '+79990000000')
+
+        rng = random.Random(seed)
+        samples = [_check(analyzer, str(200000 + rng.randrange(users)), make_text(2048, seed=i))
+                   for i in range(64)]
+        started = time.perf_counter()
+        for i in range(writes):
+            row = samples[i % len(samples)]
+            db.save_check(row['telegram_id'], row['material_type'], row['material_url'], row['verdict'],
+                          row['violations_count'], row['report_path'], row['rules_version'],
+                          row['result'], row['violations'])
+        single = time.perf_counter() - started
+        started = time.perf_counter()
+        for offset in range(0, writes, batch):
+            db.save_checks([samples[i % len(samples)] for i in range(offset, min(writes, offset + batch))])
+        batched = time.perf_counter() - started
+
+        fill_seconds = _fill(db, checks, users, categories, seed)
+        now = datetime.utcnow()
+        queries = {
+            f'stats_{label}_ms': _median_ms(lambda: db.get_violation_stats(now - timedelta(days=days)), repeat)
+            for label, days in (('1d', 1), ('30d', 30), ('365d', 366))
+        }
+        month = db.get_violation_stats(now - timedelta(days=30))
+
+    return {
+        'backend': 'postgresql' if db.use_postgresql else 'sqlite',
+        'writes': writes,
+        'save_check_per_second': round(writes / single),
+        'save_checks_per_second': round(writes / batched),
+        'batch': batch,
+        'checks': checks,
+        'fill_s': round(fill_seconds, 1),
+        'checks_30d': month['checks'],
+        'violations_30d': sum(month['categories'].values()),
+        **queries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк хранения проверок и аналитики')
+    parser.add_argument('--checks', type=int, default=1000000, help='Проверок в базе для аналитики')
+    parser.add_argument('--writes', type=int, default=2000, help='Проверок для замера записи')
+    parser.add_argument('--batch', type=int, default=64, help='Размер пакета save_checks')
+    parser.add_argument('--repeat', type=int, default=5, help='Повторов каждого запроса')
+    args = parser.parse_args()
+    print(json.dumps(run(args.checks, args.writes, args.batch, repeat=args.repeat), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
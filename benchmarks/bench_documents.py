@@ -0,0 +1,165 @@
+"""
+Бенчмарк извлечения текста из документов: МБ/с по форматам
+
+Для каждого формата (.txt, .html, .docx, .pdf) генерируется синтетический
+документ примерно `--size` МБ текста объявлений и дисклеймера и замеряется
+extract_document — то, что выполняет процесс пула документов бота.
+
+Для каждого: размер файла, медиана времени по `--rounds` раундам, скорость
+в МБ файла и МБ извлеченного текста в секунду, число абзацев (страниц PDF)
+и пик памяти Python при извлечении (tracemalloc, отдельный прогон) — при
+потоковом чтении он близок к размеру текста, а не к размеру разобранного документа.
+
+PDF создается reportlab со шрифтом DejaVuSans (кириллица) и читается pypdf;
+без них формат пропускается.
+
+Запуск:
+    python -m benchmarks.bench_documents --size 4 --rounds 3
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from html import escape
+from typing import Dict, List
+
+from analyzer.documents import PDF_AVAILABLE, extract_document
+from benchmarks.bench_ocr import FONT_CANDIDATES
+from benchmarks.corpus import make_html, make_text
+
+PARAGRAPH_BYTES = 1024
+# Символов в строке и строк на странице синтетического PDF
+PDF_LINE_CHARS = 90
+PDF_PAGE_LINES = 60
+
+DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="word/document.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>'
+)
+
+
+def _paragraphs(size_bytes: int) -> List[str]:
+    paragraphs, size, seed = [], 0, 1
+    while size < size_bytes:
+        paragraph = make_text(PARAGRAPH_BYTES, seed=seed, disclaimer=seed == 1)
+        paragraphs.append(paragraph)
+        size += len(paragraph.encode('utf-8')) + 1
+        seed += 1
+    return paragraphs
+
+
+def _write_text(path: str, text: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def _write_docx(path: str, paragraphs: List[str]):
+    body = ''.join(f'<w:p><w:r><w:t xml:space="preserve">{escape(p, quote=False)}</w:t></w:r></w:p>'
+                   for p in paragraphs)
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f'<w:body>{body}</w:body></w:document>'
+    )
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', DOCX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', DOCX_RELS)
+        archive.writestr('word/document.xml', document)
+
+
+def _write_pdf(path: str, paragraphs: List[str]) -> bool:
+    font_path = next((p for p in FONT_CANDIDATES if os.path.exists(p)), None)
+    if not PDF_AVAILABLE or font_path is None:
+        return False
+    import textwrap
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    pdfmetrics.registerFont(TTFont('DejaVuSans', font_path))
+    lines = [line for p in paragraphs for line in textwrap.wrap(p, PDF_LINE_CHARS)]
+    pdf = canvas.Canvas(path, pagesize=A4, pageCompression=1)
+    for start in range(0, len(lines), PDF_PAGE_LINES):
+        text = pdf.beginText(40, A4[1] - 40)
+        text.setFont('DejaVuSans', 9)
+        for line in lines[start:start + PDF_PAGE_LINES]:
+            text.textLine(line)
+        pdf.drawText(text)
+        pdf.showPage()
+    pdf.save()
+    return True
+
+
+def _measure(path: str, filename: str, rounds: int) -> Dict:
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        extracted = extract_document(path, filename)
+        samples.append(time.perf_counter() - started)
+    seconds = statistics.median(samples)
+
+    tracemalloc.start()
+    extract_document(path, filename)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    file_mb = os.path.getsize(path) / (1024 * 1024)
+    text_mb = len(extracted['text'].encode('utf-8')) / (1024 * 1024)
+    return {
+        'file_mb': round(file_mb, 2),
+        'seconds': round(seconds, 3),
+        'mb_per_second': round(file_mb / seconds, 1),
+        'text_mb_per_second': round(text_mb / seconds, 1),
+        'units': extracted['units'],
+        'peak_memory_mb': round(peak / (1024 * 1024), 1),
+    }
+
+
+def run(size_mb: float = 4.0, rounds: int = 3) -> Dict:
+    size = int(size_mb * 1024 * 1024)
+    paragraphs = _paragraphs(size)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='inspector-bench-documents-') as workdir:
+        files = {
+            'txt': lambda path: _write_text(path, '\n'.join(paragraphs)),
+            'html': lambda path: _write_text(path, make_html(size)),
+            'docx': lambda path: _write_docx(path, paragraphs),
+            'pdf': lambda path: _write_pdf(path, paragraphs),
+        }
+        for format, write in files.items():
+            filename = f'sample.{format}'
+            path = os.path.join(workdir, filename)
+            if write(path) is False:
+                results[format] = None
+                continue
+            results[format] = _measure(path, filename, rounds)
+    return {'text_mb': size_mb, 'rounds': rounds, **results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк извлечения текста из документов по форматам')
+    parser.add_argument('--size', type=float, default=4.0, help='Объем текста документа (МБ)')
+    parser.add_argument('--rounds', type=int, default=3, help='Раундов (берется медиана)')
+    args = parser.parse_args()
+    print(json.dumps(run(args.size, args.rounds), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,427 @@
+"""
+Нагрузочный тест бота целиком: поддельный Bot API, локальный сайт и реальные
+обработчики bot.py
+
+Бот запускается с long polling к поддельному Bot API (benchmarks.fake_bot_api),
+генератор кладет в него апдейты с заданной частотой (поток Пуассона): регистрации
+(/start → имя → телефон → согласие), проверки текста и проверки URL страниц
+локального сайта (benchmarks.fixture_site). Задержка — от апдейта до ответа,
+которым сценарий завершается: PDF для проверок, приветствие после согласия для
+регистрации. Трафик детерминирован (--seed), его можно записать и повторить.
+
+Бот работает во временном каталоге с отдельной SQLite; DATABASE_URL не
+используется.
+
+Запуск:
+    python -m benchmarks.bench_load --rate 5 --duration 60
+    python -m benchmarks.bench_load --rate 10 --mix registration=1,text=6,url=3 --record traffic.jsonl
+    python -m benchmarks.bench_load --replay traffic.jsonl --api-delay-ms 80 --chat-limit 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.fake_bot_api import FakeBotAPI
+from benchmarks.fixture_site import FixtureSite
+
+TOKEN = '123456:LOAD-TEST-TOKEN'
+ADMIN_CHAT = 1
+# Чаты зарегистрированных заранее пользователей и новых (для сценария регистрации)
+REGISTERED_CHAT_BASE = 1_000_000
+NEW_CHAT_BASE = 5_000_000
+
+DEFAULT_MIX = {'registration': 1.0, 'text': 6.0, 'url': 3.0}
+TEXT_SIZES = (300, 1500, 6000)
+PAGE_SIZES = {'/landing-small': 16 * 1024, '/landing-large': 256 * 1024}
+# Ответы, которыми бот сообщает об ошибке проверки (краткий отчет тоже может
+# начинаться с ❌ — это вердикт, а не ошибка)
+ERROR_PREFIXES = ('❌', '⏳')
+ERROR_MARKERS = ('ошибк', 'не удалось', 'много проверок', 'недоступна', 'слишком большое')
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """'registration=1,text=6,url=3' → веса сценариев"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in DEFAULT_MIX:
+            raise ValueError(f"Неизвестный сценарий: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def make_schedule(rate: float, duration: float, mix: Dict[str, float], seed: int = 1) -> List[Dict]:
+    """
+    Расписание сценариев: моменты запуска (поток Пуассона) и параметры
+
+    Тексты и страницы задаются размером и seed, а не содержимым, поэтому
+    записанный трафик компактен и воспроизводится точно.
+    """
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    schedule, at = [], 0.0
+    while True:
+        at += rng.expovariate(rate)
+        if at >= duration:
+            break
+        event = {'at': round(at, 4), 'scenario': rng.choices(names, weights)[0]}
+        if event['scenario'] == 'text':
+            event.update(size=rng.choice(TEXT_SIZES), seed=rng.randrange(1 << 30))
+        elif event['scenario'] == 'url':
+            event['page'] = rng.choice(list(PAGE_SIZES))
+        schedule.append(event)
+    return schedule
+
+
+def save_schedule(schedule: List[Dict], path: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        for event in schedule:
+            f.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+
+def load_schedule(path: str) -> List[Dict]:
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _percentiles(samples: List[float]) -> Dict:
+    if not samples:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+    return {'p50_ms': pick(0.5), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99)}
+
+
+class _Responses:
+    """
+    Ожидание ответов бота по чатам
+
+    Поддельный API вызывает on_response из своего потока; ожидающие сценарии
+    получают ответ в цикле событий.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self._waiters: Dict[int, List] = defaultdict(list)
+        self._first: Dict[int, asyncio.Future] = {}
+
+    def on_response(self, method: str, params: Dict, result: Dict):
+        self.loop.call_soon_threadsafe(self._dispatch, method, params, result)
+
+    def _dispatch(self, method: str, params: Dict, result: Dict):
+        try:
+            chat_id = int(params.get('chat_id') or 0)
+        except ValueError:
+            return
+        first = self._first.pop(chat_id, None)
+        if first is not None and not first.done():
+            first.set_result(time.perf_counter())
+        for waiter in list(self._waiters.get(chat_id, ())):
+            predicate, future = waiter
+            if not future.done() and predicate(method, params):
+                future.set_result(method)
+                self._waiters[chat_id].remove(waiter)
+                break
+
+    def expect(self, chat_id: int, predicate: Callable[[str, Dict], bool]) -> asyncio.Future:
+        """Будущий ответ в чат, удовлетворяющий predicate (регистрировать до апдейта)"""
+        future = self.loop.create_future()
+        self._waiters[chat_id].append((predicate, future))
+        return future
+
+    def first_reply(self, chat_id: int) -> asyncio.Future:
+        """Время первого ответа в чат"""
+        future = self.loop.create_future()
+        self._first[chat_id] = future
+        return future
+
+
+def _is_error(method: str, params: Dict) -> bool:
+    if method not in ('sendMessage', 'editMessageText'):
+        return False
+    text = params.get('text', '').lstrip()
+    return text.startswith(ERROR_PREFIXES) and any(marker in text.lower() for marker in ERROR_MARKERS)
+
+
+def _check_done(method: str, params: Dict) -> bool:
+    return method == 'sendDocument' or _is_error(method, params)
+
+
+def _user(chat_id: int) -> Dict:
+    return {'id': chat_id, 'is_bot': False, 'first_name': 'Нагрузка', 'username': f'load{chat_id}'}
+
+
+def _message_update(chat_id: int, text: str) -> Dict:
+    message = {
+        'message_id': random.randrange(1, 1 << 30),
+        'date': int(time.time()),
+        'chat': {'id': chat_id, 'type': 'private'},
+        'from': _user(chat_id),
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'message': message}
+
+
+def _callback_update(chat_id: int, data: str) -> Dict:
+    return {'callback_query': {
+        'id': str(random.randrange(1 << 30)),
+        'from': _user(chat_id),
+        'chat_instance': str(chat_id),
+        'data': data,
+        'message': {
+            'message_id': random.randrange(1, 1 << 30),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': True, 'first_name': 'Инспектор'},
+            'text': 'Согласие на обработку персональных данных',
+        },
+    }}
+
+
+class LoadRunner:
+    """Выполняет расписание сценариев против запущенного бота"""
+
+    def __init__(self, api: FakeBotAPI, site: FixtureSite, responses: _Responses,
+                 registered_users: int, timeout: float):
+        self.api = api
+        self.site = site
+        self.responses = responses
+        self.registered_users = registered_users
+        self.timeout = timeout
+        self.results: List[Dict] = []
+        self._new_chat = NEW_CHAT_BASE
+        self._check_number = 0
+
+    async def _step(self, chat_id: int, update: Dict, predicate: Callable[[str, Dict], bool]) -> str:
+        done = self.responses.expect(chat_id, predicate)
+        self.api.push_update(update)
+        return await asyncio.wait_for(done, self.timeout)
+
+    async def _registration(self, event: Dict) -> Dict:
+        self._new_chat += 1
+        chat_id = self._new_chat
+        any_message = lambda method, params: method == 'sendMessage'
+        await self._step(chat_id, _message_update(chat_id, '/start'), any_message)
+        await self._step(chat_id, _message_update(chat_id, 'Иван Нагрузкин'), any_message)
+        await self._step(chat_id, _message_update(chat_id, '+79990000000'), any_message)
+        method = await self._step(
+            chat_id, _callback_update(chat_id, 'gdpr_accept'),
+            lambda method, params: method == 'editMessageText'
+        )
+        return {'chat_id': chat_id, 'ok': method == 'editMessageText'}
+
+    async def _check(self, event: Dict) -> Dict:
+        from benchmarks import corpus
+
+        self._check_number += 1
+        chat_id = REGISTERED_CHAT_BASE + self._check_number % self.registered_users
+        if event['scenario'] == 'url':
+            text = self.site.url(event['page'])
+        else:
+            text = corpus.make_text(event['size'], seed=event['seed'])
+
+        first_reply = self.responses.first_reply(chat_id)
+        done = self.responses.expect(chat_id, _check_done)
+        started = time.perf_counter()
+        self.api.push_update(_message_update(chat_id, text))
+        method = await asyncio.wait_for(done, self.timeout)
+        first = first_reply.result() - started if first_reply.done() else None
+        return {'chat_id': chat_id, 'ok': method == 'sendDocument', 'first_reply': first}
+
+    async def _run_event(self, event: Dict):
+        started = time.perf_counter()
+        result = {'scenario': event['scenario'], 'ok': False, 'timeout': False, 'first_reply': None}
+        try:
+            if event['scenario'] == 'registration':
+                result.update(await self._registration(event))
+            else:
+                result.update(await self._check(event))
+        except asyncio.TimeoutError:
+            result['timeout'] = True
+        result['latency'] = time.perf_counter() - started
+        result['finished'] = time.perf_counter()
+        self.results.append(result)
+
+    async def run(self, schedule: List[Dict]) -> float:
+        """Запускает сценарии по расписанию, возвращает время начала"""
+        started = time.perf_counter()
+        tasks = []
+        for event in schedule:
+            delay = event['at'] - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self._run_event(event)))
+        await asyncio.gather(*tasks)
+        return started
+
+
+def _report(results: List[Dict], started: float, target_rate: float, duration: float) -> Dict:
+    finished = max((r['finished'] for r in results), default=started)
+    wall = max(finished - started, 1e-9)
+    by_scenario = {}
+    for scenario in sorted({r['scenario'] for r in results}):
+        items = [r for r in results if r['scenario'] == scenario]
+        ok = [r for r in items if r['ok']]
+        timeouts = sum(1 for r in items if r['timeout'])
+        by_scenario[scenario] = {
+            'count': len(items),
+            'ok': len(ok),
+            'errors': len(items) - len(ok) - timeouts,
+            'timeouts': timeouts,
+            'error_rate': round((len(items) - len(ok)) / len(items), 4),
+            **_percentiles([r['latency'] for r in ok]),
+        }
+    ok = [r for r in results if r['ok']]
+    first_replies = [r['first_reply'] for r in results if r.get('first_reply') is not None]
+    return {
+        'target_rate': target_rate,
+        'duration': duration,
+        'scenarios': len(results),
+        'completed': len(ok),
+        'wall_seconds': round(wall, 2),
+        'throughput_per_s': round(len(ok) / wall, 2),
+        'error_rate': round((len(results) - len(ok)) / len(results), 4) if results else 0.0,
+        'latency': _percentiles([r['latency'] for r in ok]),
+        'first_reply': _percentiles(first_replies),
+        'by_scenario': by_scenario,
+    }
+
+
+async def _run_async(schedule: List[Dict], registered_users: int, api_kwargs: Dict,
+                     page_delay: float, timeout: float) -> Dict:
+    import bot
+    from benchmarks import corpus
+
+    if bot.db.use_postgresql:
+        raise RuntimeError("Нагрузочный тест работает только с SQLite: уберите DATABASE_URL")
+
+    api = FakeBotAPI(**api_kwargs).start()
+    site = FixtureSite(
+        {path: corpus.make_html(size, seed=size) for path, size in PAGE_SIZES.items()},
+        delay=page_delay
+    ).start()
+    responses = _Responses(asyncio.get_running_loop())
+    api.listeners.append(responses.on_response)
+
+    # Пользователи для сценариев проверки регистрируются заранее
+    for i in range(registered_users):
+        await asyncio.to_thread(bot.db.register_user, str(REGISTERED_CHAT_BASE + i), f'load{i}',
+                                f'Пользователь {i}', '+79990000000')
+
+    application = bot.build_application(TOKEN, base_url=api.base_url)
+    try:
+        await application.initialize()
+        await application.start()
+        await application.updater.start_polling(poll_interval=0.0, timeout=1, drop_pending_updates=True)
+
+        runner = LoadRunner(api, site, responses, registered_users, timeout)
+        started = await runner.run(schedule)
+        report = _report(runner.results, started, len(schedule) / max(schedule[-1]['at'], 1e-9)
+                         if schedule else 0.0, schedule[-1]['at'] if schedule else 0.0)
+        await bot.check_pipeline.drain()
+    finally:
+        if application.updater.running:
+            await application.updater.stop()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        bot.ocr_pool.shutdown(wait=False)
+        bot.render_pool.shutdown(wait=False)
+        api.stop()
+        site.stop()
+
+    report['api'] = {'calls': dict(api.calls), 'rejected_429_403': dict(api.rejected)}
+    report['outbound'] = dict(bot.outbound.stats)
+    report['site_hits'] = site.hits
+    return report
+
+
+def run(rate: float = 5.0, duration: float = 30.0, mix: Optional[Dict[str, float]] = None,
+        seed: int = 1, replay: Optional[str] = None, record: Optional[str] = None,
+        registered_users: int = 200, api_delay_ms: float = 50, chat_limit: Optional[int] = None,
+        global_limit: Optional[int] = None, page_delay_ms: float = 100, timeout: float = 120.0) -> Dict:
+    """
+    Выполняет нагрузочный тест
+
+    Args:
+        rate: Сценариев в секунду
+        duration: Длительность генерации (секунды)
+        mix: Веса сценариев registration/text/url
+        seed: Seed генератора трафика
+        replay: Файл записанного трафика (вместо генерации)
+        record: Куда записать сгенерированный трафик
+        registered_users: Зарегистрированных заранее пользователей для проверок
+        api_delay_ms: Задержка ответов Bot API
+        chat_limit: Лимит запросов в чат за 3 с (429 при превышении; None — без лимита)
+        global_limit: Лимит запросов бота в секунду (429 при превышении)
+        page_delay_ms: Задержка ответа локального сайта
+        timeout: Таймаут одного сценария (секунды)
+
+    Returns:
+        Отчет: пропускная способность, задержки p50/p95/p99, доля ошибок по сценариям
+    """
+    schedule = load_schedule(replay) if replay else make_schedule(rate, duration, mix or DEFAULT_MIX, seed)
+    if record:
+        save_schedule(schedule, record)
+
+    # Бот импортируется в отдельном каталоге: своя SQLite и хранилище отчетов
+    workdir = tempfile.mkdtemp(prefix='inspector-load-')
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', TOKEN)
+    os.environ['DATABASE_URL'] = ''
+    os.environ['ADMIN_CHAT_ID'] = str(ADMIN_CHAT)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('REPORTS_STORE_PATH', os.path.join(workdir, 'reports'))
+    cwd = os.getcwd()
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if repo_root not in sys.path:
+        sys.path.insert(0, repo_root)
+    os.chdir(workdir)
+    try:
+        report = asyncio.run(_run_async(
+            schedule, registered_users,
+            {'delay': api_delay_ms / 1000, 'chat_limit': chat_limit, 'global_limit': global_limit},
+            page_delay_ms / 1000, timeout
+        ))
+    finally:
+        os.chdir(cwd)
+    return {'benchmark': 'load', 'replay': replay, 'seed': None if replay else seed, **report}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест бота с поддельным Bot API')
+    parser.add_argument('--rate', type=float, default=5.0, help='Сценариев в секунду')
+    parser.add_argument('--duration', type=float, default=30.0, help='Секунд генерации трафика')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='Веса сценариев, например registration=1,text=6,url=3')
+    parser.add_argument('--seed', type=int, default=1, help='Seed генератора трафика')
+    parser.add_argument('--record', help='Записать трафик в файл JSONL')
+    parser.add_argument('--replay', help='Повторить трафик из файла JSONL')
+    parser.add_argument('--users', type=int, default=200, help='Зарегистрированных пользователей')
+    parser.add_argument('--api-delay-ms', type=float, default=50, help='Задержка Bot API')
+    parser.add_argument('--chat-limit', type=int, help='Запросов в чат за 3 с до 429')
+    parser.add_argument('--global-limit', type=int, help='Запросов бота в секунду до 429')
+    parser.add_argument('--page-delay-ms', type=float, default=100, help='Задержка локального сайта')
+    parser.add_argument('--timeout', type=float, default=120.0, help='Таймаут сценария (секунды)')
+    args = parser.parse_args()
+    logging.getLogger('sender').setLevel(logging.ERROR)
+    print(json.dumps(run(
+        args.rate, args.duration, args.mix, args.seed, args.replay, args.record, args.users,
+        args.api_delay_ms, args.chat_limit, args.global_limit, args.page_delay_ms, args.timeout
+    ), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
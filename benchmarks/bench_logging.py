@@ -0,0 +1,126 @@
+"""
+Бенчмарк логирования на пути проверки: время в обработчике на одну проверку
+
+before — прежняя схема: около дюжины f-строк logger.info на проверку
+         (handle_material, handle_url, send_full_report) и StreamHandler,
+         который пишет в вызывающем потоке;
+after  — одна итоговая запись trace на проверку, spans этапов на DEBUG
+         (отключены при INFO) и вывод через очередь (tracing.setup_logging).
+
+Вывод идет в поток с искусственной задержкой записи (--write-ms), как у
+медленного диска или журнала: в схеме before обработчик ждет каждую запись.
+
+Запуск:
+    python -m benchmarks.bench_logging --checks 2000 --write-ms 0.2
+"""
+import argparse
+import io
+import json
+import logging
+import time
+from typing import Dict
+
+from tracing import finish_trace, set_trace_fields, setup_logging, span, start_trace
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+STAGES = ('fetch', 'parse', 'analyze', 'brief', 'report_html', 'render', 'upload')
+URL = 'https://bankrot-example.ru/spisanie-dolgov'
+
+
+class _SlowStream(io.TextIOBase):
+    """Поток вывода с задержкой на каждую запись"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.lines = 0
+
+    def write(self, text: str) -> int:
+        if self.delay:
+            time.sleep(self.delay)
+        self.lines += 1
+        return len(text)
+
+
+def _check_before(logger: logging.Logger, i: int):
+    telegram_id = str(100000 + i)
+    logger.info("handle_material вызван")
+    logger.info(f"Telegram ID: {telegram_id}")
+    logger.info("Проверяю регистрацию пользователя...")
+    logger.info("Пользователь зарегистрирован")
+    logger.info(f"Получен текст: {URL[:50]}...")
+    logger.info(f"Тип материала: {'URL'}")
+    logger.info("Вызываю handle_url...")
+    logger.info(f"handle_url вызван с URL: {URL}")
+    logger.info("Отправляю сообщение 'Анализирую сайт...'")
+    logger.info("Сообщение отправлено")
+    logger.info("Начинаю анализ URL...")
+    logger.info(f"Анализ завершен. Результат: {'ТРЕБУЕТ_ДОРАБОТКИ'}")
+    timings = {stage: 0.01 for stage in STAGES}
+    logger.info("Этапы проверки: %s",
+                ', '.join(f"{stage}={seconds * 1000:.0f}мс" for stage, seconds in timings.items()))
+    logger.info("handle_material завершен успешно")
+
+
+def _check_after(logger: logging.Logger, i: int):
+    trace = start_trace('check', user=100000 + i)
+    logger.debug("Материал: %s, %d символов", 'URL', len(URL))
+    for stage in STAGES:
+        with span(stage):
+            pass
+    set_trace_fields(material_type='site', verdict='ТРЕБУЕТ_ДОРАБОТКИ', violations=3)
+    finish_trace(trace)
+
+
+def _measure(mode: str, checks: int, write_delay: float) -> Dict:
+    stream = _SlowStream(write_delay)
+    root = logging.getLogger()
+    listener = None
+    if mode == 'before':
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+        check = _check_before
+    else:
+        listener = setup_logging('INFO', LOG_FORMAT.replace('%(message)s', '[%(trace_id)s] %(message)s'))
+        listener.handlers[0].setStream(stream)
+        check = _check_after
+    logger = logging.getLogger('bot')
+
+    started = time.perf_counter()
+    for i in range(checks):
+        check(logger, i)
+    handler_seconds = time.perf_counter() - started
+    if listener is not None:
+        listener.stop()
+    drained_seconds = time.perf_counter() - started
+
+    return {
+        'handler_us_per_check': round(handler_seconds / checks * 1e6, 1),
+        'lines_per_check': round(stream.lines / checks, 1),
+        'seconds_until_written': round(drained_seconds, 3),
+    }
+
+
+def run(checks: int = 2000, write_ms: float = 0.2) -> Dict:
+    return {
+        'benchmark': 'logging',
+        'checks': checks,
+        'write_ms': write_ms,
+        'before': _measure('before', checks, write_ms / 1000),
+        'after': _measure('after', checks, write_ms / 1000),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Логирование на пути проверки')
+    parser.add_argument('--checks', type=int, default=2000, help='Проверок')
+    parser.add_argument('--write-ms', type=float, default=0.2, help='Задержка записи одной строки')
+    args = parser.parse_args()
+    print(json.dumps(run(args.checks, args.write_ms), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Бенчмарк накладных расходов метрик
+
+Сколько стоит одна операция (Counter.inc, Histogram.observe, stage_timer) и
+какую долю времени проверки текста занимает инструментирование: анализ с
+метриками сравнивается с тем же анализом без них (_analyze_text).
+
+Запуск:
+    python -m benchmarks.bench_metrics --ops 200000 --checks 300
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Callable, Dict, List
+
+from analyzer.material_analyzer import MaterialAnalyzer
+from metrics import Counter, Histogram, stage_timer
+
+SAMPLE_TEXT = (
+    'Банкротство физических лиц под ключ. Гарантируем полное списание долгов! '
+    'Не платите банкам — сохраним квартиру и машину. Беремся за любые дела. '
+)
+
+# Метрик на одну проверку текста: таймеры этапов, счетчик вердиктов, gauge в работе
+OPS_PER_CHECK = {'timer': 6, 'counter': 1, 'gauge': 2}
+
+
+def _ns_per_op(fn: Callable, ops: int) -> float:
+    started = time.perf_counter_ns()
+    for _ in range(ops):
+        fn()
+    return (time.perf_counter_ns() - started) / ops
+
+
+def _timer_op():
+    with stage_timer('bench'):
+        pass
+
+
+def _check_times(fn: Callable, checks: int) -> List[float]:
+    samples = []
+    for _ in range(checks):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def run(ops: int = 200000, checks: int = 300) -> Dict:
+    counter = Counter('bench_total', 'bench')
+    labelled = Counter('bench_labelled_total', 'bench', ['stage'])
+    histogram = Histogram('bench_seconds', 'bench')
+
+    per_op = {
+        'counter_inc_ns': _ns_per_op(counter.inc, ops),
+        'counter_labels_inc_ns': _ns_per_op(lambda: labelled.labels('analyze').inc(), ops),
+        'histogram_observe_ns': _ns_per_op(lambda: histogram.observe(0.042), ops),
+        'stage_timer_ns': _ns_per_op(_timer_op, ops),
+    }
+
+    analyzer = MaterialAnalyzer()
+    text = SAMPLE_TEXT * 5
+    # Прогрев: компиляция правил, кэши
+    analyzer.analyze_text(text)
+    bare = _check_times(lambda: analyzer._analyze_text(text, 'text'), checks)
+    instrumented = _check_times(lambda: analyzer.analyze_text(text), checks)
+    bare_median = statistics.median(bare)
+    instrumented_median = statistics.median(instrumented)
+
+    # Оценка полной стоимости метрик одной проверки по числу операций на нее
+    per_check_ns = (
+        OPS_PER_CHECK['timer'] * per_op['stage_timer_ns']
+        + OPS_PER_CHECK['counter'] * per_op['counter_labels_inc_ns']
+        + OPS_PER_CHECK['gauge'] * per_op['counter_inc_ns']
+    )
+    return {
+        'benchmark': 'metrics',
+        'per_op': {key: round(value, 1) for key, value in per_op.items()},
+        'analyze_text_ms': {
+            'bare_median': round(bare_median * 1000, 3),
+            'instrumented_median': round(instrumented_median * 1000, 3),
+        },
+        'per_check_metrics_us': round(per_check_ns / 1000, 2),
+        'per_check_overhead_percent': round(per_check_ns / 1e9 / bare_median * 100, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Накладные расходы метрик')
+    parser.add_argument('--ops', type=int, default=200000, help='Операций на замер')
+    parser.add_argument('--checks', type=int, default=300, help='Проверок текста на замер')
+    args = parser.parse_args()
+    print(json.dumps(run(args.ops, args.checks), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+"""
+Симуляция наблюдения за сайтами (monitor.py)
+
+Ставит на наблюдение `--urls` страниц на `--hosts` хостах (размер хостов
+неравномерный: у крупных — сотни страниц) с равномерно распределенными сроками
+и в течение `--duration` секунд реального времени проверяет их через
+UrlMonitor с настоящей базой SQLite и анализатором. Сайты симулируются: задержка
+ответа, доля страниц с ETag (ответ 304), доля изменившихся страниц, смена
+дисклеймера (смена вердикта → уведомление). Интервал сжат (`--interval`
+секунд вместо суток), поэтому нагрузка в сотни раз выше рабочей.
+
+На полпути планировщик останавливается и создается заново — как при
+перезапуске бота: расписание продолжается из базы.
+
+Сообщает проверки в секунду против требуемых, опоздание относительно срока
+(p50/p95/p99/max) отдельно для хостов, чьи страницы укладываются в паузу
+host_delay, и для перегруженных (их проверки намеренно растягиваются), исходы,
+нарушения вежливости к хостам (одновременные запросы или пауза меньше
+host_delay; сразу после перезапуска паузы прежнего процесса не известны),
+загрузку CPU и пиковую память.
+
+Запуск:
+    python -m benchmarks.bench_monitor --urls 10000 --interval 240 --duration 480
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from analyzer.incremental import IncrementalAnalyzer
+from analyzer.material_analyzer import MaterialAnalyzer
+from benchmarks.corpus import make_html
+from database import Database
+from monitor import FetchResult, UrlMonitor, host_of
+
+
+class SimulatedSites:
+    """Сайты для симуляции: версии страниц, ETag и учет вежливости к хостам"""
+
+    def __init__(self, latency_ms: float, change_rate: float, etag_share: float, flip_share: float,
+                 host_delay: float, page_bytes: int, seed: int = 1):
+        self.latency = latency_ms / 1000
+        self.change_rate = change_rate
+        self.etag_share = etag_share
+        self.flip_share = flip_share
+        self.host_delay = host_delay
+        self.page_bytes = page_bytes
+        self.rng = random.Random(seed)
+        self.versions: Dict[str, int] = {}
+        self.in_flight: Dict[str, int] = {}
+        self.last_done: Dict[str, float] = {}
+        self.violations = 0
+        self.requests = 0
+
+    def _page(self, url: str, version: int) -> str:
+        key = zlib.crc32(url.encode('utf-8'))
+        # У части сайтов дисклеймер то пропадает, то возвращается
+        flips = key % 1000 < self.flip_share * 1000
+        return make_html(self.page_bytes, seed=key + version, disclaimer=not (flips and version % 2))
+
+    async def fetch(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> FetchResult:
+        host = host_of(url)
+        now = time.time()
+        if self.in_flight.get(host) or now - self.last_done.get(host, -1e9) < self.host_delay * 0.99:
+            self.violations += 1
+        self.in_flight[host] = self.in_flight.get(host, 0) + 1
+        self.requests += 1
+        try:
+            await asyncio.sleep(self.rng.expovariate(1 / self.latency))
+            version = self.versions.get(url, 0)
+            if url in self.versions and self.rng.random() < self.change_rate:
+                version += 1
+            self.versions[url] = version
+            tag = f'"{version}"'
+            supports_etag = zlib.crc32(url.encode('utf-8')) % 1000 >= (1 - self.etag_share) * 1000
+            if supports_etag and etag == tag:
+                return FetchResult(304, b'', '', tag, None)
+            text = self._page(url, version)
+            return FetchResult(200, text.encode('utf-8'), text, tag if supports_etag else None, None)
+        finally:
+            self.in_flight[host] -= 1
+            self.last_done[host] = time.time()
+
+    async def close(self):
+        pass
+
+
+class _MeasuredMonitor(UrlMonitor):
+    """UrlMonitor с записью опоздания каждой проверки (хост, секунды)"""
+
+    lags: List[Tuple[str, float]] = []
+
+    async def check(self, row: Dict) -> str:
+        self.lags.append((row['host'], max(0.0, time.time() - row['next_check_at'])))
+        return await super().check(row)
+
+
+def _hosts(urls: int, hosts: int, rng: random.Random) -> List[str]:
+    """Хост каждой страницы: вес хоста ~ 1/ранг (несколько крупных, много мелких)"""
+    weights = [1 / (rank + 1) for rank in range(hosts)]
+    return rng.choices([f"site{rank}.example.ru" for rank in range(hosts)], weights, k=urls)
+
+
+def _percentiles(samples: List[float]) -> Dict:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+
+    return {'p50_s': pick(0.5), 'p95_s': pick(0.95), 'p99_s': pick(0.99), 'max_s': round(ordered[-1], 2)}
+
+
+async def _simulate(db: Database, analyzer: MaterialAnalyzer, sites: SimulatedSites, duration: float,
+                    concurrency: int, host_delay: float, overloaded: Set[str]) -> Dict:
+    alerts = []
+
+    async def notify(bot, row, result, previous_verdict, diff):
+        alerts.append((row['url'], previous_verdict, result.verdict))
+
+    incremental = IncrementalAnalyzer(analyzer, db)
+
+    def make_monitor() -> UrlMonitor:
+        return _MeasuredMonitor(db, incremental, notify, fetcher=sites, concurrency=concurrency,
+                                host_delay=host_delay, lease_seconds=60)
+
+    stats = {}
+    cpu_started, started = time.process_time(), time.perf_counter()
+    monitor = make_monitor()
+    monitor.start()
+    await asyncio.sleep(duration / 2)
+    # Перезапуск: ожидающие проверки возвращаются в базу, новый планировщик продолжает
+    await monitor.stop()
+    violations_before_restart = sites.violations
+    for key, value in monitor.stats.items():
+        stats[key] = stats.get(key, 0) + value
+    monitor = make_monitor()
+    monitor.start()
+    # Первые паузы после перезапуска: время последних запросов прежнего процесса не известно
+    restart_window = min(duration / 2, 2 * host_delay + 1)
+    await asyncio.sleep(restart_window)
+    violations_at_restart = sites.violations - violations_before_restart
+    await asyncio.sleep(duration / 2 - restart_window)
+    await monitor.stop()
+    for key, value in monitor.stats.items():
+        stats[key] = stats.get(key, 0) + value
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+
+    checks = sum(stats[key] for key in ('not_modified', 'unchanged', 'analyzed', 'error'))
+    return {
+        'checks': checks,
+        'checks_per_second': round(checks / elapsed, 1),
+        'outcomes': stats,
+        'alerts': len(alerts),
+        'lag': _percentiles([lag for host, lag in _MeasuredMonitor.lags if host not in overloaded]),
+        'lag_overloaded_hosts': _percentiles([lag for host, lag in _MeasuredMonitor.lags if host in overloaded]),
+        'host_politeness_violations': sites.violations - violations_at_restart,
+        'host_politeness_violations_at_restart': violations_at_restart,
+        'cpu_percent': round(100 * cpu / elapsed, 1),
+    }
+
+
+def run(urls: int = 10000, hosts: int = 1500, interval: float = 240.0, duration: float = 480.0,
+        concurrency: int = 16, host_delay: float = 1.0, latency_ms: float = 150.0, change_rate: float = 0.05,
+        etag_share: float = 0.6, flip_share: float = 0.02, page_bytes: int = 8192, seed: int = 1) -> Dict:
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory(prefix='inspector-bench-monitor-') as workdir:
+        db = Database(os.path.join(workdir, 'users.db'))
+        setup_started = time.perf_counter()
+        owners = [str(100000 + i) for i in range(max(1, urls // 5))]
+        for owner in owners:
+            db.register_user(owner, f'monitor{owner}', 'Наблюдатель', '+79990000000')
+        now = time.time()
+        url_hosts = _hosts(urls, hosts, rng)
+        # Хост перегружен, если его страницы не успеть проверить за интервал с паузами host_delay
+        per_host = interval / (host_delay + latency_ms / 1000)
+        overloaded = {host for host, count in Counter(url_hosts).items() if count > per_host}
+        # Установившийся режим: сроки равномерно распределены по интервалу
+        for i, host in enumerate(url_hosts):
+            url = f"https://{host}/page{i}"
+            db.add_monitored_url(owners[i % len(owners)], url, f"{i:064x}", host, int(interval),
+                                 now + rng.uniform(0, interval))
+        setup_seconds = time.perf_counter() - setup_started
+
+        sites = SimulatedSites(latency_ms, change_rate, etag_share, flip_share, host_delay, page_bytes, seed)
+        _MeasuredMonitor.lags = []
+        result = asyncio.run(_simulate(db, MaterialAnalyzer(), sites, duration, concurrency, host_delay,
+                                       overloaded))
+
+    return {
+        'urls': urls,
+        'hosts': hosts,
+        'interval_s': interval,
+        'duration_s': duration,
+        'required_checks_per_second': round(urls / interval, 1),
+        'overloaded_hosts': len(overloaded),
+        'overloaded_host_urls': sum(1 for host in url_hosts if host in overloaded),
+        'concurrency': concurrency,
+        'host_delay_s': host_delay,
+        'setup_s': round(setup_seconds, 1),
+        'cpu_count': os.cpu_count(),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        **result,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Симуляция наблюдения за сайтами')
+    parser.add_argument('--urls', type=int, default=10000, help='Страниц на наблюдении')
+    parser.add_argument('--hosts', type=int, default=1500, help='Хостов')
+    parser.add_argument('--interval', type=float, default=240.0, help='Интервал проверки страницы (секунды)')
+    parser.add_argument('--duration', type=float, default=480.0, help='Длительность симуляции (секунды)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Одновременных проверок')
+    parser.add_argument('--host-delay', type=float, default=1.0, help='Пауза между запросами к хосту (секунды)')
+    parser.add_argument('--latency-ms', type=float, default=150.0, help='Средняя задержка ответа сайта')
+    parser.add_argument('--change-rate', type=float, default=0.05, help='Доля проверок, на которых страница изменилась')
+    parser.add_argument('--etag-share', type=float, default=0.6, help='Доля сайтов с ETag')
+    parser.add_argument('--page-bytes', type=int, default=8192, help='Размер страницы')
+    args = parser.parse_args()
+    print(json.dumps(run(args.urls, args.hosts, args.interval, args.duration, args.concurrency, args.host_delay,
+                         args.latency_ms, args.change_rate, args.etag_share, page_bytes=args.page_bytes),
+                     ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Бенчмарк OCR-конвейера: изображений в секунду на ядро
+
+Запуск:
+    python -m benchmarks.bench_ocr --images 40
+    python -m benchmarks.bench_ocr --dir ./banners --workers 1 2 4
+
+Без --dir генерирует синтетические баннеры 2400x1200 с рекламным текстом
+и дисклеймером (нужен TTF-шрифт с кириллицей, например DejaVuSans).
+Требует Pillow, pytesseract и установленный tesseract с языком rus.
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from config import REQUIRED_DISCLAIMER, OCR_LANG, OCR_MAX_SIDE
+from analyzer.image_analyzer import OCR_AVAILABLE, ocr_image
+
+FONT_CANDIDATES = [
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    '/Library/Fonts/Arial.ttf',
+    'C:\\Windows\\Fonts\\arial.ttf',
+]
+
+AD_LINES = [
+    'Банкротство физических лиц под ключ',
+    'Гарантируем списание долгов!',
+    'Консультация бесплатно: 8 800 000-00-00',
+]
+
+
+def _find_font(path: Optional[str]) -> Optional[str]:
+    if path:
+        return path
+    for candidate in FONT_CANDIDATES:
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def make_banner(font_path: Optional[str], size=(2400, 1200), disclaimer_scale: float = 1.0) -> bytes:
+    """Синтетический баннер: заголовок, текст и дисклеймер внизу (PNG)"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    image = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(image)
+
+    def font(px):
+        return ImageFont.truetype(font_path, px) if font_path else ImageFont.load_default()
+
+    y = 60
+    for line in AD_LINES:
+        draw.text((60, y), line, fill='black', font=font(90))
+        y += 140
+
+    # Дисклеймер переносится по словам в несколько строк
+    disclaimer_font = font(int(36 * disclaimer_scale))
+    words = REQUIRED_DISCLAIMER.split()
+    line = ''
+    y = size[1] - int(260 * disclaimer_scale)
+    for word in words:
+        candidate = f'{line} {word}'.strip()
+        if draw.textlength(candidate, font=disclaimer_font) > size[0] - 120:
+            draw.text((60, y), line, fill='black', font=disclaimer_font)
+            y += int(48 * disclaimer_scale)
+            line = word
+        else:
+            line = candidate
+    draw.text((60, y), line, fill='black', font=disclaimer_font)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def load_images(directory: Optional[str], count: int, font_path: Optional[str]) -> List[bytes]:
+    """Изображения из каталога или синтетические баннеры"""
+    if directory:
+        images = []
+        for name in sorted(os.listdir(directory)):
+            if name.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')):
+                with open(os.path.join(directory, name), 'rb') as f:
+                    images.append(f.read())
+        return images[:count] if count else images
+    base = make_banner(font_path)
+    return [base] * count
+
+
+def run(images: List[bytes], workers_list: List[int], max_side: int = OCR_MAX_SIDE,
+        lang: str = OCR_LANG) -> Dict:
+    """Прогоняет изображения через пул для каждого числа процессов"""
+    results = []
+    for workers in workers_list:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Прогрев: запуск процессов и загрузка моделей tesseract
+            list(pool.map(ocr_image, images[:workers], [max_side] * workers, [lang] * workers))
+
+            started = time.perf_counter()
+            outputs = list(pool.map(ocr_image, images, [max_side] * len(images), [lang] * len(images)))
+            elapsed = time.perf_counter() - started
+
+        stages = {}
+        for output in outputs:
+            for stage, seconds in output['timings'].items():
+                stages.setdefault(stage, []).append(seconds * 1000)
+
+        images_per_second = len(images) / elapsed
+        results.append({
+            'workers': workers,
+            'images': len(images),
+            'seconds': round(elapsed, 3),
+            'images_per_second': round(images_per_second, 2),
+            'images_per_second_per_core': round(images_per_second / workers, 2),
+            'stage_median_ms': {s: round(statistics.median(v), 1) for s, v in stages.items()},
+            'disclaimer_area_percent': outputs[0]['disclaimer_area_percent'],
+        })
+    return {'benchmark': 'ocr', 'max_side': max_side, 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк OCR-конвейера')
+    parser.add_argument('--dir', help='Каталог с изображениями (по умолчанию — синтетические)')
+    parser.add_argument('--images', type=int, default=24, help='Сколько изображений прогнать')
+    parser.add_argument('--workers', type=int, nargs='+', help='Числа процессов (по умолчанию 1 и все ядра)')
+    parser.add_argument('--max-side', type=int, default=OCR_MAX_SIDE)
+    parser.add_argument('--font', help='TTF-шрифт с кириллицей для синтетических баннеров')
+    args = parser.parse_args()
+
+    if not OCR_AVAILABLE:
+        print('Не установлены Pillow/pytesseract', file=sys.stderr)
+        sys.exit(1)
+
+    cores = os.cpu_count() or 1
+    workers_list = args.workers or sorted({1, cores})
+    images = load_images(args.dir, args.images, _find_font(args.font))
+    print(json.dumps(run(images, workers_list, args.max_side), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Бенчмарк исходящих сообщений под нагрузкой: прямые вызовы против планировщика
+
+Поддельный Bot API (benchmarks.fake_bot_api) отвечает 429, как Telegram, при
+превышении лимитов. Каждая проверка — это сообщения о ходе проверки,
+краткий отчет и PDF.
+
+direct    — прежняя схема: «Анализирую…», краткий отчет, PDF отдельными
+            сообщениями, без ожидания лимитов и повторов;
+scheduled — одно сообщение с правками по этапам (ProgressMessage) и PDF через
+            OutboundScheduler.
+
+Запуск:
+    python -m benchmarks.bench_outbound --checks 300 --chats 100
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Dict
+
+from telegram import Bot, Chat, Message, User
+
+from sender import OutboundScheduler, ProgressMessage
+from benchmarks.fake_bot_api import FakeBotAPI
+
+STAGES = ['🔍 Загружаю сайт...', '🔍 Анализирую текст страницы...', '🔍 Измеряю дисклеймер...']
+PDF_BYTES = b'%PDF-1.7 ' + b'0' * 30000
+
+
+def _user_message(bot: Bot, chat_id: int) -> Message:
+    message = Message(
+        message_id=1, date=datetime.now(), chat=Chat(id=chat_id, type='private'),
+        from_user=User(id=chat_id, first_name='Bench', is_bot=False)
+    )
+    message.set_bot(bot)
+    return message
+
+
+async def _direct_check(message: Message, step: float):
+    await message.reply_text(STAGES[0])
+    await asyncio.sleep(step)
+    await message.reply_text('✅ ВЕРДИКТ: СООТВЕТСТВУЕТ')
+    await message.reply_document(document=PDF_BYTES, filename='report.pdf')
+
+
+async def _scheduled_check(sender: OutboundScheduler, message: Message, step: float):
+    progress = ProgressMessage(sender, message)
+    await progress.start(STAGES[0])
+    for text in STAGES[1:]:
+        await asyncio.sleep(step / len(STAGES))
+        progress.update(text)
+    await progress.finish('✅ ВЕРДИКТ: СООТВЕТСТВУЕТ')
+    await sender.call(message.chat_id, message.reply_document, document=PDF_BYTES, filename='report.pdf')
+
+
+async def _run_mode(mode: str, checks: int, chats: int, delay_ms: float, step_ms: float) -> Dict:
+    # Лимиты близки к Telegram: ~30 запросов в секунду на бота, небольшие серии в чат
+    api = FakeBotAPI(delay=delay_ms / 1000, chat_limit=6, chat_window=3.0, global_limit=30).start()
+    try:
+        bot = Bot('123456:FAKE', base_url=api.base_url)
+        await bot.initialize()
+        sender = OutboundScheduler()
+        step = step_ms / 1000
+
+        async def one(i: int) -> bool:
+            message = _user_message(bot, 1000 + i % chats)
+            try:
+                if mode == 'direct':
+                    await _direct_check(message, step)
+                else:
+                    await _scheduled_check(sender, message, step)
+                return True
+            except Exception:
+                return False
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(checks)))
+        elapsed = time.perf_counter() - started
+        await bot.shutdown()
+
+        completed = sum(results)
+        return {
+            'completed': completed,
+            'failed': checks - completed,
+            'seconds': round(elapsed, 2),
+            'checks_per_second': round(completed / elapsed, 1),
+            'api_calls': dict(api.calls),
+            'api_429': dict(api.rejected),
+            'scheduler': sender.stats if mode == 'scheduled' else None,
+        }
+    finally:
+        api.stop()
+
+
+def run(checks: int = 300, chats: int = 100, delay_ms: float = 50, step_ms: float = 300) -> Dict:
+    return {
+        'benchmark': 'outbound',
+        'checks': checks,
+        'chats': chats,
+        'direct': asyncio.run(_run_mode('direct', checks, chats, delay_ms, step_ms)),
+        'scheduled': asyncio.run(_run_mode('scheduled', checks, chats, delay_ms, step_ms)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Исходящие сообщения под нагрузкой')
+    parser.add_argument('--checks', type=int, default=300, help='Одновременных проверок')
+    parser.add_argument('--chats', type=int, default=100, help='Число разных чатов')
+    parser.add_argument('--delay-ms', type=float, default=50, help='Задержка ответа Bot API')
+    parser.add_argument('--step-ms', type=float, default=300, help='Длительность этапов проверки')
+    args = parser.parse_args()
+    # Предупреждения о 429 ожидаемы: итог считается по счетчикам
+    logging.getLogger('sender').setLevel(logging.ERROR)
+    print(json.dumps(run(args.checks, args.chats, args.delay_ms, args.step_ms), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Сквозной бенчмарк задержки проверки: последовательные этапы против конвейера
+
+Бот работает с локальным поддельным Bot API (benchmarks.fake_bot_api) с
+заданной сетевой задержкой. Время считается от завершения анализа до
+доставки PDF-отчета пользователю.
+
+До: краткий ответ → рендеринг PDF → запись в хранилище → загрузка → запись в базу.
+После: CheckPipeline — рендеринг параллельно с кратким ответом, база в фоне.
+
+Запуск:
+    python -m benchmarks.bench_pipeline --checks 20 --delay-ms 150
+    python -m benchmarks.bench_pipeline --render-ms 300   # без WeasyPrint
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from telegram import Bot, Chat, Message, User
+from telegram.constants import ParseMode
+
+from analyzer.material_analyzer import MaterialAnalyzer
+from database import Database
+from pipeline import CheckPipeline
+from reports.report_generator import ReportGenerator
+from reports.store import ReportStore
+from benchmarks.fake_bot_api import FakeBotAPI
+
+SAMPLE_TEXT = (
+    'Банкротство физических лиц под ключ. Гарантируем полное списание долгов! '
+    'Не платите банкам — сохраним квартиру и машину. '
+)
+TELEGRAM_ID = '1000'
+
+
+def _percentiles(samples: List[float]) -> Dict:
+    ordered = sorted(samples)
+    return {
+        'p50_ms': round(statistics.median(ordered) * 1000, 1),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+        'mean_ms': round(statistics.mean(ordered) * 1000, 1),
+    }
+
+
+def _make_renderer(render_ms: Optional[float], pool):
+    if render_ms is not None:
+        async def render(html_content: str) -> bytes:
+            await asyncio.sleep(render_ms / 1000)
+            return b'%PDF-1.7 ' + html_content.encode('utf-8')
+        return render
+
+    from reports.pdf_generator import render_report_pdf
+    return lambda html_content: pool.submit(render_report_pdf, html_content)
+
+
+async def _sequential(pipeline: CheckPipeline, message: Message, analysis_result, material_info: Dict):
+    """Прежний порядок этапов: каждый ждет предыдущий"""
+    generator = pipeline.report_generator
+    await message.reply_text(generator.generate_brief(analysis_result, material_info),
+                             parse_mode=ParseMode.MARKDOWN)
+    html_content = generator.generate_html(analysis_result, material_info, embed_css=False)
+    pdf_bytes = await pipeline.render_pdf(html_content)
+    stored = pipeline.report_store.put(pdf_bytes, 'pdf')
+    await message.reply_document(document=pdf_bytes, filename='report.pdf', caption='📄')
+    pipeline.db.save_check(TELEGRAM_ID, 'text', material_info['text'], analysis_result.verdict,
+                           analysis_result.total_violations, stored.path, analysis_result.rules_version)
+
+
+async def _run(checks: int, delay_ms: float, render_ms: Optional[float]) -> Dict:
+    from workers import WorkerPool
+
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    api = FakeBotAPI(delay=delay_ms / 1000).start()
+    pool = WorkerPool('render', max_workers=2, max_queue=checks)
+    try:
+        bot = Bot('123456:FAKE', base_url=api.base_url)
+        await bot.initialize()
+        message = Message(
+            message_id=1, date=datetime.now(), chat=Chat(id=int(TELEGRAM_ID), type='private'),
+            from_user=User(id=int(TELEGRAM_ID), first_name='Bench', is_bot=False)
+        )
+        message.set_bot(bot)
+
+        db = Database(os.path.join(workdir, 'users.db'))
+        db.register_user(TELEGRAM_ID, 'bench', 'Bench User', '+70000000000')
+        analyzer = MaterialAnalyzer()
+        pipeline = CheckPipeline(analyzer, ReportGenerator(), ReportStore(os.path.join(workdir, 'reports')),
+                                 db, render_pdf=_make_renderer(render_ms, pool))
+
+        results = {}
+        for mode in ('sequential', 'pipelined'):
+            samples = []
+            for i in range(checks):
+                # Уникальный материал: иначе сработает повторная отправка по file_id
+                text = f"{mode} {i}. {SAMPLE_TEXT}"
+                analysis_result = analyzer.analyze_text(text)
+                material_info = {'text': text[:100], 'type': 'Текст объявления'}
+                started = time.perf_counter()
+                if mode == 'sequential':
+                    await _sequential(pipeline, message, analysis_result, material_info)
+                else:
+                    await pipeline.run(message, TELEGRAM_ID, analysis_result, material_info,
+                                       material_type='text', material_url=text[:100])
+                samples.append(time.perf_counter() - started)
+            await pipeline.drain()
+            results[mode] = _percentiles(samples)
+
+        await bot.shutdown()
+        return {
+            'benchmark': 'pipeline',
+            'checks': checks,
+            'api_delay_ms': delay_ms,
+            'render': f'simulated {render_ms} ms' if render_ms is not None else 'weasyprint',
+            **results,
+            'api_calls': dict(api.calls),
+        }
+    finally:
+        api.stop()
+        pool.shutdown()
+
+
+def run(checks: int = 20, delay_ms: float = 150, render_ms: Optional[float] = None) -> Dict:
+    return asyncio.run(_run(checks, delay_ms, render_ms))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сквозная задержка проверки: последовательно vs конвейер')
+    parser.add_argument('--checks', type=int, default=20, help='Проверок на режим')
+    parser.add_argument('--delay-ms', type=float, default=150, help='Задержка ответа Bot API')
+    parser.add_argument('--render-ms', type=float, default=None,
+                        help='Имитировать рендеринг PDF заданной длительности вместо WeasyPrint')
+    args = parser.parse_args()
+    print(json.dumps(run(args.checks, args.delay_ms, args.render_ms), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
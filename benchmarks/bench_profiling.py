@@ -0,0 +1,64 @@
+"""
+Бенчмарк профилирования по команде админа: цена проверки без сеанса и во время него
+
+Проверка — анализ HTML лендинга (этапы parse и analyze в spans) внутри trace,
+как в обработчике. Режимы:
+- off         — сеанс не запущен (обычная работа: этапы проверяют одну переменную);
+- cpu         — /profiling N: выборка стеков и прирост RSS по этапам;
+- allocations — /profiling N mem: еще и снимки tracemalloc до и после этапов.
+
+Для каждого: проверок в секунду и замедление относительно off; для сеансов —
+размер отчета.
+
+Запуск:
+    python -m benchmarks.bench_profiling --checks 200 --size 16
+"""
+import argparse
+import json
+import time
+from typing import Dict
+
+import profiling
+from analyzer.material_analyzer import MaterialAnalyzer
+from benchmarks.corpus import make_html
+from tracing import finish_trace, start_trace
+
+
+def _checks(analyzer: MaterialAnalyzer, html: str, checks: int) -> float:
+    started = time.perf_counter()
+    for i in range(checks):
+        trace = start_trace('check', user=i)
+        analyzer.analyze_html(html, 'https://bankrot-example.ru/')
+        finish_trace(trace)
+    return time.perf_counter() - started
+
+
+def run(checks: int = 200, size_kb: int = 16) -> Dict:
+    analyzer = MaterialAnalyzer()
+    html = make_html(size_kb * 1024)
+    _checks(analyzer, html, 10)
+
+    results = {'off': {'checks_per_second': round(checks / _checks(analyzer, html, checks), 1)}}
+    for mode, allocations in (('cpu', False), ('allocations', True)):
+        reports = []
+        session = profiling.ProfileSession(checks, allocations=allocations, on_finish=reports.append)
+        session.start()
+        seconds = _checks(analyzer, html, checks)
+        results[mode] = {
+            'checks_per_second': round(checks / seconds, 1),
+            'slowdown': round(results['off']['checks_per_second'] * seconds / checks, 2),
+            'report_kb': round(len(reports[0].encode('utf-8')) / 1024, 1) if reports else None,
+        }
+    return {'checks': checks, 'html_kb': size_kb, **results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк профилирования по команде админа')
+    parser.add_argument('--checks', type=int, default=200, help='Проверок в каждом режиме')
+    parser.add_argument('--size', type=int, default=16, help='Размер HTML лендинга (КБ)')
+    args = parser.parse_args()
+    print(json.dumps(run(args.checks, args.size), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Микробенчмарк горячих запросов Database: get_user, save_check, get_stats
+
+Каждый вызов — полный путь через Database: соединение из пула, запрос,
+разбор строк. Результат — медиана по `--rounds` раундам времени одного вызова
+в микросекундах. База заполняется `--users` пользователями и `--checks`
+проверками (пакетами save_checks, с обновлением агрегатов).
+
+С DATABASE_URL (PostgreSQL на psycopg3) запросы замеряются дважды: как
+подготовленные на сервере (Database.prepare, по умолчанию) и без подготовки —
+разница показывает выигрыш от подготовленных запросов на соединениях пула.
+
+Запуск:
+    python -m benchmarks.bench_queries --calls 2000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict
+
+from analyzer.material_analyzer import MaterialAnalyzer
+from database import Database
+
+FILL_BATCH = 500
+
+
+def _check(analyzer: MaterialAnalyzer) -> Dict:
+    result = analyzer.analyze_text('Гарантируем полное списание долгов! Сохраним квартиру и машину.')
+    return {
+        'material_type': 'text', 'material_url': 'Текст объявления', 'verdict': result.verdict,
+        'violations_count': result.total_violations, 'report_path': None,
+        'rules_version': result.rules_version, 'result': result.to_bytes(),
+        'violations': [(v.category, v.pattern_id, v.phrase, v.start, v.end) for v in result.violations],
+    }
+
+
+def _per_call_us(fn: Callable[[int], object], calls: int, rounds: int) -> float:
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for i in range(calls):
+            fn(i)
+        samples.append((time.perf_counter() - started) / calls)
+    return round(statistics.median(samples) * 1e6, 1)
+
+
+def _measure(db: Database, check: Dict, users: int, calls: int, rounds: int, seed: int) -> Dict:
+    rng = random.Random(seed)
+    telegram_ids = [f"q{rng.randrange(users)}" for _ in range(calls)]
+    return {
+        'get_user_us': _per_call_us(lambda i: db.get_user(telegram_ids[i]), calls, rounds),
+        'save_check_us': _per_call_us(
+            lambda i: db.save_check(telegram_ids[i], check['material_type'], check['material_url'],
+                                    check['verdict'], check['violations_count'], check['report_path'],
+                                    check['rules_version'], check['result'], check['violations']),
+            calls, rounds),
+        'get_stats_us': _per_call_us(lambda i: db.get_stats(), max(calls // 10, 1), rounds),
+    }
+
+
+def run(calls: int = 2000, rounds: int = 5, users: int = 1000, checks: int = 20000, seed: int = 1) -> Dict:
+    check = _check(MaterialAnalyzer())
+    with tempfile.TemporaryDirectory(prefix='inspector-bench-queries-') as workdir:
+        db = Database(os.path.join(workdir, 'users.db'))
+        for i in range(users):
+            db.register_user(f"q{i}", f'user{i}', 'Пользователь', '+79990000000')
+        rng = random.Random(seed)
+        for offset in range(0, checks, FILL_BATCH):
+            db.save_checks([dict(check, telegram_id=f"q{rng.randrange(users)}")
+                            for _ in range(min(FILL_BATCH, checks - offset))])
+
+        if db.use_psycopg3:
+            modes = {}
+            for name, prepare in (('prepared', True), ('unprepared', False)):
+                db.prepare = prepare
+                modes[name] = _measure(db, check, users, calls, rounds, seed)
+            results = {**modes, 'get_user_speedup': round(modes['unprepared']['get_user_us']
+                                                          / max(modes['prepared']['get_user_us'], 0.1), 2)}
+        else:
+            results = _measure(db, check, users, calls, rounds, seed)
+        db.close()
+
+    return {
+        'backend': 'postgresql' if db.use_postgresql else 'sqlite',
+        'users': users,
+        'checks': checks,
+        'calls': calls,
+        **results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Микробенчмарк get_user, save_check и get_stats')
+    parser.add_argument('--calls', type=int, default=2000, help='Вызовов в раунде')
+    parser.add_argument('--rounds', type=int, default=5, help='Раундов (берется медиана)')
+    parser.add_argument('--users', type=int, default=1000, help='Пользователей в базе')
+    parser.add_argument('--checks', type=int, default=20000, help='Проверок в базе')
+    args = parser.parse_args()
+    print(json.dumps(run(args.calls, args.rounds, args.users, args.checks), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
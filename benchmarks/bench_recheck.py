@@ -0,0 +1,87 @@
+"""
+Бенчмарк повторной проверки страницы (analyzer.incremental)
+
+Для текстов страниц разного размера сравнивает полный анализ правилами с
+повторной проверкой после небольшой правки: сегменты прошлой проверки берутся
+из сохраненного снимка (как после перезапуска бота) или из кэша в памяти.
+Разбор HTML одинаков в обоих случаях и не измеряется.
+
+Запуск:
+    python -m benchmarks.bench_recheck --sizes 16kb,256kb,1mb,5mb --edits 3
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Dict, List
+
+from analyzer.incremental import IncrementalAnalyzer
+from analyzer.material_analyzer import MaterialAnalyzer
+from benchmarks.corpus import NEUTRAL, SIZES, VIOLATIONS, make_text
+
+
+def _edit(text: str, edits: int, seed: int) -> str:
+    """Правка как у клиента: несколько предложений заменены или добавлены"""
+    rng = random.Random(seed)
+    for _ in range(edits):
+        position = text.find('. ', rng.randrange(len(text)))
+        if position < 0:
+            position = len(text) // 2
+        text = text[:position + 2] + rng.choice(NEUTRAL + VIOLATIONS) + ' ' + text[position + 2:]
+    return text
+
+
+def _median_seconds(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def run(sizes: List[str] = ('16kb', '256kb', '1mb'), edits: int = 3, repeat: int = 5) -> Dict:
+    analyzer = MaterialAnalyzer()
+    results = {}
+    for label in sizes:
+        original = make_text(SIZES[label], seed=7)
+        edited = _edit(original, edits, seed=11)
+
+        incremental = IncrementalAnalyzer(analyzer)
+        first, segments, seams = incremental._analyze(original, None, None)
+        # Снимок проходит через JSON, как при хранении в базе
+        snapshot = json.loads(json.dumps({'rules': first.rules_version, 'segments': segments, 'seams': seams}))
+
+        def from_snapshot():
+            incremental._cache.clear()
+            return incremental._analyze(edited, None, snapshot)
+
+        full = _median_seconds(lambda: analyzer._analyze_text(edited, 'site'), repeat)
+        cold = _median_seconds(from_snapshot, repeat)
+        warm = _median_seconds(lambda: incremental._analyze(edited, None, None), repeat)
+
+        known = {h for h, _ in segments}
+        changed = sum(1 for h, _ in incremental._analyze(edited, None, None)[1] if h not in known)
+        results[label] = {
+            'segments': len(segments),
+            'changed_segments': changed,
+            'full_ms': round(full * 1000, 2),
+            'recheck_snapshot_ms': round(cold * 1000, 2),
+            'recheck_memory_ms': round(warm * 1000, 2),
+            'speedup': round(full / cold, 1) if cold else None,
+        }
+    return {'edits': edits, 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк повторной проверки страницы')
+    parser.add_argument('--sizes', default='16kb,256kb,1mb', help=f"Размеры через запятую: {', '.join(SIZES)}")
+    parser.add_argument('--edits', type=int, default=3, help='Правок между проверками')
+    parser.add_argument('--repeat', type=int, default=5, help='Повторов каждого замера')
+    args = parser.parse_args()
+    print(json.dumps(run(args.sizes.split(','), args.edits, args.repeat), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Бенчмарк рендеринга отчетов: время на один отчет до и после
+
+До: каждый отчет — HTML со встроенным <style>, который WeasyPrint разбирает
+заново, и новая конфигурация шрифтов на каждый write_pdf.
+После: стили и FontConfiguration разобраны один раз (PDFGenerator.render_pdf).
+
+Запуск:
+    python -m benchmarks.bench_report_render --reports 20
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from analyzer.material_analyzer import MaterialAnalyzer
+from reports.report_generator import ReportGenerator
+
+SAMPLE_TEXT = (
+    'Банкротство физических лиц под ключ. Гарантируем полное списание долгов! '
+    'Не платите банкам — сохраним квартиру и машину. Беремся за любые дела. '
+)
+
+
+def _timed(fn, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def _summary(samples: List[float]) -> Dict:
+    return {
+        'median_ms': round(statistics.median(samples), 2),
+        'mean_ms': round(statistics.mean(samples), 2),
+        'min_ms': round(min(samples), 2),
+    }
+
+
+def run(reports: int = 20) -> Dict:
+    from weasyprint import HTML
+    from reports.pdf_generator import PDFGenerator
+
+    result = MaterialAnalyzer().analyze_text(SAMPLE_TEXT * 3)
+    material_info = {'text': SAMPLE_TEXT[:100], 'type': 'Текст объявления'}
+    generator = ReportGenerator()
+    pdf_generator = PDFGenerator(reports_path=tempfile.mkdtemp())
+
+    html_inline = generator.generate_html(result, material_info, embed_css=True)
+    html_bare = generator.generate_html(result, material_info, embed_css=False)
+
+    # Прогрев: загрузка системных шрифтов, импорты
+    HTML(string=html_inline).write_pdf()
+    pdf_generator.render_pdf(html_bare)
+
+    return {
+        'benchmark': 'report_render',
+        'reports': reports,
+        'html_template_render': _summary(_timed(
+            lambda: generator.generate_html(result, material_info, embed_css=False), reports * 10
+        )),
+        'pdf_before': _summary(_timed(lambda: HTML(string=html_inline).write_pdf(), reports)),
+        'pdf_after': _summary(_timed(lambda: pdf_generator.render_pdf(html_bare), reports)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Время рендеринга отчетов до и после')
+    parser.add_argument('--reports', type=int, default=20, help='Сколько отчетов рендерить')
+    args = parser.parse_args()
+    print(json.dumps(run(args.reports), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Бенчмарк памяти результата анализа: AnalysisResult со __slots__ против словарей
+
+Сравнивает прежний формат (словарь списков словарей с заранее вырезанным
+контекстом) и AnalysisResult на странице с сотнями совпадений: пиковую
+память построения, размер в памяти и размер сериализованной формы.
+
+Запуск:
+    python -m benchmarks.bench_result_memory --matches 500
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Dict
+
+from analyzer.material_analyzer import MaterialAnalyzer
+
+FILLER = 'Помогаем в процедуре банкротства граждан и ИП, работаем по всей России. '
+BAD_PHRASES = [
+    'Гарантируем полное списание долгов!',
+    'Не платите банкам, мы решим вопрос.',
+    'Вернем деньги, если не получится.',
+    'Сохраним квартиру и машину.',
+]
+
+
+def make_page(matches: int) -> str:
+    """Текст страницы примерно с заданным числом совпадений"""
+    parts = []
+    for i in range(matches // 2):
+        parts.append(FILLER * 3)
+        parts.append(BAD_PHRASES[i % len(BAD_PHRASES)])
+    return ' '.join(parts)
+
+
+def _measure(fn) -> Dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    value = fn()
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'value': value, 'seconds': elapsed, 'retained_bytes': current, 'peak_bytes': peak}
+
+
+def run(matches: int = 500) -> Dict:
+    analyzer = MaterialAnalyzer()
+    text = make_page(matches)
+    analyzer.analyze_text(text)  # прогрев: компиляция шаблонов, кэши
+
+    slots = _measure(lambda: analyzer.analyze_text(text))
+    result = slots.pop('value')
+    # Прежний формат: тот же анализ плюс словари с вырезанным контекстом
+    legacy = _measure(lambda: analyzer.analyze_text(text).to_dict())
+    legacy_dict = legacy.pop('value')
+
+    return {
+        'benchmark': 'result_memory',
+        'text_chars': len(text),
+        'violations': result.total_violations,
+        'slots': {
+            'retained_bytes': slots['retained_bytes'],
+            'peak_bytes': slots['peak_bytes'],
+            'analyze_seconds': round(slots['seconds'], 4),
+            'json_bytes': len(result.to_json().encode('utf-8')),
+            'compressed_bytes': len(result.to_bytes()),
+        },
+        'legacy_dicts': {
+            'retained_bytes': legacy['retained_bytes'],
+            'peak_bytes': legacy['peak_bytes'],
+            'json_bytes': len(json.dumps(legacy_dict, ensure_ascii=False).encode('utf-8')),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Память результата анализа')
+    parser.add_argument('--matches', type=int, default=500, help='Примерное число совпадений на странице')
+    args = parser.parse_args()
+    print(json.dumps(run(args.matches), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Бенчмарк SQLite-режима (VPS без DATABASE_URL): прежняя схема против пула
+
+Прежняя схема — новое соединение sqlite3 на каждый вызов и журнал отката по
+умолчанию (воспроизведена в LegacyDatabase). Новая — Database как есть: WAL,
+synchronous=NORMAL, одно соединение записи с очередью и пул соединений чтения.
+
+Сценарии:
+- handlers: `--threads` потоков, как обработчики бота — проверка регистрации,
+  запись проверки по одной (save_check), счетчик проверок пользователя;
+- pipeline: один поток пишет пакеты save_checks, как CheckPipeline, остальные
+  читают профиль пользователя и статистику.
+
+Для каждого: проверок в секунду, чтений в секунду и число ошибок (в основном
+"database is locked": save_check возвращает False, get_user — None).
+
+Запуск:
+    python -m benchmarks.bench_sqlite --threads 8 --seconds 10
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict
+
+from analyzer.material_analyzer import MaterialAnalyzer
+from database import Database, _Connection
+
+USERS = 1000
+BATCH = 64
+
+
+class LegacyDatabase(Database):
+    """Database с прежним подключением: sqlite3.connect на каждый вызов, журнал по умолчанию"""
+
+    def _get_connection(self, write: bool = False):
+        conn = sqlite3.connect(self.db_path, factory=_Connection)
+        conn.row_factory = sqlite3.Row
+        return conn._track()
+
+
+def _check(analyzer: MaterialAnalyzer) -> Dict:
+    result = analyzer.analyze_text('Гарантируем полное списание долгов! Сохраним квартиру и машину.')
+    return {
+        'material_type': 'text', 'material_url': 'Текст объявления', 'verdict': result.verdict,
+        'violations_count': result.total_violations, 'report_path': None,
+        'rules_version': result.rules_version, 'result': result.to_bytes(),
+        'violations': [(v.category, v.pattern_id, v.phrase, v.start, v.end) for v in result.violations],
+    }
+
+
+def _handlers(db: Database, check: Dict, threads: int, seconds: float) -> Dict:
+    """Потоки-обработчики: чтение, запись проверки по одной, чтение"""
+    totals = {'checks': 0, 'reads': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        checks = reads = errors = 0
+        while time.perf_counter() < deadline:
+            telegram_id = str(rng.randrange(USERS))
+            if db.get_user(telegram_id) is None:
+                errors += 1
+                continue
+            if db.save_check(telegram_id, check['material_type'], check['material_url'], check['verdict'],
+                             check['violations_count'], check['report_path'], check['rules_version'],
+                             check['result'], check['violations']):
+                checks += 1
+            else:
+                errors += 1
+            db.get_user_checks_count(telegram_id)
+            reads += 2
+        with lock:
+            totals['checks'] += checks
+            totals['reads'] += reads
+            totals['errors'] += errors
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        'checks_per_second': round(totals['checks'] / elapsed),
+        'reads_per_second': round(totals['reads'] / elapsed),
+        'errors': totals['errors'],
+    }
+
+
+def _pipeline(db: Database, check: Dict, threads: int, seconds: float) -> Dict:
+    """Один поток пишет пакетами, остальные читают"""
+    totals = {'checks': 0, 'reads': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    month = datetime.utcnow() - timedelta(days=30)
+
+    def writer():
+        rng = random.Random(0)
+        checks = errors = 0
+        while time.perf_counter() < deadline:
+            saved = db.save_checks([dict(check, telegram_id=str(rng.randrange(USERS))) for _ in range(BATCH)])
+            checks += saved
+            errors += saved == 0
+        with lock:
+            totals['checks'] += checks
+            totals['errors'] += errors
+
+    def reader(seed: int):
+        rng = random.Random(seed)
+        reads = errors = 0
+        while time.perf_counter() < deadline:
+            try:
+                if db.get_user(str(rng.randrange(USERS))) is None:
+                    errors += 1
+                db.get_user_checks_count(str(rng.randrange(USERS)))
+                db.get_violation_stats(month)
+                reads += 3
+            except sqlite3.OperationalError:
+                errors += 1
+        with lock:
+            totals['reads'] += reads
+            totals['errors'] += errors
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=writer)]
+    workers += [threading.Thread(target=reader, args=(i,)) for i in range(1, max(threads, 2))]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        'checks_per_second': round(totals['checks'] / elapsed),
+        'reads_per_second': round(totals['reads'] / elapsed),
+        'errors': totals['errors'],
+    }
+
+
+def run(threads: int = 8, seconds: float = 10.0) -> Dict:
+    # Ошибки считаются, а не выводятся
+    logging.getLogger('database').setLevel(logging.CRITICAL)
+    check = _check(MaterialAnalyzer())
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='inspector-bench-sqlite-') as workdir:
+        for name, factory in (('legacy', LegacyDatabase), ('pooled', Database)):
+            db = factory(os.path.join(workdir, f'{name}.db'))
+            for i in range(USERS):
+                db.register_user(str(i), f'user{i}', 'Пользователь', '+79990000000')
+            results[name] = {
+                'handlers': _handlers(db, check, threads, seconds),
+                'pipeline': _pipeline(db, check, threads, seconds),
+            }
+            db.close()
+    return {
+        'threads': threads,
+        'seconds': seconds,
+        **results,
+        'handlers_speedup': round(results['pooled']['handlers']['checks_per_second']
+                                  / max(results['legacy']['handlers']['checks_per_second'], 1), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк SQLite: соединение на вызов против WAL и пула')
+    parser.add_argument('--threads', type=int, default=8, help='Одновременных потоков')
+    parser.add_argument('--seconds', type=float, default=10.0, help='Длительность каждого сценария')
+    args = parser.parse_args()
+    print(json.dumps(run(args.threads, args.seconds), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Корпус для бенчмарков: синтетические тексты объявлений и HTML лендингов
+заданного размера (от 1 КБ до 5 МБ) и записанные образцы из benchmarks/recorded
+
+Синтетический корпус детерминирован (фиксированный seed), поэтому результаты
+разных запусков и машин сравнимы.
+"""
+import os
+import random
+from typing import Dict, List, NamedTuple
+
+from config import REQUIRED_DISCLAIMER
+
+RECORDED_DIR = os.path.join(os.path.dirname(__file__), 'recorded')
+
+# Размеры синтетических материалов (байт в UTF-8)
+SIZES = {
+    '1kb': 1024,
+    '16kb': 16 * 1024,
+    '256kb': 256 * 1024,
+    '1mb': 1024 * 1024,
+    '5mb': 5 * 1024 * 1024,
+}
+QUICK_SIZES = ('1kb', '16kb', '256kb')
+
+NEUTRAL = [
+    'Помогаем в процедуре банкротства граждан и ИП, работаем по всей России.',
+    'Бесплатная консультация юриста по телефону и в офисе.',
+    'Стоимость услуг фиксируется в договоре, оплата частями.',
+    'Сопровождаем дело от подачи заявления до завершения процедуры.',
+    'Опыт арбитражных управляющих — более 10 лет.',
+    'Расскажем, какие последствия банкротства важно учесть заранее.',
+]
+VIOLATIONS = [
+    'Гарантируем полное списание долгов!',
+    'Не платите банкам, мы решим вопрос.',
+    'Вернем деньги, если не получится.',
+    'Сохраним квартиру и машину.',
+    'Спишем долги за 3 месяца без последствий.',
+]
+
+
+class Sample(NamedTuple):
+    name: str
+    kind: str  # 'text' или 'html'
+    content: str
+
+    @property
+    def size(self) -> int:
+        return len(self.content.encode('utf-8'))
+
+
+def _sentences(target_bytes: int, rng: random.Random, violation_rate: float) -> List[str]:
+    sentences, size = [], 0
+    while size < target_bytes:
+        pool = VIOLATIONS if rng.random() < violation_rate else NEUTRAL
+        sentence = rng.choice(pool)
+        sentences.append(sentence)
+        size += len(sentence.encode('utf-8')) + 1
+    return sentences
+
+
+def make_text(target_bytes: int, seed: int = 1, violation_rate: float = 0.08,
+              disclaimer: bool = True) -> str:
+    """Текст объявления примерно заданного размера"""
+    rng = random.Random(seed)
+    sentences = _sentences(target_bytes, rng, violation_rate)
+    if disclaimer:
+        sentences.insert(len(sentences) // 2, REQUIRED_DISCLAIMER)
+    return ' '.join(sentences)
+
+
+def make_html(target_bytes: int, seed: int = 1, violation_rate: float = 0.05,
+              disclaimer: bool = True) -> str:
+    """
+    Лендинг примерно заданного размера: меню, блоки с абзацами, скрипты,
+    стили и футер с дисклеймером — как у типичных страниц юридических услуг
+    """
+    rng = random.Random(seed)
+    head = (
+        '<!DOCTYPE html><html lang="ru"><head><meta charset="utf-8">'
+        '<title>Банкротство физических лиц</title>'
+        '<style>body{font-family:sans-serif}.hero{padding:40px}.footer{font-size:12px}</style>'
+        '<script>window.dataLayer=window.dataLayer||[];function gtag(){dataLayer.push(arguments)}</script>'
+        '</head><body><nav><a href="/">Главная</a><a href="/uslugi">Услуги</a>'
+        '<a href="/ceny">Цены</a><a href="/kontakty">Контакты</a></nav>'
+    )
+    footer = '<footer class="footer"><p>ООО «Юридическая компания», ИНН 7700000000</p>'
+    if disclaimer:
+        footer += f'<p class="disclaimer">{REQUIRED_DISCLAIMER}</p>'
+    footer += '</footer></body></html>'
+
+    blocks, size = [], len((head + footer).encode('utf-8'))
+    number = 0
+    while size < target_bytes:
+        number += 1
+        paragraphs = ''.join(
+            f'<p>{sentence}</p>' for sentence in _sentences(rng.randint(300, 900), rng, violation_rate)
+        )
+        block = (
+            f'<section class="block-{number}"><h2>Раздел {number}</h2>{paragraphs}'
+            f'<div class="cta"><button data-id="{number}">Получить консультацию</button></div></section>'
+        )
+        blocks.append(block)
+        size += len(block.encode('utf-8'))
+    return head + ''.join(blocks) + footer
+
+
+def synthetic(sizes=None) -> List[Sample]:
+    """Синтетические тексты и страницы для размеров из SIZES"""
+    samples = []
+    for label in sizes or SIZES:
+        target = SIZES[label]
+        samples.append(Sample(f'text_{label}', 'text', make_text(target)))
+        samples.append(Sample(f'html_{label}', 'html', make_html(target)))
+    return samples
+
+
+def recorded(directory: str = RECORDED_DIR) -> List[Sample]:
+    """Записанные образцы: *.txt — тексты объявлений, *.html — страницы"""
+    samples = []
+    if not os.path.isdir(directory):
+        return samples
+    for filename in sorted(os.listdir(directory)):
+        name, ext = os.path.splitext(filename)
+        if ext not in ('.txt', '.html'):
+            continue
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            samples.append(Sample(f'recorded_{name}', ext[1:] if ext == '.html' else 'text', f.read()))
+    return samples
+
+
+def load(quick: bool = False, recorded_dir: str = RECORDED_DIR) -> Dict[str, Sample]:
+    """Весь корпус по именам образцов"""
+    samples = synthetic(QUICK_SIZES if quick else None) + recorded(recorded_dir)
+    return {sample.name: sample for sample in samples}
@@ -0,0 +1,245 @@
+"""
+Локальный поддельный Bot API для бенчмарков
+
+HTTP-сервер в отдельном потоке отвечает на методы Bot API так, как это делает
+Telegram, с искусственной сетевой задержкой. Бот подключается через
+Bot(token, base_url=api.base_url). Может отвечать 429 (Too Many Requests)
+при превышении лимитов, как Telegram. Апдейты, добавленные push_update(),
+отдаются через getUpdates с long polling — так бот можно запустить целиком.
+"""
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import parse_qs
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Инспектор', 'username': 'fake_inspector_bot'}
+
+_PATH_RE = re.compile(r'^/bot[^/]+/(\w+)$')
+_MULTIPART_FIELD_RE = re.compile(rb'name="(\w+)"\r\n\r\n([^\r]*)\r\n')
+
+# Служебные методы: без лимитов и задержки, ответ True
+_SERVICE_METHODS = {'deleteWebhook', 'answerCallbackQuery', 'setMyCommands', 'close', 'logOut'}
+
+
+def _parse_params(content_type: str, body: bytes) -> Dict[str, str]:
+    """Параметры запроса: JSON, form-urlencoded или текстовые поля multipart"""
+    if content_type.startswith('application/json'):
+        return json.loads(body or b'{}')
+    if content_type.startswith('multipart/form-data'):
+        return {k.decode(): v.decode('utf-8', 'replace') for k, v in _MULTIPART_FIELD_RE.findall(body)}
+    return {k: v[0] for k, v in parse_qs(body.decode('utf-8')).items()}
+
+
+class FakeBotAPI:
+    """
+    Поддельный Bot API
+
+    Поддерживает getMe, getUpdates, sendMessage, editMessageText, sendDocument
+    и служебные методы. Каждый ответ задерживается на `delay` секунд (время
+    сети до серверов Telegram).
+    Лимиты считаются в скользящем окне: не более `chat_limit` запросов в чат
+    за `chat_window` секунд и не более `global_limit` запросов в секунду.
+    """
+
+    def __init__(self, delay: float = 0.0, upload_delay_per_mb: float = 0.0,
+                 chat_limit: Optional[int] = None, chat_window: float = 3.0,
+                 global_limit: Optional[int] = None, blocked_chats: Iterable[int] = ()):
+        """
+        Args:
+            delay: Задержка ответа на любой метод (секунды)
+            upload_delay_per_mb: Дополнительная задержка загрузки файла (секунды на МБ)
+            chat_limit: Запросов в один чат за chat_window секунд (None — без лимита)
+            chat_window: Окно лимита чата (секунды)
+            global_limit: Запросов в секунду на бота (None — без лимита)
+            blocked_chats: Чаты, заблокировавшие бота (ответ 403)
+        """
+        self.delay = delay
+        self.upload_delay_per_mb = upload_delay_per_mb
+        self.chat_limit = chat_limit
+        self.chat_window = chat_window
+        self.global_limit = global_limit
+        self.blocked_chats = {int(chat_id) for chat_id in blocked_chats}
+        self.calls: Counter = Counter()
+        self.rejected: Counter = Counter()
+        self._chat_hits = defaultdict(deque)
+        self._global_hits = deque()
+        self._message_id = 0
+        self._lock = threading.Lock()
+        self._updates: deque = deque()
+        self._update_id = 0
+        self._updates_ready = threading.Condition()
+        # Вызываются из потока сервера после каждого успешного ответа: (method, params, result)
+        self.listeners: List[Callable[[str, Dict, Dict], None]] = []
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """base_url для telegram.Bot"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def _next_message_id(self) -> int:
+        with self._lock:
+            self._message_id += 1
+            return self._message_id
+
+    def _message(self, params: Dict, **extra) -> Dict:
+        chat_id = int(params.get('chat_id', 0) or 0)
+        message = {
+            'message_id': int(params.get('message_id') or self._next_message_id()),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+        }
+        message.update(extra)
+        return message
+
+    @staticmethod
+    def _over_limit(hits: deque, now: float, limit: Optional[int], window: float) -> float:
+        """Регистрирует запрос в окне; при превышении возвращает retry_after"""
+        if limit is None:
+            return 0.0
+        while hits and hits[0] <= now - window:
+            hits.popleft()
+        if len(hits) >= limit:
+            return hits[0] + window - now
+        hits.append(now)
+        return 0.0
+
+    def push_update(self, update: Dict) -> int:
+        """Добавляет апдейт для getUpdates, возвращает его update_id"""
+        with self._updates_ready:
+            self._update_id += 1
+            self._updates.append(dict(update, update_id=self._update_id))
+            self._updates_ready.notify_all()
+            return self._update_id
+
+    def _get_updates(self, params: Dict) -> List[Dict]:
+        """getUpdates: подтверждает апдейты до offset и ждет новых до timeout секунд"""
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        deadline = time.monotonic() + float(params.get('timeout') or 0)
+        with self._updates_ready:
+            while self._updates and self._updates[0]['update_id'] < offset:
+                self._updates.popleft()
+            while not self._updates and self._server is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._updates_ready.wait(remaining)
+            return list(islice(self._updates, limit))
+
+    def _check_limits(self, method: str, params: Dict) -> int:
+        if method in ('getMe', 'getUpdates') or method in _SERVICE_METHODS:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            wait = self._over_limit(self._global_hits, now, self.global_limit, 1.0)
+            if not wait:
+                chat_hits = self._chat_hits[params.get('chat_id')]
+                wait = self._over_limit(chat_hits, now, self.chat_limit, self.chat_window)
+                if wait and self.global_limit is not None:
+                    # Запрос не прошел по лимиту чата — не учитываем его в общем окне
+                    self._global_hits.pop()
+        return max(1, math.ceil(wait)) if wait else 0
+
+    def handle(self, method: str, params: Dict, body_size: int):
+        """
+        Ответ на вызов метода
+
+        Returns:
+            (HTTP-статус, тело ответа Bot API)
+        """
+        if method == 'getUpdates':
+            return 200, {'ok': True, 'result': self._get_updates(params)}
+        if method in _SERVICE_METHODS:
+            return 200, {'ok': True, 'result': True}
+
+        retry_after = self._check_limits(method, params)
+        if retry_after:
+            self.rejected[method] += 1
+            return 429, {
+                'ok': False, 'error_code': 429,
+                'description': f'Too Many Requests: retry after {retry_after}',
+                'parameters': {'retry_after': retry_after},
+            }
+
+        if self.blocked_chats and int(params.get('chat_id', 0) or 0) in self.blocked_chats:
+            self.rejected[method] += 1
+            return 403, {'ok': False, 'error_code': 403, 'description': 'Forbidden: bot was blocked by the user'}
+
+        self.calls[method] += 1
+        delay = self.delay
+        if method == 'sendDocument':
+            delay += self.upload_delay_per_mb * body_size / (1024 * 1024)
+        if delay:
+            time.sleep(delay)
+
+        if method == 'getMe':
+            result = BOT_USER
+        elif method in ('sendMessage', 'editMessageText'):
+            result = self._message(params, text=params.get('text', ''))
+        elif method == 'sendDocument':
+            file_id = params.get('document') if not params.get('document', '').startswith('attach://') else None
+            number = self._next_message_id()
+            result = self._message(params, document={
+                'file_id': file_id or f'fake-file-{number}',
+                'file_unique_id': f'fake-unique-{number}',
+                'file_name': 'report.pdf',
+                'file_size': body_size,
+            })
+        else:
+            return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found: method not found'}
+        for listener in self.listeners:
+            listener(method, params, result)
+        return 200, {'ok': True, 'result': result}
+
+    def start(self) -> 'FakeBotAPI':
+        """Запускает сервер на свободном порту localhost"""
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                match = _PATH_RE.match(self.path)
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if not match:
+                    status, payload = 404, {'ok': False, 'error_code': 404, 'description': 'Not Found'}
+                else:
+                    params = _parse_params(self.headers.get('Content-Type', ''), body)
+                    status, payload = api.handle(match.group(1), params, len(body))
+                data = json.dumps(payload).encode('utf-8')
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Клиент закрыл соединение (например, getUpdates при остановке бота)
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-bot-api', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Останавливает сервер"""
+        if self._server is not None:
+            server, self._server = self._server, None
+            with self._updates_ready:
+                # Будим ожидающие getUpdates
+                self._updates_ready.notify_all()
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,63 @@
+"""
+Локальный сайт с лендингами для нагрузочных тестов проверки URL
+
+HTTP-сервер в отдельном потоке отдает заранее заданные страницы с
+искусственной задержкой — вместо реальных сайтов, которые нельзя нагружать.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+
+class FixtureSite:
+    """Сайт из словаря путь → HTML"""
+
+    def __init__(self, pages: Dict[str, str], delay: float = 0.0):
+        """
+        Args:
+            pages: Страницы по путям ('/landing')
+            delay: Задержка ответа (секунды), как у медленного хостинга
+        """
+        self.pages = {path: html.encode('utf-8') for path, html in pages.items()}
+        self.delay = delay
+        self.hits = 0
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def url(self, path: str) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def start(self) -> 'FixtureSite':
+        """Запускает сервер на свободном порту localhost"""
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.hits += 1
+                if site.delay:
+                    time.sleep(site.delay)
+                body = site.pages.get(self.path.split('?')[0])
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='fixture-site', daemon=True).start()
+        return self
+
+    def stop(self):
+        """Останавливает сервер"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
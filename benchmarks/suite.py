@@ -0,0 +1,332 @@
+"""
+Набор бенчмарков: анализ, генерация отчетов, рендеринг PDF и операции с базой
+
+Корпус — синтетические тексты и лендинги от 1 КБ до 5 МБ и записанные образцы
+(benchmarks/corpus.py). Для каждого случая измеряются медиана и p95 времени,
+пропускная способность и пиковая память (tracemalloc, только Python-аллокации).
+Результаты пишутся в JSON; compare сравнивает их с сохраненной базовой линией
+и завершается с кодом 1, если есть регрессии.
+
+Запуск:
+    python -m benchmarks.suite run --out bench_results.json
+    python -m benchmarks.suite run --quick --only analyzer,report
+    python -m benchmarks.suite run --save-baseline
+    python -m benchmarks.suite compare bench_results.json --threshold 0.15
+
+База: по умолчанию временная SQLite. Если задан DATABASE_URL, замеры PostgreSQL
+выполняются только с --postgres (пишет строки с telegram_id 'bench-*' —
+используйте отдельную базу).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from analyzer.material_analyzer import MaterialAnalyzer
+from reports.report_generator import ReportGenerator
+from reports.store import ReportStore
+from benchmarks import corpus
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+GROUPS = ('analyzer', 'report', 'pdf', 'db')
+
+# Случай повторяется, пока не наберется repeat запусков или не истечет бюджет времени
+DEFAULT_REPEAT = 20
+DEFAULT_BUDGET = 3.0
+# Разница меньше этой не считается регрессией (шум таймера на быстрых случаях)
+MIN_DELTA_MS = 0.05
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(fn: Callable, repeat: int = DEFAULT_REPEAT, budget: float = DEFAULT_BUDGET,
+            size_bytes: Optional[int] = None, memory: bool = True) -> Dict:
+    """
+    Время и память одного случая
+
+    Args:
+        fn: Измеряемый вызов без аргументов
+        repeat: Максимум запусков
+        budget: Бюджет времени на запуски (секунды; минимум — 3 запуска)
+        size_bytes: Размер входа для расчета пропускной способности
+        memory: Измерять пиковую память отдельным запуском
+
+    Returns:
+        runs, median_ms, p95_ms, min_ms, [mb_per_s], [peak_kb]
+    """
+    fn()  # прогрев: импорты, кэши, компиляция шаблонов
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < repeat and (len(samples) < 3 or time.perf_counter() - started < budget):
+        run_started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - run_started) * 1000)
+
+    median = statistics.median(samples)
+    result = {
+        'runs': len(samples),
+        'median_ms': round(median, 3),
+        'p95_ms': round(_percentile(samples, 0.95), 3),
+        'min_ms': round(min(samples), 3),
+    }
+    if size_bytes:
+        result['mb_per_s'] = round(size_bytes / (1024 * 1024) / (median / 1000), 2) if median else None
+    if memory:
+        # Отдельный запуск: tracemalloc замедляет выполнение
+        tracemalloc.start()
+        try:
+            fn()
+            result['peak_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def _bench_analyzer(samples: Dict[str, corpus.Sample], repeat: int, budget: float) -> Dict:
+    analyzer = MaterialAnalyzer()
+    cases = {}
+    for name, sample in samples.items():
+        if sample.kind == 'html':
+            fn = lambda s=sample: analyzer.analyze_html(s.content)
+        else:
+            fn = lambda s=sample: analyzer.analyze_text(s.content)
+        cases[f'analyze/{name}'] = measure(fn, repeat, budget, size_bytes=sample.size)
+    return cases
+
+
+def _analysis_results(samples: Dict[str, corpus.Sample]) -> Dict:
+    analyzer = MaterialAnalyzer()
+    results = {}
+    for name, sample in samples.items():
+        if sample.kind == 'html':
+            results[name] = analyzer.analyze_html(sample.content)
+        else:
+            results[name] = analyzer.analyze_text(sample.content)
+    return results
+
+
+def _bench_report(samples: Dict[str, corpus.Sample], repeat: int, budget: float, workdir: str) -> Dict:
+    generator = ReportGenerator(store=ReportStore(os.path.join(workdir, 'reports')))
+    cases = {}
+    for name, result in _analysis_results(samples).items():
+        info = {'text': samples[name].content[:100], 'type': 'Бенчмарк'}
+        cases[f'report_brief/{name}'] = measure(lambda: generator.generate_brief(result, info), repeat, budget)
+        cases[f'report_markdown/{name}'] = measure(lambda: generator.generate_markdown(result, info), repeat, budget)
+        cases[f'report_html/{name}'] = measure(
+            lambda: generator.generate_html(result, info, embed_css=False), repeat, budget
+        )
+    return cases
+
+
+def _bench_pdf(samples: Dict[str, corpus.Sample], repeat: int, budget: float, workdir: str) -> Dict:
+    from reports.pdf_generator import PDFGenerator
+
+    generator = ReportGenerator(store=ReportStore(os.path.join(workdir, 'reports')))
+    pdf_generator = PDFGenerator(reports_path=None)
+    cases = {}
+    # Размер PDF зависит от числа нарушений, а не от размера страницы — берем малый и большой отчет
+    selected = [name for name in samples if name.endswith('_1kb') or name.endswith('_256kb')
+                or name.startswith('recorded_')]
+    results = _analysis_results({name: samples[name] for name in selected})
+    for name, result in results.items():
+        html_content = generator.generate_html(result, {'text': samples[name].content[:100], 'type': 'Бенчмарк'},
+                                               embed_css=False)
+        cases[f'pdf/{name}'] = measure(lambda: pdf_generator.render_pdf(html_content), min(repeat, 10), budget)
+    return cases
+
+
+def _bench_db(repeat: int, budget: float, workdir: str, users: int = 2000) -> Dict:
+    from database import Database
+
+    db = Database(os.path.join(workdir, 'bench.db'))
+    backend = 'postgresql' if db.use_postgresql else 'sqlite'
+    prefix = f"bench-{os.getpid()}-"
+
+    # Заполнение: база не пустая, как в работе
+    for i in range(users):
+        db.register_user(f"{prefix}{i}", f"user{i}", f"Пользователь {i}", f"+7999{i:07d}")
+        if i % 10 == 0:
+            db.save_check(f"{prefix}{i}", 'text', 'Текст объявления', 'СООТВЕТСТВУЕТ', 0, None)
+
+    counter = iter(range(users, users * 1000))
+    probe = f"{prefix}{users // 2}"
+    cases = {
+        'register_user': lambda: db.register_user(f"{prefix}{next(counter)}", 'u', 'Пользователь', '+79990000000'),
+        'is_user_registered': lambda: db.is_user_registered(probe),
+        'get_user': lambda: db.get_user(probe),
+        'save_check': lambda: db.save_check(probe, 'site', 'https://example.ru', 'ТРЕБУЕТ_ДОРАБОТКИ', 3, None),
+        'get_user_checks_count': lambda: db.get_user_checks_count(probe),
+        'save_report_file': lambda: db.save_report_file(f"{prefix}hash", 'file-id', '/tmp/report.pdf'),
+        'get_report_file': lambda: db.get_report_file(f"{prefix}hash"),
+        'get_stats': lambda: db.get_stats(),
+    }
+    return {f'db_{backend}/{name}': measure(fn, repeat, budget, memory=False) for name, fn in cases.items()}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(groups=GROUPS, quick: bool = False, repeat: int = DEFAULT_REPEAT, budget: float = DEFAULT_BUDGET,
+        postgres: bool = False, recorded_dir: str = corpus.RECORDED_DIR) -> Dict:
+    """
+    Выполняет набор бенчмарков
+
+    Args:
+        groups: Группы случаев (analyzer, report, pdf, db)
+        quick: Только малые размеры корпуса (до 256 КБ)
+        repeat: Максимум запусков на случай
+        budget: Бюджет времени на случай (секунды)
+        postgres: Разрешить замеры PostgreSQL, если задан DATABASE_URL
+        recorded_dir: Каталог записанных образцов
+
+    Returns:
+        Результаты: метаданные, cases и skipped (случаи, которые нельзя выполнить здесь)
+    """
+    samples = corpus.load(quick=quick, recorded_dir=recorded_dir)
+    cases: Dict[str, Dict] = {}
+    skipped: Dict[str, str] = {}
+
+    with tempfile.TemporaryDirectory(prefix='inspector-bench-') as workdir:
+        if 'analyzer' in groups:
+            cases.update(_bench_analyzer(samples, repeat, budget))
+        if 'report' in groups:
+            cases.update(_bench_report(samples, repeat, budget, workdir))
+        if 'pdf' in groups:
+            try:
+                cases.update(_bench_pdf(samples, repeat, budget, workdir))
+            except (ImportError, OSError) as e:
+                # WeasyPrint без системных библиотек (pango) не импортируется
+                skipped['pdf'] = f"WeasyPrint недоступен: {e}"
+        if 'db' in groups:
+            if os.getenv('DATABASE_URL') and not postgres:
+                skipped['db'] = "задан DATABASE_URL: замеры PostgreSQL только с --postgres"
+            else:
+                cases.update(_bench_db(repeat, budget, workdir))
+
+    return {
+        'suite': 'inspector',
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'quick': quick,
+        'corpus': {name: {'kind': s.kind, 'bytes': s.size} for name, s in samples.items()},
+        'cases': cases,
+        'skipped': skipped,
+    }
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 0.15, memory_threshold: float = 0.25) -> Dict:
+    """
+    Сравнивает результаты с базовой линией
+
+    Регрессия — медиана выросла больше чем на threshold (и больше чем на
+    MIN_DELTA_MS) или пиковая память больше чем на memory_threshold.
+
+    Returns:
+        regressions, improvements, missing (нет в текущих), new (нет в базовой линии)
+    """
+    report = {'regressions': [], 'improvements': [], 'missing': [], 'new': []}
+    base_cases, cur_cases = baseline.get('cases', {}), current.get('cases', {})
+    for name, base in sorted(base_cases.items()):
+        cur = cur_cases.get(name)
+        if cur is None:
+            report['missing'].append(name)
+            continue
+        ratio = cur['median_ms'] / base['median_ms'] if base['median_ms'] else 1.0
+        entry = {'case': name, 'baseline_ms': base['median_ms'], 'current_ms': cur['median_ms'],
+                 'change': round(ratio - 1, 3)}
+        slower = ratio > 1 + threshold and cur['median_ms'] - base['median_ms'] > MIN_DELTA_MS
+        if base.get('peak_kb') and cur.get('peak_kb'):
+            memory_ratio = cur['peak_kb'] / base['peak_kb']
+            entry['memory_change'] = round(memory_ratio - 1, 3)
+            slower = slower or memory_ratio > 1 + memory_threshold
+        if slower:
+            report['regressions'].append(entry)
+        elif ratio < 1 - threshold:
+            report['improvements'].append(entry)
+    report['new'] = sorted(set(cur_cases) - set(base_cases))
+    return report
+
+
+def _print_comparison(report: Dict):
+    for title, key in (('Регрессии', 'regressions'), ('Ускорения', 'improvements')):
+        if report[key]:
+            print(f"{title}:")
+            for entry in report[key]:
+                memory = f", память {entry['memory_change']:+.0%}" if 'memory_change' in entry else ''
+                print(f"  {entry['case']}: {entry['baseline_ms']} → {entry['current_ms']} мс "
+                      f"({entry['change']:+.0%}{memory})")
+    if report['missing']:
+        print("Нет в текущих результатах: " + ', '.join(report['missing']))
+    if report['new']:
+        print("Новые случаи: " + ', '.join(report['new']))
+    if not report['regressions']:
+        print("Регрессий нет")
+
+
+def _load(path: str) -> Dict:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Набор бенчмарков Рекламного Инспектора')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Выполнить бенчмарки')
+    run_parser.add_argument('--only', default=','.join(GROUPS), help='Группы через запятую: ' + ', '.join(GROUPS))
+    run_parser.add_argument('--quick', action='store_true', help='Только материалы до 256 КБ')
+    run_parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Максимум запусков на случай')
+    run_parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET, help='Секунд на случай')
+    run_parser.add_argument('--postgres', action='store_true', help='Замеры PostgreSQL по DATABASE_URL')
+    run_parser.add_argument('--recorded', default=corpus.RECORDED_DIR, help='Каталог записанных образцов')
+    run_parser.add_argument('--out', help='Файл результатов (по умолчанию — stdout)')
+    run_parser.add_argument('--save-baseline', action='store_true', help=f'Сохранить как {BASELINE_PATH}')
+
+    compare_parser = commands.add_parser('compare', help='Сравнить результаты с базовой линией')
+    compare_parser.add_argument('current', help='Файл результатов')
+    compare_parser.add_argument('--baseline', default=BASELINE_PATH, help='Файл базовой линии')
+    compare_parser.add_argument('--threshold', type=float, default=0.15, help='Допустимый рост медианы')
+    compare_parser.add_argument('--memory-threshold', type=float, default=0.25, help='Допустимый рост памяти')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        groups = [group.strip() for group in args.only.split(',') if group.strip()]
+        unknown = set(groups) - set(GROUPS)
+        if unknown:
+            parser.error(f"неизвестные группы: {', '.join(sorted(unknown))}")
+        results = run(groups, args.quick, args.repeat, args.budget, args.postgres, args.recorded)
+        data = json.dumps(results, ensure_ascii=False, indent=2)
+        for path in filter(None, [args.out, BASELINE_PATH if args.save_baseline else None]):
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(data + '\n')
+        if not args.out:
+            print(data)
+    else:
+        report = compare(_load(args.baseline), _load(args.current), args.threshold, args.memory_threshold)
+        _print_comparison(report)
+        sys.exit(1 if report['regressions'] else 0)
+
+
+if __name__ == '__main__':
+    main()
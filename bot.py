@@ -2,9 +2,14 @@
 Telegram бот Рекламный Инспектор (ЛИД-МАГНИТ)
 Проверка рекламы банкротства на соответствие ФЗ "О рекламе"
 """
+import asyncio
 import logging
+import math
 import os
-from datetime import datetime
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
@@ -17,18 +22,42 @@ from telegram.ext import (
     filters
 )
 from telegram.constants import ParseMode
-
-from config import TELEGRAM_BOT_TOKEN, ADMIN_CHAT_ID, LOG_LEVEL, LOG_FORMAT
+from telegram.error import Forbidden
+
+from config import (
+    TELEGRAM_BOT_TOKEN, ADMIN_CHAT_ID, LOG_LEVEL, LOG_FORMAT, LOG_JSON, LOG_DEBUG_SAMPLE_RATE, RULES_RELOAD_INTERVAL,
+    OCR_LANG, OCR_WORKERS, OCR_QUEUE_SIZE, OCR_MAX_SIDE, IMAGE_MAX_BYTES,
+    DOCUMENT_MAX_BYTES, DOCUMENT_WORKERS, DOCUMENT_QUEUE_SIZE,
+    RENDER_WORKERS, RENDER_QUEUE_SIZE, OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_RATE,
+    OUTBOUND_CHAT_BURST, BROADCAST_PAGE_SIZE, BROADCAST_CONCURRENCY, BROADCAST_RATE, REPORTS_STORE_PATH, REPORTS_COMPRESS_AFTER_DAYS,
+    REPORTS_EXPIRE_AFTER_DAYS, REPORTS_MAX_MB, REPORTS_SWEEP_INTERVAL, METRICS_PORT, METRICS_HOST,
+    API_PORT, API_HOST, API_CONCURRENCY, MONITOR_ENABLED, MONITOR_INTERVAL_HOURS, MONITOR_MIN_INTERVAL_HOURS,
+    MONITOR_MAX_INTERVAL_HOURS, MONITOR_MAX_URLS, MONITOR_CONCURRENCY, MONITOR_HOST_DELAY, MONITOR_JITTER
+)
 from analyzer.material_analyzer import MaterialAnalyzer
-from reports.report_generator import ReportGenerator
-from reports.pdf_generator import PDFGenerator
+from analyzer.rules import RulePackError
+from analyzer.results import AnalysisResult
+from analyzer.image_analyzer import OCR_AVAILABLE, ocr_image
+from analyzer.documents import DOCUMENT_FORMATS, PDF_AVAILABLE, DocumentError, document_format, extract_document
+from analyzer.layout import LayoutStage
+from analyzer.incremental import IncrementalAnalyzer
+from reports.report_generator import VERDICT_EMOJI, ReportGenerator
+from reports.pdf_generator import render_report_pdf
+from reports.store import ReportStore
 from database import Database
-
-# Настройка логирования
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL),
-    format=LOG_FORMAT
-)
+from workers import WorkerPool, QueueFullError, timed_call
+from pipeline import CheckPipeline
+from sender import OutboundScheduler, ProgressMessage
+from broadcast import Broadcaster, format_report
+from monitor import UrlMonitor
+import metrics
+import profiling
+from metrics import CHECKS_IN_FLIGHT, ERRORS_TOTAL, CallbackGauge
+from tracing import finish_trace, record_span, set_trace_fields, setup_logging, span, start_trace
+
+# Настройка логирования: записи пишет отдельный поток, обработчики не ждут вывода
+log_listener = setup_logging(LOG_LEVEL, LOG_FORMAT, json_output=LOG_JSON,
+                             debug_sample_rate=LOG_DEBUG_SAMPLE_RATE)
 logger = logging.getLogger(__name__)
 
 # Проверка обязательных переменных окружения
@@ -41,20 +70,83 @@ try:
     logger.info("Инициализация компонентов...")
     analyzer = MaterialAnalyzer()
     logger.info("MaterialAnalyzer инициализирован")
-    report_generator = ReportGenerator()
+    report_store = ReportStore(
+        REPORTS_STORE_PATH,
+        compress_after_days=REPORTS_COMPRESS_AFTER_DAYS,
+        expire_after_days=REPORTS_EXPIRE_AFTER_DAYS,
+        max_bytes=REPORTS_MAX_MB * 1024 * 1024 or None
+    )
+    report_generator = ReportGenerator(store=report_store)
     logger.info("ReportGenerator инициализирован")
-    pdf_generator = PDFGenerator()
-    logger.info("PDFGenerator инициализирован")
     db = Database()
     logger.info("Database инициализирована")
+    # Повторная проверка URL анализирует только изменившиеся части страницы
+    incremental_analyzer = IncrementalAnalyzer(analyzer, db)
+    ocr_pool = WorkerPool('ocr', max_workers=OCR_WORKERS, max_queue=OCR_QUEUE_SIZE)
+    render_pool = WorkerPool('render', max_workers=RENDER_WORKERS, max_queue=RENDER_QUEUE_SIZE)
+    document_pool = WorkerPool('documents', max_workers=DOCUMENT_WORKERS, max_queue=DOCUMENT_QUEUE_SIZE)
+    layout_stage = LayoutStage(render_pool)
+    # Все ответы проверок идут через планировщик с лимитами Telegram
+    outbound = OutboundScheduler(
+        global_rate=OUTBOUND_GLOBAL_RATE,
+        chat_rate=OUTBOUND_CHAT_RATE,
+        chat_burst=OUTBOUND_CHAT_BURST
+    )
+    broadcaster = Broadcaster(
+        db, outbound,
+        page_size=BROADCAST_PAGE_SIZE,
+        concurrency=BROADCAST_CONCURRENCY,
+        rate=BROADCAST_RATE
+    )
+    # PDF рендерится в пуле рендеринга (стили и шрифты разобраны один раз на процесс)
+    check_pipeline = CheckPipeline(
+        analyzer, report_generator, report_store, db,
+        render_pdf=lambda html_content: render_pool.submit(render_report_pdf, html_content),
+        sender=outbound
+    )
+    # Наблюдение за сайтами: планировщик запускается в post_init
+    url_monitor = UrlMonitor(
+        db, incremental_analyzer,
+        notify=lambda *args: notify_verdict_change(*args),
+        concurrency=MONITOR_CONCURRENCY,
+        host_delay=MONITOR_HOST_DELAY,
+        jitter=MONITOR_JITTER
+    )
+    # Длина очередей пулов и запросы к Bot API в полете — вычисляются при выдаче метрик
+    metrics.REGISTRY.register(CallbackGauge(
+        'inspector_pool_tasks', 'Задачи пулов процессов: в работе и в очереди',
+        lambda: {
+            (pool.name, state): getattr(pool, state)
+            for pool in (ocr_pool, render_pool, document_pool) for state in ('pending', 'queued')
+        },
+        ['pool', 'state']
+    ))
+    metrics.REGISTRY.register(CallbackGauge(
+        'inspector_outbound_in_flight', 'Запросы к Bot API в полете',
+        lambda: {(): outbound.in_flight}
+    ))
+    metrics.REGISTRY.register(CallbackGauge(
+        'inspector_outbound_calls', 'Вызовы Bot API через планировщик по исходу',
+        lambda: {(key,): value for key, value in outbound.stats.items()},
+        ['result']
+    ))
+    metrics.REGISTRY.register(CallbackGauge(
+        'inspector_monitor_tasks', 'Проверки сайтов на наблюдении: в работе и ожидающие хоста',
+        lambda: {('in_flight',): url_monitor.in_flight, ('queued',): url_monitor.queued},
+        ['state']
+    ))
     logger.info("Все компоненты инициализированы успешно")
 except Exception as e:
-    logger.error(f"Ошибка инициализации компонентов: {e}", exc_info=True)
-    print(f"ERROR: Ошибка инициализации компонентов: {e}")
-    import traceback
-    traceback.print_exc()
+    logger.error("Ошибка инициализации компонентов: %s", e, exc_info=True)
+    log_listener.stop()
     raise
 
+# HTTP API (запускается в post_init при API_PORT > 0)
+api_runner = None
+
+# Период /analytics по умолчанию (дней)
+ANALYTICS_DAYS = 30
+
 # Состояния для регистрации
 ASKING_NAME, ASKING_PHONE, ASKING_GDPR = range(3)
 
@@ -69,7 +161,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if db.is_user_registered(telegram_id):
             user_data = db.get_user(telegram_id)
             if not user_data:
-                logger.error(f"get_user вернул None для telegram_id: {telegram_id}")
+                logger.error("get_user вернул None для telegram_id: %s", telegram_id)
                 await update.message.reply_text(
                     "❌ Ошибка получения данных пользователя. Попробуй /start еще раз."
                 )
@@ -129,7 +221,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
             return ASKING_NAME
     except Exception as e:
-        logger.error(f"Ошибка в start_command: {e}", exc_info=True)
+        logger.error("Ошибка в start_command: %s", e, exc_info=True)
         try:
             await update.message.reply_text(
                 "❌ Произошла ошибка. Попробуй еще раз: /start"
@@ -314,12 +406,17 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 /help — Эта справка
 /profile — Мой профиль
 /stats — Моя статистика
+/watch <url> [часов] — Следить за сайтом
+/unwatch <url> — Перестать следить
+/watchlist — Сайты на наблюдении
 
 **Как проверить материал:**
 
 1. **Сайт:** Отправь URL (например: `https://site.ru`)
 2. **Текст:** Отправь текст объявления
 3. **Соцсети:** Отправь ссылку на пост/профиль
+4. **Изображение:** Отправь баннер или скриншот объявления
+5. **Документ:** Отправь файл .docx, .pdf, .html или .txt
 
 **Что проверяю:**
 
@@ -332,6 +429,9 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 **Результат:**
 📄 PDF-отчет с детальными рекомендациями по исправлению
+
+**Наблюдение:**
+🔔 Сайт на наблюдении проверяется по расписанию, и я напишу, если изменится вердикт
 """
     
     await update.message.reply_text(
@@ -399,7 +499,14 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 **Средняя активность:**
 {stats['total_checks'] / max(stats['total_users'], 1):.1f} проверок на пользователя
+
+📚 Версия правил: {analyzer.rules.version}
+
+📄 **PDF-отчеты:**
+Загружено: {stats['report_uploads']}, отправлено повторно по file_id: {stats['report_reuses']}
+Доля повторных отправок: {stats['report_reuses'] / max(stats['report_uploads'] + stats['report_reuses'], 1):.0%}
 """
+    stats_text += format_metrics_summary(metrics.summary())
     
     await update.message.reply_text(
         stats_text,
@@ -407,82 +514,493 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+async def analytics_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /analytics [user <id> | domain <домен>] [дней] - аналитика по агрегатам (только для админа)"""
+    telegram_id = str(update.effective_user.id)
+    
+    if telegram_id != ADMIN_CHAT_ID:
+        await update.message.reply_text("У тебя нет доступа к этой команде.")
+        return
+    
+    args = list(context.args or [])
+    days = ANALYTICS_DAYS
+    if args and args[-1].isdigit():
+        days = max(1, int(args.pop()))
+    # Агрегаты посуточные по UTC, как checked_at
+    since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+    
+    if not args:
+        text = format_analytics(days, await asyncio.to_thread(collect_analytics, since))
+    elif len(args) == 2 and args[0] == 'user':
+        trend = await asyncio.to_thread(db.get_user_trend, args[1], since)
+        text = format_trend(f"👤 Пользователь {args[1]} за {days} дн.", trend)
+    elif len(args) == 2 and args[0] == 'domain':
+        trend = await asyncio.to_thread(db.get_domain_trend, args[1], since)
+        text = format_trend(f"🌐 {args[1]} за {days} дн.", trend)
+    else:
+        text = ("Использование:\n/analytics [дней] — сводка\n"
+                "/analytics user <telegram_id> [дней] — проверки пользователя по неделям\n"
+                "/analytics domain <домен> [дней] — проверки сайта по неделям")
+    await update.message.reply_text(text, disable_web_page_preview=True)
+
+
+def collect_analytics(since: datetime) -> dict:
+    """Данные сводки /analytics из суточных агрегатов"""
+    return {
+        'stats': db.get_violation_stats(since, patterns=0, phrases=5),
+        'trend': db.get_verdict_trend(since, 'week'),
+        'domains': db.get_top_domains(since, limit=5),
+        'users': db.get_top_users(since, limit=5),
+        'funnel': db.get_funnel(since),
+    }
+
+
+def format_analytics(days: int, data: dict) -> str:
+    """Текст сводки /analytics"""
+    stats, funnel = data['stats'], data['funnel']
+    names = analyzer.rules.current.category_names
+    lines = [f"📈 АНАЛИТИКА за {days} дн.\n", f"🔍 Проверок: {stats['checks']}"]
+    if stats['checks']:
+        lines.append(', '.join(f"{VERDICT_EMOJI.get(verdict, '❓')} {count / stats['checks']:.0%}"
+                               for verdict, count in sorted(stats['verdicts'].items(), key=lambda item: -item[1])))
+    lines.append(format_trend("\nПо неделям:", data['trend']))
+    if stats['categories']:
+        lines.append("\nНарушения по категориям:")
+        lines.extend(f"• {names.get(category, category)}: {count}"
+                     for category, count in list(stats['categories'].items())[:5])
+    if stats['phrases']:
+        lines.append("\nЧастые фразы:")
+        lines.extend(f"• «{phrase}»: {count}" for phrase, count in stats['phrases'])
+    if data['domains']:
+        lines.append("\nСайты с нарушениями:")
+        lines.extend(f"• {row['domain']}: {row['violations']} в {row['checks']} проверках" for row in data['domains'])
+    if data['users']:
+        lines.append("\nАктивные пользователи:")
+        lines.extend(f"• {row['telegram_id']} (@{row['username'] or '—'}): {row['checks']} проверок"
+                     for row in data['users'])
+    registered = max(funnel['registered'], 1)
+    lines.append(
+        f"\nВоронка: регистраций {funnel['registered']} → первая проверка {funnel['checked']} "
+        f"({funnel['checked'] / registered:.0%}), в первые сутки {funnel['checked_first_day']} "
+        f"({funnel['checked_first_day'] / registered:.0%})"
+    )
+    return '\n'.join(lines)
+
+
+def format_trend(title: str, trend: list) -> str:
+    """Проверки по периодам: число, вердикты и нарушения"""
+    if not trend:
+        return f"{title}\nПроверок нет"
+    lines = [title]
+    for row in trend:
+        verdicts = ' '.join(f"{VERDICT_EMOJI.get(verdict, '❓')}{count}" for verdict, count in row['verdicts'].items())
+        period = datetime.strptime(row['period'], '%Y-%m-%d').strftime('%d.%m')
+        lines.append(f"{period}: {row['checks']} ({verdicts}), нарушений {row['violations']}")
+    return '\n'.join(lines)
+
+
+def format_metrics_summary(summary: dict) -> str:
+    """Блок /stats с задержками этапов (с момента запуска процесса)"""
+    lines = [f"\n⏱ **Этапы с запуска** (p50 / p95), в работе: {summary['in_flight']:.0f}"]
+    for stage, values in summary['stages'].items():
+        lines.append(
+            f"`{stage}`: {values['p50'] * 1000:.0f} / {values['p95'] * 1000:.0f} мс ({values['count']})"
+        )
+    if summary['verdicts']:
+        lines.append('Вердикты: ' + ', '.join(f"{v.replace('_', ' ')}: {n:.0f}" for v, n in summary['verdicts'].items()))
+    if summary['errors']:
+        lines.append('Ошибки: ' + ', '.join(f"`{s}`: {n:.0f}" for s, n in summary['errors'].items()))
+    return '\n'.join(lines) + '\n'
+
+
+async def profiling_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /profiling <N> [mem] | stop - профилирование следующих N проверок (только для админа)"""
+    telegram_id = str(update.effective_user.id)
+    
+    if telegram_id != ADMIN_CHAT_ID:
+        await update.message.reply_text("У тебя нет доступа к этой команде.")
+        return
+    
+    args = list(context.args or [])
+    session = profiling.current_session()
+    if args == ['stop']:
+        if session is None:
+            await update.message.reply_text("Профилирование не запущено.")
+            return
+        # Отчет отправит on_finish сеанса
+        await asyncio.to_thread(session.stop)
+        return
+    if session is not None:
+        await update.message.reply_text(f"⏳ Профилирование идет: {session.summary()}.\n"
+                                        "Остановить досрочно: /profiling stop")
+        return
+    if not args or not args[0].isdigit() or args[1:] not in ([], ['mem']):
+        await update.message.reply_text(
+            "Использование:\n/profiling <N> — профиль CPU и прирост памяти по этапам для следующих N проверок\n"
+            "/profiling <N> mem — еще и выделения памяти по этапам (tracemalloc; проверки идут в разы медленнее)\n"
+            "/profiling stop — остановить и прислать отчет\n"
+            "/dump_state — очереди, пулы и память процесса сейчас"
+        )
+        return
+    
+    loop = asyncio.get_running_loop()
+    application = context.application
+    session = profiling.ProfileSession(
+        int(args[0]),
+        allocations=args[1:] == ['mem'],
+        state=lambda: format_state(collect_state()),
+        # Сеанс завершается в том потоке, где закончилась N-я проверка
+        on_finish=lambda report: loop.call_soon_threadsafe(
+            application.create_task, send_profile_report(application.bot, report)
+        )
+    )
+    session.start()
+    await update.message.reply_text(
+        f"🔬 Профилирование запущено{' с учетом выделений памяти' if session.allocations else ''}, "
+        f"проверок в сеансе: {session.checks}. Отчет придет файлом."
+    )
+
+
+async def send_profile_report(bot, report: str):
+    """Отправляет админу отчет профилирования документом"""
+    try:
+        await outbound.call(int(ADMIN_CHAT_ID), bot.send_document,
+                            chat_id=int(ADMIN_CHAT_ID), document=report.encode('utf-8'),
+                            filename=f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+                            caption=report.split('\n', 1)[0][:1024])
+    except Exception as e:
+        logger.error("Ошибка отправки отчета профилирования: %s", e, exc_info=True)
+
+
+async def dump_state_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /dump_state - очереди, пулы и память процесса (только для админа)"""
+    telegram_id = str(update.effective_user.id)
+    
+    if telegram_id != ADMIN_CHAT_ID:
+        await update.message.reply_text("У тебя нет доступа к этой команде.")
+        return
+    
+    await update.message.reply_text(format_state(collect_state()))
+
+
+def collect_state() -> dict:
+    """Снимок очередей и пулов: процесс, пулы процессов, отправка, запись в базу, наблюдение"""
+    return {
+        'process': profiling.process_state(),
+        'pools': {pool.name: pool.state() for pool in (ocr_pool, render_pool, document_pool)},
+        'outbound': {'in_flight': outbound.in_flight, **outbound.stats},
+        'pipeline': check_pipeline.state(),
+        'monitor': {'queued': url_monitor.queued, 'in_flight': url_monitor.in_flight, **url_monitor.stats},
+        'db': db.pool_state(),
+        'checks_in_flight': metrics.summary()['in_flight'],
+    }
+
+
+def format_state(state: dict) -> str:
+    """Текст снимка состояния (/dump_state и конец отчета профилирования)"""
+    process = state['process']
+    lines = [
+        f"🧠 Процесс {process['pid']}: RSS {profiling.mb(process['rss'])} МБ, "
+        f"пик {profiling.mb(process['peak_rss'])} МБ, потоков {process['threads']}, "
+        f"проверок в работе {state['checks_in_flight']:.0f}",
+        f"GC (поколения 0/1/2): {'/'.join(map(str, process['gc_counts']))}",
+    ]
+    if 'traced' in process:
+        lines.append(f"tracemalloc: {profiling.mb(process['traced'])} МБ, "
+                     f"пик {profiling.mb(process['traced_peak'])} МБ")
+    for name, pool in state['pools'].items():
+        processes = ', '.join(f"{pid}: {profiling.mb(rss)} МБ" for pid, rss in pool['processes'].items())
+        lines.append(f"Пул {name}: в работе и в очереди {pool['pending']} (в очереди {pool['queued']} "
+                     f"из {pool['max_queue']}), процессов {len(pool['processes'])}/{pool['workers']}"
+                     + (f" — {processes}" if processes else ""))
+    lines.append("Отправка в Telegram: " + ', '.join(f"{key} {value}" for key, value in state['outbound'].items()))
+    lines.append(f"Запись проверок: в очереди {state['pipeline']['pending_checks']}, "
+                 f"фоновых задач {state['pipeline']['background_tasks']}")
+    lines.append("Наблюдение: " + ', '.join(f"{key} {value}" for key, value in state['monitor'].items()))
+    lines.append("Соединения с базой: " + ', '.join(f"{key} {value}" for key, value in state['db'].items()))
+    return '\n'.join(lines)
+
+
+async def reload_rules_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /reload_rules - перезагрузка набора правил (только для админа)"""
+    telegram_id = str(update.effective_user.id)
+    
+    if telegram_id != ADMIN_CHAT_ID:
+        await update.message.reply_text("У тебя нет доступа к этой команде.")
+        return
+    
+    previous_version = analyzer.rules.version
+    try:
+        rule_pack = analyzer.rules.reload()
+    except RulePackError as e:
+        logger.error("Ошибка перезагрузки правил: %s", e)
+        await update.message.reply_text(
+            f"❌ Набор правил не загружен, продолжаю работать с версией {previous_version}.\n\n{e}"
+        )
+        return
+    
+    await update.message.reply_text(
+        f"✅ Набор правил загружен: {previous_version} → {rule_pack.version}\n"
+        f"Категорий: {len(rule_pack.categories)}"
+    )
+
+
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /broadcast <текст> - рассылка всем активным пользователям (только для админа)"""
+    telegram_id = str(update.effective_user.id)
+    
+    if telegram_id != ADMIN_CHAT_ID:
+        await update.message.reply_text("У тебя нет доступа к этой команде.")
+        return
+    
+    # Текст после команды (с сохранением переносов строк)
+    parts = update.message.text.split(maxsplit=1)
+    text = parts[1].strip() if len(parts) > 1 else ""
+    if not text:
+        await update.message.reply_text("Использование: /broadcast <текст сообщения>")
+        return
+    
+    broadcast_id = db.create_broadcast(text)
+    context.application.create_task(
+        run_broadcast(context.bot, {'id': broadcast_id, 'text': text})
+    )
+    await update.message.reply_text(
+        f"🚀 Рассылка #{broadcast_id} запущена. Отчет придет по завершении."
+    )
+
+
+async def run_broadcast(bot, broadcast: dict, resumed: bool = False):
+    """Выполняет рассылку и отправляет админу отчет"""
+    try:
+        report = await broadcaster.run(bot, broadcast)
+        logger.info("Рассылка #%s завершена: %s", broadcast['id'], report)
+        if ADMIN_CHAT_ID:
+            await outbound.call(int(ADMIN_CHAT_ID), bot.send_message,
+                                chat_id=int(ADMIN_CHAT_ID), text=format_report(report, resumed))
+    except Exception as e:
+        logger.error("Ошибка рассылки #%s: %s", broadcast['id'], e, exc_info=True)
+
+
+async def resume_broadcasts(application: Application):
+    """Продолжает рассылки, прерванные перезапуском бота"""
+    for broadcast in db.get_broadcasts(status='running'):
+        logger.info("Продолжаю рассылку #%s после пользователя %s", broadcast['id'], broadcast['last_user_id'])
+        application.create_task(run_broadcast(application.bot, broadcast, resumed=True))
+
+
+async def start_api(application: Application):
+    """Запускает HTTP API в цикле событий бота: общие анализатор, кэш верстки, хранилище и пул рендеринга"""
+    global api_runner
+    # aiohttp нужен только API — импорт при включенном API_PORT
+    from api import CheckService, build_api_app, start_api_server
+    
+    service = CheckService(
+        analyzer, report_generator, report_store,
+        render_pdf=lambda html_content: render_pool.submit(render_report_pdf, html_content),
+        layout_stage=layout_stage,
+        concurrency=API_CONCURRENCY
+    )
+    try:
+        api_runner = await start_api_server(build_api_app(service), API_HOST, API_PORT)
+    except (ValueError, OSError) as e:
+        # Бот работает и без API
+        logger.error("HTTP API не запущен: %s", e)
+
+
+async def watch_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /watch <url> [часов] - поставить сайт на наблюдение"""
+    telegram_id = str(update.effective_user.id)
+    
+    if not db.is_user_registered(telegram_id):
+        await update.message.reply_text("Ты не зарегистрирован. Отправь /start для регистрации.")
+        return
+    
+    args = context.args or []
+    url = args[0] if args else ""
+    if not url.startswith(('http://', 'https://')):
+        await update.message.reply_text(
+            f"Использование: /watch <url> [часов]\n"
+            f"Интервал по умолчанию — {MONITOR_INTERVAL_HOURS:g} ч, "
+            f"от {MONITOR_MIN_INTERVAL_HOURS:g} до {MONITOR_MAX_INTERVAL_HOURS:g} ч."
+        )
+        return
+    try:
+        hours = float(args[1].replace(',', '.')) if len(args) > 1 else MONITOR_INTERVAL_HOURS
+    except ValueError:
+        hours = math.nan
+    # float() принимает и nan/inf
+    if not math.isfinite(hours):
+        await update.message.reply_text("Интервал — число часов, например: /watch https://site.ru 12")
+        return
+    hours = min(max(hours, MONITOR_MIN_INTERVAL_HOURS), MONITOR_MAX_INTERVAL_HOURS)
+    
+    watched = await asyncio.to_thread(db.get_monitored_urls, telegram_id)
+    if len(watched) >= MONITOR_MAX_URLS and url not in {row['url'] for row in watched}:
+        await update.message.reply_text(
+            f"На наблюдении уже {len(watched)} сайтов — это максимум. Сними лишние: /unwatch <url>"
+        )
+        return
+    
+    if not await asyncio.to_thread(url_monitor.subscribe, telegram_id, url, int(hours * 3600)):
+        await update.message.reply_text("❌ Не удалось поставить сайт на наблюдение. Попробуй позже.")
+        return
+    url_monitor.wake()
+    await update.message.reply_text(
+        f"🔔 Слежу за {url}\n"
+        f"Проверка раз в {hours:g} ч. Напишу, если изменится вердикт."
+    )
+
+
+async def unwatch_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /unwatch <url> - снять сайт с наблюдения"""
+    telegram_id = str(update.effective_user.id)
+    
+    if not context.args:
+        await update.message.reply_text("Использование: /unwatch <url>")
+        return
+    
+    if await asyncio.to_thread(url_monitor.unsubscribe, telegram_id, context.args[0]):
+        await update.message.reply_text(f"🔕 Больше не слежу за {context.args[0]}")
+    else:
+        await update.message.reply_text("Этого сайта нет на наблюдении. Список: /watchlist")
+
+
+async def watchlist_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /watchlist - сайты на наблюдении"""
+    telegram_id = str(update.effective_user.id)
+    
+    watched = await asyncio.to_thread(db.get_monitored_urls, telegram_id)
+    if not watched:
+        await update.message.reply_text("Сайтов на наблюдении нет. Добавить: /watch <url>")
+        return
+    
+    lines = [f"🔔 Сайты на наблюдении ({len(watched)} из {MONITOR_MAX_URLS}):\n"]
+    for row in watched:
+        verdict = (row['last_verdict'] or 'еще не проверен').replace('_', ' ')
+        next_check = datetime.fromtimestamp(row['next_check_at']).strftime('%d.%m %H:%M')
+        failures = f", не загружается ({row['failures']})" if row['failures'] else ""
+        lines.append(
+            f"• {row['url']}\n  {verdict}{failures}; раз в {row['interval_seconds'] / 3600:g} ч, "
+            f"следующая проверка {next_check}"
+        )
+    await update.message.reply_text('\n'.join(lines), disable_web_page_preview=True)
+
+
+async def notify_verdict_change(bot, row: dict, analysis_result: AnalysisResult, previous_verdict: str,
+                                diff: Optional[dict]):
+    """Уведомление о смене вердикта сайта на наблюдении"""
+    text = report_generator.generate_monitor_alert(analysis_result, row['url'], previous_verdict, diff)
+    try:
+        await outbound.call(int(row['owner']), bot.send_message, chat_id=int(row['owner']), text=text,
+                            parse_mode=ParseMode.MARKDOWN, disable_web_page_preview=True)
+    except Forbidden:
+        # Пользователь заблокировал бота — его сайты больше не проверяются
+        await asyncio.to_thread(db.deactivate_users, [row['owner']])
+
+
+async def post_init(application: Application):
+    """Фоновые задачи после запуска приложения"""
+    await resume_broadcasts(application)
+    if API_PORT > 0:
+        await start_api(application)
+    if MONITOR_ENABLED:
+        url_monitor.start(application.bot)
+
+
+async def post_shutdown(application: Application):
+    """Останавливает HTTP API и наблюдение за сайтами, дописывает проверки в базу и закрывает ее"""
+    if api_runner is not None:
+        await api_runner.cleanup()
+    await url_monitor.stop()
+    await check_pipeline.drain()
+    db.close()
+
+
 async def handle_material(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка материала (URL или текст)"""
+    trace = start_trace('check', user=update.effective_user.id)
     try:
-        logger.info("handle_material вызван")
         telegram_id = str(update.effective_user.id)
-        logger.info(f"Telegram ID: {telegram_id}")
         
         # Проверяем регистрацию
-        logger.info("Проверяю регистрацию пользователя...")
         if not db.is_user_registered(telegram_id):
-            logger.info("Пользователь не зарегистрирован")
+            logger.debug("Пользователь %s не зарегистрирован", telegram_id)
             await update.message.reply_text(
                 "⚠️ Для проверки материалов нужна регистрация.\n\n"
                 "Отправь /start для регистрации.",
                 parse_mode=ParseMode.MARKDOWN
             )
+            trace.fields['status'] = 'unregistered'
             return
         
-        logger.info("Пользователь зарегистрирован")
         text = update.message.text.strip()
-        logger.info(f"Получен текст: {text[:50]}...")
         
         # Пропускаем команды
         if text.startswith('/'):
-            logger.info("Пропускаю команду")
             return
         
         # Определяем тип материала
         is_url = text.startswith('http://') or text.startswith('https://')
-        logger.info(f"Тип материала: {'URL' if is_url else 'Текст'}")
+        logger.debug("Материал: %s, %d символов", 'URL' if is_url else 'текст', len(text))
         
-        if is_url:
-            logger.info("Вызываю handle_url...")
-            await handle_url(update, context, text)
-        else:
-            logger.info("Вызываю handle_text_material...")
-            await handle_text_material(update, context, text)
-        logger.info("handle_material завершен успешно")
+        CHECKS_IN_FLIGHT.inc()
+        try:
+            if is_url:
+                await handle_url(update, context, text)
+            else:
+                await handle_text_material(update, context, text)
+        finally:
+            CHECKS_IN_FLIGHT.dec()
     except Exception as e:
-        logger.error(f"Ошибка в handle_material: {e}", exc_info=True)
-        import traceback
-        traceback.print_exc()
+        logger.error("Ошибка в handle_material: %s", e, exc_info=True)
+        ERRORS_TOTAL.labels('handler').inc()
+        trace.fields['status'] = 'error'
         try:
             await update.message.reply_text(
                 f"❌ Произошла ошибка при обработке запроса: {str(e)}\n\n"
                 "Попробуй еще раз или отправь /help"
             )
         except Exception as send_error:
-            logger.error(f"Ошибка отправки сообщения об ошибке: {send_error}", exc_info=True)
+            logger.error("Ошибка отправки сообщения об ошибке: %s", send_error, exc_info=True)
+    finally:
+        finish_trace(trace)
 
 
 async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE, url: str):
     """Обработка URL"""
-    logger.info(f"handle_url вызван с URL: {url}")
-    telegram_id = str(update.effective_user.id)
-    
+    # Одно сообщение о ходе проверки, которое правится по этапам
+    progress = ProgressMessage(outbound, update.message)
     try:
-        logger.info("Отправляю сообщение 'Анализирую сайт...'")
-        await update.message.reply_text("🔍 Анализирую сайт... Пожалуйста, подожди.")
-        logger.info("Сообщение отправлено")
+        await progress.start("🔍 Загружаю сайт... Пожалуйста, подожди.")
     except Exception as e:
-        logger.error(f"Ошибка отправки сообщения: {e}", exc_info=True)
+        logger.error("Ошибка отправки сообщения: %s", e, exc_info=True)
         return
     
     try:
-        # Анализируем сайт
-        logger.info("Начинаю анализ URL...")
-        analysis_result = analyzer.analyze_url(url)
-        logger.info(f"Анализ завершен. Результат: {analysis_result.get('verdict', 'UNKNOWN')}")
-        
-        if analysis_result.get('error'):
-            await update.message.reply_text(
-                f"❌ Ошибка: {analysis_result['error']}\n\n"
+        # Загружаем сайт в потоке: requests.get блокировал бы цикл событий
+        try:
+            html = await asyncio.to_thread(analyzer.fetch_html, url)
+        except Exception as e:
+            ERRORS_TOTAL.labels('fetch').inc()
+            set_trace_fields(status='fetch_error')
+            logger.info("Не удалось загрузить %s: %s", url, e)
+            await progress.finish(
+                f"❌ Ошибка: Ошибка при загрузке сайта: {str(e)}\n\n"
                 "Попробуй отправить текст материала."
             )
             return
+        progress.update("🔍 Анализирую текст страницы...")
+        
+        # Верстка страницы для измерения дисклеймера идет в пуле рендеринга
+        # параллельно с анализом текста и кратким ответом
+        layout_task = asyncio.create_task(layout_stage.measure(html, url))
+        
+        # При повторной проверке того же URL анализируются только изменившиеся сегменты
+        analysis_result, diff = await asyncio.to_thread(
+            incremental_analyzer.analyze_html, html, url, str(update.effective_user.id)
+        )
+        if diff is not None:
+            set_trace_fields(recheck=True)
         
         # Генерируем отчеты
         material_info = {
@@ -490,94 +1008,35 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE, url: st
             'type': 'Сайт'
         }
         
-        # Отправляем краткий отчет
-        await send_brief_report(update, context, analysis_result, material_info)
-        
-        # Генерируем HTML-отчет
-        try:
-            logger.info("Генерирую HTML-отчет...")
-            html_path = report_generator.save_report(analysis_result, material_info, format='html')
-            logger.info(f"HTML-отчет создан: {html_path}")
-        except Exception as e:
-            logger.error(f"Ошибка генерации HTML-отчета: {e}", exc_info=True)
-            await update.message.reply_text(
-                "❌ Ошибка при генерации отчета. Попробуй еще раз."
-            )
-            return
-        
-        # Конвертируем в PDF
-        try:
-            if html_path and os.path.exists(html_path):
-                logger.info("Конвертирую HTML в PDF...")
-                pdf_filename = os.path.basename(html_path).replace('.html', '')
-                pdf_path = pdf_generator.generate_from_html_file(html_path, pdf_filename)
-                logger.info(f"PDF создан: {pdf_path}")
-                
-                if pdf_path and os.path.exists(pdf_path):
-                    logger.info("Отправляю PDF пользователю...")
-                    # Отправляем PDF
-                    with open(pdf_path, 'rb') as f:
-                        await update.message.reply_document(
-                            document=f,
-                            filename=f"Отчет_РекламныйИнспектор_{datetime.now().strftime('%Y%m%d')}.pdf",
-                            caption="📄 Полный PDF-отчет с детальными рекомендациями"
-                        )
-                    logger.info("PDF успешно отправлен")
-                    
-                    # Сохраняем проверку в базу
-                    try:
-                        db.save_check(
-                            telegram_id=telegram_id,
-                            material_type='site',
-                            material_url=url,
-                            verdict=analysis_result.get('verdict', 'ERROR'),
-                            violations_count=analysis_result.get('total_violations', 0),
-                            report_path=pdf_path
-                        )
-                        logger.info("Проверка сохранена в базу данных")
-                    except Exception as e:
-                        logger.error(f"Ошибка сохранения в базу: {e}", exc_info=True)
-                else:
-                    logger.error(f"PDF файл не создан или не найден: {pdf_path}")
-                    await update.message.reply_text(
-                        "❌ Ошибка при создании PDF-отчета. Попробуй еще раз."
-                    )
-            else:
-                logger.error(f"HTML файл не создан или не найден: {html_path}")
-                await update.message.reply_text(
-                    "❌ Ошибка при создании HTML-отчета. Попробуй еще раз."
-                )
-        except Exception as e:
-            logger.error(f"Ошибка при генерации/отправке PDF: {e}", exc_info=True)
-            await update.message.reply_text(
-                f"❌ Ошибка при создании PDF-отчета: {str(e)}\n\n"
-                "Попробуй еще раз или отправь текст материала."
-            )
+        await send_full_report(update, context, analysis_result, material_info,
+                               material_type='site', material_url=url,
+                               layout_task=layout_task, progress=progress, diff=diff)
         
     except Exception as e:
-        logger.error(f"Ошибка при анализе URL: {e}", exc_info=True)
+        logger.error("Ошибка при анализе URL: %s", e, exc_info=True)
+        ERRORS_TOTAL.labels('analyze').inc()
+        set_trace_fields(status='error')
         try:
-            await update.message.reply_text(
+            await progress.finish(
                 "❌ Произошла ошибка при анализе сайта.\n\n"
                 "Попробуй отправить текст материала."
             )
         except Exception as send_error:
-            logger.error(f"Ошибка отправки сообщения об ошибке: {send_error}", exc_info=True)
+            logger.error("Ошибка отправки сообщения об ошибке: %s", send_error, exc_info=True)
 
 
 async def handle_text_material(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
     """Обработка текста"""
-    telegram_id = str(update.effective_user.id)
-    
+    progress = ProgressMessage(outbound, update.message)
     try:
-        await update.message.reply_text("🔍 Анализирую текст... Пожалуйста, подожди.")
+        await progress.start("🔍 Анализирую текст... Пожалуйста, подожди.")
     except Exception as e:
-        logger.error(f"Ошибка отправки сообщения: {e}", exc_info=True)
+        logger.error("Ошибка отправки сообщения: %s", e, exc_info=True)
         return
     
     try:
-        # Анализируем текст
-        analysis_result = analyzer.analyze_text(text, material_type='text')
+        # Анализируем текст в потоке: разбор длинного текста не должен задерживать цикл событий
+        analysis_result = await asyncio.to_thread(analyzer.analyze_text, text, material_type='text')
         
         # Генерируем отчеты
         material_info = {
@@ -585,143 +1044,300 @@ async def handle_text_material(update: Update, context: ContextTypes.DEFAULT_TYP
             'type': 'Текст объявления'
         }
         
-        # Отправляем краткий отчет
-        await send_brief_report(update, context, analysis_result, material_info)
+        await send_full_report(update, context, analysis_result, material_info,
+                               material_type='text', material_url=text[:100], progress=progress)
         
-        # Генерируем HTML-отчет
+    except Exception as e:
+        logger.error("Ошибка при анализе текста: %s", e, exc_info=True)
+        ERRORS_TOTAL.labels('analyze').inc()
+        set_trace_fields(status='error')
         try:
-            logger.info("Генерирую HTML-отчет...")
-            html_path = report_generator.save_report(analysis_result, material_info, format='html')
-            logger.info(f"HTML-отчет создан: {html_path}")
-        except Exception as e:
-            logger.error(f"Ошибка генерации HTML-отчета: {e}", exc_info=True)
-            await update.message.reply_text(
-                "❌ Ошибка при генерации отчета. Попробуй еще раз."
+            await progress.finish("❌ Произошла ошибка при анализе текста.")
+        except Exception as send_error:
+            logger.error("Ошибка отправки сообщения об ошибке: %s", send_error, exc_info=True)
+
+
+async def handle_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка изображения (фото или файл-картинка): OCR + анализ текста"""
+    telegram_id = str(update.effective_user.id)
+    
+    if not db.is_user_registered(telegram_id):
+        await update.message.reply_text(
+            "⚠️ Для проверки материалов нужна регистрация.\n\n"
+            "Отправь /start для регистрации."
+        )
+        return
+    
+    if not OCR_AVAILABLE:
+        await update.message.reply_text(
+            "❌ Проверка изображений сейчас недоступна. Отправь текст объявления."
+        )
+        return
+    
+    message = update.message
+    # У фото берем самый крупный вариант, у документа — сам файл
+    attachment = message.photo[-1] if message.photo else message.document
+    if attachment.file_size and attachment.file_size > IMAGE_MAX_BYTES:
+        await message.reply_text(
+            f"❌ Изображение слишком большое (больше {IMAGE_MAX_BYTES // (1024 * 1024)} МБ)."
+        )
+        return
+    
+    trace = start_trace('check', user=update.effective_user.id)
+    progress = ProgressMessage(outbound, message)
+    try:
+        await progress.start("🔍 Загружаю изображение... Пожалуйста, подожди.")
+    except Exception as e:
+        logger.error("Ошибка отправки сообщения: %s", e, exc_info=True)
+        finish_trace(trace, status='error')
+        return
+    
+    CHECKS_IN_FLIGHT.inc()
+    try:
+        with span('download'):
+            telegram_file = await attachment.get_file()
+            image_bytes = bytes(await telegram_file.download_as_bytearray())
+        progress.update("🔍 Распознаю текст на изображении...")
+        
+        try:
+            ocr_result = await ocr_pool.submit(
+                timed_call, ocr_image, time.time(), image_bytes, OCR_MAX_SIDE, OCR_LANG
+            )
+        except QueueFullError:
+            ERRORS_TOTAL.labels('ocr_queue_full').inc()
+            trace.fields['status'] = 'ocr_queue_full'
+            await progress.finish(
+                "⏳ Сейчас много проверок изображений. Попробуй через минуту."
             )
             return
         
-        # Конвертируем в PDF
-        try:
-            if html_path and os.path.exists(html_path):
-                logger.info("Конвертирую HTML в PDF...")
-                pdf_filename = os.path.basename(html_path).replace('.html', '')
-                pdf_path = pdf_generator.generate_from_html_file(html_path, pdf_filename)
-                logger.info(f"PDF создан: {pdf_path}")
-                
-                if pdf_path and os.path.exists(pdf_path):
-                    logger.info("Отправляю PDF пользователю...")
-                    # Отправляем PDF
-                    with open(pdf_path, 'rb') as f:
-                        await update.message.reply_document(
-                            document=f,
-                            filename=f"Отчет_РекламныйИнспектор_{datetime.now().strftime('%Y%m%d')}.pdf",
-                            caption="📄 Полный PDF-отчет с детальными рекомендациями"
-                        )
-                    logger.info("PDF успешно отправлен")
-                    
-                    # Сохраняем проверку в базу
-                    try:
-                        db.save_check(
-                            telegram_id=telegram_id,
-                            material_type='text',
-                            material_url=text[:100],
-                            verdict=analysis_result.get('verdict', 'ERROR'),
-                            violations_count=analysis_result.get('total_violations', 0),
-                            report_path=pdf_path
-                        )
-                        logger.info("Проверка сохранена в базу данных")
-                    except Exception as e:
-                        logger.error(f"Ошибка сохранения в базу: {e}", exc_info=True)
-                else:
-                    logger.error(f"PDF файл не создан или не найден: {pdf_path}")
-                    await update.message.reply_text(
-                        "❌ Ошибка при создании PDF-отчета. Попробуй еще раз."
-                    )
-            else:
-                logger.error(f"HTML файл не создан или не найден: {html_path}")
-                await update.message.reply_text(
-                    "❌ Ошибка при создании HTML-отчета. Попробуй еще раз."
-                )
-        except Exception as e:
-            logger.error(f"Ошибка при генерации/отправке PDF: {e}", exc_info=True)
-            await update.message.reply_text(
-                f"❌ Ошибка при создании PDF-отчета: {str(e)}\n\n"
-                "Попробуй еще раз или отправь текст материала."
+        # Этапы OCR измерены в процессе пула — переносим их в метрики и trace здесь
+        for stage, seconds in ocr_result['timings'].items():
+            record_span(f'ocr_{stage}', seconds)
+        trace.fields['image'] = f"{ocr_result['width']}x{ocr_result['height']}"
+        
+        if not ocr_result['text'].strip():
+            trace.fields['status'] = 'no_text'
+            await progress.finish(
+                "❌ Не удалось распознать текст на изображении. Отправь текст объявления."
             )
+            return
+        
+        analysis_result = await asyncio.to_thread(
+            analyzer.analyze_text,
+            ocr_result['text'],
+            material_type='image',
+            disclaimer_area_percent=ocr_result['disclaimer_area_percent']
+        )
+        
+        material_info = {
+            'text': ocr_result['text'][:100],
+            'type': 'Изображение'
+        }
+        
+        await send_full_report(update, context, analysis_result, material_info,
+                               material_type='image', material_url=ocr_result['text'][:100],
+                               progress=progress)
         
     except Exception as e:
-        logger.error(f"Ошибка при анализе текста: {e}", exc_info=True)
+        logger.error("Ошибка при анализе изображения: %s", e, exc_info=True)
+        ERRORS_TOTAL.labels('image').inc()
+        trace.fields['status'] = 'error'
         try:
-            await update.message.reply_text("❌ Произошла ошибка при анализе текста.")
+            await progress.finish("❌ Произошла ошибка при анализе изображения.")
         except Exception as send_error:
-            logger.error(f"Ошибка отправки сообщения об ошибке: {send_error}", exc_info=True)
+            logger.error("Ошибка отправки сообщения об ошибке: %s", send_error, exc_info=True)
+    finally:
+        CHECKS_IN_FLIGHT.dec()
+        finish_trace(trace)
 
 
-async def send_brief_report(
-    update: Update,
-    context: ContextTypes.DEFAULT_TYPE,
-    analysis_result: dict,
-    material_info: dict
-):
-    """Отправляет краткий отчет пользователю"""
+async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка документа (.txt, .html, .docx, .pdf): извлечение текста в пуле + анализ"""
+    telegram_id = str(update.effective_user.id)
+    
+    if not db.is_user_registered(telegram_id):
+        await update.message.reply_text(
+            "⚠️ Для проверки материалов нужна регистрация.\n\n"
+            "Отправь /start для регистрации."
+        )
+        return
+    
+    message = update.message
+    document = message.document
+    format = document_format(document.file_name)
+    if format is None:
+        await message.reply_text(
+            f"❌ Этот формат не поддерживается. Отправь файл {', '.join(DOCUMENT_FORMATS)}."
+        )
+        return
+    if format == 'pdf' and not PDF_AVAILABLE:
+        await message.reply_text(
+            "❌ Проверка PDF сейчас недоступна. Отправь .docx или текст объявления."
+        )
+        return
+    if document.file_size and document.file_size > DOCUMENT_MAX_BYTES:
+        await message.reply_text(
+            f"❌ Файл слишком большой (больше {DOCUMENT_MAX_BYTES // (1024 * 1024)} МБ)."
+        )
+        return
+    
+    trace = start_trace('check', user=update.effective_user.id)
+    progress = ProgressMessage(outbound, message)
     try:
-        logger.info("send_brief_report вызван")
-        verdict = analysis_result.get('verdict', 'ERROR')
-        logger.info(f"Verdict: {verdict}")
-        
-        verdict_emoji = {
-            'СООТВЕТСТВУЕТ': '✅',
-            'ЧАСТИЧНОЕ_НАРУШЕНИЕ': '⚠️',
-            'НЕ_СООТВЕТСТВУЕТ': '❌',
-            'КРИТИЧЕСКИЕ_НАРУШЕНИЯ': '🚨',
-            'ERROR': '❌'
-        }
+        await progress.start("🔍 Загружаю документ... Пожалуйста, подожди.")
+    except Exception as e:
+        logger.error("Ошибка отправки сообщения: %s", e, exc_info=True)
+        finish_trace(trace, status='error')
+        return
+    
+    CHECKS_IN_FLIGHT.inc()
+    # Файл скачивается на диск: процесс пула читает его частями, байты не передаются через очередь
+    fd, path = tempfile.mkstemp(prefix='inspector-document-', suffix=os.path.splitext(document.file_name)[1])
+    os.close(fd)
+    try:
+        with span('download'):
+            telegram_file = await document.get_file()
+            await telegram_file.download_to_drive(path)
+        progress.update("🔍 Извлекаю текст из документа...")
         
-        emoji = verdict_emoji.get(verdict, '❓')
-        verdict_text = verdict.replace('_', ' ')
+        try:
+            extracted = await document_pool.submit(
+                timed_call, extract_document, time.time(), path, document.file_name
+            )
+        except QueueFullError:
+            ERRORS_TOTAL.labels('document_queue_full').inc()
+            trace.fields['status'] = 'document_queue_full'
+            await progress.finish(
+                "⏳ Сейчас много проверок документов. Попробуй через минуту."
+            )
+            return
+        except DocumentError as e:
+            logger.info("Документ %s не прочитан: %s", document.file_name, e)
+            trace.fields['status'] = 'bad_document'
+            await progress.finish(
+                "❌ Не удалось прочитать файл. Проверь, что он не поврежден и не защищен паролем."
+            )
+            return
         
-        # Формируем краткий отчет
-        report_text = f"""
-{emoji} **ВЕРДИКТ: {verdict_text}**
-
-📋 **Материал:** {material_info.get('url', material_info.get('text', 'Не указано'))[:80]}
-📅 **Дата:** {datetime.now().strftime('%d.%m.%Y %H:%M')}
-
-"""
+        # Извлечение измерено в процессе пула — переносим в метрики и trace здесь
+        for stage, seconds in extracted['timings'].items():
+            record_span(f'document_{stage}', seconds)
+        trace.fields['document'] = f"{format}:{extracted['units']}"
+        if extracted['truncated']:
+            trace.fields['truncated'] = True
         
-        # Дисклеймер
-        disclaimer = analysis_result.get('disclaimer', {})
-        if disclaimer.get('found'):
-            report_text += "✅ **Дисклеймер:** Найден\n"
-        else:
-            report_text += "❌ **Дисклеймер:** Не найден\n"
+        if not extracted['text']:
+            trace.fields['status'] = 'no_text'
+            await progress.finish(
+                "❌ В документе не найден текст. Если это скан, отправь его как изображение."
+            )
+            return
         
-        # Нарушения
-        total_violations = analysis_result.get('total_violations', 0)
+        # Текст документа — до MAX_TEXT_CHARS символов: анализ в потоке, чтобы не задерживать другие чаты
+        analysis_result = await asyncio.to_thread(analyzer.analyze_text, extracted['text'], material_type='document')
         
-        if total_violations > 0:
-            report_text += f"\n❌ **Нарушений найдено:** {total_violations}\n"
-        else:
-            report_text += "\n✅ **Нарушений не обнаружено**\n"
+        # По разделам отчет указывает страницу или абзац каждой найденной формулировки
+        material_info = {
+            'text': document.file_name,
+            'type': f'Документ ({format.upper()})',
+            'sections': extracted['sections']
+        }
         
-        report_text += "\n📄 Загружаю PDF-отчет с рекомендациями..."
+        await send_full_report(update, context, analysis_result, material_info,
+                               material_type='document', material_url=document.file_name,
+                               progress=progress)
         
-        logger.info("Отправляю краткий отчет...")
-        await update.message.reply_text(
-            report_text,
-            parse_mode=ParseMode.MARKDOWN
-        )
-        logger.info("Краткий отчет отправлен")
     except Exception as e:
-        logger.error(f"Ошибка в send_brief_report: {e}", exc_info=True)
-        import traceback
-        traceback.print_exc()
+        logger.error("Ошибка при анализе документа: %s", e, exc_info=True)
+        ERRORS_TOTAL.labels('document').inc()
+        trace.fields['status'] = 'error'
         try:
-            await update.message.reply_text(
-                "❌ Ошибка при формировании отчета. Продолжаю обработку..."
-            )
-        except:
-            pass
+            await progress.finish("❌ Произошла ошибка при анализе документа.")
+        except Exception as send_error:
+            logger.error("Ошибка отправки сообщения об ошибке: %s", send_error, exc_info=True)
+    finally:
+        CHECKS_IN_FLIGHT.dec()
+        os.remove(path)
+        finish_trace(trace)
+
+
+async def send_full_report(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    analysis_result: AnalysisResult,
+    material_info: dict,
+    material_type: str,
+    material_url: str,
+    layout_task: Optional[asyncio.Task] = None,
+    progress: Optional[ProgressMessage] = None,
+    diff: Optional[dict] = None
+):
+    """Отправляет краткий отчет и PDF-отчет, сохраняет проверку (этапы идут параллельно)"""
+    # Длительности этапов попадают в trace проверки и в итоговую запись лога
+    await check_pipeline.run(
+        update.message,
+        str(update.effective_user.id),
+        analysis_result,
+        material_info,
+        material_type=material_type,
+        material_url=material_url,
+        layout_task=layout_task,
+        progress=progress,
+        diff=diff
+    )
+
+
+def build_application(token: str, base_url: Optional[str] = None) -> Application:
+    """
+    Создает приложение со всеми обработчиками
+    
+    Args:
+        token: Токен бота
+        base_url: Адрес Bot API (по умолчанию — api.telegram.org; в нагрузочных тестах — поддельный API)
+        
+    Returns:
+        Application, готовое к запуску
+    """
+    builder = Application.builder().token(token).post_init(post_init).post_shutdown(post_shutdown)
+    if base_url:
+        builder = builder.base_url(base_url)
+    application = builder.build()
+    
+    # Регистрация пользователя (ConversationHandler)
+    conv_handler = ConversationHandler(
+        entry_points=[CommandHandler("start", start_command)],
+        states={
+            ASKING_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, asking_name)],
+            ASKING_PHONE: [
+                MessageHandler(filters.CONTACT, asking_phone),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, asking_phone)
+            ],
+            ASKING_GDPR: [CallbackQueryHandler(gdpr_callback)]
+        },
+        fallbacks=[CommandHandler("cancel", cancel_registration)]
+    )
+    
+    application.add_handler(conv_handler)
+    
+    # Остальные команды
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("profile", profile_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(CommandHandler("reload_rules", reload_rules_command))
+    application.add_handler(CommandHandler("broadcast", broadcast_command))
+    application.add_handler(CommandHandler("analytics", analytics_command))
+    application.add_handler(CommandHandler("profiling", profiling_command))
+    application.add_handler(CommandHandler("dump_state", dump_state_command))
+    application.add_handler(CommandHandler("watch", watch_command))
+    application.add_handler(CommandHandler("unwatch", unwatch_command))
+    application.add_handler(CommandHandler("watchlist", watchlist_command))
+    
+    # Обработка материалов
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_material))
+    application.add_handler(MessageHandler(filters.PHOTO | filters.Document.IMAGE, handle_image))
+    application.add_handler(MessageHandler(filters.Document.ALL & ~filters.Document.IMAGE, handle_document))
+    return application
 
 
 def main():
@@ -733,9 +1349,9 @@ def main():
             return
         
         logger.info("Начинаю запуск бота...")
-        logger.info(f"LOG_LEVEL: {LOG_LEVEL}")
-        logger.info(f"ADMIN_CHAT_ID: {'установлен' if ADMIN_CHAT_ID else 'не установлен'}")
-        logger.info(f"TELEGRAM_BOT_TOKEN: {'установлен' if TELEGRAM_BOT_TOKEN else 'НЕ УСТАНОВЛЕН!'}")
+        logger.info("LOG_LEVEL: %s", LOG_LEVEL)
+        logger.info("ADMIN_CHAT_ID: %s", 'установлен' if ADMIN_CHAT_ID else 'не установлен')
+        logger.info("TELEGRAM_BOT_TOKEN: %s", 'установлен' if TELEGRAM_BOT_TOKEN else 'НЕ УСТАНОВЛЕН!')
         
         # Проверяем токен перед созданием приложения
         if not TELEGRAM_BOT_TOKEN or len(TELEGRAM_BOT_TOKEN) < 10:
@@ -743,32 +1359,20 @@ def main():
             raise ValueError("TELEGRAM_BOT_TOKEN обязателен для работы бота")
         
         # Создаем приложение
-        application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+        application = build_application(TELEGRAM_BOT_TOKEN)
         logger.info("Приложение создано успешно")
         
-        # Регистрация пользователя (ConversationHandler)
-        conv_handler = ConversationHandler(
-            entry_points=[CommandHandler("start", start_command)],
-            states={
-                ASKING_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, asking_name)],
-                ASKING_PHONE: [
-                    MessageHandler(filters.CONTACT, asking_phone),
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, asking_phone)
-                ],
-                ASKING_GDPR: [CallbackQueryHandler(gdpr_callback)]
-            },
-            fallbacks=[CommandHandler("cancel", cancel_registration)]
-        )
-        
-        application.add_handler(conv_handler)
+        # Следим за изменениями файла правил
+        if RULES_RELOAD_INTERVAL > 0:
+            analyzer.rules.start_watching(RULES_RELOAD_INTERVAL)
         
-        # Остальные команды
-        application.add_handler(CommandHandler("help", help_command))
-        application.add_handler(CommandHandler("profile", profile_command))
-        application.add_handler(CommandHandler("stats", stats_command))
+        # Фоновое сжатие и удаление старых отчетов
+        if REPORTS_SWEEP_INTERVAL > 0:
+            report_store.start_retention(REPORTS_SWEEP_INTERVAL)
         
-        # Обработка материалов
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_material))
+        # HTTP-сервер метрик для Prometheus
+        if METRICS_PORT > 0:
+            metrics.start_http_server(METRICS_PORT, METRICS_HOST)
         
         # Запускаем бота
         logger.info("🔍 Рекламный Инспектор запущен!")
@@ -790,16 +1394,16 @@ def main():
         except KeyboardInterrupt:
             logger.info("Бот остановлен пользователем")
         except Exception as e:
-            logger.error(f"Критическая ошибка в polling: {e}", exc_info=True)
-            print(f"ERROR: Критическая ошибка в polling: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.error("Критическая ошибка в polling: %s", e, exc_info=True)
             # Не падаем сразу, пробуем перезапустить
             raise
     except Exception as e:
-        logger.error(f"Критическая ошибка при запуске бота: {e}", exc_info=True)
+        logger.error("Критическая ошибка при запуске бота: %s", e, exc_info=True)
         print(f"ERROR: Критическая ошибка: {e}")
         raise
+    finally:
+        # Дописываем записи, оставшиеся в очереди
+        log_listener.stop()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,135 @@
+"""
+Рассылка сообщений зарегистрированным пользователям (для админа)
+Получатели читаются из базы страницами, сообщения отправляются параллельно в
+пределах лимитов Telegram, прогресс сохраняется после каждой страницы
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, TelegramError
+
+from sender import OutboundScheduler, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class Broadcaster:
+    """
+    Рассылка с контрольными точками
+
+    После каждой страницы в broadcasts записывается id последнего
+    пользователя и счетчики, поэтому после перезапуска рассылка продолжается
+    со следующей страницы (сообщения незавершенной страницы могут уйти
+    повторно). Заблокировавшие бота помечаются неактивными одним запросом на
+    страницу.
+    """
+
+    def __init__(self, db, sender: OutboundScheduler, page_size: int = 500,
+                 concurrency: int = 20, rate: float = 20.0):
+        """
+        Args:
+            db: Database
+            sender: Общий планировщик исходящих запросов (лимиты чатов и бота)
+            page_size: Получателей на страницу
+            concurrency: Одновременных отправок
+            rate: Сообщений рассылки в секунду (остаток общего лимита — ответам на проверки)
+        """
+        self.db = db
+        self.sender = sender
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, 1)
+
+    async def _send(self, bot: Bot, telegram_id: str, text: str) -> str:
+        """Отправляет одно сообщение, возвращает sent, blocked или failed"""
+        wait = self.bucket.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        try:
+            await self.sender.call(int(telegram_id), bot.send_message, chat_id=int(telegram_id), text=text)
+            return 'sent'
+        except Forbidden:
+            # Пользователь заблокировал бота или удалил аккаунт
+            return 'blocked'
+        except BadRequest as e:
+            if 'chat not found' in str(e).lower():
+                return 'blocked'
+            logger.warning("Рассылка: ошибка отправки %s: %s", telegram_id, e)
+            return 'failed'
+        except TelegramError as e:
+            logger.warning("Рассылка: ошибка отправки %s: %s", telegram_id, e)
+            return 'failed'
+
+    async def _send_page(self, bot: Bot, page: List[Tuple[int, str]], text: str) -> List[str]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send_one(telegram_id: str) -> str:
+            async with semaphore:
+                return await self._send(bot, telegram_id, text)
+
+        return await asyncio.gather(*(send_one(telegram_id) for _, telegram_id in page))
+
+    async def run(self, bot: Bot, broadcast: Dict) -> Dict:
+        """
+        Выполняет (или продолжает) рассылку
+
+        Args:
+            bot: Бот
+            broadcast: Строка broadcasts (id, text, last_user_id, sent, failed, blocked)
+
+        Returns:
+            Отчет: sent, failed, blocked, recipients, seconds, per_second
+        """
+        broadcast_id = broadcast['id']
+        text = broadcast['text']
+        counts = {key: broadcast.get(key) or 0 for key in ('sent', 'failed', 'blocked')}
+        last_user_id = broadcast.get('last_user_id') or 0
+        started = time.perf_counter()
+        processed = 0
+
+        pages = self.db.iter_active_user_pages(self.page_size, after_id=last_user_id)
+        next_page = asyncio.create_task(asyncio.to_thread(next, pages, None))
+        while True:
+            page = await next_page
+            if not page:
+                break
+            # Следующая страница читается, пока отправляется текущая
+            next_page = asyncio.create_task(asyncio.to_thread(next, pages, None))
+
+            results = await self._send_page(bot, page, text)
+            blocked = [telegram_id for (_, telegram_id), result in zip(page, results) if result == 'blocked']
+            for result in results:
+                counts[result] += 1
+            processed += len(page)
+            last_user_id = page[-1][0]
+
+            await asyncio.to_thread(self.db.deactivate_users, blocked)
+            await asyncio.to_thread(self.db.update_broadcast, broadcast_id, last_user_id,
+                                    counts['sent'], counts['failed'], counts['blocked'])
+            logger.info("Рассылка #%s: обработано %s, %s", broadcast_id, processed, counts)
+
+        await asyncio.to_thread(self.db.update_broadcast, broadcast_id, last_user_id,
+                                counts['sent'], counts['failed'], counts['blocked'], 'done')
+        seconds = time.perf_counter() - started
+        return {
+            'broadcast_id': broadcast_id,
+            **counts,
+            'recipients': processed,
+            'seconds': round(seconds, 1),
+            'per_second': round(processed / seconds, 1) if seconds else 0.0,
+        }
+
+
+def format_report(report: Dict, resumed: Optional[bool] = False) -> str:
+    """Текст отчета о рассылке для админа"""
+    return (
+        f"📣 Рассылка #{report['broadcast_id']} завершена{' (после перезапуска)' if resumed else ''}\n\n"
+        f"✅ Доставлено: {report['sent']}\n"
+        f"🚫 Заблокировали бота: {report['blocked']}\n"
+        f"❌ Ошибки: {report['failed']}\n\n"
+        f"⏱ {report['recipients']} получателей за {report['seconds']} с "
+        f"({report['per_second']} сообщений/с)"
+    )
@@ -31,10 +31,23 @@ REPORTS_PATH = os.path.join(
 # Railway автоматически создаст PostgreSQL и установит DATABASE_URL
 # Если DATABASE_URL не установлен, используется SQLite для локальной разработки
 DATABASE_URL = os.getenv("DATABASE_URL", "")
+# Соединений PostgreSQL, которые держатся открытыми между запросами (с их подготовленными запросами)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+# SQLite (без DATABASE_URL): журнал WAL, соединений чтения в пуле, сколько ждать
+# блокировку базы и очередь записи (секунды), кэш страниц на соединение и mmap (МБ)
+SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() in ("1", "true", "yes")
+SQLITE_READ_POOL = int(os.getenv("SQLITE_READ_POOL", "4"))
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "32"))
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
 
 # Логирование
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
-LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s"
+# Записи строками JSON (для сборщиков логов)
+LOG_JSON = os.getenv("LOG_JSON", "false").lower() in ("1", "true", "yes")
+# Доля проверок, отладочные записи которых сохраняются при LOG_LEVEL=DEBUG
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))
 
 # Обязательный дисклеймер (точный текст из закона)
 REQUIRED_DISCLAIMER = (
@@ -44,3 +57,88 @@ REQUIRED_DISCLAIMER = (
 
 # Минимальный размер дисклеймера (% от площади)
 MIN_DISCLAIMER_SIZE = 7
+
+# Набор правил (запрещенные формулировки, категории, рекомендации)
+RULES_PATH = os.getenv(
+    "RULES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "analyzer", "rules.json")
+)
+
+# Интервал проверки изменений файла правил (секунды, 0 — не следить)
+RULES_RELOAD_INTERVAL = float(os.getenv("RULES_RELOAD_INTERVAL", "10"))
+
+# Распознавание текста на изображениях (Tesseract)
+OCR_LANG = os.getenv("OCR_LANG", "rus")
+# Число процессов OCR (по умолчанию — по числу ядер) и длина очереди ожидания
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0")) or None
+OCR_QUEUE_SIZE = int(os.getenv("OCR_QUEUE_SIZE", "8"))
+# Большая сторона изображения перед OCR (крупные баннеры уменьшаются)
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "2000"))
+# Максимальный размер изображения для проверки (байты)
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+
+# Документы (.txt, .html, .docx, .pdf): максимальный размер файла (байты),
+# число процессов извлечения текста (0 — по числу ядер) и длина очереди
+DOCUMENT_MAX_BYTES = int(os.getenv("DOCUMENT_MAX_BYTES", str(20 * 1024 * 1024)))
+DOCUMENT_WORKERS = int(os.getenv("DOCUMENT_WORKERS", "0")) or None
+DOCUMENT_QUEUE_SIZE = int(os.getenv("DOCUMENT_QUEUE_SIZE", "8"))
+
+# Пул рендеринга (верстка страниц и PDF): число процессов (0 — по числу ядер) и очередь
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0")) or None
+RENDER_QUEUE_SIZE = int(os.getenv("RENDER_QUEUE_SIZE", "16"))
+
+# Измерение дисклеймера на сайте: размер первого экрана (ширина x высота, CSS px)
+LAYOUT_VIEWPORT = tuple(int(v) for v in os.getenv("LAYOUT_VIEWPORT", "1366x768").split("x"))
+# Таймаут загрузки CSS сайта при верстке (секунды)
+LAYOUT_FETCH_TIMEOUT = int(os.getenv("LAYOUT_FETCH_TIMEOUT", "5"))
+
+# Хранилище PDF-отчетов (адресация по содержимому) и его очистка
+REPORTS_STORE_PATH = os.getenv("REPORTS_STORE_PATH", "data/reports")
+# Через сколько дней отчеты сжимаются и удаляются (0 — никогда)
+REPORTS_COMPRESS_AFTER_DAYS = float(os.getenv("REPORTS_COMPRESS_AFTER_DAYS", "7"))
+REPORTS_EXPIRE_AFTER_DAYS = float(os.getenv("REPORTS_EXPIRE_AFTER_DAYS", "90"))
+# Бюджет диска под отчеты (МБ, 0 — без ограничения)
+REPORTS_MAX_MB = int(os.getenv("REPORTS_MAX_MB", "1024"))
+# Интервал фоновой очистки (секунды, 0 — не запускать)
+REPORTS_SWEEP_INTERVAL = float(os.getenv("REPORTS_SWEEP_INTERVAL", "3600"))
+
+# Лимиты исходящих сообщений Telegram: запросов в секунду на бота и в один чат,
+# сколько запросов в чат можно отправить подряд
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "25"))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))
+OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", "3"))
+
+# Рассылка (/broadcast): получателей на страницу, одновременных отправок,
+# сообщений в секунду (остаток общего лимита остается ответам на проверки)
+BROADCAST_PAGE_SIZE = int(os.getenv("BROADCAST_PAGE_SIZE", "500"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "20"))
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "20"))
+
+# Метрики в формате Prometheus: порт HTTP-сервера (0 — не запускать) и адрес
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# HTTP API для CRM (api.py): порт в процессе бота (0 — не запускать; отдельно — python api.py,
+# по умолчанию 8080), адрес и ключи через запятую
+API_PORT = int(os.getenv("API_PORT", "0"))
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_KEYS = [key.strip() for key in os.getenv("API_KEYS", "").split(",") if key.strip()]
+# Одновременных проверок, запросов в работе на сервис и на один ключ (сверх — ответ 429)
+API_CONCURRENCY = int(os.getenv("API_CONCURRENCY", "8"))
+API_MAX_REQUESTS = int(os.getenv("API_MAX_REQUESTS", "64"))
+API_KEY_CONCURRENCY = int(os.getenv("API_KEY_CONCURRENCY", "8"))
+# Материалов в одном пакетном запросе и размер тела запроса (МБ)
+API_BATCH_MAX = int(os.getenv("API_BATCH_MAX", "100"))
+API_MAX_BODY_MB = float(os.getenv("API_MAX_BODY_MB", "5"))
+
+# Наблюдение за сайтами (/watch): планировщик в процессе бота, интервал проверок
+# по умолчанию, минимальный и максимальный (часы), сайтов на пользователя
+MONITOR_ENABLED = os.getenv("MONITOR_ENABLED", "true").lower() in ("1", "true", "yes")
+MONITOR_INTERVAL_HOURS = float(os.getenv("MONITOR_INTERVAL_HOURS", "24"))
+MONITOR_MIN_INTERVAL_HOURS = float(os.getenv("MONITOR_MIN_INTERVAL_HOURS", "1"))
+MONITOR_MAX_INTERVAL_HOURS = float(os.getenv("MONITOR_MAX_INTERVAL_HOURS", "720"))
+MONITOR_MAX_URLS = int(os.getenv("MONITOR_MAX_URLS", "20"))
+# Одновременных проверок, пауза между запросами к одному хосту (секунды), разброс интервала (доля)
+MONITOR_CONCURRENCY = int(os.getenv("MONITOR_CONCURRENCY", "8"))
+MONITOR_HOST_DELAY = float(os.getenv("MONITOR_HOST_DELAY", "5"))
+MONITOR_JITTER = float(os.getenv("MONITOR_JITTER", "0.1"))
@@ -2,9 +2,27 @@
 База данных для хранения пользователей
 Поддержка PostgreSQL (Railway) и SQLite (локальная разработка)
 """
+import logging
 import os
+import queue
+import time
+from collections import Counter
 from datetime import datetime
 from typing import Optional, Dict, List
+from urllib.parse import urlsplit
+
+from config import DB_POOL_SIZE, SQLITE_WAL, SQLITE_READ_POOL, SQLITE_BUSY_TIMEOUT, SQLITE_CACHE_MB, SQLITE_MMAP_MB
+from metrics import DB_CONNECTIONS_OPEN, DB_CONNECTIONS_TOTAL, DB_WRITE_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Таблицы суточных агрегатов и их счетчики
+ROLLUP_COUNTERS = {
+    'daily_verdicts': ['checks', 'violations'],
+    'daily_violations': ['violations'],
+    'daily_user_checks': ['checks', 'violations'],
+    'daily_domain_checks': ['checks', 'violations'],
+}
 
 # Определяем какой драйвер использовать
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -21,6 +39,7 @@ if DATABASE_URL:
         # Если psycopg2 не работает, пробуем psycopg3 (для Python 3.13+)
         try:
             import psycopg
+            from psycopg.rows import dict_row
             USE_POSTGRESQL = True
             USE_PSYCOPG3 = True
         except ImportError:
@@ -32,45 +51,359 @@ else:
     USE_PSYCOPG3 = False
 
 
+class _TrackedConnection:
+    """Примесь к классу соединения драйвера: учет открытых соединений в метриках"""
+    
+    def _track(self):
+        self._tracked = True
+        DB_CONNECTIONS_OPEN.inc()
+        DB_CONNECTIONS_TOTAL.inc()
+        return self
+    
+    def _untrack(self):
+        if getattr(self, '_tracked', False):
+            self._tracked = False
+            DB_CONNECTIONS_OPEN.dec()
+    
+    def close(self):
+        self._untrack()
+        super().close()
+    
+    def __del__(self):
+        # Соединение, не закрытое явно (ветка с исключением), закрывается сборщиком
+        self._untrack()
+        parent_del = getattr(super(), '__del__', None)
+        if parent_del:
+            parent_del()
+
+
+if USE_POSTGRESQL and USE_PSYCOPG3:
+    class _Connection(_TrackedConnection, psycopg.Connection):
+        pass
+elif USE_POSTGRESQL:
+    class _Connection(_TrackedConnection, psycopg2.extensions.connection):
+        pass
+else:
+    class _Connection(_TrackedConnection, sqlite3.Connection):
+        pass
+
+
+class _PooledConnection(_Connection):
+    """Соединение из пула: close() возвращает его в пул"""
+    
+    _pool = None
+    _write = False
+    _checked_out = False
+    
+    def close(self):
+        if self._pool is None:
+            super().close()
+        elif self._checked_out:
+            self._checked_out = False
+            self._pool.release(self)
+    
+    def _close(self):
+        self._pool = None
+        super().close()
+
+
+class _Pool:
+    """
+    Пул соединений: свободные хранятся стеком (последнее возвращенное выдается
+    первым), при нехватке открывается новое, лишние при возврате закрываются.
+    Соединение живет дольше одного вызова — его кэш подготовленных запросов
+    используется повторно.
+    """
+    
+    def __init__(self, size: int):
+        self._idle = queue.LifoQueue(maxsize=size)
+    
+    def _connect(self, write: bool):
+        raise NotImplementedError
+    
+    def acquire(self):
+        """Свободное соединение из пула (или новое)"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect(write=False)
+            if not getattr(conn, 'closed', False):
+                break
+            # PostgreSQL: соединение, закрытое сервером, не возвращается в работу
+            conn._close()
+        conn._checked_out = True
+        return conn
+    
+    def release(self, conn):
+        """Вернуть соединение: незавершенная транзакция откатывается, сломанное закрывается"""
+        try:
+            conn.rollback()
+        except Exception:
+            conn._close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn._close()
+    
+    def close(self):
+        """Закрыть свободные соединения (при остановке процесса)"""
+        while True:
+            try:
+                self._idle.get_nowait()._close()
+            except queue.Empty:
+                break
+    
+    def state(self) -> Dict:
+        """Свободные соединения и размер пула"""
+        return {'idle': self._idle.qsize(), 'size': self._idle.maxsize}
+
+
+class _PostgresPool(_Pool):
+    """Соединения PostgreSQL: любое годится и для чтения, и для записи"""
+    
+    def __init__(self):
+        super().__init__(DB_POOL_SIZE)
+    
+    def _connect(self, write: bool):
+        if USE_PSYCOPG3:
+            conn = _PooledConnection.connect(DATABASE_URL)
+        else:
+            conn = psycopg2.connect(DATABASE_URL, connection_factory=_PooledConnection)
+        conn._pool = self
+        return conn._track()
+
+
+class _SqlitePool(_Pool):
+    """
+    Соединения SQLite: одно долгоживущее соединение записи, за которым потоки
+    встают в очередь, и пул соединений чтения. В режиме WAL чтение не ждет
+    записи и не блокирует ее, а запись из одного соединения не получает
+    "database is locked" от соседних потоков — ждать приходится только другие
+    процессы (busy_timeout).
+    """
+    
+    # Подготовленных запросов в кэше соединения (у модуля sqlite3 по умолчанию 128)
+    CACHED_STATEMENTS = 256
+    
+    def __init__(self, db_path: str):
+        super().__init__(SQLITE_READ_POOL)
+        self.db_path = db_path
+        # Очередь из одного места: соединение записи (None — создать при обращении)
+        self._writer = queue.Queue(maxsize=1)
+        self._writer.put(None)
+    
+    def _connect(self, write: bool):
+        # IMMEDIATE: блокировка записи берется в начале транзакции, ожидание — по busy_timeout
+        conn = sqlite3.connect(self.db_path, timeout=SQLITE_BUSY_TIMEOUT, factory=_PooledConnection,
+                               check_same_thread=False, isolation_level='IMMEDIATE' if write else '',
+                               cached_statements=self.CACHED_STATEMENTS)
+        conn.row_factory = sqlite3.Row
+        if write and SQLITE_WAL:
+            conn.execute('PRAGMA journal_mode = WAL')
+        if SQLITE_WAL:
+            # В режиме WAL потеря последних транзакций при сбое питания не портит базу
+            conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA cache_size = {-SQLITE_CACHE_MB * 1024}')
+        conn.execute(f'PRAGMA mmap_size = {SQLITE_MMAP_MB * 1024 * 1024}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        conn._pool = self
+        conn._write = write
+        return conn._track()
+    
+    def writer(self):
+        """
+        Соединение записи: ждет, пока его вернет предыдущий поток
+        
+        Вызывающий обязан вернуть соединение (close() в finally) — иначе
+        очередь записи стоит до перезапуска процесса.
+        
+        Raises:
+            sqlite3.OperationalError: если очередь не продвинулась за SQLITE_BUSY_TIMEOUT
+        """
+        started = time.perf_counter()
+        try:
+            conn = self._writer.get(timeout=SQLITE_BUSY_TIMEOUT)
+        except queue.Empty:
+            raise sqlite3.OperationalError("database is locked: очередь записи не продвигается") from None
+        DB_WRITE_WAIT_SECONDS.observe(time.perf_counter() - started)
+        if conn is None:
+            try:
+                conn = self._connect(write=True)
+            except Exception:
+                # Место в очереди не теряется, если открыть соединение не удалось
+                self._writer.put(None)
+                raise
+        conn._checked_out = True
+        return conn
+    
+    def release(self, conn):
+        if not conn._write:
+            super().release(conn)
+            return
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            conn._close()
+            conn = None
+        self._writer.put(conn)
+    
+    def state(self) -> Dict:
+        return {**super().state(), 'writer_busy': self._writer.empty()}
+    
+    def close(self):
+        super().close()
+        try:
+            conn = self._writer.get(timeout=SQLITE_BUSY_TIMEOUT)
+        except queue.Empty:
+            return
+        if conn is not None:
+            conn._close()
+        self._writer.put(None)
+
+
+# Тексты запросов для PostgreSQL (плейсхолдеры %s) по исходному тексту
+_PG_QUERIES: Dict[str, str] = {}
+
+
+def _dict_row(cursor, row) -> Dict:
+    """Фабрика строк SQLite: словарь по именам столбцов"""
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def url_domain(url: str) -> str:
+    """Домен сайта для агрегатов: хост URL в нижнем регистре без www."""
+    host = urlsplit(url if '://' in url else f'http://{url}').hostname or ''
+    return host[4:] if host.startswith('www.') else host
+
+
 class Database:
     """Работа с базой данных пользователей"""
     
+    # psycopg3: запросы выполняются как подготовленные (на соединении из пула — один раз)
+    prepare = True
+    
     def __init__(self, db_path: str = "data/users.db"):
         self.db_path = db_path
         self.use_postgresql = USE_POSTGRESQL
         self.use_psycopg3 = USE_PSYCOPG3 if USE_POSTGRESQL else False
         
-        if not self.use_postgresql:
+        if self.use_postgresql:
+            self._pool = _PostgresPool()
+        else:
             # SQLite: создаем директорию если нужно
             os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self._pool = _SqlitePool(db_path)
         
         self.init_db()
     
-    def _get_connection(self):
-        """Получить соединение с базой данных"""
-        if self.use_postgresql:
-            if USE_PSYCOPG3:
-                # Используем psycopg3 (для Python 3.13+)
-                return psycopg.connect(DATABASE_URL)
-            else:
-                # Используем psycopg2 (для Python < 3.13)
-                return psycopg2.connect(DATABASE_URL)
+    def close(self):
+        """Закрыть соединения пула (при остановке процесса)"""
+        self._pool.close()
+    
+    def pool_state(self) -> Dict:
+        """Состояние пула соединений (для снимка состояния)"""
+        return self._pool.state()
+    
+    def _get_connection(self, write: bool = False):
+        """
+        Получить соединение с базой данных из пула (close() возвращает его в пул)
+        
+        Args:
+            write: соединение для записи (SQLite: единственное, в очереди)
+        """
+        if write and not self.use_postgresql:
+            return self._pool.writer()
+        return self._pool.acquire()
+    
+    def _sql(self, query: str) -> str:
+        """Текст запроса для драйвера: запросы пишутся один раз, с плейсхолдерами ?"""
+        if not self.use_postgresql:
+            return query
+        sql = _PG_QUERIES.get(query)
+        if sql is None:
+            sql = _PG_QUERIES[query] = query.replace('%', '%%').replace('?', '%s')
+        return sql
+    
+    def _execute(self, cursor, query: str, params=()):
+        """Выполнить запрос на курсоре, возвращает курсор (psycopg3 — подготовленный, двоичный протокол)"""
+        if self.use_psycopg3:
+            cursor.execute(self._sql(query), params, prepare=self.prepare, binary=True)
         else:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            return conn
+            cursor.execute(self._sql(query), params)
+        return cursor
+    
+    def _executemany(self, cursor, query: str, rows: List):
+        """Выполнить запрос для каждого набора параметров"""
+        cursor.executemany(self._sql(query), rows)
+        return cursor
+    
+    def _cursor(self, conn, dicts: bool = False):
+        """Курсор; dicts — строки словарями (фабрика строк драйвера)"""
+        if not dicts:
+            return conn.cursor()
+        if self.use_psycopg3:
+            return conn.cursor(row_factory=dict_row)
+        if self.use_postgresql:
+            return conn.cursor(cursor_factory=RealDictCursor)
+        cursor = conn.cursor()
+        cursor.row_factory = _dict_row
+        return cursor
+    
+    def _fetch(self, query: str, params=(), one: bool = False, dicts: bool = False):
+        """Запрос чтения: все строки или первая (None, если строк нет)"""
+        conn = self._get_connection()
+        try:
+            cursor = self._execute(self._cursor(conn, dicts), query, params)
+            return cursor.fetchone() if one else cursor.fetchall()
+        finally:
+            conn.close()
+    
+    def _write(self, query: str, params=()) -> int:
+        """Команда записи отдельной транзакцией, возвращает число затронутых строк"""
+        conn = self._get_connection(write=True)
+        try:
+            cursor = self._execute(conn.cursor(), query, params)
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+    
+    def _in(self, column: str, values: List) -> tuple:
+        """Условие «column входит в values» и его параметры"""
+        if self.use_postgresql:
+            # Один текст запроса при любом числе значений — подготавливается один раз
+            return f'{column} = ANY(?)', [list(values)]
+        return f"{column} IN ({', '.join('?' * len(values))})", list(values)
     
     def init_db(self):
         """Инициализация базы данных"""
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
+            conn = self._get_connection(write=True)
         except Exception as e:
             print(f"ERROR: Не удалось подключиться к базе данных: {e}")
             if self.use_postgresql:
                 print(f"ERROR: DATABASE_URL: {'установлен' if DATABASE_URL else 'не установлен'}")
             raise
         
+        try:
+            backfill = self._create_tables(conn.cursor())
+            conn.commit()
+        finally:
+            conn.close()
+        
+        if backfill:
+            logger.info("Пересчет суточных агрегатов по сохраненным проверкам")
+            self.rebuild_rollups()
+    
+    def _create_tables(self, cursor) -> bool:
+        """
+        Создать недостающие таблицы и индексы
+        
+        Returns:
+            True, если суточные агрегаты нужно пересчитать по сохраненным проверкам
+        """
         if self.use_postgresql:
             # PostgreSQL синтаксис
             # Таблица пользователей
@@ -98,9 +431,146 @@ class Database:
                     violations_count INTEGER,
                     checked_at TIMESTAMP DEFAULT NOW(),
                     report_path TEXT,
+                    rules_version VARCHAR(50),
+                    result BYTEA,
                     FOREIGN KEY (user_id) REFERENCES users (id)
                 )
             ''')
+            
+            # Миграция: версия набора правил и полный результат для существующих таблиц
+            cursor.execute('ALTER TABLE checks ADD COLUMN IF NOT EXISTS rules_version VARCHAR(50)')
+            cursor.execute('ALTER TABLE checks ADD COLUMN IF NOT EXISTS result BYTEA')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_checks_time ON checks (checked_at, verdict)')
+            
+            # Нарушения проверок построчно — для аналитики без разбора результатов
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS check_violations (
+                    check_id INTEGER NOT NULL REFERENCES checks (id),
+                    category VARCHAR(100) NOT NULL,
+                    pattern_id INTEGER,
+                    phrase TEXT,
+                    start_pos INTEGER,
+                    end_pos INTEGER,
+                    rules_version VARCHAR(50),
+                    checked_at TIMESTAMP NOT NULL
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_check_violations_time '
+                           'ON check_violations (checked_at, category, pattern_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_check_violations_check ON check_violations (check_id)')
+            
+            # Суточные агрегаты для аналитики: обновляются в транзакции записи проверок
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS daily_verdicts (
+                    day DATE NOT NULL,
+                    material_type VARCHAR(50) NOT NULL,
+                    verdict VARCHAR(50) NOT NULL,
+                    checks INTEGER NOT NULL DEFAULT 0,
+                    violations INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, material_type, verdict)
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS daily_violations (
+                    day DATE NOT NULL,
+                    category VARCHAR(100) NOT NULL,
+                    pattern_id INTEGER NOT NULL,
+                    phrase TEXT NOT NULL,
+                    violations INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, category, pattern_id, phrase)
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS daily_user_checks (
+                    day DATE NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    verdict VARCHAR(50) NOT NULL,
+                    checks INTEGER NOT NULL DEFAULT 0,
+                    violations INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, user_id, verdict)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_daily_user_checks_user ON daily_user_checks (user_id, day)')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS daily_domain_checks (
+                    day DATE NOT NULL,
+                    domain VARCHAR(255) NOT NULL,
+                    verdict VARCHAR(50) NOT NULL,
+                    checks INTEGER NOT NULL DEFAULT 0,
+                    violations INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, domain, verdict)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_daily_domain_checks_domain ON daily_domain_checks (domain, day)')
+            
+            # Воронка: первая проверка пользователя
+            cursor.execute('ALTER TABLE users ADD COLUMN IF NOT EXISTS first_check_at TIMESTAMP')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_registered ON users (registered_at, first_check_at)')
+            
+            # Загруженные в Telegram PDF-отчеты: file_id по хэшу отчета
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS report_files (
+                    report_hash CHAR(64) PRIMARY KEY,
+                    file_id TEXT NOT NULL,
+                    report_path TEXT,
+                    uploads INTEGER DEFAULT 1,
+                    reuses INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT NOW(),
+                    last_used_at TIMESTAMP DEFAULT NOW()
+                )
+            ''')
+            
+            # Рассылки: прогресс сохраняется постранично для продолжения после перезапуска
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS broadcasts (
+                    id SERIAL PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    status VARCHAR(20) DEFAULT 'running',
+                    last_user_id INTEGER DEFAULT 0,
+                    sent INTEGER DEFAULT 0,
+                    failed INTEGER DEFAULT 0,
+                    blocked INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT NOW(),
+                    finished_at TIMESTAMP
+                )
+            ''')
+            
+            # Сегменты последней проверки страницы (для повторной проверки только изменений)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS url_snapshots (
+                    owner VARCHAR(255) NOT NULL,
+                    url_hash CHAR(64) NOT NULL,
+                    url TEXT,
+                    rules_version VARCHAR(50),
+                    snapshot TEXT NOT NULL,
+                    checked_at TIMESTAMP DEFAULT NOW(),
+                    PRIMARY KEY (owner, url_hash)
+                )
+            ''')
+            
+            # Наблюдение за сайтами: расписание проверок и состояние последней проверки
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS monitored_urls (
+                    id SERIAL PRIMARY KEY,
+                    owner VARCHAR(255) NOT NULL,
+                    url_hash CHAR(64) NOT NULL,
+                    url TEXT NOT NULL,
+                    host VARCHAR(255) NOT NULL,
+                    interval_seconds INTEGER NOT NULL,
+                    next_check_at DOUBLE PRECISION NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_hash CHAR(64),
+                    rules_version VARCHAR(50),
+                    last_verdict VARCHAR(50),
+                    failures INTEGER DEFAULT 0,
+                    last_error TEXT,
+                    last_checked_at TIMESTAMP,
+                    created_at TIMESTAMP DEFAULT NOW(),
+                    UNIQUE (owner, url_hash)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_monitored_urls_due ON monitored_urls (next_check_at)')
         else:
             # SQLite синтаксис (для локальной разработки)
             cursor.execute('''
@@ -126,17 +596,157 @@ class Database:
                     violations_count INTEGER,
                     checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     report_path TEXT,
+                    rules_version TEXT,
+                    result BLOB,
                     FOREIGN KEY (user_id) REFERENCES users (id)
                 )
             ''')
+            
+            # Миграция: SQLite не поддерживает ADD COLUMN IF NOT EXISTS
+            cursor.execute('PRAGMA table_info(checks)')
+            columns = {row[1] for row in cursor.fetchall()}
+            if 'rules_version' not in columns:
+                cursor.execute('ALTER TABLE checks ADD COLUMN rules_version TEXT')
+            if 'result' not in columns:
+                cursor.execute('ALTER TABLE checks ADD COLUMN result BLOB')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_checks_time ON checks (checked_at, verdict)')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS check_violations (
+                    check_id INTEGER NOT NULL REFERENCES checks (id),
+                    category TEXT NOT NULL,
+                    pattern_id INTEGER,
+                    phrase TEXT,
+                    start_pos INTEGER,
+                    end_pos INTEGER,
+                    rules_version TEXT,
+                    checked_at TIMESTAMP NOT NULL
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_check_violations_time '
+                           'ON check_violations (checked_at, category, pattern_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_check_violations_check ON check_violations (check_id)')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS daily_verdicts (
+                    day TEXT NOT NULL,
+                    material_type TEXT NOT NULL,
+                    verdict TEXT NOT NULL,
+                    checks INTEGER NOT NULL DEFAULT 0,
+                    violations INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, material_type, verdict)
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS daily_violations (
+                    day TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    pattern_id INTEGER NOT NULL,
+                    phrase TEXT NOT NULL,
+                    violations INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, category, pattern_id, phrase)
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS daily_user_checks (
+                    day TEXT NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    verdict TEXT NOT NULL,
+                    checks INTEGER NOT NULL DEFAULT 0,
+                    violations INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, user_id, verdict)
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_daily_user_checks_user ON daily_user_checks (user_id, day)')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS daily_domain_checks (
+                    day TEXT NOT NULL,
+                    domain TEXT NOT NULL,
+                    verdict TEXT NOT NULL,
+                    checks INTEGER NOT NULL DEFAULT 0,
+                    violations INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, domain, verdict)
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_daily_domain_checks_domain ON daily_domain_checks (domain, day)')
+            
+            cursor.execute('PRAGMA table_info(users)')
+            if 'first_check_at' not in {row[1] for row in cursor.fetchall()}:
+                cursor.execute('ALTER TABLE users ADD COLUMN first_check_at TIMESTAMP')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_registered ON users (registered_at, first_check_at)')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS report_files (
+                    report_hash TEXT PRIMARY KEY,
+                    file_id TEXT NOT NULL,
+                    report_path TEXT,
+                    uploads INTEGER DEFAULT 1,
+                    reuses INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS broadcasts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    text TEXT NOT NULL,
+                    status TEXT DEFAULT 'running',
+                    last_user_id INTEGER DEFAULT 0,
+                    sent INTEGER DEFAULT 0,
+                    failed INTEGER DEFAULT 0,
+                    blocked INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    finished_at TIMESTAMP
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS url_snapshots (
+                    owner TEXT NOT NULL,
+                    url_hash TEXT NOT NULL,
+                    url TEXT,
+                    rules_version TEXT,
+                    snapshot TEXT NOT NULL,
+                    checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (owner, url_hash)
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS monitored_urls (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    owner TEXT NOT NULL,
+                    url_hash TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    host TEXT NOT NULL,
+                    interval_seconds INTEGER NOT NULL,
+                    next_check_at REAL NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_hash TEXT,
+                    rules_version TEXT,
+                    last_verdict TEXT,
+                    failures INTEGER DEFAULT 0,
+                    last_error TEXT,
+                    last_checked_at TIMESTAMP,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE (owner, url_hash)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_monitored_urls_due ON monitored_urls (next_check_at)')
         
-        conn.commit()
-        conn.close()
+        # Миграция: агрегаты для проверок, сохраненных до появления таблиц агрегатов
+        cursor.execute('SELECT EXISTS (SELECT 1 FROM checks) AND NOT EXISTS (SELECT 1 FROM daily_verdicts)')
+        return bool(cursor.fetchone()[0])
     
     def register_user(self, telegram_id: str, username: str, full_name: str, phone: str, gdpr_consent: bool = True) -> bool:
         """
         Регистрация нового пользователя
         
+        Пользователь, отключенный рассылкой (deactivate_users), регистрируется
+        заново: его данные обновляются, is_active снова 1.
+        
         Args:
             telegram_id: ID пользователя в Telegram
             username: Username пользователя
@@ -145,105 +755,30 @@ class Database:
             gdpr_consent: Согласие на обработку данных
             
         Returns:
-            True если регистрация успешна
+            True если регистрация успешна (False — активный пользователь уже есть)
         """
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            
-            if self.use_postgresql:
-                cursor.execute('''
-                    INSERT INTO users (telegram_id, username, full_name, phone, gdpr_consent)
-                    VALUES (%s, %s, %s, %s, %s)
-                ''', (telegram_id, username, full_name, phone, 1 if gdpr_consent else 0))
-            else:
-                cursor.execute('''
-                    INSERT INTO users (telegram_id, username, full_name, phone, gdpr_consent)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (telegram_id, username, full_name, phone, 1 if gdpr_consent else 0))
-            
-            conn.commit()
-            conn.close()
-            return True
+            return self._write('''
+                INSERT INTO users (telegram_id, username, full_name, phone, gdpr_consent)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (telegram_id) DO UPDATE SET
+                    username = excluded.username,
+                    full_name = excluded.full_name,
+                    phone = excluded.phone,
+                    gdpr_consent = excluded.gdpr_consent,
+                    is_active = 1
+                WHERE users.is_active = 0
+            ''', (telegram_id, username, full_name, phone, 1 if gdpr_consent else 0)) > 0
         except Exception as e:
-            if self.use_postgresql:
-                if self.use_psycopg3:
-                    # psycopg3 использует другой тип ошибки
-                    if hasattr(e, 'sqlstate') and e.sqlstate == '23505':  # Unique violation
-                        conn.close()
-                        return False
-                else:
-                    import psycopg2
-                    if isinstance(e, psycopg2.IntegrityError):
-                        # Пользователь уже существует
-                        conn.close()
-                        return False
-            else:
-                if isinstance(e, sqlite3.IntegrityError):
-                    conn.close()
-                    return False
-            print(f"Ошибка регистрации: {e}")
-            conn.close()
+            logger.error("Ошибка регистрации пользователя %s: %s", telegram_id, e, exc_info=True)
             return False
     
     def get_user(self, telegram_id: str) -> Optional[Dict]:
         """Получить пользователя по telegram_id"""
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            
-            if self.use_postgresql:
-                cursor.execute('SELECT * FROM users WHERE telegram_id = %s', (telegram_id,))
-            else:
-                cursor.execute('SELECT * FROM users WHERE telegram_id = ?', (telegram_id,))
-            
-            row = cursor.fetchone()
-            
-            if row:
-                result = None
-                if self.use_postgresql:
-                    if self.use_psycopg3:
-                        # psycopg3 возвращает Row объект (как SQLite)
-                        result = dict(row)
-                    else:
-                        # psycopg2 возвращает tuple, конвертируем в dict
-                        # ВАЖНО: получаем описание ДО закрытия соединения
-                        if cursor.description:
-                            columns = [desc[0] for desc in cursor.description]
-                            # Проверяем что row это tuple или list
-                            if isinstance(row, (tuple, list)):
-                                result = dict(zip(columns, row))
-                            else:
-                                # Если это уже dict-like объект, пытаемся преобразовать
-                                try:
-                                    result = dict(row)
-                                except (TypeError, ValueError):
-                                    # Fallback: создаем словарь вручную
-                                    result = {col: row[i] for i, col in enumerate(columns)}
-                        else:
-                            # Если description недоступен, пытаемся преобразовать напрямую
-                            try:
-                                result = dict(row)
-                            except (TypeError, ValueError):
-                                logger.error(f"Не удалось преобразовать row в dict: {type(row)}")
-                                result = None
-                else:
-                    # SQLite уже возвращает Row объект
-                    result = dict(row)
-                
-                conn.close()
-                return result
-            
-            conn.close()
-            return None
+            return self._fetch('SELECT * FROM users WHERE telegram_id = ?', (telegram_id,), one=True, dicts=True)
         except Exception as e:
-            logger.error(f"Ошибка в get_user для telegram_id {telegram_id}: {e}", exc_info=True)
-            import traceback
-            traceback.print_exc()
-            try:
-                conn.close()
-            except:
-                pass
+            logger.error("Ошибка в get_user для telegram_id %s: %s", telegram_id, e, exc_info=True)
             return None
     
     def is_user_registered(self, telegram_id: str) -> bool:
@@ -252,7 +787,9 @@ class Database:
         return user is not None and user.get('is_active', 0) == 1
     
     def save_check(self, telegram_id: str, material_type: str, material_url: str, 
-                   verdict: str, violations_count: int, report_path: str) -> bool:
+                   verdict: str, violations_count: int, report_path: str,
+                   rules_version: Optional[str] = None, result: Optional[bytes] = None,
+                   violations: Optional[List[tuple]] = None) -> bool:
         """
         Сохранить проверку в базу
         
@@ -263,109 +800,658 @@ class Database:
             verdict: Вердикт
             violations_count: Количество нарушений
             report_path: Путь к отчету
+            rules_version: Версия набора правил, по которой выполнена проверка
+            result: Полный результат анализа (AnalysisResult.to_bytes())
+            violations: Нарушения — список (категория, номер шаблона, фраза, начало, конец)
             
         Returns:
             True если сохранение успешно
         """
-        try:
-            user = self.get_user(telegram_id)
-            if not user:
-                return False
+        return self.save_checks([{
+            'telegram_id': telegram_id,
+            'material_type': material_type,
+            'material_url': material_url,
+            'verdict': verdict,
+            'violations_count': violations_count,
+            'report_path': report_path,
+            'rules_version': rules_version,
+            'result': result,
+            'violations': violations,
+        }]) == 1
+    
+    def save_checks(self, checks: List[Dict]) -> int:
+        """
+        Сохранить пакет проверок одной транзакцией (нарушения — в check_violations)
+        
+        Args:
+            checks: Словари с аргументами save_check
             
-            conn = self._get_connection()
+        Returns:
+            Количество сохраненных проверок (проверки незарегистрированных пользователей пропускаются)
+        """
+        if not checks:
+            return 0
+        
+        try:
+            conn = self._get_connection(write=True)
+            try:
+                cursor = conn.cursor()
+                
+                condition, params = self._in('telegram_id', sorted({check['telegram_id'] for check in checks}))
+                self._execute(cursor, f'SELECT telegram_id, id FROM users WHERE {condition}', params)
+                user_ids = {row[0]: row[1] for row in cursor.fetchall()}
+                
+                # SQLite без RETURNING (до 3.35) — id из lastrowid
+                insert = '''
+                    INSERT INTO checks (user_id, material_type, material_url, verdict, violations_count, report_path,
+                                        rules_version, result)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''' + (' RETURNING id' if self.use_postgresql else '')
+                saved = []
+                violations = []
+                for check in checks:
+                    user_id = user_ids.get(check['telegram_id'])
+                    if user_id is None:
+                        continue
+                    self._execute(cursor, insert, (user_id, check['material_type'], check['material_url'],
+                                                   check['verdict'], check['violations_count'], check['report_path'],
+                                                   check.get('rules_version'), check.get('result')))
+                    check_id = cursor.fetchone()[0] if self.use_postgresql else cursor.lastrowid
+                    violations.extend((check_id, category, pattern_id, phrase, start, end, check_id)
+                                      for category, pattern_id, phrase, start, end in check.get('violations') or ())
+                    saved.append((user_id, check))
+                
+                # Время и версия правил нарушения — как у его проверки
+                if violations:
+                    self._executemany(cursor, '''
+                        INSERT INTO check_violations (check_id, category, pattern_id, phrase, start_pos, end_pos,
+                                                      rules_version, checked_at)
+                        SELECT ?, ?, ?, ?, ?, ?, rules_version, checked_at FROM checks WHERE id = ?
+                    ''', violations)
+                
+                self._add_to_rollups(cursor, saved)
+                
+                conn.commit()
+            finally:
+                conn.close()
+            return len(saved)
+        except Exception as e:
+            logger.error("Ошибка сохранения проверок: %s", e, exc_info=True)
+            return 0
+    
+    def get_check_result(self, check_id: int) -> Optional[bytes]:
+        """Полный результат анализа проверки (для AnalysisResult.from_bytes) или None"""
+        row = self._fetch('SELECT result FROM checks WHERE id = ?', (check_id,), one=True)
+        return bytes(row[0]) if row and row[0] is not None else None
+    
+    def _upsert_rollup(self, cursor, table: str, keys: List[str], rows: List[tuple], day: Optional[str] = None):
+        """Прибавить счетчики к суточным агрегатам: rows — (ключи..., счетчики...) за сегодня или day"""
+        if not rows:
+            return
+        counters = ROLLUP_COUNTERS[table]
+        columns = ', '.join(['day'] + keys + counters)
+        values = ', '.join(['?' if day else 'CURRENT_DATE'] + ['?'] * (len(keys) + len(counters)))
+        updates = ', '.join(f'{c} = {table}.{c} + excluded.{c}' for c in counters)
+        if day:
+            rows = [(day,) + row for row in rows]
+        self._executemany(cursor, f'INSERT INTO {table} ({columns}) VALUES ({values}) '
+                                  f'ON CONFLICT (day, {", ".join(keys)}) DO UPDATE SET {updates}', rows)
+    
+    def _add_to_rollups(self, cursor, saved: List[tuple]):
+        """Учесть сохраненные проверки (user_id, check) в суточных агрегатах и воронке"""
+        if not saved:
+            return
+        
+        verdicts, users, domains = {}, {}, {}
+        violations = Counter()
+        for user_id, check in saved:
+            verdict = check['verdict'] or ''
+            found = check['violations_count'] or 0
+            keys = [(verdicts, (check['material_type'] or '', verdict)), (users, (user_id, verdict))]
+            if check['material_type'] == 'site' and check['material_url']:
+                keys.append((domains, (url_domain(check['material_url']), verdict)))
+            for totals, key in keys:
+                counts = totals.setdefault(key, [0, 0])
+                counts[0] += 1
+                counts[1] += found
+            for category, pattern_id, phrase, _, _ in check.get('violations') or ():
+                violations[(category, pattern_id if pattern_id is not None else -1, phrase or '')] += 1
+        
+        self._upsert_rollup(cursor, 'daily_verdicts', ['material_type', 'verdict'],
+                            [key + tuple(counts) for key, counts in verdicts.items()])
+        self._upsert_rollup(cursor, 'daily_violations', ['category', 'pattern_id', 'phrase'],
+                            [key + (count,) for key, count in violations.items()])
+        self._upsert_rollup(cursor, 'daily_user_checks', ['user_id', 'verdict'],
+                            [key + tuple(counts) for key, counts in users.items()])
+        self._upsert_rollup(cursor, 'daily_domain_checks', ['domain', 'verdict'],
+                            [key + tuple(counts) for key, counts in domains.items()])
+        
+        condition, params = self._in('id', sorted({user_id for user_id, _ in saved}))
+        self._execute(cursor, f'UPDATE users SET first_check_at = CURRENT_TIMESTAMP '
+                              f'WHERE {condition} AND first_check_at IS NULL', params)
+    
+    def rebuild_rollups(self):
+        """
+        Пересчитать суточные агрегаты и первые проверки пользователей из checks
+        и check_violations одной транзакцией (миграция и сверка)
+        """
+        conn = self._get_connection(write=True)
+        try:
             cursor = conn.cursor()
             
-            if self.use_postgresql:
-                cursor.execute('''
-                    INSERT INTO checks (user_id, material_type, material_url, verdict, violations_count, report_path)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                ''', (user['id'], material_type, material_url, verdict, violations_count, report_path))
-            else:
-                cursor.execute('''
-                    INSERT INTO checks (user_id, material_type, material_url, verdict, violations_count, report_path)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (user['id'], material_type, material_url, verdict, violations_count, report_path))
+            for table in ROLLUP_COUNTERS:
+                cursor.execute(f'DELETE FROM {table}')
+            cursor.execute('''
+                INSERT INTO daily_verdicts (day, material_type, verdict, checks, violations)
+                SELECT DATE(checked_at), COALESCE(material_type, ''), COALESCE(verdict, ''), COUNT(*),
+                       COALESCE(SUM(violations_count), 0)
+                FROM checks GROUP BY 1, 2, 3
+            ''')
+            cursor.execute('''
+                INSERT INTO daily_violations (day, category, pattern_id, phrase, violations)
+                SELECT DATE(checked_at), category, COALESCE(pattern_id, -1), COALESCE(phrase, ''), COUNT(*)
+                FROM check_violations GROUP BY 1, 2, 3, 4
+            ''')
+            cursor.execute('''
+                INSERT INTO daily_user_checks (day, user_id, verdict, checks, violations)
+                SELECT DATE(checked_at), user_id, COALESCE(verdict, ''), COUNT(*), COALESCE(SUM(violations_count), 0)
+                FROM checks GROUP BY 1, 2, 3
+            ''')
+            # Домен вычисляется из URL — группировка по нему в Python
+            cursor.execute('''
+                SELECT DATE(checked_at), material_url, COALESCE(verdict, ''), COUNT(*), COALESCE(SUM(violations_count), 0)
+                FROM checks WHERE material_type = 'site' AND material_url IS NOT NULL GROUP BY 1, 2, 3
+            ''')
+            domains = {}
+            for day, url, verdict, checks, found in cursor.fetchall():
+                counts = domains.setdefault((str(day), url_domain(url), verdict), [0, 0])
+                counts[0] += checks
+                counts[1] += found
+            self._executemany(cursor, 'INSERT INTO daily_domain_checks (day, domain, verdict, checks, violations) '
+                                      'VALUES (?, ?, ?, ?, ?)', [key + tuple(counts) for key, counts in domains.items()])
+            # Первые проверки — одним проходом по checks (индекса по user_id нет)
+            cursor.execute('SELECT MIN(checked_at), user_id FROM checks GROUP BY user_id')
+            self._executemany(cursor, 'UPDATE users SET first_check_at = ? WHERE id = ? AND first_check_at IS NULL',
+                              cursor.fetchall())
             
             conn.commit()
+        finally:
             conn.close()
-            return True
-        except Exception as e:
-            print(f"Ошибка сохранения проверки: {e}")
-            return False
     
-    def get_user_checks_count(self, telegram_id: str) -> int:
-        """Получить количество проверок пользователя"""
+    def _period(self, since: datetime, until: Optional[datetime]) -> tuple:
+        """Условие на day и параметры: since включительно, until (если задан) — не включая"""
+        condition = 'day >= ?'
+        params = [since.strftime('%Y-%m-%d')]
+        if until is not None:
+            condition += ' AND day < ?'
+            params.append(until.strftime('%Y-%m-%d'))
+        return condition, params
+    
+    def _bucket(self, bucket: str) -> str:
+        """Выражение периода: сутки или неделя (с понедельника)"""
+        if bucket == 'week':
+            if self.use_postgresql:
+                return "CAST(date_trunc('week', day) AS DATE)"
+            return "DATE(day, 'weekday 0', '-6 days')"
+        return 'day'
+    
+    def get_violation_stats(self, since: datetime, until: Optional[datetime] = None,
+                            patterns: int = 10, phrases: int = 10) -> Dict:
+        """
+        Статистика проверок за период по суточным агрегатам (без разбора результатов)
+        
+        Args:
+            since: Первые сутки периода (UTC, как checked_at)
+            until: Сутки после периода (по умолчанию — без ограничения)
+            patterns: Сколько самых частых шаблонов вернуть
+            phrases: Сколько самых частых фраз вернуть
+            
+        Returns:
+            Dict: checks, verdicts {вердикт: проверок}, categories {категория: нарушений}
+            (по убыванию), patterns [(категория, номер шаблона, нарушений)], phrases [(фраза, нарушений)]
+        """
+        period, params = self._period(since, until)
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            
+            self._execute(cursor, f'SELECT verdict, SUM(checks) FROM daily_verdicts WHERE {period} GROUP BY verdict',
+                          params)
+            verdicts = {row[0]: int(row[1]) for row in cursor.fetchall()}
+            self._execute(cursor, f'SELECT category, SUM(violations) AS n FROM daily_violations WHERE {period} '
+                                  f'GROUP BY category ORDER BY n DESC', params)
+            categories = {row[0]: int(row[1]) for row in cursor.fetchall()}
+            top_patterns = []
+            if patterns:
+                self._execute(cursor, f'SELECT category, pattern_id, SUM(violations) AS n FROM daily_violations '
+                                      f'WHERE {period} GROUP BY category, pattern_id ORDER BY n DESC LIMIT ?',
+                              params + [patterns])
+                top_patterns = [(row[0], row[1], int(row[2])) for row in cursor.fetchall()]
+            top_phrases = []
+            if phrases:
+                self._execute(cursor, f'SELECT phrase, SUM(violations) AS n FROM daily_violations WHERE {period} '
+                                      f'GROUP BY phrase ORDER BY n DESC LIMIT ?', params + [phrases])
+                top_phrases = [(row[0], int(row[1])) for row in cursor.fetchall()]
+            
+        finally:
+            conn.close()
+        return {
+            'checks': sum(verdicts.values()),
+            'verdicts': verdicts,
+            'categories': categories,
+            'patterns': top_patterns,
+            'phrases': top_phrases,
+        }
+    
+    def get_verdict_trend(self, since: datetime, bucket: str = 'week') -> List[Dict]:
+        """
+        Распределение вердиктов по периодам
+        
+        Args:
+            since: Первые сутки
+            bucket: 'day' или 'week'
+            
+        Returns:
+            Список {period, checks, violations, verdicts {вердикт: проверок}} по возрастанию периода
+        """
+        return self._trend('daily_verdicts', None, None, since, bucket)
+    
+    def get_user_trend(self, telegram_id: str, since: datetime, bucket: str = 'week') -> List[Dict]:
+        """Проверки пользователя по периодам (формат get_verdict_trend)"""
         user = self.get_user(telegram_id)
         if not user:
-            return 0
+            return []
+        return self._trend('daily_user_checks', 'user_id', user['id'], since, bucket)
+    
+    def get_domain_trend(self, domain: str, since: datetime, bucket: str = 'week') -> List[Dict]:
+        """Проверки сайтов домена по периодам (формат get_verdict_trend)"""
+        return self._trend('daily_domain_checks', 'domain', url_domain(domain), since, bucket)
+    
+    def _trend(self, table: str, key_column: Optional[str], key, since: datetime, bucket: str) -> List[Dict]:
+        period, params = self._period(since, None)
+        if key_column:
+            period = f'{key_column} = ? AND {period}'
+            params = [key] + params
+        expression = self._bucket(bucket)
         
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        trend = {}
+        for period_start, verdict, checks, found in self._fetch(
+                f'SELECT {expression} AS period, verdict, SUM(checks), SUM(violations) FROM {table} '
+                f'WHERE {period} GROUP BY 1, 2 ORDER BY 1', params):
+            row = trend.setdefault(str(period_start), {'period': str(period_start), 'checks': 0,
+                                                       'violations': 0, 'verdicts': {}})
+            row['checks'] += int(checks)
+            row['violations'] += int(found)
+            row['verdicts'][verdict] = int(checks)
+        return list(trend.values())
+    
+    def get_top_domains(self, since: datetime, limit: int = 10) -> List[Dict]:
+        """Домены с наибольшим числом нарушений за период: [{domain, checks, violations}]"""
+        period, params = self._period(since, None)
+        # domain || '': группировка не по индексу (domain, day) — SQLite читает только дни периода,
+        # а не весь индекс доменов
+        rows = self._fetch(f"SELECT domain || '' AS domain, SUM(checks), SUM(violations) AS n "
+                           f"FROM daily_domain_checks WHERE {period} GROUP BY 1 ORDER BY n DESC LIMIT ?",
+                           params + [limit])
+        return [{'domain': row[0], 'checks': int(row[1]), 'violations': int(row[2])} for row in rows]
+    
+    def get_top_users(self, since: datetime, limit: int = 10) -> List[Dict]:
+        """Пользователи с наибольшим числом проверок за период: [{telegram_id, username, checks, violations}]"""
+        period, params = self._period(since, None)
+        # user_id + 0 — как domain || '' в get_top_domains
+        rows = self._fetch(f'''
+            SELECT u.telegram_id, u.username, t.checks, t.violations
+            FROM (SELECT user_id + 0 AS user_id, SUM(checks) AS checks, SUM(violations) AS violations
+                  FROM daily_user_checks WHERE {period} GROUP BY 1 ORDER BY checks DESC LIMIT ?) t
+            JOIN users u ON u.id = t.user_id
+            ORDER BY t.checks DESC
+        ''', params + [limit])
+        return [{'telegram_id': row[0], 'username': row[1], 'checks': int(row[2]), 'violations': int(row[3])}
+                for row in rows]
+    
+    def get_funnel(self, since: datetime) -> Dict:
+        """
+        Воронка пользователей, зарегистрированных с since
         
+        Returns:
+            Dict: registered, checked (сделали хотя бы одну проверку),
+            checked_first_day (первая проверка в течение суток после регистрации)
+        """
         if self.use_postgresql:
-            cursor.execute('SELECT COUNT(*) FROM checks WHERE user_id = %s', (user['id'],))
+            first_day = "COUNT(*) FILTER (WHERE first_check_at <= registered_at + INTERVAL '1 day')"
         else:
-            cursor.execute('SELECT COUNT(*) FROM checks WHERE user_id = ?', (user['id'],))
+            first_day = "COALESCE(SUM(first_check_at <= DATETIME(registered_at, '+1 day')), 0)"
+        registered, checked, first_day = self._fetch(
+            f'SELECT COUNT(*), COUNT(first_check_at), {first_day} FROM users WHERE registered_at >= ?',
+            (since.strftime('%Y-%m-%d %H:%M:%S'),), one=True)
+        return {'registered': registered, 'checked': checked, 'checked_first_day': first_day}
+    
+    def get_report_file(self, report_hash: str) -> Optional[Dict]:
+        """
+        Получить file_id ранее загруженного в Telegram отчета
         
-        count = cursor.fetchone()[0]
-        conn.close()
-        return count
+        Args:
+            report_hash: Хэш содержимого отчета
+            
+        Returns:
+            Dict с file_id и report_path или None
+        """
+        return self._fetch('SELECT file_id, report_path FROM report_files WHERE report_hash = ?', (report_hash,),
+                           one=True, dicts=True)
     
-    def get_all_users(self) -> List[Dict]:
-        """Получить всех пользователей"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+    def save_report_file(self, report_hash: str, file_id: str, report_path: str) -> bool:
+        """
+        Сохранить file_id загруженного отчета (повторная загрузка обновляет file_id)
         
-        cursor.execute('SELECT * FROM users ORDER BY registered_at DESC')
-        rows = cursor.fetchall()
+        Returns:
+            True если сохранение успешно
+        """
+        try:
+            self._write('''
+                INSERT INTO report_files (report_hash, file_id, report_path)
+                VALUES (?, ?, ?)
+                ON CONFLICT (report_hash) DO UPDATE SET
+                    file_id = excluded.file_id,
+                    report_path = excluded.report_path,
+                    uploads = report_files.uploads + 1,
+                    last_used_at = CURRENT_TIMESTAMP
+            ''', (report_hash, file_id, report_path))
+            return True
+        except Exception as e:
+            print(f"Ошибка сохранения file_id отчета: {e}")
+            return False
+    
+    def mark_report_file_reused(self, report_hash: str):
+        """Учесть повторную отправку отчета по file_id"""
+        self._write('''
+            UPDATE report_files SET reuses = reuses + 1, last_used_at = CURRENT_TIMESTAMP
+            WHERE report_hash = ?
+        ''', (report_hash,))
+    
+    def get_url_snapshot(self, owner: str, url_hash: str) -> Optional[Dict]:
+        """
+        Сегменты последней проверки страницы
         
-        conn.close()
+        Args:
+            owner: Кто проверял (telegram_id)
+            url_hash: Хэш URL страницы
+            
+        Returns:
+            Dict со snapshot (JSON), rules_version и checked_at или None
+        """
+        return self._fetch('''
+            SELECT snapshot, rules_version, checked_at FROM url_snapshots
+            WHERE owner = ? AND url_hash = ?
+        ''', (owner, url_hash), one=True, dicts=True)
+    
+    def save_url_snapshot(self, owner: str, url_hash: str, url: str, rules_version: str, snapshot: str) -> bool:
+        """
+        Сохранить сегменты проверки страницы (заменяет предыдущие)
         
-        if self.use_postgresql:
-            if self.use_psycopg3:
-                # psycopg3 возвращает Row объекты (как SQLite)
-                return [dict(row) for row in rows]
-            else:
-                # psycopg2 возвращает tuples, конвертируем в dicts
-                columns = [desc[0] for desc in cursor.description]
-                return [dict(zip(columns, row)) for row in rows]
-        else:
-            return [dict(row) for row in rows]
+        Returns:
+            True если сохранение успешно
+        """
+        try:
+            self._write('''
+                INSERT INTO url_snapshots (owner, url_hash, url, rules_version, snapshot)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (owner, url_hash) DO UPDATE SET
+                    url = excluded.url,
+                    rules_version = excluded.rules_version,
+                    snapshot = excluded.snapshot,
+                    checked_at = CURRENT_TIMESTAMP
+            ''', (owner, url_hash, url, rules_version, snapshot))
+            return True
+        except Exception as e:
+            logger.error("Ошибка сохранения сегментов страницы: %s", e)
+            return False
     
-    def get_stats(self) -> Dict:
-        """Получить статистику"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+    def add_monitored_url(self, owner: str, url: str, url_hash: str, host: str,
+                          interval_seconds: int, next_check_at: float) -> bool:
+        """
+        Поставить сайт на наблюдение (повторная подписка меняет интервал)
         
-        if self.use_postgresql:
-            cursor.execute('SELECT COUNT(*) FROM users WHERE is_active = 1')
-            total_users = cursor.fetchone()[0]
+        Args:
+            owner: Кто наблюдает (telegram_id)
+            url: URL страницы
+            url_hash: Хэш URL
+            host: Хост (для вежливости к сайту: запросы к нему идут по одному)
+            interval_seconds: Интервал проверок
+            next_check_at: Время первой проверки (unix time)
+            
+        Returns:
+            True если сохранение успешно
+        """
+        least = 'LEAST' if self.use_postgresql else 'MIN'
+        try:
+            self._write(f'''
+                INSERT INTO monitored_urls (owner, url_hash, url, host, interval_seconds, next_check_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (owner, url_hash) DO UPDATE SET
+                    interval_seconds = excluded.interval_seconds,
+                    next_check_at = {least}(monitored_urls.next_check_at, excluded.next_check_at)
+            ''', (owner, url_hash, url, host, interval_seconds, next_check_at))
+            return True
+        except Exception as e:
+            logger.error("Ошибка постановки сайта на наблюдение: %s", e)
+            return False
+    
+    def remove_monitored_url(self, owner: str, url_hash: str) -> bool:
+        """Снять сайт с наблюдения, возвращает True если он наблюдался"""
+        return self._write('DELETE FROM monitored_urls WHERE owner = ? AND url_hash = ?', (owner, url_hash)) > 0
+    
+    def get_monitored_urls(self, owner: str) -> List[Dict]:
+        """Сайты на наблюдении у пользователя"""
+        return self._fetch('''
+            SELECT id, url, interval_seconds, next_check_at, last_verdict, failures, last_checked_at
+            FROM monitored_urls WHERE owner = ? ORDER BY id
+        ''', (owner,), dicts=True)
+    
+    def claim_due_monitored_urls(self, now: float, limit: int, lease_seconds: float) -> List[Dict]:
+        """
+        Забрать сайты, которым пора на проверку
+        
+        Забранным сразу назначается время next_check_at = now + lease_seconds:
+        пока проверка идет, они не выбираются повторно, а если процесс
+        остановится, проверка повторится после перезапуска. Сайты пользователей,
+        заблокировавших бота, не проверяются.
+        
+        Args:
+            now: Текущее время (unix time)
+            limit: Сколько забрать
+            lease_seconds: На сколько отложить забранные
             
-            cursor.execute('SELECT COUNT(*) FROM checks')
-            total_checks = cursor.fetchone()[0]
+        Returns:
+            Строки monitored_urls по возрастанию next_check_at
+        """
+        conn = self._get_connection(write=True)
+        try:
+            cursor = self._cursor(conn, dicts=True)
             
-            cursor.execute('''
-                SELECT COUNT(*) FROM users 
-                WHERE DATE(registered_at) = CURRENT_DATE
-            ''')
-            today_registrations = cursor.fetchone()[0]
-        else:
-            cursor.execute('SELECT COUNT(*) FROM users WHERE is_active = 1')
-            total_users = cursor.fetchone()[0]
+            # PostgreSQL: строки, забранные другим процессом, пропускаются
+            lock = ' FOR UPDATE OF m SKIP LOCKED' if self.use_postgresql else ''
+            self._execute(cursor, f'''
+                SELECT m.id, m.owner, m.url_hash, m.url, m.host, m.interval_seconds, m.next_check_at, m.etag,
+                       m.last_modified, m.content_hash, m.rules_version, m.last_verdict, m.failures
+                FROM monitored_urls m JOIN users u ON u.telegram_id = m.owner
+                WHERE m.next_check_at <= ? AND u.is_active = 1
+                ORDER BY m.next_check_at LIMIT ?{lock}
+            ''', (now, limit))
+            rows = [dict(row) for row in cursor.fetchall()]
             
-            cursor.execute('SELECT COUNT(*) FROM checks')
-            total_checks = cursor.fetchone()[0]
+            if rows:
+                condition, params = self._in('id', [row['id'] for row in rows])
+                self._execute(cursor, f'UPDATE monitored_urls SET next_check_at = ? WHERE {condition}',
+                              [now + lease_seconds] + params)
             
-            cursor.execute('''
-                SELECT COUNT(*) FROM users 
-                WHERE DATE(registered_at) = DATE('now')
-            ''')
-            today_registrations = cursor.fetchone()[0]
+            conn.commit()
+        finally:
+            conn.close()
+        return rows
+    
+    def get_next_monitor_time(self) -> Optional[float]:
+        """Ближайшее время проверки среди сайтов на наблюдении (None — наблюдаемых нет)"""
+        row = self._fetch('''
+            SELECT MIN(m.next_check_at)
+            FROM monitored_urls m JOIN users u ON u.telegram_id = m.owner
+            WHERE u.is_active = 1
+        ''', one=True)
+        return row[0] if row else None
+    
+    def reschedule_monitored_urls(self, planned: List[tuple]):
+        """
+        Перенести проверки сайтов (без изменения их результата) одной транзакцией
+        
+        Args:
+            planned: Список (id, next_check_at)
+        """
+        if not planned:
+            return
+        
+        conn = self._get_connection(write=True)
+        try:
+            cursor = conn.cursor()
+            self._executemany(cursor, 'UPDATE monitored_urls SET next_check_at = ? WHERE id = ?',
+                              [(next_check_at, url_id) for url_id, next_check_at in planned])
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def save_monitored_checks(self, rows: List[Dict]) -> bool:
+        """
+        Сохранить результаты проверок сайтов на наблюдении одной транзакцией
+        
+        Args:
+            rows: Строки из claim_due_monitored_urls с обновленными next_check_at,
+                etag, last_modified, content_hash, rules_version, last_verdict,
+                failures и last_error
+                
+        Returns:
+            True если сохранение успешно
+        """
+        if not rows:
+            return True
+        
+        columns = ['next_check_at', 'etag', 'last_modified', 'content_hash', 'rules_version',
+                   'last_verdict', 'failures', 'last_error']
+        params = [[row.get(column) for column in columns] + [row['id']] for row in rows]
+        assignments = ', '.join(f'{column} = ?' for column in columns)
+        try:
+            conn = self._get_connection(write=True)
+            try:
+                cursor = conn.cursor()
+                self._executemany(cursor, f'UPDATE monitored_urls SET {assignments}, last_checked_at = CURRENT_TIMESTAMP '
+                                          f'WHERE id = ?', params)
+                conn.commit()
+            finally:
+                conn.close()
+            return True
+        except Exception as e:
+            logger.error("Ошибка сохранения проверок сайтов на наблюдении: %s", e, exc_info=True)
+            return False
+    
+    def get_user_checks_count(self, telegram_id: str) -> int:
+        """Получить количество проверок пользователя (по суточным агрегатам)"""
+        row = self._fetch('''
+            SELECT COALESCE(SUM(d.checks), 0) FROM users u JOIN daily_user_checks d ON d.user_id = u.id
+            WHERE u.telegram_id = ?
+        ''', (telegram_id,), one=True)
+        return int(row[0])
+    
+    def get_all_users(self) -> List[Dict]:
+        """Получить всех пользователей"""
+        return self._fetch('SELECT * FROM users ORDER BY registered_at DESC', dicts=True)
+    
+    def iter_active_user_pages(self, page_size: int = 500, after_id: int = 0):
+        """
+        Активные пользователи страницами по возрастанию id (keyset-пагинация)
         
-        conn.close()
+        Каждая страница читается отдельным коротким запросом, поэтому в памяти
+        не больше page_size строк, а соединение не держится во время рассылки.
+        
+        Args:
+            page_size: Размер страницы
+            after_id: Начать после пользователя с этим id (продолжение рассылки)
+            
+        Yields:
+            Список кортежей (id, telegram_id)
+        """
+        while True:
+            page = [(row[0], row[1]) for row in self._fetch('''
+                SELECT id, telegram_id FROM users
+                WHERE is_active = 1 AND id > ?
+                ORDER BY id LIMIT ?
+            ''', (after_id, page_size))]
+            
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            after_id = page[-1][0]
+    
+    def deactivate_users(self, telegram_ids: List[str]) -> int:
+        """
+        Пометить пользователей неактивными одним запросом (заблокировали бота)
+        
+        Returns:
+            Количество обновленных строк
+        """
+        if not telegram_ids:
+            return 0
+        
+        condition, params = self._in('telegram_id', telegram_ids)
+        return self._write(f'UPDATE users SET is_active = 0 WHERE {condition}', params)
+    
+    def create_broadcast(self, text: str) -> int:
+        """Создать рассылку, возвращает ее id"""
+        conn = self._get_connection(write=True)
+        try:
+            cursor = conn.cursor()
+            
+            if self.use_postgresql:
+                broadcast_id = self._execute(cursor, 'INSERT INTO broadcasts (text) VALUES (?) RETURNING id',
+                                             (text,)).fetchone()[0]
+            else:
+                broadcast_id = self._execute(cursor, 'INSERT INTO broadcasts (text) VALUES (?)', (text,)).lastrowid
+            
+            conn.commit()
+        finally:
+            conn.close()
+        return broadcast_id
+    
+    def get_broadcasts(self, status: Optional[str] = None) -> List[Dict]:
+        """Рассылки (все или с указанным статусом)"""
+        query = 'SELECT id, text, status, last_user_id, sent, failed, blocked FROM broadcasts'
+        if status is None:
+            return self._fetch(f'{query} ORDER BY id', dicts=True)
+        return self._fetch(f'{query} WHERE status = ? ORDER BY id', (status,), dicts=True)
+    
+    def update_broadcast(self, broadcast_id: int, last_user_id: int, sent: int, failed: int,
+                         blocked: int, status: str = 'running'):
+        """Сохранить прогресс рассылки (контрольная точка)"""
+        self._write('''
+            UPDATE broadcasts
+            SET last_user_id = ?, sent = ?, failed = ?, blocked = ?, status = ?,
+                finished_at = CASE WHEN ? THEN CURRENT_TIMESTAMP ELSE finished_at END
+            WHERE id = ?
+        ''', (last_user_id, sent, failed, blocked, status, status != 'running', broadcast_id))
+    
+    def get_stats(self) -> Dict:
+        """Получить статистику (одним запросом; проверки — по суточным агрегатам)"""
+        row = self._fetch('''
+            SELECT (SELECT COUNT(*) FROM users WHERE is_active = 1),
+                   (SELECT COALESCE(SUM(checks), 0) FROM daily_verdicts),
+                   (SELECT COUNT(*) FROM users WHERE registered_at >= CURRENT_DATE),
+                   (SELECT COALESCE(SUM(uploads), 0) FROM report_files),
+                   (SELECT COALESCE(SUM(reuses), 0) FROM report_files)
+        ''', one=True)
         
         return {
-            'total_users': total_users,
-            'total_checks': total_checks,
-            'today_registrations': today_registrations
+            'total_users': row[0],
+            'total_checks': int(row[1]),
+            'today_registrations': row[2],
+            # Загрузки PDF и повторные отправки по file_id
+            'report_uploads': int(row[3]),
+            'report_reuses': int(row[4])
         }
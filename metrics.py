@@ -0,0 +1,358 @@
+"""
+Метрики бота: счетчики, gauge и гистограммы длительности этапов проверки
+Отдаются в текстовом формате Prometheus по HTTP и сводкой в /stats
+"""
+import bisect
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм длительности (секунды)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Базовый класс: имя, описание, метки и дочерние серии по значениям меток"""
+
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Серия с заданными значениями меток (создается при первом обращении)"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _series(self) -> List[Tuple[Tuple[str, ...], object]]:
+        if not self.labelnames:
+            return [((), self._default)]
+        # Копия под блокировкой: labels() из другого потока может добавить серию во время обхода
+        with self._lock:
+            return list(self._children.items())
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        for values, child in self._series():
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child) -> List[str]:
+        return [f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}']
+
+
+class _Value:
+    """Значение счетчика или gauge"""
+
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    """Текущее значение (задачи в работе, длина очереди)"""
+
+    type_name = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._default.dec(amount)
+
+    def set(self, value: float):
+        self._default.set(value)
+
+
+class _Timer:
+    """Контекстный менеджер: записывает длительность блока в гистограмму"""
+
+    __slots__ = ('_histogram', '_started')
+
+    def __init__(self, histogram: '_HistogramValue'):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._started)
+        return False
+
+
+class _HistogramValue:
+    """Одна серия гистограммы: счетчики по корзинам, сумма и количество"""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Оценка квантиля по корзинам (линейная интерполяция внутри корзины)"""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            if seen + count >= rank and count:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+
+class Histogram(_Metric):
+    """Гистограмма длительностей с фиксированными корзинами"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.bounds)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def time(self) -> _Timer:
+        return self._default.time()
+
+    def _render_child(self, values, child) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float('inf'),), child.counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f'{self.name}_sum{labels} {child.sum!r}')
+        lines.append(f'{self.name}_count{labels} {child.count}')
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """Gauge, значение которого вычисляется при выдаче метрик (длина очереди пула и т.п.)"""
+
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], Dict[Tuple[str, ...], float]],
+                 labelnames: Sequence[str] = ()):
+        self.callback = callback
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _Value()
+
+    def _series(self):
+        try:
+            values = self.callback()
+        except Exception as e:
+            logger.warning("Ошибка вычисления метрики %s: %s", self.name, e)
+            return []
+        series = []
+        for labels, value in values.items():
+            child = _Value()
+            child.value = value
+            series.append((labels, child))
+        return series
+
+
+class Registry:
+    """Реестр метрик процесса"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'inspector_stage_seconds', 'Длительность этапов проверки', ['stage']
+))
+CHECKS_TOTAL = REGISTRY.register(Counter(
+    'inspector_checks_total', 'Завершенные проверки по типу материала и вердикту', ['material_type', 'verdict']
+))
+ERRORS_TOTAL = REGISTRY.register(Counter(
+    'inspector_errors_total', 'Ошибки по этапам', ['stage']
+))
+CHECKS_IN_FLIGHT = REGISTRY.register(Gauge(
+    'inspector_checks_in_flight', 'Проверки в работе'
+))
+HTTP_FETCH_IN_FLIGHT = REGISTRY.register(Gauge(
+    'inspector_http_fetch_in_flight', 'Загрузки страниц сайтов в работе'
+))
+PAGE_ENCODING_TOTAL = REGISTRY.register(Counter(
+    'inspector_page_encoding_total', 'Откуда взята кодировка страницы (corrected — объявленная не совпала с содержимым)', ['source']
+))
+RECHECK_SEGMENTS_TOTAL = REGISTRY.register(Counter(
+    'inspector_recheck_segments_total', 'Сегменты страниц при проверке URL: взяты из кэша или проанализированы', ['result']
+))
+MONITOR_CHECKS_TOTAL = REGISTRY.register(Counter(
+    'inspector_monitor_checks_total', 'Проверки сайтов на наблюдении по исходу', ['result']
+))
+MONITOR_ALERTS_TOTAL = REGISTRY.register(Counter(
+    'inspector_monitor_alerts_total', 'Уведомления о смене вердикта сайта на наблюдении'
+))
+MONITOR_LAG_SECONDS = REGISTRY.register(Histogram(
+    'inspector_monitor_lag_seconds', 'Опоздание проверки сайта на наблюдении относительно срока',
+    buckets=(1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+))
+API_REQUESTS_TOTAL = REGISTRY.register(Counter(
+    'inspector_api_requests_total', 'Запросы HTTP API по методу и коду ответа', ['endpoint', 'status']
+))
+DB_CONNECTIONS_OPEN = REGISTRY.register(Gauge(
+    'inspector_db_connections_open', 'Открытые соединения с базой данных'
+))
+DB_CONNECTIONS_TOTAL = REGISTRY.register(Counter(
+    'inspector_db_connections_total', 'Открытые за все время соединения с базой данных'
+))
+DB_WRITE_WAIT_SECONDS = REGISTRY.register(Histogram(
+    'inspector_db_write_wait_seconds', 'Ожидание соединения записи SQLite в очереди',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+))
+
+
+def stage_timer(stage: str) -> _Timer:
+    """with stage_timer('fetch'): ... — длительность этапа в inspector_stage_seconds"""
+    return STAGE_SECONDS.labels(stage).time()
+
+
+def summary() -> Dict:
+    """Сводка для /stats: p50/p95 по этапам, вердикты, проверки в работе"""
+    stages = {}
+    for (stage,), child in sorted(STAGE_SECONDS._series()):
+        if child.count:
+            stages[stage] = {
+                'count': child.count,
+                'p50': child.quantile(0.5),
+                'p95': child.quantile(0.95),
+            }
+    verdicts: Dict[str, float] = {}
+    for (_, verdict), child in CHECKS_TOTAL._series():
+        verdicts[verdict] = verdicts.get(verdict, 0) + child.value
+    errors = {stage: child.value for (stage,), child in ERRORS_TOTAL._series()}
+    return {
+        'stages': stages,
+        'verdicts': verdicts,
+        'errors': errors,
+        'in_flight': CHECKS_IN_FLIGHT._default.value,
+    }
+
+
+def start_http_server(port: int, host: str = '127.0.0.1', registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """Запускает HTTP-сервер метрик (GET /metrics) в фоновом потоке"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            data = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info("Метрики доступны на http://%s:%s/metrics", host, port)
+    return server
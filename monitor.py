@@ -0,0 +1,395 @@
+"""
+Наблюдение за сайтами: периодическая повторная проверка подписанных URL
+Проверки распределяются во времени со случайным разбросом, запросы к одному
+хосту идут по одному и с паузой, неизменившиеся страницы отсекаются условным
+GET (ETag / Last-Modified) и хэшем содержимого. Пользователь получает
+сообщение, только когда меняется вердикт. Расписание хранится в базе
+(monitored_urls) и переживает перезапуск
+"""
+import asyncio
+import hashlib
+import heapq
+import itertools
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from analyzer.charset import decode_html
+from analyzer.incremental import IncrementalAnalyzer, url_hash
+from metrics import ERRORS_TOTAL, MONITOR_ALERTS_TOTAL, MONITOR_CHECKS_TOTAL, MONITOR_LAG_SECONDS
+from tracing import finish_trace, set_trace_fields, span, start_trace
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+# Таймаут загрузки страницы (секунды) и ее максимальный размер (байты)
+FETCH_TIMEOUT = 10
+MAX_PAGE_BYTES = 5 * 1024 * 1024
+# Тело ответа читается частями такого размера (байты)
+READ_CHUNK_BYTES = 64 * 1024
+# Опрос базы не реже (секунды): новые подписки и сроки проверок
+POLL_INTERVAL = 30.0
+# Страница, которую не удалось загрузить, проверяется снова через
+# RETRY_BASE_SECONDS, затем вдвое реже (но не реже обычного интервала)
+RETRY_BASE_SECONDS = 300
+# В памяти ждут только проверки, чей слот хоста наступит не позже чем через
+# HOST_QUEUE_SLOTS пауз; остальные откладываются в базе до своего слота
+HOST_QUEUE_SLOTS = 2
+# Первая проверка после подписки — в пределах этого времени (секунды)
+FIRST_CHECK_SPREAD = 600.0
+# Результаты проверок пишутся в базу порциями: не реже раза в FLUSH_INTERVAL
+# секунд или при FLUSH_BATCH готовых (до записи строку держит аренда)
+FLUSH_INTERVAL = 1.0
+FLUSH_BATCH = 64
+
+
+class FetchResult(NamedTuple):
+    """Ответ сайта: status 304 — страница не изменилась (body и text пустые)"""
+    status: int
+    body: bytes
+    text: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+
+def host_of(url: str) -> str:
+    return (urlsplit(url).hostname or '').lower()
+
+
+class PageFetcher:
+    """Загрузка страниц с условным GET через общий пул соединений aiohttp"""
+
+    def __init__(self, timeout: float = FETCH_TIMEOUT, max_bytes: int = MAX_PAGE_BYTES):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def fetch(self, url: str, etag: Optional[str] = None,
+                    last_modified: Optional[str] = None) -> FetchResult:
+        """
+        Загружает страницу; с etag/last_modified сайт может ответить 304
+
+        Raises:
+            aiohttp.ClientError, asyncio.TimeoutError, ValueError: при ошибке загрузки
+        """
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                headers={'User-Agent': USER_AGENT},
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        async with self._session.get(url, headers=headers) as response:
+            if response.status == 304:
+                return FetchResult(304, b'', '', response.headers.get('ETag') or etag,
+                                   response.headers.get('Last-Modified') or last_modified)
+            response.raise_for_status()
+            # read(n) возвращает то, что уже пришло, а не n байт — читаем до конца ответа
+            chunks = []
+            size = 0
+            async for chunk in response.content.iter_chunked(READ_CHUNK_BYTES):
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise ValueError(f"страница больше {self.max_bytes // (1024 * 1024)} МБ")
+                chunks.append(chunk)
+            body = b''.join(chunks)
+            text = decode_html(body, response.headers.get('Content-Type'))
+            return FetchResult(response.status, body, text,
+                               response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+# notify(bot, строка monitored_urls, результат анализа, прошлый вердикт, сравнение с прошлой проверкой)
+Notify = Callable[..., Awaitable]
+
+
+class UrlMonitor:
+    """
+    Планировщик проверок сайтов на наблюдении
+
+    Сайты, которым пора на проверку, забираются из базы порциями (не больше
+    max_pending в памяти) с арендой: пока проверка идет, строка не выбирается
+    снова, а после сбоя процесса проверка повторится, когда аренда истечет.
+    Каждой забранной проверке назначается слот хоста: к одному хосту — один
+    запрос за раз и не чаще, чем раз в host_delay секунд. Проверки крупного
+    хоста, до слота которых далеко, возвращаются в базу со сроком, равным
+    слоту, и не занимают место проверок других сайтов.
+    Следующая проверка назначается через интервал ± jitter, поэтому подписки,
+    сделанные одновременно, со временем расходятся.
+    """
+
+    def __init__(self, db, incremental_analyzer: IncrementalAnalyzer, notify: Notify,
+                 fetcher: Optional[PageFetcher] = None, concurrency: int = 8,
+                 host_delay: float = 5.0, jitter: float = 0.1, lease_seconds: float = 900.0,
+                 max_pending: Optional[int] = None):
+        """
+        Args:
+            db: Database (таблица monitored_urls)
+            incremental_analyzer: Анализатор повторных проверок (сравнение с прошлой проверкой)
+            notify: Корутина уведомления пользователя о смене вердикта
+            fetcher: Загрузчик страниц (по умолчанию — PageFetcher)
+            concurrency: Одновременных проверок
+            host_delay: Пауза между запросами к одному хосту (секунды)
+            jitter: Разброс интервала (доля: 0.1 — ±10%)
+            lease_seconds: Аренда забранной проверки (больше времени одной проверки)
+            max_pending: Проверок в памяти (в работе и ожидающих хоста)
+        """
+        self.db = db
+        self.incremental_analyzer = incremental_analyzer
+        self.notify = notify
+        self.fetcher = fetcher or PageFetcher()
+        self.concurrency = concurrency
+        self.host_delay = host_delay
+        self.jitter = jitter
+        self.lease_seconds = lease_seconds
+        self.max_pending = max_pending or concurrency * 16
+        self.bot = None
+        self.stats = {'not_modified': 0, 'unchanged': 0, 'analyzed': 0, 'error': 0, 'alerts': 0}
+        # (время старта, порядковый номер, строка) — ожидающие своего хоста
+        self._queue: List[Tuple[float, int, Dict]] = []
+        self._seq = itertools.count()
+        # Хост → время, с которого свободен следующий слот (при планировании)
+        self._host_ready: Dict[str, float] = {}
+        # Проверка, отложенная в базу, → ее слот хоста
+        self._reserved: Dict[int, float] = {}
+        # Хост → время окончания последнего запроса
+        self._host_done: Dict[str, float] = {}
+        self._busy_hosts: Set[str] = set()
+        self._running: Set[asyncio.Task] = set()
+        self._wake = asyncio.Event()
+        self._next_poll = 0.0
+        # Готовые результаты, еще не записанные в базу
+        self._finished: List[Dict] = []
+        self._flushed_at = time.time()
+        self._loop_task: Optional[asyncio.Task] = None
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._running)
+
+    def next_interval(self, interval_seconds: float) -> float:
+        return interval_seconds * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def subscribe(self, owner: str, url: str, interval_seconds: int) -> bool:
+        """Ставит сайт на наблюдение; первая проверка — в пределах FIRST_CHECK_SPREAD"""
+        first_check = time.time() + random.uniform(0, min(interval_seconds, FIRST_CHECK_SPREAD))
+        return self.db.add_monitored_url(owner, url, url_hash(url), host_of(url), interval_seconds, first_check)
+
+    def unsubscribe(self, owner: str, url: str) -> bool:
+        return self.db.remove_monitored_url(owner, url_hash(url))
+
+    def wake(self):
+        """Опросить базу сейчас (после подписки)"""
+        self._next_poll = 0.0
+        self._wake.set()
+
+    def start(self, bot=None) -> asyncio.Task:
+        """Запускает планировщик в текущем цикле событий"""
+        self.bot = bot
+        self._loop_task = asyncio.create_task(self._run(), name='url_monitor')
+        return self._loop_task
+
+    async def stop(self):
+        """
+        Останавливает планировщик: идущие проверки завершаются, ожидающие
+        возвращаются в базу с прежним сроком (после перезапуска — сразу)
+        """
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+        if self._running:
+            await asyncio.gather(*list(self._running), return_exceptions=True)
+        await self._flush()
+        if self._queue:
+            planned = [(row['id'], row['next_check_at']) for _, _, row in self._queue]
+            self._queue.clear()
+            await asyncio.to_thread(self.db.reschedule_monitored_urls, planned)
+        await self.fetcher.close()
+
+    async def _run(self):
+        while True:
+            try:
+                await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Ошибка базы не останавливает наблюдение
+                ERRORS_TOTAL.labels('monitor').inc()
+                logger.error("Ошибка планировщика наблюдения: %s", e, exc_info=True)
+                self._next_poll = time.time() + POLL_INTERVAL
+
+            now = time.time()
+            deadlines = []
+            if self._queue and len(self._running) < self.concurrency:
+                deadlines.append(self._queue[0][0])
+            if self._can_poll():
+                deadlines.append(self._next_poll)
+            if self._finished:
+                deadlines.append(self._flushed_at + FLUSH_INTERVAL)
+            timeout = min([POLL_INTERVAL] + [deadline - now for deadline in deadlines])
+            self._wake.clear()
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _can_poll(self) -> bool:
+        """База опрашивается порциями: когда освободилась четверть места или очередь пуста"""
+        capacity = self.max_pending - len(self._queue) - len(self._running)
+        return capacity >= self.max_pending // 4 or (capacity > 0 and not self._queue)
+
+    async def _flush(self):
+        rows, self._finished = self._finished, []
+        self._flushed_at = time.time()
+        if rows:
+            await asyncio.to_thread(self.db.save_monitored_checks, rows)
+            # Короткий интервал может наступить раньше запланированного опроса
+            self._next_poll = min(self._next_poll, min(row['next_check_at'] for row in rows))
+
+    async def _tick(self):
+        now = time.time()
+        if len(self._finished) >= FLUSH_BATCH or (self._finished and now >= self._flushed_at + FLUSH_INTERVAL):
+            await self._flush()
+        if now >= self._next_poll and self._can_poll():
+            capacity = self.max_pending - len(self._queue) - len(self._running)
+            rows = await asyncio.to_thread(self.db.claim_due_monitored_urls, now, capacity, self.lease_seconds)
+            deferred = self._plan(rows, now)
+            if deferred:
+                await asyncio.to_thread(self.db.reschedule_monitored_urls, deferred)
+            if len(rows) < capacity:
+                # Все, что пора проверить, забрано: следующий опрос — к ближайшему сроку
+                next_due = await asyncio.to_thread(self.db.get_next_monitor_time)
+                self._next_poll = now + POLL_INTERVAL if next_due is None else max(next_due, now + 1.0)
+        self._dispatch(time.time())
+
+    def _plan(self, rows: List[Dict], now: float) -> List[Tuple[int, float]]:
+        """Назначает время старта с учетом хоста; возвращает (id, срок) проверок, отложенных в базу"""
+        if len(self._host_ready) > 4 * self.max_pending:
+            self._host_ready = {host: t for host, t in self._host_ready.items() if t > now}
+            self._host_done = {host: t for host, t in self._host_done.items() if t + self.host_delay > now}
+        if len(self._reserved) > 4 * self.max_pending:
+            # Слоты снятых с наблюдения сайтов
+            self._reserved = {url_id: t for url_id, t in self._reserved.items() if t + self.lease_seconds > now}
+        deferred = []
+        for row in rows:
+            start = self._reserved.pop(row['id'], None)
+            if start is None:
+                host = row['host']
+                start = max(now, self._host_ready.get(host, 0.0))
+                self._host_ready[host] = start + self.host_delay
+            if start - now > self.host_delay * HOST_QUEUE_SLOTS:
+                self._reserved[row['id']] = start
+                deferred.append((row['id'], start))
+                continue
+            heapq.heappush(self._queue, (max(start, now), next(self._seq), row))
+        return deferred
+
+    def _dispatch(self, now: float):
+        while self._queue and self._queue[0][0] <= now and len(self._running) < self.concurrency:
+            _, _, row = heapq.heappop(self._queue)
+            host = row['host']
+            free_at = self._host_done.get(host, 0.0) + self.host_delay
+            if host in self._busy_hosts or free_at > now:
+                # Предыдущий запрос к хосту еще идет или закончился недавно
+                later = max(free_at, now + self.host_delay) if host in self._busy_hosts else free_at
+                heapq.heappush(self._queue, (later, next(self._seq), row))
+                continue
+            self._busy_hosts.add(host)
+            MONITOR_LAG_SECONDS.observe(max(0.0, now - row['next_check_at']))
+            task = asyncio.create_task(self._check_traced(row), name=f"monitor:{row['id']}")
+            self._running.add(task)
+            task.add_done_callback(lambda t, host=host: self._done(t, host))
+
+    def _done(self, task: asyncio.Task, host: str):
+        self._running.discard(task)
+        self._busy_hosts.discard(host)
+        self._host_done[host] = time.time()
+        if not task.cancelled() and task.exception():
+            ERRORS_TOTAL.labels('monitor').inc()
+            logger.error("Ошибка проверки сайта на наблюдении: %s", task.exception(), exc_info=task.exception())
+        self._wake.set()
+
+    async def _check_traced(self, row: Dict):
+        trace = start_trace('monitor', url_id=row['id'])
+        try:
+            outcome = await self.check(row)
+            trace.fields['outcome'] = outcome
+        finally:
+            finish_trace(trace)
+
+    async def check(self, row: Dict) -> str:
+        """
+        Проверяет сайт; результат и срок следующей проверки запишутся в базу
+        со следующей порцией
+
+        Returns:
+            not_modified (304), unchanged (тот же хэш содержимого), analyzed или error
+        """
+        rules_version = self.incremental_analyzer.analyzer.rules.version
+        # После смены правил страница анализируется заново, даже если не менялась
+        same_rules = row['rules_version'] == rules_version
+        try:
+            with span('monitor_fetch'):
+                page = await self.fetcher.fetch(row['url'], row['etag'] if same_rules else None,
+                                                row['last_modified'] if same_rules else None)
+        except Exception as e:
+            row['failures'] = (row['failures'] or 0) + 1
+            row['last_error'] = str(e)[:500] or type(e).__name__
+            retry = min(row['interval_seconds'], RETRY_BASE_SECONDS * 2 ** (row['failures'] - 1))
+            row['next_check_at'] = time.time() + self.next_interval(retry)
+            logger.info("Наблюдение: не удалось загрузить %s: %s", row['url'], row['last_error'])
+            return await self._finish(row, 'error')
+
+        row['failures'] = 0
+        row['last_error'] = None
+        row['etag'], row['last_modified'] = page.etag, page.last_modified
+        outcome = 'not_modified'
+        if page.status != 304:
+            content_hash = hashlib.sha256(page.body).hexdigest()
+            outcome = 'unchanged'
+            if not same_rules or content_hash != row['content_hash']:
+                outcome = 'analyzed'
+                result, diff = await asyncio.to_thread(
+                    self.incremental_analyzer.analyze_html, page.text, row['url'], row['owner']
+                )
+                previous_verdict = row['last_verdict']
+                row.update(content_hash=content_hash, rules_version=result.rules_version,
+                           last_verdict=result.verdict)
+                set_trace_fields(verdict=result.verdict)
+                # Первая проверка — точка отсчета; сообщаем только о смене вердикта
+                if previous_verdict is not None and previous_verdict != result.verdict:
+                    await self._alert(row, result, previous_verdict, diff)
+        row['next_check_at'] = time.time() + self.next_interval(row['interval_seconds'])
+        return await self._finish(row, outcome)
+
+    async def _alert(self, row: Dict, result, previous_verdict: str, diff: Optional[Dict]):
+        self.stats['alerts'] += 1
+        MONITOR_ALERTS_TOTAL.inc()
+        try:
+            await self.notify(self.bot, row, result, previous_verdict, diff)
+        except Exception as e:
+            ERRORS_TOTAL.labels('monitor_notify').inc()
+            logger.error("Ошибка уведомления о смене вердикта %s: %s", row['url'], e, exc_info=True)
+
+    async def _finish(self, row: Dict, outcome: str) -> str:
+        self.stats[outcome] += 1
+        MONITOR_CHECKS_TOTAL.labels(outcome).inc()
+        self._finished.append(row)
+        return outcome
@@ -0,0 +1,278 @@
+"""
+Конвейер проверки материала: этапы после анализа
+Краткий ответ, рендеринг PDF и запись в базу выполняются параллельно:
+рендеринг начинается сразу после анализа, запись в базу не задерживает ответ
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from telegram import Message
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, TelegramError
+
+from analyzer.material_analyzer import MaterialAnalyzer
+from metrics import CHECKS_TOTAL, ERRORS_TOTAL
+from tracing import set_trace_fields, span
+from analyzer.results import AnalysisResult
+from reports.report_generator import ReportGenerator
+from reports.store import ReportStore
+from sender import OutboundScheduler, ProgressMessage
+
+logger = logging.getLogger(__name__)
+
+PDF_CAPTION = "📄 Полный PDF-отчет с детальными рекомендациями"
+
+# Проверки записываются в базу пакетами: не реже раза в секунду или по 64
+CHECK_FLUSH_INTERVAL = 1.0
+CHECK_FLUSH_BATCH = 64
+
+
+class CheckPipeline:
+    """
+    Этапы проверки после анализа
+
+    brief  — краткий отчет в чат;
+    report — верстка (если есть) → HTML → PDF в пуле рендеринга → отправка
+             (уже загруженный отчет отправляется по file_id);
+    store  — запись PDF в хранилище в фоне и проверки в базу пакетами.
+
+    PDF рендерится одновременно с отправкой краткого отчета, но отправляется
+    после него, чтобы порядок сообщений в чате не менялся.
+    """
+
+    def __init__(self, analyzer: MaterialAnalyzer, report_generator: ReportGenerator,
+                 report_store: ReportStore, db, render_pdf: Callable[[str], Awaitable[bytes]],
+                 sender: Optional[OutboundScheduler] = None):
+        """
+        Args:
+            analyzer: Анализатор (для учета верстки в вердикте)
+            report_generator: Генератор отчетов
+            report_store: Хранилище PDF-отчетов
+            db: Database
+            render_pdf: Корутина рендеринга HTML в PDF (обычно через пул процессов)
+            sender: Планировщик исходящих запросов (лимиты Telegram)
+        """
+        self.analyzer = analyzer
+        self.report_generator = report_generator
+        self.report_store = report_store
+        self.db = db
+        self.render_pdf = render_pdf
+        self.sender = sender or OutboundScheduler()
+        self._background: Set[asyncio.Task] = set()
+        self._pending_checks: List[Dict] = []
+        self._flush_scheduled = False
+
+    def _spawn(self, coro, name: str) -> asyncio.Task:
+        """Фоновая задача: ссылка хранится до завершения, ошибки логируются"""
+        task = asyncio.create_task(coro, name=name)
+        self._background.add(task)
+
+        def _done(t: asyncio.Task):
+            self._background.discard(t)
+            if not t.cancelled() and t.exception():
+                logger.error("Ошибка фоновой задачи %s: %s", name, t.exception(), exc_info=t.exception())
+
+        task.add_done_callback(_done)
+        return task
+
+    @staticmethod
+    async def _in_thread(stage: str, fn, *args, **kwargs):
+        """Блокирующий вызов (база, диск) в потоке с учетом длительности этапа"""
+        with span(stage):
+            return await asyncio.to_thread(fn, *args, **kwargs)
+
+    def _record_check(self, check: Dict):
+        """Ставит проверку в очередь записи: пакет уходит через CHECK_FLUSH_INTERVAL или при CHECK_FLUSH_BATCH"""
+        self._pending_checks.append(check)
+        if len(self._pending_checks) >= CHECK_FLUSH_BATCH:
+            self._spawn(self._flush_checks(), name='save_checks')
+        elif not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._spawn(self._flush_checks_later(), name='save_checks')
+
+    async def _flush_checks_later(self):
+        await asyncio.sleep(CHECK_FLUSH_INTERVAL)
+        self._flush_scheduled = False
+        await self._flush_checks()
+
+    async def _flush_checks(self):
+        checks, self._pending_checks = self._pending_checks, []
+        if checks:
+            await self._in_thread('db', self.db.save_checks, checks)
+
+    def state(self) -> Dict:
+        """Проверки, ожидающие записи в базу, и фоновые задачи (для снимка состояния)"""
+        return {'pending_checks': len(self._pending_checks), 'background_tasks': len(self._background)}
+
+    async def drain(self):
+        """Дожидается фоновых задач (при остановке и в бенчмарках)"""
+        while self._background:
+            await asyncio.gather(*list(self._background), return_exceptions=True)
+
+    async def _send_text(self, message: Message, progress: Optional[ProgressMessage], text: str, **kwargs):
+        if progress is not None:
+            # Краткий отчет заменяет сообщение о ходе проверки
+            await progress.finish(text, **kwargs)
+        else:
+            await self.sender.call(message.chat_id, message.reply_text, text, **kwargs)
+
+    async def _send_brief(self, message: Message, analysis_result: AnalysisResult, material_info: Dict,
+                          progress: Optional[ProgressMessage], diff: Optional[Dict] = None):
+        brief_text = self.report_generator.generate_brief(analysis_result, material_info, diff)
+        try:
+            with span('brief'):
+                try:
+                    await self._send_text(message, progress, brief_text, parse_mode=ParseMode.MARKDOWN)
+                except BadRequest as e:
+                    # Разметка не разобрана ("can't parse entities") — вердикт важнее форматирования
+                    logger.warning("Краткий отчет не принят с Markdown, отправляю без разметки: %s", e)
+                    await self._send_text(message, progress, brief_text)
+        except Exception as e:
+            ERRORS_TOTAL.labels('brief').inc()
+            logger.error("Ошибка отправки краткого отчета: %s", e, exc_info=True)
+
+    async def run(self, message: Message, telegram_id: str, analysis_result: AnalysisResult,
+                  material_info: Dict, material_type: str, material_url: str,
+                  layout_task: Optional[asyncio.Task] = None,
+                  progress: Optional[ProgressMessage] = None,
+                  diff: Optional[Dict] = None) -> Dict:
+        """
+        Выполняет этапы проверки после анализа
+
+        Args:
+            message: Сообщение пользователя (ответы отправляются в его чат)
+            telegram_id: ID пользователя
+            analysis_result: Результат анализа
+            material_info: Информация о материале
+            material_type: Тип материала для базы
+            material_url: URL или начало текста для базы
+            layout_task: Задача измерения верстки (для сайтов)
+            progress: Сообщение о ходе проверки (краткий отчет заменит его текст)
+            diff: Сравнение с прошлой проверкой страницы (в краткий отчет)
+
+        Returns:
+            Длительности этапов в секундах (brief, report, total)
+        """
+        started = time.perf_counter()
+        timings = {}
+
+        # Краткий отчет уходит в сеть, пока готовится PDF
+        brief_task = asyncio.create_task(self._send_brief(message, analysis_result, material_info, progress, diff))
+        brief_task.add_done_callback(lambda _: timings.setdefault('brief', time.perf_counter() - started))
+
+        try:
+            # Учитываем верстку страницы (размер и видимость дисклеймера)
+            caption_note = ""
+            if layout_task is not None:
+                text_verdict = analysis_result.verdict
+                self.analyzer.apply_layout(analysis_result, await layout_task)
+                if analysis_result.verdict != text_verdict:
+                    caption_note = (
+                        f"\n⚠️ С учетом верстки страницы вердикт: "
+                        f"{analysis_result.verdict.replace('_', ' ')}"
+                    )
+
+            # HTML без встроенных стилей: для PDF они уже разобраны
+            with span('report_html'):
+                html_content = self.report_generator.generate_html(analysis_result, material_info, embed_css=False)
+            report_path = await self._send_pdf(message, html_content, PDF_CAPTION + caption_note, brief_task)
+        except Exception as e:
+            ERRORS_TOTAL.labels('report').inc()
+            logger.error("Ошибка при генерации/отправке PDF: %s", e, exc_info=True)
+            await brief_task
+            await self.sender.call(
+                message.chat_id, message.reply_text,
+                f"❌ Ошибка при создании PDF-отчета: {str(e)}\n\n"
+                "Попробуй еще раз или отправь текст материала."
+            )
+            return timings
+        timings['report'] = time.perf_counter() - started
+        CHECKS_TOTAL.labels(material_type, analysis_result.verdict).inc()
+        set_trace_fields(material_type=material_type, verdict=analysis_result.verdict,
+                         violations=analysis_result.total_violations)
+
+        # Запись в базу — вне критического пути ответа, пакетами
+        self._record_check({
+            'telegram_id': telegram_id,
+            'material_type': material_type,
+            'material_url': material_url,
+            'verdict': analysis_result.verdict,
+            'violations_count': analysis_result.total_violations,
+            'report_path': report_path,
+            'rules_version': analysis_result.rules_version,
+            'result': analysis_result.to_bytes(),
+            'violations': [(v.category, v.pattern_id, v.phrase, v.start, v.end) for v in analysis_result.violations],
+        })
+
+        timings['total'] = time.perf_counter() - started
+        return timings
+
+    async def _send_pdf(self, message: Message, html_content: str, caption: str,
+                        brief_task: asyncio.Task) -> Optional[str]:
+        """
+        Рендерит и отправляет PDF; уже загруженный отчет отправляется по file_id
+
+        Ключ — хэш HTML-отчета: он включает результат анализа, материал, версию
+        правил и дату, поэтому одинаковый HTML дает одинаковый PDF.
+
+        Returns:
+            Путь к PDF-отчету в хранилище (None, если сохранить не удалось)
+        """
+        report_hash = ReportStore.digest(html_content.encode('utf-8'))
+
+        cached = await self._in_thread('db', self.db.get_report_file, report_hash)
+        if cached:
+            await brief_task
+            try:
+                with span('resend'):
+                    await self.sender.call(message.chat_id, message.reply_document,
+                                           document=cached['file_id'], caption=caption)
+                self._spawn(self._in_thread('db', self.db.mark_report_file_reused, report_hash),
+                            name='mark_report_file_reused')
+                logger.debug("PDF отправлен по file_id (отчет %s)", report_hash[:12])
+                set_trace_fields(pdf='file_id')
+                return cached['report_path']
+            except TelegramError as e:
+                # file_id мог стать недействительным — загружаем заново
+                logger.warning("Не удалось отправить PDF по file_id: %s", e)
+
+        with span('render'):
+            pdf_bytes = await self.render_pdf(html_content)
+
+        # Хранилище пишется с fsync — параллельно с загрузкой в Telegram
+        store_task = asyncio.create_task(self._in_thread('store', self.report_store.put, pdf_bytes, 'pdf'))
+
+        try:
+            await brief_task
+            with span('upload'):
+                sent = await self.sender.call(
+                    message.chat_id, message.reply_document,
+                    document=pdf_bytes,
+                    filename=f"Отчет_РекламныйИнспектор_{datetime.now().strftime('%Y%m%d')}.pdf",
+                    caption=caption
+                )
+        except BaseException:
+            # Загрузка не удалась — дожидаемся записи, чтобы ее ошибка не потерялась
+            stored = (await asyncio.gather(store_task, return_exceptions=True))[0]
+            if isinstance(stored, Exception):
+                logger.error("Ошибка сохранения PDF в хранилище: %s", stored, exc_info=stored)
+            raise
+
+        try:
+            stored = await store_task
+        except OSError as e:
+            # Отчет уже у пользователя; без файла не сохраняем и file_id
+            logger.error("Ошибка сохранения PDF в хранилище: %s", e, exc_info=True)
+            return None
+        logger.debug(
+            "PDF сохранен: %s (задание %s, %s байт%s)",
+            stored.path, stored.job_id, stored.size, ", уже был в хранилище" if stored.deduplicated else ""
+        )
+        if sent.document:
+            self._spawn(self._in_thread('db', self.db.save_report_file, report_hash,
+                                        sent.document.file_id, stored.path),
+                        name='save_report_file')
+        return stored.path
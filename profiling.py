@@ -0,0 +1,402 @@
+"""
+Профилирование работающего процесса по команде админа
+Сеанс на следующие N проверок: выборочный профиль CPU (поток, снимающий стеки
+всех потоков), выделения памяти по этапам (tracemalloc) и прирост RSS по
+этапам, в том числе в процессах пулов. Пока сеанс не запущен, этапы и пулы
+проверяют только одну глобальную переменную.
+"""
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Optional
+
+import tracing
+
+try:
+    import resource
+except ImportError:
+    # Windows: пиковый RSS недоступен
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Интервал выборки стеков (секунды), глубина стека и число строк в разделах отчета
+SAMPLE_INTERVAL = 0.005
+MAX_STACK_DEPTH = 64
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 10
+TOP_STACKS = 200
+# Больше проверок за сеанс не профилируется (tracemalloc замедляет работу)
+MAX_CHECKS = 500
+# Кадров стека в трассировке tracemalloc (для группировки по строке хватает одного)
+TRACEMALLOC_FRAMES = 1
+# Строки с меньшим приростом за этап не попадают в отчет (байты)
+MIN_ALLOCATION = 1024
+
+MB = 1024 * 1024
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+_OWN_FILES = {__file__, tracemalloc.__file__}
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+# Листовые функции потока, который ничего не делает, а ждет (цикл событий, пулы, очереди)
+_IDLE_FRAMES = {
+    ('selectors.py', 'select'),
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),
+    ('socket.py', 'accept'),
+    ('connection.py', 'wait'),
+}
+
+# Текущий сеанс (None — профилирование выключено)
+_session: Optional['ProfileSession'] = None
+
+
+def current_session() -> Optional['ProfileSession']:
+    return _session
+
+
+def rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """Текущий RSS процесса (Linux, /proc); None, если недоступен"""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Пиковый RSS процесса с запуска (ru_maxrss: КБ в Linux, байты в macOS)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def mb(value: Optional[float]) -> str:
+    return 'н/д' if value is None else f"{value / MB:.1f}"
+
+
+def _delta(before: Optional[int], after: Optional[int]) -> int:
+    return after - before if before is not None and after is not None else 0
+
+
+def _short_path(filename: str) -> str:
+    """Путь в отчете: относительно проекта или site-packages"""
+    if filename.startswith(_ROOT):
+        return os.path.relpath(filename, _ROOT)
+    marker = filename.rfind('-packages' + os.sep)
+    if marker >= 0:
+        return filename[marker + len('-packages') + 1:]
+    return os.sep.join(filename.split(os.sep)[-2:])
+
+
+def measured_call(fn: Callable, *args) -> Dict:
+    """
+    Обертка для выполнения в процессе пула: fn(*args) с замером памяти процесса
+
+    Returns:
+        {'result': результат fn, 'seconds', 'rss_before', 'rss_after', 'peak_before', 'peak_after'}
+    """
+    rss, peak = rss_bytes(), peak_rss_bytes()
+    started = time.perf_counter()
+    result = fn(*args)
+    return {
+        'result': result,
+        'seconds': time.perf_counter() - started,
+        'rss_before': rss,
+        'rss_after': rss_bytes(),
+        'peak_before': peak,
+        'peak_after': peak_rss_bytes(),
+    }
+
+
+def process_state() -> Dict:
+    """Память и потоки текущего процесса (для снимка состояния)"""
+    state = {
+        'pid': os.getpid(),
+        'rss': rss_bytes(),
+        'peak_rss': peak_rss_bytes(),
+        'threads': threading.active_count(),
+        'gc_counts': gc.get_count(),
+    }
+    if tracemalloc.is_tracing():
+        state['traced'], state['traced_peak'] = tracemalloc.get_traced_memory()
+    return state
+
+
+class _Sampler(threading.Thread):
+    """Поток выборки: раз в interval снимает стеки остальных потоков"""
+
+    def __init__(self, interval: float):
+        super().__init__(name='profiler-sampler', daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle = 0
+        # Выборки, попавшие в сам профилировщик (снимки tracemalloc)
+        self.overhead = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    self.idle += 1
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                if any(filename == __file__ for filename, _, _ in stack):
+                    self.overhead += 1
+                    continue
+                self.stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class _StageStats:
+    """Сводка по этапу: длительность, прирост RSS и пика RSS, выделения tracemalloc"""
+
+    __slots__ = ('count', 'seconds', 'rss', 'rss_max', 'peak', 'peak_max', 'traced', 'traced_max', 'allocations')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.rss = self.rss_max = 0
+        self.peak = self.peak_max = 0
+        self.traced = self.traced_max = 0
+        # "файл:строка" → [прирост байт, прирост блоков]
+        self.allocations: Dict[str, list] = defaultdict(lambda: [0, 0])
+
+
+class ProfileSession:
+    """
+    Сеанс профилирования следующих `checks` проверок
+
+    Этапы (tracing.span) и задачи пулов процессов (WorkerPool.submit) во время
+    сеанса замеряются: RSS до и после, рост пикового RSS, с allocations —
+    снимки tracemalloc до и после этапа (строки с наибольшим приростом).
+    Этапы идут параллельно, поэтому прирост памяти этапа включает выделения
+    соседних — это оценка, а не точный учет. Снимки tracemalloc дороги, и
+    проверки во время сеанса идут медленнее.
+
+    По окончании (N проверок или stop()) отчет передается в on_finish.
+    """
+
+    def __init__(self, checks: int, allocations: bool = False, interval: float = SAMPLE_INTERVAL,
+                 state: Optional[Callable[[], str]] = None, on_finish: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            checks: Сколько проверок профилировать (не больше MAX_CHECKS)
+            allocations: Учитывать выделения памяти по этапам (tracemalloc)
+            interval: Интервал выборки стеков (секунды)
+            state: Текст снимка очередей и пулов для конца отчета
+            on_finish: Вызывается с текстом отчета по окончании сеанса
+        """
+        self.checks = max(1, min(checks, MAX_CHECKS))
+        self.allocations = allocations
+        self.state = state
+        self.on_finish = on_finish
+        self.done = 0
+        self.report: Optional[str] = None
+        self._sampler = _Sampler(interval)
+        self._stages: Dict[str, _StageStats] = defaultdict(_StageStats)
+        self._workers: Dict[str, _StageStats] = defaultdict(_StageStats)
+        self._lock = threading.Lock()
+        self._owns_tracemalloc = False
+        self._started = 0.0
+        self._rss_start: Optional[int] = None
+        self._peak_start: Optional[int] = None
+
+    def start(self):
+        """Запускает сеанс (одновременно может идти только один)"""
+        global _session
+        if _session is not None:
+            raise RuntimeError("Профилирование уже запущено")
+        if self.allocations and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._owns_tracemalloc = True
+        self._started = time.perf_counter()
+        self._rss_start, self._peak_start = rss_bytes(), peak_rss_bytes()
+        self._sampler.start()
+        _session = self
+        tracing.set_stage_profiler(self)
+        logger.info("Профилирование запущено: %d проверок%s", self.checks,
+                    ", с учетом выделений памяти" if self.allocations else "")
+
+    def stop(self) -> str:
+        """Останавливает сеанс и возвращает отчет (повторный вызов возвращает тот же)"""
+        global _session
+        with self._lock:
+            if self.report is not None:
+                return self.report
+            if _session is self:
+                _session = None
+                tracing.set_stage_profiler(None)
+            self._sampler.stop()
+            # Снимок состояния — до остановки tracemalloc, чтобы попал его объем
+            state = self._safe_state()
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+            self.report = self._format(state)
+        logger.info("Профилирование завершено: %s", self.summary())
+        if self.on_finish is not None:
+            self.on_finish(self.report)
+        return self.report
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._started
+
+    def summary(self) -> str:
+        return (f"{self.done} из {self.checks} проверок за {self.elapsed:.1f} с, "
+                f"выборок CPU {self._sampler.samples}")
+
+    # Вызовы из tracing и workers
+
+    def stage_started(self, stage: str) -> tuple:
+        snapshot = self._snapshot() if self.allocations else None
+        traced = tracemalloc.get_traced_memory()[0] if snapshot is not None else 0
+        return rss_bytes(), peak_rss_bytes(), traced, snapshot
+
+    def stage_finished(self, stage: str, token: tuple, seconds: float):
+        rss, peak, traced, before = token
+        diffs = []
+        traced_delta = 0
+        if before is not None and tracemalloc.is_tracing():
+            traced_delta = tracemalloc.get_traced_memory()[0] - traced
+            # Разница отсортирована по модулю прироста: освобождения пропускаются
+            for diff in self._snapshot().compare_to(before, 'lineno'):
+                if abs(diff.size_diff) < MIN_ALLOCATION or len(diffs) >= TOP_ALLOCATIONS:
+                    break
+                if diff.size_diff > 0 and diff.traceback[0].filename not in _OWN_FILES:
+                    diffs.append(diff)
+        with self._lock:
+            stats = self._stages[stage]
+            self._add(stats, seconds, _delta(rss, rss_bytes()), _delta(peak, peak_rss_bytes()))
+            stats.traced += traced_delta
+            stats.traced_max = max(stats.traced_max, traced_delta)
+            for diff in diffs:
+                frame = diff.traceback[0]
+                entry = stats.allocations[f"{_short_path(frame.filename)}:{frame.lineno}"]
+                entry[0] += diff.size_diff
+                entry[1] += diff.count_diff
+
+    def trace_finished(self, trace):
+        with self._lock:
+            self.done += 1
+            finished = self.done >= self.checks
+        if finished:
+            self.stop()
+
+    def record_worker(self, task: str, measured: Dict):
+        """Замер задачи, выполненной в процессе пула (результат measured_call)"""
+        with self._lock:
+            stats = self._workers[task]
+            self._add(stats, measured['seconds'], _delta(measured['rss_before'], measured['rss_after']),
+                      _delta(measured['peak_before'], measured['peak_after']))
+            # Для процессов пула traced_max — наибольший пиковый RSS процесса
+            stats.traced_max = max(stats.traced_max, measured['peak_after'] or 0)
+
+    # Внутреннее
+
+    @staticmethod
+    def _add(stats: _StageStats, seconds: float, rss_delta: int, peak_delta: int):
+        stats.count += 1
+        stats.seconds += seconds
+        stats.rss += rss_delta
+        stats.rss_max = max(stats.rss_max, rss_delta)
+        stats.peak += peak_delta
+        stats.peak_max = max(stats.peak_max, peak_delta)
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        # Выделения самого профилировщика отбрасываются при сравнении: filter_traces намного медленнее
+        return tracemalloc.take_snapshot()
+
+    def _safe_state(self) -> Optional[str]:
+        if self.state is None:
+            return None
+        try:
+            return self.state()
+        except Exception as e:
+            logger.warning("Не удалось снять состояние очередей и пулов: %s", e)
+            return None
+
+    def _format(self, state: Optional[str]) -> str:
+        sampler = self._sampler
+        total = max(sampler.samples, 1)
+        rss, peak = rss_bytes(), peak_rss_bytes()
+        lines = [
+            f"Профиль: {self.summary()} (каждые {sampler.interval * 1000:.0f} мс), "
+            f"в ожидании {sampler.idle}, в профилировщике {sampler.overhead}",
+            f"RSS процесса: {mb(self._rss_start)} → {mb(rss)} МБ, пик {mb(peak)} МБ "
+            f"(за сеанс вырос на {mb(_delta(self._peak_start, peak))} МБ)",
+        ]
+
+        own, cumulative = Counter(), Counter()
+        for stack, count in sampler.stacks.items():
+            own[stack[-1]] += count
+            for frame in set(stack):
+                cumulative[frame] += count
+        for title, counter in (("CPU: собственное время функций", own),
+                               ("CPU: время функций вместе с вызванными", cumulative)):
+            lines += ['', f"== {title} ==", " доля  выборок  функция"]
+            lines += [f"{count / total:6.1%} {count:7d}  {_short_path(filename)}:{lineno} {name}"
+                      for (filename, lineno, name), count in counter.most_common(TOP_FUNCTIONS)]
+
+        lines += ['', "== Этапы (прирост за вызов, МБ: среднее / наибольший) ==",
+                  f"{'этап':<22}{'вызовов':>8}{'ср. мс':>9}{'RSS':>16}{'пик RSS':>16}"
+                  + (f"{'tracemalloc':>16}" if self.allocations else '')]
+        for stage, stats in sorted(self._stages.items(), key=lambda item: -item[1].peak_max):
+            lines.append(self._stage_line(stage, stats, self.allocations))
+
+        if self.allocations:
+            lines += ['', "== Выделения памяти по этапам (tracemalloc, строки с наибольшим приростом) =="]
+            for stage, stats in sorted(self._stages.items(), key=lambda item: -item[1].traced):
+                top = sorted(stats.allocations.items(), key=lambda item: -item[1][0])[:TOP_ALLOCATIONS]
+                if top:
+                    lines.append(f"[{stage}]")
+                    lines += [f"  {size / MB:+9.2f} МБ {blocks:+8d} блоков  {location}"
+                              for location, (size, blocks) in top]
+
+        if self._workers:
+            lines += ['', "== Процессы пулов (прирост за задачу, МБ: среднее / наибольший) ==",
+                      f"{'задача':<22}{'вызовов':>8}{'ср. мс':>9}{'RSS':>16}{'пик RSS':>16}{'пик процесса':>16}"]
+            for task, stats in sorted(self._workers.items()):
+                lines.append(self._stage_line(task, stats, False) + f"{mb(stats.traced_max):>16}")
+
+        if state:
+            lines += ['', "== Очереди и пулы ==", state]
+
+        lines += ['', "== Стеки (формат flamegraph.pl: кадры через ';' и число выборок) =="]
+        for stack, count in sampler.stacks.most_common(TOP_STACKS):
+            lines.append(';'.join(f"{name} ({_short_path(filename)}:{lineno})"
+                                  for filename, lineno, name in stack) + f" {count}")
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _stage_line(name: str, stats: _StageStats, traced: bool) -> str:
+        count = max(stats.count, 1)
+        line = (f"{name:<22}{stats.count:>8}{stats.seconds / count * 1000:>9.1f}"
+                f"{mb(stats.rss / count) + ' / ' + mb(stats.rss_max):>16}"
+                f"{mb(stats.peak / count) + ' / ' + mb(stats.peak_max):>16}")
+        if traced:
+            line += f"{mb(stats.traced / count) + ' / ' + mb(stats.traced_max):>16}"
+        return line
@@ -2,5 +2,6 @@
 Модуль генерации отчетов
 """
 from .report_generator import ReportGenerator
+from .store import ReportStore, StoredReport
 
-__all__ = ['ReportGenerator']
+__all__ = ['ReportGenerator', 'ReportStore', 'StoredReport']
@@ -2,17 +2,44 @@
 Генератор PDF-отчетов
 Конвертирует HTML-отчеты в PDF
 """
+import logging
 import os
-from weasyprint import HTML
+from weasyprint import CSS, HTML
+from weasyprint.text.fonts import FontConfiguration
 from typing import Optional
 
+from .report_generator import REPORT_CSS
+from .store import atomic_write
+
+logger = logging.getLogger(__name__)
 
 class PDFGenerator:
     """Генератор PDF-отчетов из HTML"""
     
-    def __init__(self, reports_path: str = "data/reports"):
+    def __init__(self, reports_path: Optional[str] = "data/reports", css: str = REPORT_CSS):
         self.reports_path = reports_path
-        os.makedirs(reports_path, exist_ok=True)
+        if reports_path:
+            os.makedirs(reports_path, exist_ok=True)
+        
+        # Конфигурация шрифтов и таблица стилей разбираются один раз и
+        # переиспользуются всеми отчетами (а не на каждый write_pdf)
+        self.font_config = FontConfiguration()
+        self.stylesheet = CSS(string=css, font_config=self.font_config)
+    
+    def render_pdf(self, html_content: str) -> bytes:
+        """
+        Рендерит HTML (без встроенных стилей) в PDF с общей таблицей стилей
+        
+        Args:
+            html_content: HTML-контент (ReportGenerator.generate_html(..., embed_css=False))
+            
+        Returns:
+            Содержимое PDF-файла
+        """
+        return HTML(string=html_content).write_pdf(
+            stylesheets=[self.stylesheet],
+            font_config=self.font_config
+        )
     
     def html_to_pdf(self, html_content: str, output_filename: str) -> Optional[str]:
         """
@@ -26,28 +53,20 @@ class PDFGenerator:
             Путь к PDF-файлу или None при ошибке
         """
         try:
-            import logging
-            logger = logging.getLogger(__name__)
-            
             pdf_path = os.path.join(self.reports_path, f"{output_filename}.pdf")
-            logger.info(f"Генерирую PDF: {pdf_path}")
+            logger.debug("Генерирую PDF: %s", pdf_path)
             
-            # Генерируем PDF
-            HTML(string=html_content).write_pdf(pdf_path)
+            # Генерируем PDF (атомарная запись: недописанный файл не виден читателям)
+            atomic_write(pdf_path, self.render_pdf(html_content))
             
             if os.path.exists(pdf_path):
-                logger.info(f"PDF успешно создан: {pdf_path}, размер: {os.path.getsize(pdf_path)} байт")
+                logger.info("PDF успешно создан: %s, размер: %s байт", pdf_path, os.path.getsize(pdf_path))
                 return pdf_path
             else:
-                logger.error(f"PDF файл не создан: {pdf_path}")
+                logger.error("PDF файл не создан: %s", pdf_path)
                 return None
         except Exception as e:
-            import logging
-            import traceback
-            logger = logging.getLogger(__name__)
-            logger.error(f"Ошибка генерации PDF: {e}", exc_info=True)
-            traceback.print_exc()
-            print(f"ERROR: Ошибка генерации PDF: {e}")
+            logger.error("Ошибка генерации PDF: %s", e, exc_info=True)
             return None
     
     def generate_from_html_file(self, html_file_path: str, output_filename: str) -> Optional[str]:
@@ -62,24 +81,36 @@ class PDFGenerator:
             Путь к PDF-файлу или None при ошибке
         """
         try:
-            import logging
-            logger = logging.getLogger(__name__)
-            
-            logger.info(f"Читаю HTML файл: {html_file_path}")
+            logger.debug("Читаю HTML файл: %s", html_file_path)
             if not os.path.exists(html_file_path):
-                logger.error(f"HTML файл не найден: {html_file_path}")
+                logger.error("HTML файл не найден: %s", html_file_path)
                 return None
             
             with open(html_file_path, 'r', encoding='utf-8') as f:
                 html_content = f.read()
             
-            logger.info(f"HTML файл прочитан, размер: {len(html_content)} символов")
+            logger.debug("HTML файл прочитан, размер: %s символов", len(html_content))
             return self.html_to_pdf(html_content, output_filename)
         except Exception as e:
-            import logging
-            import traceback
-            logger = logging.getLogger(__name__)
-            logger.error(f"Ошибка чтения HTML-файла: {e}", exc_info=True)
-            traceback.print_exc()
-            print(f"ERROR: Ошибка чтения HTML-файла: {e}")
+            logger.error("Ошибка чтения HTML-файла: %s", e, exc_info=True)
             return None
+
+
+# Генератор процесса пула рендеринга (стили и шрифты разбираются один раз на процесс)
+_process_generator: Optional[PDFGenerator] = None
+
+
+def render_report_pdf(html_content: str) -> bytes:
+    """
+    Рендерит HTML-отчет в PDF; предназначена для выполнения в WorkerPool
+
+    Args:
+        html_content: HTML-контент без встроенных стилей
+
+    Returns:
+        Содержимое PDF-файла
+    """
+    global _process_generator
+    if _process_generator is None:
+        _process_generator = PDFGenerator(reports_path=None)
+    return _process_generator.render_pdf(html_content)
@@ -3,18 +3,200 @@
 """
 import os
 from datetime import datetime
-from typing import Dict
-from config import REPORTS_PATH, REQUIRED_DISCLAIMER
+from html import escape
+from string import Template
+from typing import Callable, Dict, List, Optional
+from telegram.helpers import escape_markdown
+from config import REPORTS_PATH, REQUIRED_DISCLAIMER, MIN_DISCLAIMER_SIZE
+from analyzer.documents import section_locator
+from analyzer.results import AnalysisResult
+from analyzer.rules import RulePack, RulePackManager, get_rule_manager
+from .store import ReportStore
+
+
+TEMPLATES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+
+def _read_template(name: str) -> str:
+    with open(os.path.join(TEMPLATES_PATH, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+# Таблица стилей отчета (общая для HTML-файлов и PDF)
+REPORT_CSS = _read_template('report.css')
+
+VERDICT_EMOJI = {
+    'СООТВЕТСТВУЕТ': '✅',
+    'ЧАСТИЧНОЕ_НАРУШЕНИЕ': '⚠️',
+    'НЕ_СООТВЕТСТВУЕТ': '❌',
+    'КРИТИЧЕСКИЕ_НАРУШЕНИЯ': '🚨',
+    'ERROR': '❌'
+}
+
+VERDICT_CLASSES = {
+    'СООТВЕТСТВУЕТ': 'success',
+    'ЧАСТИЧНОЕ_НАРУШЕНИЕ': 'partial',
+    'НЕ_СООТВЕТСТВУЕТ': 'fail',
+    'КРИТИЧЕСКИЕ_НАРУШЕНИЯ': 'fail',
+    'ERROR': 'fail',
+}
+
+ALLOWED_PHRASES = [
+    "Помогаем в процедуре банкротства",
+    "Сопровождаем процесс банкротства",
+    "Консультируем по вопросам банкротства",
+    "Работаем в рамках законодательства",
+]
+
+# Повторяющиеся фрагменты HTML-отчета
+HTML_ERROR = Template('    <div class="error"><strong>Ошибка:</strong> $error</div>\n')
+HTML_CATEGORY = Template('''    <div class="category">
+        <h3>$name</h3>
+        <p><span class="$status_class">$status</span> <span class="article">$article</span></p>
+$findings    </div>
+''')
+HTML_FINDING = Template('''            <li><mark>$phrase</mark>$location<br><span class="context">…$context…</span></li>
+''')
+HTML_ALLOWED_PHRASES = Template('''    <h3>Разрешенные формулировки</h3>
+    <ul class="allowed">$items</ul>
+''')
+
+# Сколько найденных формулировок показывать в каждой категории
+MAX_FINDINGS_PER_CATEGORY = 5
+
+# Причины, по которым дисклеймер на странице считается скрытым
+HIDDEN_REASONS = {
+    'not_rendered': 'не отображается на странице',
+    'visibility': 'visibility: hidden',
+    'transparent': 'прозрачный текст',
+    'font_size': 'нулевой кегль',
+    'color_matches_background': 'цвет текста совпадает с фоном',
+    'clipped': 'свернут или обрезан',
+}
 
 
 class ReportGenerator:
     """Генератор отчетов о проверке рекламы"""
     
-    def __init__(self):
+    def __init__(self, rules: Optional[RulePackManager] = None, store: Optional[ReportStore] = None):
         self.reports_path = REPORTS_PATH
-        os.makedirs(self.reports_path, exist_ok=True)
+        self.rules = rules or get_rule_manager()
+        self.store = store or ReportStore(self.reports_path)
+        
+        # Шаблоны и статические разделы готовятся один раз, а не на каждый отчет
+        self._page_template = Template(_read_template('report.html'))
+        self._inline_style = f"    <style>\n{REPORT_CSS}\n    </style>"
+        self._legal_basis_md = self._format_legal_basis()
+        self._legal_basis_html = self._html_legal_basis()
+        self._allowed_phrases_html = HTML_ALLOWED_PHRASES.substitute(
+            items=''.join(f"<li>✅ «{escape(p)}»</li>" for p in ALLOWED_PHRASES)
+        )
+        self._disclaimer_html = f'<p class="disclaimer-text">{escape(REQUIRED_DISCLAIMER)}</p>'
     
-    def generate_markdown(self, analysis_result: Dict, material_info: Dict) -> str:
+    def generate_brief(self, analysis_result: AnalysisResult, material_info: Dict,
+                       diff: Optional[Dict] = None) -> str:
+        """
+        Генерирует краткий отчет для чата (Markdown Telegram)
+        
+        Args:
+            analysis_result: Результаты анализа
+            material_info: Информация о материале
+            diff: Сравнение с прошлой проверкой страницы (analyzer.incremental.diff_results)
+            
+        Returns:
+            Текст краткого отчета
+        """
+        verdict = analysis_result.verdict
+        emoji = VERDICT_EMOJI.get(verdict, '❓')
+        
+        report_text = f"""
+{emoji} **ВЕРДИКТ: {verdict.replace('_', ' ')}**
+
+📋 **Материал:** {escape_markdown(str(material_info.get('url', material_info.get('text', 'Не указано')))[:80])}
+📅 **Дата:** {datetime.now().strftime('%d.%m.%Y %H:%M')}
+
+"""
+        
+        # Дисклеймер
+        disclaimer = analysis_result.disclaimer
+        if disclaimer.get('size_check') == 'too_small':
+            report_text += f"⚠️ **Дисклеймер:** Найден, но занимает {disclaimer.get('area_percent')}% площади\n"
+        elif disclaimer.get('found'):
+            report_text += "✅ **Дисклеймер:** Найден\n"
+        else:
+            report_text += "❌ **Дисклеймер:** Не найден\n"
+        
+        # Нарушения
+        total_violations = analysis_result.total_violations
+        if total_violations > 0:
+            report_text += f"\n❌ **Нарушений найдено:** {total_violations}\n"
+        else:
+            report_text += "\n✅ **Нарушений не обнаружено**\n"
+        
+        if diff is not None:
+            report_text += self._format_recheck_section(diff, self.rules.pack_for(analysis_result.rules_version))
+        
+        report_text += "\n📄 Загружаю PDF-отчет с рекомендациями..."
+        return report_text
+    
+    def generate_monitor_alert(self, analysis_result: AnalysisResult, url: str, previous_verdict: str,
+                               diff: Optional[Dict] = None) -> str:
+        """
+        Уведомление о смене вердикта сайта на наблюдении (Markdown Telegram)
+
+        Args:
+            analysis_result: Результаты анализа
+            url: URL страницы
+            previous_verdict: Вердикт прошлой проверки наблюдения
+            diff: Сравнение с прошлой проверкой страницы
+
+        Returns:
+            Текст уведомления
+        """
+        verdict = analysis_result.verdict
+        report_text = f"""
+🔔 **Изменился вердикт сайта на наблюдении**
+
+📋 **Сайт:** {escape_markdown(url[:80])}
+{VERDICT_EMOJI.get(previous_verdict, '❓')} {previous_verdict.replace('_', ' ')} → {VERDICT_EMOJI.get(verdict, '❓')} **{verdict.replace('_', ' ')}**
+❌ **Нарушений:** {analysis_result.total_violations}
+"""
+        if diff is not None:
+            report_text += self._format_recheck_section(diff, self.rules.pack_for(analysis_result.rules_version))
+
+        report_text += "\nОтправь ссылку боту, чтобы получить полный PDF-отчет. Снять с наблюдения: /unwatch <url>"
+        return report_text
+
+    def _format_recheck_section(self, diff: Dict, rule_pack: RulePack) -> str:
+        """Раздел краткого отчета о повторной проверке: что исправлено, что появилось"""
+        names = rule_pack.category_names
+        previous = diff['previous_verdict'].replace('_', ' ')
+        section = f"\n🔁 **Повторная проверка** (прошлая — {diff['previous_checked_at']}, {previous})\n"
+        if diff['rules_changed']:
+            section += "ℹ️ С прошлой проверки обновился набор правил\n"
+        if diff['disclaimer'] == 'added':
+            section += "✅ Дисклеймер добавлен\n"
+        elif diff['disclaimer'] == 'removed':
+            section += "❌ Дисклеймер пропал\n"
+        
+        for key, title in (('fixed', '✅ Исправлено'), ('new', '❌ Новые нарушения')):
+            found = diff[key]
+            if not found:
+                continue
+            section += f"{title}: {sum(item['count'] for item in found)}\n"
+            for item in found[:MAX_FINDINGS_PER_CATEGORY]:
+                count = f" ×{item['count']}" if item['count'] > 1 else ""
+                name = names.get(item['category'], item['category'])
+                section += f"• «{escape_markdown(item['phrase'])}»{count} — {escape_markdown(name)}\n"
+            if len(found) > MAX_FINDINGS_PER_CATEGORY:
+                section += f"• … и еще {len(found) - MAX_FINDINGS_PER_CATEGORY}\n"
+        if not diff['fixed'] and not diff['new']:
+            section += "Нарушения те же, что в прошлый раз\n"
+        elif diff['unchanged']:
+            section += f"Без изменений: {diff['unchanged']}\n"
+        return section
+    
+    def generate_markdown(self, analysis_result: AnalysisResult, material_info: Dict) -> str:
         """
         Генерирует отчет в формате Markdown
         
@@ -25,22 +207,15 @@ class ReportGenerator:
         Returns:
             Строка с отчетом в формате Markdown
         """
-        verdict_emoji = {
-            'СООТВЕТСТВУЕТ': '✅',
-            'ЧАСТИЧНОЕ_НАРУШЕНИЕ': '⚠️',
-            'НЕ_СООТВЕТСТВУЕТ': '❌',
-            'КРИТИЧЕСКИЕ_НАРУШЕНИЯ': '🚨',
-            'ERROR': '❌'
-        }
-        
-        verdict = analysis_result.get('verdict', 'ERROR')
-        emoji = verdict_emoji.get(verdict, '❓')
+        verdict = analysis_result.verdict
+        emoji = VERDICT_EMOJI.get(verdict, '❓')
         
         report = f"""# 🔍 РЕКЛАМНЫЙ ИНСПЕКТОР | Проверка рекламы банкротства
 
 **Дата проверки:** {datetime.now().strftime('%d.%m.%Y')}
 **Материал:** {material_info.get('url', material_info.get('text', 'Не указано'))[:100]}
 **Тип материала:** {material_info.get('type', 'Не указано')}
+**Версия правил:** {analysis_result.rules_version or 'н/д'}
 
 ---
 
@@ -51,68 +226,71 @@ class ReportGenerator:
 """
         
         if verdict == 'ERROR':
-            report += f"**Ошибка:** {analysis_result.get('error', 'Неизвестная ошибка')}\n"
+            report += f"**Ошибка:** {analysis_result.error or 'Неизвестная ошибка'}\n"
             return report
         
         # Дисклеймер
-        disclaimer = analysis_result.get('disclaimer', {})
+        disclaimer = analysis_result.disclaimer
         report += self._format_disclaimer_section(disclaimer)
         
-        # Нарушения
-        violations = analysis_result.get('violations', {})
-        report += self._format_violations_section(violations)
+        # Нарушения (по набору правил, которым посчитан результат: правила могли обновиться после анализа)
+        violations = analysis_result.violations_by_category()
+        rule_pack = self.rules.pack_for(analysis_result.rules_version)
+        locate = section_locator(material_info.get('sections'))
+        report += self._format_violations_section(violations, rule_pack, locate)
         
         # Рекомендации
-        report += self._format_recommendations(disclaimer, violations)
+        report += self._format_recommendations(disclaimer, violations, rule_pack)
         
         # Нормативная база
-        report += self._format_legal_basis()
+        report += self._legal_basis_md
         
         return report
     
-    def generate_html(self, analysis_result: Dict, material_info: Dict) -> str:
+    def generate_html(self, analysis_result: AnalysisResult, material_info: Dict,
+                      embed_css: bool = True) -> str:
         """
-        Генерирует отчет в формате HTML
+        Генерирует полный отчет в формате HTML
         
         Args:
             analysis_result: Результаты анализа
             material_info: Информация о материале
+            embed_css: Встроить стили в <style> (для самостоятельного HTML-файла).
+                Для PDF стили передаются уже разобранными, см. PDFGenerator
             
         Returns:
             HTML-строка с отчетом
         """
-        # Используем шаблон из существующего HTML-отчета
-        # В реальной реализации здесь будет генерация HTML на основе анализа
-        
-        # Пока возвращаем простой HTML
-        verdict = analysis_result.get('verdict', 'ERROR')
-        
-        html = f"""<!DOCTYPE html>
-<html lang="ru">
-<head>
-    <meta charset="UTF-8">
-    <title>Рекламный Инспектор | Отчет</title>
-    <style>
-        body {{ font-family: Arial, sans-serif; padding: 20px; }}
-        .verdict {{ padding: 20px; border-radius: 8px; margin: 20px 0; }}
-        .fail {{ background: #fee; border: 2px solid #e74c3c; }}
-        .success {{ background: #efe; border: 2px solid #27ae60; }}
-    </style>
-</head>
-<body>
-    <h1>🔍 РЕКЛАМНЫЙ ИНСПЕКТОР</h1>
-    <p><strong>Дата:</strong> {datetime.now().strftime('%d.%m.%Y')}</p>
-    <p><strong>Материал:</strong> {material_info.get('url', 'Текст')}</p>
-    <div class="verdict {'fail' if 'НЕ' in verdict or 'КРИТИЧЕСКИЕ' in verdict else 'success'}">
-        <h2>Вердикт: {verdict.replace('_', ' ')}</h2>
-    </div>
-    <!-- Здесь будет полный HTML-отчет -->
-</body>
-</html>"""
-        
-        return html
-    
-    def save_report(self, analysis_result: Dict, material_info: Dict, format: str = 'markdown') -> str:
+        verdict = analysis_result.verdict
+        
+        if verdict == 'ERROR':
+            body = HTML_ERROR.substitute(error=escape(analysis_result.error or 'Неизвестная ошибка'))
+        else:
+            disclaimer = analysis_result.disclaimer
+            rule_pack = self.rules.pack_for(analysis_result.rules_version)
+            violations = analysis_result.violations_by_category()
+            locate = section_locator(material_info.get('sections'))
+            body = (
+                self._html_disclaimer_section(disclaimer)
+                + self._html_violations_section(violations, rule_pack, locate)
+                + self._html_recommendations(disclaimer, violations, rule_pack)
+                + self._legal_basis_html
+            )
+        
+        return self._page_template.substitute(
+            style=self._inline_style if embed_css else '',
+            date=datetime.now().strftime('%d.%m.%Y'),
+            material=escape(str(material_info.get('url', material_info.get('text', 'Не указано')))[:200]),
+            material_type=escape(material_info.get('type', 'Не указано')),
+            rules_version=escape(analysis_result.rules_version or 'н/д'),
+            verdict_class=VERDICT_CLASSES.get(verdict, 'fail'),
+            verdict_emoji=VERDICT_EMOJI.get(verdict, '❓'),
+            verdict=verdict.replace('_', ' '),
+            verdict_summary=self._verdict_summary(analysis_result),
+            body=body,
+        )
+    
+    def save_report(self, analysis_result: AnalysisResult, material_info: Dict, format: str = 'markdown') -> str:
         """
         Сохраняет отчет в файл
         
@@ -124,22 +302,16 @@ class ReportGenerator:
         Returns:
             Путь к сохраненному файлу
         """
-        date_str = datetime.now().strftime('%Y-%m-%d')
-        material_name = material_info.get('url', 'text').replace('https://', '').replace('http://', '').replace('/', '_')[:50]
-        
         if format == 'html':
             content = self.generate_html(analysis_result, material_info)
-            filename = f"{date_str}_{material_name}.html"
+            ext = 'html'
         else:
             content = self.generate_markdown(analysis_result, material_info)
-            filename = f"{date_str}_{material_name}.md"
-        
-        filepath = os.path.join(self.reports_path, filename)
+            ext = 'md'
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(content)
-        
-        return filepath
+        # Имя файла — хэш содержимого: параллельные проверки не перезаписывают
+        # друг друга, одинаковые отчеты хранятся один раз
+        return self.store.put(content.encode('utf-8'), ext).path
     
     def _format_disclaimer_section(self, disclaimer: Dict) -> str:
         """Форматирует раздел о дисклеймере"""
@@ -150,41 +322,51 @@ class ReportGenerator:
             if not disclaimer.get('exact_match'):
                 section += " ⚠️ (текст может быть изменен)"
             section += "\n\n"
+            if disclaimer.get('area_percent') is not None:
+                size_ok = disclaimer.get('size_check') == 'ok'
+                section += (
+                    f"**Площадь:** {'✅' if size_ok else '❌'} {disclaimer['area_percent']}% "
+                    f"(требуется не менее {MIN_DISCLAIMER_SIZE}%)\n\n"
+                )
+            if disclaimer.get('visible') is False:
+                reasons = ', '.join(
+                    HIDDEN_REASONS.get(r, r) for r in disclaimer.get('hidden_reasons', [])
+                )
+                section += f"**Видимость:** ❌ Скрыт ({reasons})\n\n"
+            elif disclaimer.get('visible') is True:
+                section += "**Видимость:** ✅ Виден"
+                if disclaimer.get('on_first_screen') is False:
+                    section += " ⚠️ (не на первом экране)"
+                section += "\n\n"
+            if disclaimer.get('font_size_px'):
+                section += f"**Кегль:** {disclaimer['font_size_px']} px\n\n"
             section += f"**Текст дисклеймера:**\n```\n{REQUIRED_DISCLAIMER}\n```\n\n"
         else:
             section += "**Статус:** ❌ Не найден\n\n"
         
         return section
     
-    def _format_violations_section(self, violations: Dict) -> str:
-        """Форматирует раздел о нарушениях"""
+    def _format_violations_section(self, violations: Dict, rule_pack: RulePack,
+                                   locate: Optional[Callable[[int], Optional[str]]] = None) -> str:
+        """Форматирует раздел о нарушениях (locate — страница или абзац документа по смещению)"""
         section = "## 2️⃣ ЗАПРЕТЫ (ФЗ \"О рекламе\", ст. 28.1)\n\n"
         
-        violation_names = {
-            'guarantees': 'Гарантии и обещания освобождения',
-            'calls_not_pay': 'Призывы не исполнять обязательства',
-            'state_system': 'Упоминания о государственной системе',
-            'mention_exemption': 'Упоминания о возможности освобождения',
-            'property_preservation': 'Обещания сохранения имущества',
-            'money_back': 'Гарантии возврата средств',
-            'take_loans': 'Призывы брать кредиты',
-            'any_cases': 'Обещания взяться за любые дела',
-        }
-        
-        for key, name in violation_names.items():
-            found_violations = violations.get(key, [])
+        for category in rule_pack.categories:
+            name = category.name
+            found_violations = violations.get(category.id, [])
             if found_violations:
-                section += f"### {name}\n**Статус:** ❌ Нарушение обнаружено\n\n"
+                section += f"### {name}\n**Статус:** ❌ Нарушение обнаружено ({category.article})\n\n"
                 section += "**Найденные формулировки:**\n"
                 for violation in found_violations[:5]:  # Показываем первые 5
-                    section += f"- \"{violation.get('phrase', '')}\"\n"
+                    location = locate(violation.start) if locate else None
+                    section += f"- \"{violation.phrase}\"" + (f" ({location})" if location else "") + "\n"
                 section += "\n"
             else:
                 section += f"### {name}\n**Статус:** ✅ Нет нарушений\n\n"
         
         return section
     
-    def _format_recommendations(self, disclaimer: Dict, violations: Dict) -> str:
+    def _format_recommendations(self, disclaimer: Dict, violations: Dict, rule_pack: RulePack) -> str:
         """Форматирует раздел с рекомендациями"""
         section = "## 💡 РЕКОМЕНДАЦИИ ПО ИСПРАВЛЕНИЮ\n\n"
         
@@ -194,26 +376,34 @@ class ReportGenerator:
             section += "**Как исправить:**\n"
             section += f"1. Добавить дисклеймер в видимую часть материала\n"
             section += f"2. Точный текст: \"{REQUIRED_DISCLAIMER}\"\n"
-            section += f"3. Размер должен быть не менее 7% площади\n\n"
+            section += f"3. Размер должен быть не менее {MIN_DISCLAIMER_SIZE}% площади\n\n"
+        
+        elif disclaimer.get('visible') is False:
+            section += "### ❌ Проблема: Дисклеймер скрыт\n\n"
+            section += "**Как исправить:**\n"
+            section += "1. Показать дисклеймер без сворачивания, прозрачности и совпадения цвета с фоном\n"
+            section += "2. Разместить его на первом экране страницы\n\n"
+        elif disclaimer.get('size_check') == 'too_small':
+            section += "### ❌ Проблема: Дисклеймер слишком мелкий\n\n"
+            section += "**Как исправить:**\n"
+            section += (
+                f"1. Увеличить дисклеймер до {MIN_DISCLAIMER_SIZE}% площади материала "
+                f"(сейчас {disclaimer.get('area_percent')}%)\n\n"
+            )
         
         # Рекомендации по нарушениям
-        allowed_phrases = [
-            "Помогаем в процедуре банкротства",
-            "Сопровождаем процесс банкротства",
-            "Консультируем по вопросам банкротства",
-            "Работаем в рамках законодательства",
-        ]
-        
-        for key, violation_list in violations.items():
-            if violation_list:
-                section += f"### ❌ Проблема: Найдены запрещенные формулировки\n\n"
-                section += "**Как исправить:**\n"
-                section += "1. Удалить найденные запрещенные фразы\n"
-                section += "2. Заменить на разрешенные формулировки:\n"
-                for phrase in allowed_phrases:
-                    section += f"   ✅ \"{phrase}\"\n"
-                section += "\n"
-                break
+        violated = [c for c in rule_pack.categories if violations.get(c.id)]
+        if violated:
+            section += f"### ❌ Проблема: Найдены запрещенные формулировки\n\n"
+            section += "**Как исправить:**\n"
+            section += "1. Удалить найденные запрещенные фразы\n"
+            for category in violated:
+                if category.recommendation:
+                    section += f"   • {category.name}: {category.recommendation}\n"
+            section += "2. Заменить на разрешенные формулировки:\n"
+            for phrase in ALLOWED_PHRASES:
+                section += f"   ✅ \"{phrase}\"\n"
+            section += "\n"
         
         return section
     
@@ -229,3 +419,118 @@ class ReportGenerator:
 ---
 
 """
+    
+    def _html_legal_basis(self) -> str:
+        """Раздел с нормативной базой (HTML, рендерится один раз)"""
+        return """    <h2>📚 Нормативная база</h2>
+    <ul>
+        <li>ФЗ «О рекламе» № 38-ФЗ от 13.03.2006</li>
+        <li>Федеральный закон № 332-ФЗ от 31.07.2025 (изменения с 1 января 2026)</li>
+        <li>Статья 28.1 ФЗ «О рекламе» (запреты на рекламу банкротства)</li>
+        <li>Дополнительные требования АРИБ</li>
+    </ul>
+"""
+    
+    def _verdict_summary(self, analysis_result: AnalysisResult) -> str:
+        """Одна строка под вердиктом: дисклеймер и число нарушений"""
+        if analysis_result.verdict == 'ERROR':
+            return 'Материал не удалось проверить.'
+        disclaimer = 'найден' if analysis_result.disclaimer.get('found') else 'не найден'
+        return f"Дисклеймер: {disclaimer}. Запрещенных формулировок: {analysis_result.total_violations}."
+    
+    def _html_disclaimer_section(self, disclaimer: Dict) -> str:
+        """Раздел о дисклеймере (HTML)"""
+        section = "    <h2>1️⃣ Обязательный дисклеймер</h2>\n"
+        
+        if not disclaimer.get('found'):
+            return section + '    <p><span class="status-fail">❌ Не найден</span></p>\n'
+        
+        if disclaimer.get('exact_match'):
+            section += '    <p><span class="status-ok">✅ Найден</span></p>\n'
+        else:
+            section += '    <p><span class="status-warn">✅ Найден ⚠️ (текст может быть изменен)</span></p>\n'
+        
+        if disclaimer.get('area_percent') is not None:
+            size_ok = disclaimer.get('size_check') == 'ok'
+            section += (
+                f'    <p>Площадь: <span class="{"status-ok" if size_ok else "status-fail"}">'
+                f'{disclaimer["area_percent"]}%</span> (требуется не менее {MIN_DISCLAIMER_SIZE}%)</p>\n'
+            )
+        if disclaimer.get('visible') is False:
+            reasons = ', '.join(HIDDEN_REASONS.get(r, r) for r in disclaimer.get('hidden_reasons', []))
+            section += f'    <p>Видимость: <span class="status-fail">❌ Скрыт ({escape(reasons)})</span></p>\n'
+        elif disclaimer.get('visible') is True:
+            note = ' ⚠️ (не на первом экране)' if disclaimer.get('on_first_screen') is False else ''
+            section += f'    <p>Видимость: <span class="status-ok">✅ Виден</span>{note}</p>\n'
+        if disclaimer.get('font_size_px'):
+            section += f"    <p>Кегль: {disclaimer['font_size_px']} px</p>\n"
+        
+        return section + "    <p>Требуемый текст:</p>\n    " + self._disclaimer_html + "\n"
+    
+    def _html_violations_section(self, violations: Dict, rule_pack: RulePack,
+                                 locate: Optional[Callable[[int], Optional[str]]] = None) -> str:
+        """Раздел о нарушениях по категориям набора правил (HTML)"""
+        section = "    <h2>2️⃣ Запреты (ФЗ «О рекламе», ст. 28.1)</h2>\n"
+        
+        for category in rule_pack.categories:
+            found = violations.get(category.id, [])
+            findings = ''
+            if found:
+                items = ''.join(
+                    HTML_FINDING.substitute(phrase=escape(v.phrase), context=escape(v.context),
+                                            location=self._html_location(locate, v.start))
+                    for v in found[:MAX_FINDINGS_PER_CATEGORY]
+                )
+                if len(found) > MAX_FINDINGS_PER_CATEGORY:
+                    items += f"            <li>… и еще {len(found) - MAX_FINDINGS_PER_CATEGORY}</li>\n"
+                findings = f'        <ul class="findings">\n{items}        </ul>\n'
+            section += HTML_CATEGORY.substitute(
+                name=escape(category.name),
+                status_class='status-fail' if found else 'status-ok',
+                status=f'❌ Нарушение обнаружено ({len(found)})' if found else '✅ Нет нарушений',
+                article=escape(category.article),
+                findings=findings,
+            )
+        
+        return section
+    
+    @staticmethod
+    def _html_location(locate: Optional[Callable[[int], Optional[str]]], offset: int) -> str:
+        """Страница или абзац документа, где найдена формулировка"""
+        location = locate(offset) if locate else None
+        return f' <span class="location">{escape(location)}</span>' if location else ''
+    
+    def _html_recommendations(self, disclaimer: Dict, violations: Dict, rule_pack: RulePack) -> str:
+        """Раздел с рекомендациями (HTML)"""
+        items: List[str] = []
+        
+        if not disclaimer.get('found'):
+            items.append(
+                "<li><strong>Отсутствует обязательный дисклеймер.</strong> Добавьте в видимую часть "
+                f"материала точный текст (не менее {MIN_DISCLAIMER_SIZE}% площади):"
+                f"{self._disclaimer_html}</li>"
+            )
+        elif disclaimer.get('visible') is False:
+            items.append(
+                "<li><strong>Дисклеймер скрыт.</strong> Покажите его без сворачивания, прозрачности "
+                "и совпадения цвета с фоном, на первом экране страницы.</li>"
+            )
+        elif disclaimer.get('size_check') == 'too_small':
+            items.append(
+                f"<li><strong>Дисклеймер слишком мелкий.</strong> Увеличьте его до {MIN_DISCLAIMER_SIZE}% "
+                f"площади материала (сейчас {disclaimer.get('area_percent')}%).</li>"
+            )
+        
+        for category in rule_pack.categories:
+            if violations.get(category.id) and category.recommendation:
+                items.append(f"<li><strong>{escape(category.name)}.</strong> {escape(category.recommendation)}</li>")
+        
+        if not items:
+            return "    <h2>💡 Рекомендации</h2>\n    <p>Нарушений не обнаружено.</p>\n"
+        
+        section = "    <h2>💡 Рекомендации по исправлению</h2>\n    <ol>\n"
+        section += ''.join(f"        {item}\n" for item in items)
+        section += "    </ol>\n"
+        if any(violations.values()):
+            section += self._allowed_phrases_html
+        return section
@@ -0,0 +1,237 @@
+"""
+Хранилище отчетов с адресацией по содержимому
+Файлы именуются SHA-256 содержимого и раскладываются по вложенным каталогам
+(ab/cd/abcd....pdf), запись атомарная (временный файл + rename), старые
+отчеты сжимаются и удаляются фоновой очисткой в пределах бюджета диска
+"""
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Суффикс сжатых фоновой очисткой файлов
+GZIP_SUFFIX = '.gz'
+
+# Префикс временных файлов (недописанные отчеты)
+TMP_PREFIX = '.tmp-'
+
+# Через сколько секунд брошенный временный файл считается мусором
+STALE_TMP_SECONDS = 3600
+
+
+def new_job_id() -> str:
+    """Уникальный идентификатор задания (проверки)"""
+    return uuid.uuid4().hex
+
+
+def atomic_write(path: str, data: bytes, job_id: Optional[str] = None):
+    """
+    Атомарно записывает файл: временный файл в том же каталоге, fsync, rename
+
+    Читатели видят либо прежнее содержимое, либо новое целиком, а
+    параллельные записи в один путь не перемешиваются.
+    """
+    directory = os.path.dirname(path) or '.'
+    tmp_path = os.path.join(directory, f"{TMP_PREFIX}{job_id or new_job_id()}")
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class StoredReport(NamedTuple):
+    """Сохраненный отчет"""
+    job_id: str
+    digest: str
+    path: str
+    size: int
+    deduplicated: bool
+
+
+class ReportStore:
+    """
+    Хранилище отчетов
+
+    put() и read() работают за O(1) независимо от числа отчетов: путь
+    вычисляется из хэша, каталоги двухуровневые (256 x 256). Одинаковые по
+    байтам отчеты хранятся один раз.
+    """
+
+    def __init__(self, root: str, compress_after_days: float = 7, expire_after_days: float = 90,
+                 max_bytes: Optional[int] = None):
+        """
+        Args:
+            root: Корневой каталог хранилища
+            compress_after_days: Возраст, после которого файл сжимается gzip (0 — не сжимать)
+            expire_after_days: Возраст, после которого файл удаляется (0 — не удалять)
+            max_bytes: Бюджет диска; при превышении удаляются самые старые отчеты
+        """
+        self.root = root
+        self.compress_after = compress_after_days * 86400
+        self.expire_after = expire_after_days * 86400
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+        self._stop = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        """Хэш содержимого отчета"""
+        return hashlib.sha256(data).hexdigest()
+
+    def path_for(self, digest: str, ext: str) -> str:
+        """Путь к отчету по хэшу (без учета сжатия)"""
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.{ext}")
+
+    def put(self, data: bytes, ext: str = 'pdf', job_id: Optional[str] = None) -> StoredReport:
+        """
+        Сохраняет отчет
+
+        Args:
+            data: Содержимое отчета
+            ext: Расширение файла (pdf, html, md)
+            job_id: Идентификатор задания (по умолчанию генерируется)
+
+        Returns:
+            StoredReport; deduplicated=True, если такой отчет уже был сохранен
+        """
+        job_id = job_id or new_job_id()
+        digest = self.digest(data)
+        path = self.path_for(digest, ext)
+
+        for existing in (path, path + GZIP_SUFFIX):
+            try:
+                # Продлеваем срок хранения уже сохраненного отчета
+                os.utime(existing)
+                return StoredReport(job_id, digest, existing, len(data), True)
+            except FileNotFoundError:
+                continue
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, data, job_id)
+        return StoredReport(job_id, digest, path, len(data), False)
+
+    def read(self, digest: str, ext: str = 'pdf') -> Optional[bytes]:
+        """Содержимое отчета по хэшу (сжатые файлы распаковываются) или None"""
+        path = self.path_for(digest, ext)
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+        try:
+            with gzip.open(path + GZIP_SUFFIX, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _iter_files(self):
+        """Все файлы хранилища: (путь, размер, mtime)"""
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def _compress(self, path: str) -> int:
+        """Сжимает файл gzip (атомарно), возвращает новый размер"""
+        target = path + GZIP_SUFFIX
+        tmp_path = os.path.join(os.path.dirname(path), f"{TMP_PREFIX}{new_job_id()}")
+        mtime = os.stat(path).st_mtime
+        with open(path, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst)
+        # Сохраняем возраст отчета, иначе сжатие продлит срок хранения
+        os.utime(tmp_path, (mtime, mtime))
+        os.replace(tmp_path, target)
+        os.unlink(path)
+        return os.path.getsize(target)
+
+    def sweep(self, now: Optional[float] = None) -> Dict:
+        """
+        Очистка хранилища: сжатие, удаление по возрасту и по бюджету диска
+
+        Returns:
+            Статистика: files, bytes, compressed, expired, evicted, tmp_removed
+        """
+        now = now or time.time()
+        stats = {'files': 0, 'bytes': 0, 'compressed': 0, 'expired': 0, 'evicted': 0, 'tmp_removed': 0}
+        kept: List[Tuple[float, str, int]] = []
+
+        for path, size, mtime in self._iter_files():
+            age = now - mtime
+            name = os.path.basename(path)
+            try:
+                if name.startswith(TMP_PREFIX):
+                    if age > STALE_TMP_SECONDS:
+                        os.unlink(path)
+                        stats['tmp_removed'] += 1
+                    continue
+                if self.expire_after and age > self.expire_after:
+                    os.unlink(path)
+                    stats['expired'] += 1
+                    continue
+                if self.compress_after and age > self.compress_after and not name.endswith(GZIP_SUFFIX):
+                    path, size = path + GZIP_SUFFIX, self._compress(path)
+                    stats['compressed'] += 1
+            except FileNotFoundError:
+                # Файл удален параллельно
+                continue
+            except OSError as e:
+                logger.warning("Не удалось обработать %s: %s", path, e)
+            kept.append((mtime, path, size))
+            stats['bytes'] += size
+
+        if self.max_bytes and stats['bytes'] > self.max_bytes:
+            kept.sort()
+            for mtime, path, size in kept:
+                if stats['bytes'] <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                stats['bytes'] -= size
+                stats['evicted'] += 1
+
+        stats['files'] = len(kept) - stats['evicted']
+        return stats
+
+    def start_retention(self, interval: float = 3600.0):
+        """Запускает фоновую очистку хранилища"""
+        if self._sweeper and self._sweeper.is_alive():
+            return
+        self._stop.clear()
+
+        def _sweep():
+            while not self._stop.wait(interval):
+                try:
+                    stats = self.sweep()
+                    logger.info("Очистка отчетов: %s", stats)
+                except Exception as e:
+                    logger.error("Ошибка очистки хранилища отчетов: %s", e, exc_info=True)
+
+        self._sweeper = threading.Thread(target=_sweep, name='report-retention', daemon=True)
+        self._sweeper.start()
+
+    def stop_retention(self):
+        """Останавливает фоновую очистку"""
+        self._stop.set()
@@ -0,0 +1,238 @@
+"""
+Исходящие запросы к Telegram: ограничение частоты и сообщение о ходе проверки
+Общий и по-чатовый token bucket, ожидание retry_after при 429, повтор при
+сетевых ошибках и объединение частых правок одного сообщения
+"""
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from telegram import Message
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+logger = logging.getLogger(__name__)
+
+# Пустые по-чатовые корзины удаляются, когда их становится больше этого числа
+MAX_IDLE_BUCKETS = 10000
+
+
+class TokenBucket:
+    """
+    Token bucket с резервированием
+
+    reserve() сразу списывает токен (баланс может уйти в минус) и возвращает,
+    сколько секунд ждать. Поэтому ожидающие обслуживаются по очереди, без
+    повторных проверок.
+    """
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Списывает токен, возвращает время ожидания (секунды)"""
+        self._refill(time.monotonic())
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    @property
+    def saturated(self) -> bool:
+        """Токенов нет: следующий запрос пришлось бы отложить"""
+        self._refill(time.monotonic())
+        return self.tokens < 1
+
+    def pause(self, seconds: float):
+        """Запрещает отправку на seconds секунд (ответ 429 с retry_after)"""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+    @property
+    def idle(self) -> bool:
+        """Корзина полна — состояние можно не хранить"""
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class OutboundScheduler:
+    """
+    Планировщик исходящих вызовов Bot API
+
+    Каждый вызов ждет токен своего чата и общий токен. На 429 чат (а если
+    его лимит не исчерпан — весь бот) приостанавливается на retry_after и
+    вызов повторяется; на сетевые ошибки
+    (кроме таймаута, после которого сообщение могло уйти) — повтор с
+    экспоненциальной задержкой.
+    """
+
+    def __init__(self, global_rate: float = 25.0, chat_rate: float = 1.0, chat_burst: float = 3.0,
+                 global_burst: float = 5.0, max_retries: int = 3, backoff: float = 0.5):
+        """
+        Args:
+            global_rate: Запросов в секунду на всего бота
+            chat_rate: Запросов в секунду в один чат
+            chat_burst: Сколько запросов в чат можно отправить подряд без ожидания
+            global_burst: Сколько запросов бота можно отправить подряд сверх global_rate
+            max_retries: Повторов одного вызова
+            backoff: Начальная задержка повтора при сетевой ошибке (секунды)
+        """
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._chats: Dict[int, TokenBucket] = {}
+        self.stats = {'calls': 0, 'retry_after': 0, 'network_retries': 0, 'failed': 0}
+        # Запросы к Bot API в полете (занятые соединения HTTP-клиента)
+        self.in_flight = 0
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_IDLE_BUCKETS:
+                self._chats = {k: b for k, b in self._chats.items() if not b.idle}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _acquire(self, chat_id: int):
+        # Сначала чат, затем общий лимит: ожидание чата не занимает общие токены
+        wait = self._chat_bucket(chat_id).reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        wait = self.global_bucket.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+    async def call(self, chat_id: int, fn: Callable[..., Awaitable], /, *args, **kwargs) -> Any:
+        """
+        Выполняет вызов Bot API с учетом лимитов
+
+        Args:
+            chat_id: Чат, в который уходит запрос
+            fn: Метод бота или сообщения (reply_text, edit_text, ...)
+
+        Raises:
+            TelegramError: если вызов не удался после всех повторов
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(chat_id)
+            self.stats['calls'] += 1
+            self.in_flight += 1
+            backoff = 0.0
+            try:
+                return await fn(*args, **kwargs)
+            except RetryAfter as e:
+                self.stats['retry_after'] += 1
+                seconds = _retry_seconds(e)
+                logger.warning("429 для чата %s: ждем %.0f с", chat_id, seconds)
+                bucket = self._chat_bucket(chat_id)
+                # Лимит чата не исчерпан — значит, сработал общий лимит бота: ждут все чаты
+                if not bucket.saturated:
+                    self.global_bucket.pause(seconds)
+                bucket.pause(seconds)
+                if attempt == self.max_retries:
+                    self.stats['failed'] += 1
+                    raise
+            except (BadRequest, TimedOut):
+                self.stats['failed'] += 1
+                raise
+            except NetworkError as e:
+                self.stats['network_retries'] += 1
+                if attempt == self.max_retries:
+                    self.stats['failed'] += 1
+                    raise
+                backoff = self.backoff * 2 ** attempt
+                logger.warning("Сетевая ошибка Telegram (%s), повтор через %.1f с", e, backoff)
+            finally:
+                self.in_flight -= 1
+            if backoff:
+                await asyncio.sleep(backoff)
+
+
+class ProgressMessage:
+    """
+    Одно сообщение о ходе проверки, которое правится по этапам
+
+    update() не ждет отправки: пока предыдущая правка ждет токен или сеть,
+    новые тексты заменяют друг друга и уходит только последний.
+    """
+
+    def __init__(self, sender: OutboundScheduler, reply_to: Message):
+        """
+        Args:
+            sender: Планировщик исходящих запросов
+            reply_to: Сообщение пользователя, на которое отвечает бот
+        """
+        self.sender = sender
+        self.reply_to = reply_to
+        self.chat_id = reply_to.chat_id
+        self.message: Optional[Message] = None
+        self._text: Optional[str] = None
+        self._pending: Optional[Tuple[str, Dict]] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def start(self, text: str, **kwargs):
+        """Отправляет сообщение о ходе проверки"""
+        self.message = await self.sender.call(self.chat_id, self.reply_to.reply_text, text, **kwargs)
+        self._text = text
+
+    def update(self, text: str, **kwargs):
+        """Планирует правку сообщения (частые правки объединяются)"""
+        self._pending = (text, kwargs)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        while self._pending is not None:
+            text, kwargs = self._pending
+            self._pending = None
+            if text == self._text:
+                continue
+            try:
+                await self._send(text, **kwargs)
+            except BadRequest as e:
+                # "message is not modified" и т.п. — состояние чата не изменилось
+                logger.debug("Правка сообщения о ходе проверки отклонена: %s", e)
+            except Exception as e:
+                logger.error("Ошибка обновления сообщения о ходе проверки: %s", e, exc_info=True)
+
+    async def _send(self, text: str, **kwargs):
+        if self.message is None:
+            self.message = await self.sender.call(self.chat_id, self.reply_to.reply_text, text, **kwargs)
+        else:
+            await self.sender.call(self.chat_id, self.message.edit_text, text, **kwargs)
+        self._text = text
+
+    async def finish(self, text: str, **kwargs):
+        """
+        Последняя правка: заменяет неотправленные, дожидается текущей и отправляет text
+
+        Raises:
+            TelegramError: если сообщение не отправлено (кроме "message is not modified")
+        """
+        self._pending = None
+        if self._flusher is not None:
+            await self._flusher
+        if text == self._text:
+            return
+        try:
+            await self._send(text, **kwargs)
+        except BadRequest as e:
+            if 'not modified' not in str(e).lower():
+                raise
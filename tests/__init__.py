@@ -0,0 +1,6 @@
+"""
+Тесты Рекламного Инспектора
+
+Запуск из корня проекта:
+    python -m pytest -q
+"""
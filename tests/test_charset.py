@@ -0,0 +1,35 @@
+"""
+Кодировка страницы: объявленная сверяется с содержимым
+"""
+import pytest
+
+from analyzer.charset import decode_html, sniff_encoding
+
+PAGE = '<html><body>' + 'Банкротство физических лиц под ключ, списание долгов. ' * 40 + '</body></html>'
+
+
+@pytest.mark.parametrize('encoding, content_type', [
+    ('cp1251', 'text/html; charset=windows-1251'),
+    ('utf-8', 'text/html; charset=utf-8'),
+])
+def test_declared_encoding_matches(encoding, content_type):
+    assert sniff_encoding(PAGE.encode(encoding), content_type) == (encoding, 'header')
+
+
+@pytest.mark.parametrize('encoding, content_type', [
+    # Кириллица в windows-1251 под латинской кодировкой сервера по умолчанию
+    ('cp1251', 'text/html; charset=windows-1252'),
+    ('cp1251', 'text/html; charset=iso-8859-1'),
+    # Объявлена UTF-8, страница в windows-1251
+    ('cp1251', 'text/html; charset=utf-8'),
+    # Объявлена windows-1251, страница в UTF-8
+    ('utf-8', 'text/html; charset=windows-1251'),
+])
+def test_declared_encoding_corrected(encoding, content_type):
+    assert sniff_encoding(PAGE.encode(encoding), content_type) == (encoding, 'corrected')
+    assert decode_html(PAGE.encode(encoding), content_type) == PAGE
+
+
+def test_meta_charset_corrected():
+    html = '<meta charset="utf-8">' + PAGE
+    assert sniff_encoding(html.encode('cp1251')) == ('cp1251', 'corrected')
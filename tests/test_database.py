@@ -0,0 +1,59 @@
+"""
+База на SQLite: очередь записи и повторная регистрация
+"""
+import time
+
+import pytest
+
+import database
+
+pytestmark = pytest.mark.skipif(database.USE_POSTGRESQL, reason='тесты очереди записи SQLite')
+
+CHECK = {
+    'telegram_id': '1',
+    'material_type': 'site',
+    'material_url': 'https://example.ru',
+    'verdict': 'ok',
+    'violations_count': 0,
+    'report_path': '',
+}
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Зависшая очередь записи не ждет по умолчанию 30 секунд
+    monkeypatch.setattr(database, 'SQLITE_BUSY_TIMEOUT', 2)
+    db = database.Database(str(tmp_path / 'users.db'))
+    db.register_user('1', 'user', 'Пользователь', '+70000000000')
+    yield db
+    db.close()
+
+
+def test_writer_released_after_failed_write(db, monkeypatch):
+    held = []
+
+    def fail(cursor, saved):
+        # Ссылка на курсор держит соединение: вернуть его может только finally
+        held.append(cursor)
+        raise RuntimeError('сбой записи')
+
+    monkeypatch.setattr(db, '_add_to_rollups', fail)
+    assert db.save_checks([CHECK]) == 0
+    assert not db.pool_state()['writer_busy']
+    monkeypatch.undo()
+
+    started = time.perf_counter()
+    assert db.save_checks([CHECK]) == 1
+    assert time.perf_counter() - started < 1
+    assert db.get_user_checks_count('1') == 1
+
+
+def test_deactivated_user_registers_again(db):
+    assert not db.register_user('1', 'user', 'Пользователь', '+70000000000')
+
+    assert db.deactivate_users(['1']) == 1
+    assert not db.is_user_registered('1')
+
+    assert db.register_user('1', 'new_name', 'Новое имя', '+71111111111')
+    assert db.is_user_registered('1')
+    assert db.get_user('1')['username'] == 'new_name'
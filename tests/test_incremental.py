@@ -0,0 +1,59 @@
+"""
+Повторная проверка по сегментам дает тот же результат, что полный анализ
+"""
+import pytest
+
+from analyzer.incremental import IncrementalAnalyzer, split_segments
+from analyzer.material_analyzer import MaterialAnalyzer
+
+
+def _violations(result):
+    return [(v.category, v.pattern_id, v.start, v.end) for v in result.violations]
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return MaterialAnalyzer()
+
+
+def _page(count: int, changed: int = -1) -> str:
+    # Без концов предложений: текст режется по пробелам, в том числе внутри
+    # «полное списание» — совпадения попадают на границы сегментов
+    return ' '.join(
+        f'полное списание долга номер {i}' if i != changed else f'гарантируем результат номер {i}'
+        for i in range(count)
+    )
+
+
+def test_same_result_as_full_analysis(analyzer):
+    text = _page(600)
+    full = analyzer.analyze_text(text, material_type='site', url='https://example.ru')
+    result, diff = IncrementalAnalyzer(analyzer).analyze_html(f'<p>{text}</p>', 'https://example.ru', '1')
+
+    assert diff is None
+    assert result.verdict == full.verdict
+    assert result.disclaimer == full.disclaimer
+    assert _violations(result) == _violations(full)
+
+
+def test_matches_across_segment_boundary(analyzer):
+    text = _page(600)
+    cuts = [end for _, end in split_segments(text)[:-1]]
+    full = analyzer.analyze_text(text, material_type='site')
+    crossing = [(v.start, v.end) for v in full.violations if any(v.start < cut < v.end for cut in cuts)]
+    assert crossing, "в тексте нет совпадений через границу сегментов"
+
+    result, _ = IncrementalAnalyzer(analyzer).analyze_html(text, None, '1')
+    found = {(v.start, v.end) for v in result.violations}
+    assert set(crossing) <= found
+    assert _violations(result) == _violations(full)
+
+
+def test_recheck_of_changed_page(analyzer):
+    incremental = IncrementalAnalyzer(analyzer)
+    incremental.analyze_html(_page(600), None, '1')
+
+    # Повторная проверка: сегменты берутся из кэша, заново — только измененный
+    text = _page(600, changed=300)
+    result, _ = incremental.analyze_html(text, None, '1')
+    assert _violations(result) == _violations(analyzer.analyze_text(text, material_type='site'))
@@ -0,0 +1,51 @@
+"""
+Загрузка страниц наблюдения: тело ответа, пришедшее несколькими частями
+"""
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from monitor import PageFetcher
+
+PARAGRAPH = '<p>' + 'Списание долгов. ' * 60 + '</p>'
+
+
+async def _page(request):
+    response = web.StreamResponse(headers={'Content-Type': 'text/html; charset=utf-8'})
+    await response.prepare(request)
+    for _ in range(int(request.query['parts'])):
+        await response.write(PARAGRAPH.encode('utf-8'))
+        # Части уходят отдельными пакетами
+        await asyncio.sleep(0.01)
+    await response.write_eof()
+    return response
+
+
+async def _fetch(parts: int, max_bytes: int):
+    app = web.Application()
+    app.router.add_get('/', _page)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    fetcher = PageFetcher(max_bytes=max_bytes)
+    try:
+        return await fetcher.fetch(f'http://127.0.0.1:{port}/?parts={parts}')
+    finally:
+        await fetcher.close()
+        await runner.cleanup()
+
+
+def test_reads_multi_chunk_body():
+    result = asyncio.run(_fetch(parts=8, max_bytes=1024 * 1024))
+    assert result.status == 200
+    assert result.text == PARAGRAPH * 8
+    assert len(result.body) == len(PARAGRAPH.encode('utf-8')) * 8
+
+
+def test_body_over_limit():
+    limit = len(PARAGRAPH.encode('utf-8')) * 3
+    with pytest.raises(ValueError, match='страница больше'):
+        asyncio.run(_fetch(parts=8, max_bytes=limit))
@@ -0,0 +1,250 @@
+"""
+Логирование проверок: trace ID на проверку, spans по этапам, неблокирующий вывод
+Записи уходят в очередь и пишутся отдельным потоком, поэтому логирование не
+блокирует цикл событий; отладочные записи сохраняются для части проверок
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_current_trace: ContextVar[Optional['Trace']] = ContextVar('trace', default=None)
+
+# Сеанс профилирования (profiling.ProfileSession), пока он идет; иначе None
+_stage_profiler = None
+
+# Поля LogRecord, которые не выводятся в JSON как дополнительные
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'trace_id'}
+
+
+class Trace:
+    """
+    Одна проверка: trace ID, длительности этапов и итоговые поля
+
+    Контекст asyncio копируется в задачи и в asyncio.to_thread, поэтому
+    этапы, выполненные параллельно, попадают в тот же trace.
+    """
+
+    __slots__ = ('trace_id', 'kind', 'started', 'spans', 'fields', 'token')
+
+    def __init__(self, kind: str, **fields):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.kind = kind
+        self.started = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+        self.fields = fields
+        self.token = None
+
+    def add_span(self, stage: str, seconds: float):
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+
+def start_trace(kind: str = 'check', **fields) -> Trace:
+    """Начинает trace в текущем контексте (обработчик сообщения)"""
+    trace = Trace(kind, **fields)
+    trace.token = _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_trace_id() -> str:
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else '-'
+
+
+def set_trace_fields(**fields):
+    """Добавляет поля в итоговую запись текущей проверки (вердикт, тип материала)"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.fields.update(fields)
+
+
+def record_span(stage: str, seconds: float):
+    """Учитывает длительность этапа, измеренную в другом месте (например, в процессе пула)"""
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(stage, seconds)
+
+
+def set_stage_profiler(profiler):
+    """Подключает сеанс профилирования к этапам и проверкам (None — отключает)"""
+    global _stage_profiler
+    _stage_profiler = profiler
+
+
+@contextmanager
+def span(stage: str):
+    """
+    with span('fetch'): ... — длительность этапа в метриках и в trace проверки
+
+    Отладочная запись о каждом этапе формируется только если DEBUG включен.
+    Во время сеанса профилирования этап замеряется и профилировщиком.
+    """
+    profiler = _stage_profiler
+    token = profiler.stage_started(stage) if profiler is not None else None
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        record_span(stage, seconds)
+        logger.debug("span %s %.1f мс", stage, seconds * 1000)
+        if profiler is not None:
+            profiler.stage_finished(stage, token, seconds)
+
+
+def finish_trace(trace: Trace, **fields):
+    """Одна итоговая запись о проверке: поля и длительности этапов (мс)"""
+    trace.fields.update(fields)
+    if logger.isEnabledFor(logging.INFO):
+        total_ms = round((time.perf_counter() - trace.started) * 1000, 1)
+        spans_ms = {stage: round(seconds * 1000, 1) for stage, seconds in trace.spans.items()}
+        logger.info(
+            "%s: %.0f мс; %s; этапы (мс): %s",
+            trace.kind, total_ms,
+            ' '.join(f"{key}={value}" for key, value in trace.fields.items()),
+            ' '.join(f"{stage}={ms:.0f}" for stage, ms in spans_ms.items()),
+            extra={'fields': {**trace.fields, 'kind': trace.kind, 'total_ms': total_ms, 'spans_ms': spans_ms}}
+        )
+    profiler = _stage_profiler
+    if profiler is not None:
+        profiler.trace_finished(trace)
+    if trace.token is not None:
+        # Следующий апдейт может обрабатываться в той же задаче — trace не должен «протечь» в него
+        try:
+            _current_trace.reset(trace.token)
+        except ValueError:
+            pass
+        trace.token = None
+
+
+class TraceFilter(logging.Filter):
+    """Добавляет trace_id текущей проверки в каждую запись"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace_id()
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """
+    Пропускает отладочные записи только части проверок
+
+    Решение принимается по trace ID, поэтому у выбранной проверки сохраняются
+    все отладочные записи, а у остальных — ни одной. Записи INFO и выше и
+    записи вне проверок проходят всегда.
+    """
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.threshold = int(max(0.0, min(rate, 1.0)) * 0xFFFFFFFF)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.threshold >= 0xFFFFFFFF:
+            return True
+        trace_id = getattr(record, 'trace_id', None) or current_trace_id()
+        if trace_id == '-':
+            return True
+        return zlib.crc32(trace_id.encode()) <= self.threshold
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись одной строкой JSON: время, уровень, логгер, trace_id, сообщение и поля"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'trace_id': getattr(record, 'trace_id', '-'),
+            'message': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if isinstance(fields, dict):
+            payload.update(fields)
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and key != 'fields':
+                payload[key] = value
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload['exc_info'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler, который не форматирует запись в вызывающем потоке
+
+    Стандартный prepare() применяет форматтер (время, traceback) до постановки
+    в очередь; здесь подставляются только аргументы сообщения, остальное
+    делает поток вывода.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            # traceback нельзя передавать дальше: кадры могут измениться
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def setup_logging(level: str = 'INFO', fmt: Optional[str] = None, json_output: bool = False,
+                  debug_sample_rate: float = 1.0) -> logging.handlers.QueueListener:
+    """
+    Настраивает корневой логгер: очередь в вызывающем потоке, вывод в отдельном
+
+    Args:
+        level: Уровень логирования
+        fmt: Формат текстовых записей (может использовать %(trace_id)s)
+        json_output: Писать записи строками JSON
+        debug_sample_rate: Доля проверок, чьи отладочные записи сохраняются
+
+    Returns:
+        QueueListener (остановить при завершении, чтобы дописать очередь)
+    """
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if json_output else logging.Formatter(fmt))
+
+    log_queue = queue.SimpleQueue()
+    handler = _DeferredQueueHandler(log_queue)
+    handler.addFilter(TraceFilter())
+    handler.addFilter(DebugSampler(debug_sample_rate))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, level.upper(), logging.INFO))
+
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+
+    def _direct_output_in_child():
+        # В процессах пулов потока вывода нет — пишем напрямую
+        root.removeHandler(handler)
+        direct = logging.StreamHandler()
+        direct.setFormatter(output.formatter)
+        direct.addFilter(TraceFilter())
+        root.addHandler(direct)
+
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_direct_output_in_child)
+    return listener
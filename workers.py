@@ -0,0 +1,105 @@
+"""
+Пулы фоновых процессов для тяжелых задач (OCR, рендеринг)
+Ограничивают очередь, чтобы под нагрузкой бот отказывал сразу, а не копил задачи
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import profiling
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(RuntimeError):
+    """Очередь пула переполнена"""
+
+
+class WorkerPool:
+    """
+    Пул процессов с ограниченной очередью
+
+    Одновременно выполняется не более `max_workers` задач, еще не более
+    `max_queue` ждут свободного процесса. Остальные отклоняются с QueueFullError.
+    """
+
+    def __init__(self, name: str, max_workers: Optional[int] = None, max_queue: int = 8):
+        self.name = name
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """Задачи в работе и в очереди"""
+        return self._pending
+
+    @property
+    def queued(self) -> int:
+        """Задачи, ожидающие свободного процесса"""
+        return max(0, self._pending - self.max_workers)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Процессы создаются при первой задаче, а не при импорте
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def submit(self, fn: Callable, *args) -> Any:
+        """
+        Выполняет fn(*args) в отдельном процессе
+
+        Raises:
+            QueueFullError: если очередь переполнена
+        """
+        if self._pending >= self.max_workers + self.max_queue:
+            raise QueueFullError(f"Очередь пула {self.name} переполнена ({self._pending} задач)")
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            session = profiling.current_session()
+            if session is None:
+                return await loop.run_in_executor(self._get_executor(), fn, *args)
+            # Сеанс профилирования: задача замеряет память своего процесса
+            measured = await loop.run_in_executor(self._get_executor(), profiling.measured_call, fn, *args)
+            task = args[0] if fn is timed_call else fn
+            session.record_worker(f"{self.name}/{getattr(task, '__name__', 'task')}", measured)
+            return measured['result']
+        finally:
+            self._pending -= 1
+
+    def state(self) -> Dict:
+        """Размеры, задачи и процессы пула (pid → RSS) для снимка состояния"""
+        processes = getattr(self._executor, '_processes', None) or {}
+        return {
+            'workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'pending': self.pending,
+            'queued': self.queued,
+            'processes': {pid: profiling.rss_bytes(pid) for pid in list(processes)},
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Останавливает процессы пула"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+def timed_call(fn: Callable, submitted_at: float, *args) -> Any:
+    """
+    Обертка для выполнения в процессе пула: добавляет время ожидания в очереди
+
+    Функция fn должна возвращать словарь; в его 'timings' записывается
+    'queue_wait' — сколько задача ждала свободного процесса.
+    """
+    started = time.time()
+    result = fn(*args)
+    if isinstance(result, dict):
+        result.setdefault('timings', {})['queue_wait'] = max(0.0, started - submitted_at)
+    return result